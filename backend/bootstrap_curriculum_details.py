@@ -1,14 +1,33 @@
 
 import os
+import sys
 import django
 
 # Set up Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'school_management.settings')
 django.setup()
 
-from cbc.models import GradeLevel, LearningArea, Strand, SubStrand, LearningOutcome
+from cbc import releases
+from cbc.curriculum import BASE, get_curriculum
+from cbc.models import Strand, SubStrand, LearningOutcome
 
-def bootstrap_strands():
+
+class AddedNode:
+    """A node added by this run, in the shape of a curriculum snapshot node"""
+
+    def __init__(self, row):
+        self.id, self.name, self.code, self.order = row.pk, getattr(row, 'name', ''), row.code, row.order
+        self.strands = self.sub_strands = self.outcomes = ()
+
+
+def add(release, model, parent_id, **fields):
+    """Add a node to the base registry, or to a curriculum release (see cbc.releases)"""
+    if release is None:
+        return AddedNode(model.objects.create(**{f'{releases.PARENTS[model]}_id': parent_id}, **fields))
+    return AddedNode(releases.add(release, model, parent_id, **fields))
+
+
+def bootstrap_strands(release=None):
     # Define common strands for major learning areas
     baseline_curriculum = {
         'Mathematics': [
@@ -73,8 +92,9 @@ def bootstrap_strands():
         'Kiswahili': 'Kiswahili'
     }
 
-    learning_areas = LearningArea.objects.all()
-    print(f"Bootstrapping {learning_areas.count()} areas...")
+    curriculum = get_curriculum(release.id if release else BASE)
+    learning_areas = list(curriculum.areas.values())
+    print(f"Bootstrapping {len(learning_areas)} areas{f' in {release.name}' if release else ''}...")
 
     for area in learning_areas:
         # Determine which baseline to use
@@ -94,46 +114,33 @@ def bootstrap_strands():
         else:
             strands_to_add = baseline_curriculum[baseline_key]
 
-        print(f"Processing {area.name} ({area.grade_level.name})...")
+        print(f"Processing {area.name} ({area.grade.name})...")
         for s_data in strands_to_add:
-            # Check if a strand with this order already exists for this area
-            existing_strand = Strand.objects.filter(learning_area=area, order=s_data['order']).first()
-            if existing_strand:
-                strand = existing_strand
-                s_created = False
-            else:
+            # Reuse a strand with this order (or name) in this area
+            strand = next(
+                (s for s in area.strands if s.order == s_data['order'] or s.name == s_data['name']), None
+            )
+            if strand is None:
                 s_code = f"{area.code}-{s_data['name'].upper().replace(' ', '-')[:10]}"
-                strand, s_created = Strand.objects.get_or_create(
-                    learning_area=area,
-                    name=s_data['name'],
-                    defaults={'order': s_data['order'], 'code': s_code}
-                )
+                strand = add(release, Strand, area.id, name=s_data['name'], order=s_data['order'], code=s_code)
             
             for sub_data in s_data['sub_strands']:
-                # Check if a sub-strand with this order already exists for this strand
-                existing_sub = SubStrand.objects.filter(strand=strand, order=sub_data['order']).first()
-                if existing_sub:
-                    sub = existing_sub
-                    sub_created = False
-                else:
+                # Reuse a sub-strand with this order (or name) in this strand
+                sub = next(
+                    (u for u in strand.sub_strands if u.order == sub_data['order'] or u.name == sub_data['name']), None
+                )
+                if sub is None:
                     sub_code = f"{strand.code}-{sub_data['name'].upper().replace(' ', '-')[:10]}"
-                    sub, sub_created = SubStrand.objects.get_or_create(
-                        strand=strand,
-                        name=sub_data['name'],
-                        defaults={'order': sub_data['order'], 'code': sub_code}
-                    )
+                    sub = add(release, SubStrand, strand.id, name=sub_data['name'], order=sub_data['order'],
+                              code=sub_code)
                 
-                # Check if a learning outcome already exists for this sub-strand
-                existing_outcome = LearningOutcome.objects.filter(sub_strand=sub).first()
-                if not existing_outcome:
-                    o_code = f"{sub.code}-01"
-                    LearningOutcome.objects.get_or_create(
-                        sub_strand=sub,
-                        code=o_code,
-                        defaults={'description': sub_data['outcome'], 'order': 1}
-                    )
+                # Add a learning outcome unless the sub-strand has one
+                if not sub.outcomes:
+                    add(release, LearningOutcome, sub.id, code=f"{sub.code}-01", description=sub_data['outcome'],
+                        order=1)
     
     print("Bootstrap complete!")
 
 if __name__ == "__main__":
-    bootstrap_strands()
+    # Optional curriculum release code; without it the base registry is bootstrapped
+    bootstrap_strands(releases.get_release(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,213 @@
+"""
+Outcome Achievement Service
+Maintains the materialized student x learning outcome -> latest competency table
+"""
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+
+from cbc.models import CompetencyAssessment, OutcomeAchievement
+
+GRADED_QUIZ_STATUSES = ['graded', 'auto_graded']
+
+
+def quiz_outcome_map(quiz_ids):
+    """
+    Map each quiz to the learning outcomes it tests (tested_outcomes plus the legacy FK)
+    """
+    from courses.models import Quiz
+
+    outcomes = {quiz_id: set() for quiz_id in quiz_ids}
+    through = Quiz.tested_outcomes.through.objects.filter(quiz_id__in=quiz_ids)
+    for quiz_id, outcome_id in through.values_list('quiz_id', 'learningoutcome_id'):
+        outcomes[quiz_id].add(outcome_id)
+    legacy = Quiz.objects.filter(id__in=quiz_ids, learning_outcome__isnull=False)
+    for quiz_id, outcome_id in legacy.values_list('id', 'learning_outcome_id'):
+        outcomes[quiz_id].add(outcome_id)
+    return outcomes
+
+
+def best_quiz_attempts(student_ids=None, quiz_ids=None):
+    """
+    Highest scoring graded attempt per student per quiz, with the quiz total attached.
+    Returns a list of (submission_id, student_id, quiz_id, score, total, submitted_at, feedback).
+    """
+    from courses.models import QuizQuestion, QuizSubmission
+
+    quiz_total = QuizQuestion.objects.filter(
+        quiz_id=OuterRef('quiz_id')
+    ).values('quiz_id').annotate(total=Sum('points')).values('total')
+
+    submissions = QuizSubmission.objects.filter(status__in=GRADED_QUIZ_STATUSES)
+    if student_ids is not None:
+        submissions = submissions.filter(student_id__in=student_ids)
+    if quiz_ids is not None:
+        submissions = submissions.filter(quiz_id__in=quiz_ids)
+    submissions = submissions.annotate(quiz_total=Subquery(quiz_total)).order_by(
+        'student_id', 'quiz_id', '-score', '-submitted_at'
+    ).values_list('id', 'student_id', 'quiz_id', 'score', 'quiz_total', 'submitted_at', 'feedback')
+
+    best = []
+    seen = set()
+    for row in submissions:
+        if (row[1], row[2]) in seen:
+            continue
+        seen.add((row[1], row[2]))
+        best.append(row)
+    return best
+
+
+def compute_outcome_achievements(student_ids=None, outcome_ids=None):
+    """
+    Compute the latest achievement per (student_id, outcome_id) from source records.
+
+    The most recent evidence wins. On the same date a teacher's direct assessment
+    takes precedence over a quiz result; for quizzes only the best attempt counts.
+    """
+    from courses.models import Quiz, competency_level_for_score
+
+    candidates = {}
+
+    def offer(key, rank, row):
+        current = candidates.get(key)
+        if current is None or rank > current[0]:
+            candidates[key] = (rank, row)
+
+    assessments = CompetencyAssessment.objects.all()
+    if student_ids is not None:
+        assessments = assessments.filter(student_id__in=student_ids)
+    if outcome_ids is not None:
+        assessments = assessments.filter(learning_outcome_id__in=outcome_ids)
+    for asmt_id, student_id, outcome_id, level, asmt_date, comment in assessments.values_list(
+        'id', 'student_id', 'learning_outcome_id', 'competency_level', 'assessment_date', 'teacher_comment'
+    ):
+        offer((student_id, outcome_id), (asmt_date, 1, asmt_id), {
+            'competency_level': level,
+            'assessment_date': asmt_date,
+            'source': 'assessment',
+            'source_id': asmt_id,
+            'comment': comment,
+        })
+
+    quiz_ids = None
+    if outcome_ids is not None:
+        quiz_ids = list(Quiz.objects.filter(
+            Q(learning_outcome_id__in=outcome_ids) | Q(tested_outcomes__in=outcome_ids)
+        ).values_list('id', flat=True).distinct())
+        if not quiz_ids:
+            return {key: row for key, (_, row) in candidates.items()}
+
+    attempts = best_quiz_attempts(student_ids, quiz_ids)
+    outcomes_by_quiz = quiz_outcome_map({attempt[2] for attempt in attempts})
+    wanted = set(outcome_ids) if outcome_ids is not None else None
+    for sub_id, student_id, quiz_id, score, total, submitted_at, feedback in attempts:
+        level = competency_level_for_score(score, total)
+        if not level:
+            continue
+        sub_date = submitted_at.date()
+        for outcome_id in outcomes_by_quiz[quiz_id]:
+            if wanted is not None and outcome_id not in wanted:
+                continue
+            offer((student_id, outcome_id), (sub_date, 0, submitted_at), {
+                'competency_level': level,
+                'assessment_date': sub_date,
+                'source': 'quiz',
+                'source_id': sub_id,
+                'comment': feedback,
+            })
+
+    return {key: row for key, (_, row) in candidates.items()}
+
+
+def _write_achievements(achievements):
+    rows = [
+        OutcomeAchievement(student_id=student_id, learning_outcome_id=outcome_id, **values)
+        for (student_id, outcome_id), values in achievements.items()
+    ]
+    OutcomeAchievement.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['student', 'learning_outcome'],
+        update_fields=['competency_level', 'assessment_date', 'source', 'source_id', 'comment', 'updated_at'],
+    )
+
+
+def refresh_outcome_achievements(student_id, outcome_ids):
+    """
+    Incrementally recompute the achievement rows for one student and a few outcomes
+    """
+    refresh_students_achievements([student_id] if student_id else [], outcome_ids)
+
+
+def refresh_students_achievements(student_ids, outcome_ids):
+    """
+    Recompute the achievement rows for some students and outcomes, dropping
+    rows whose evidence is gone
+    """
+    student_ids = [s_id for s_id in student_ids if s_id]
+    outcome_ids = [o_id for o_id in outcome_ids if o_id]
+    if not student_ids or not outcome_ids:
+        return
+
+    achievements = compute_outcome_achievements(student_ids, outcome_ids)
+    with transaction.atomic():
+        stale = OutcomeAchievement.objects.filter(student_id__in=student_ids, learning_outcome_id__in=outcome_ids)
+        keep = set(achievements)
+        stale_ids = [
+            pk for pk, s_id, o_id in stale.values_list('id', 'student_id', 'learning_outcome_id')
+            if (s_id, o_id) not in keep
+        ]
+        OutcomeAchievement.objects.filter(id__in=stale_ids).delete()
+        _write_achievements(achievements)
+
+
+def _sourced_outcomes(submission_id):
+    """Outcomes whose achievement row currently comes from this quiz submission"""
+    return OutcomeAchievement.objects.filter(source='quiz', source_id=submission_id).values_list(
+        'learning_outcome_id', flat=True
+    )
+
+
+def refresh_quiz_achievements(submission):
+    """
+    Refresh achievements for every outcome tested by a quiz submission, and
+    every outcome whose achievement came from it (it may have been regraded
+    out of 'graded', or its quiz may no longer test the outcome)
+    """
+    outcome_ids = quiz_outcome_map([submission.quiz_id])[submission.quiz_id]
+    outcome_ids |= set(_sourced_outcomes(submission.pk))
+    refresh_outcome_achievements(submission.student_id, outcome_ids)
+
+
+def refresh_removed_submission(submission):
+    """A deleted submission only matters where it was the achievement's source"""
+    refresh_outcome_achievements(submission.student_id, set(_sourced_outcomes(submission.pk)))
+
+
+def refresh_quiz_outcomes(quiz_ids, outcome_ids):
+    """
+    A quiz started or stopped testing some outcomes: recompute them for every
+    student with a graded attempt on the quiz
+    """
+    from courses.models import QuizSubmission
+
+    student_ids = QuizSubmission.objects.filter(
+        quiz_id__in=quiz_ids, status__in=GRADED_QUIZ_STATUSES
+    ).values_list('student_id', flat=True).distinct()
+    refresh_students_achievements(list(student_ids), outcome_ids)
+
+
+def rebuild_outcome_achievements(student_ids=None):
+    """
+    Rebuild the table from scratch (all students, or only the given ones).
+    Returns the number of rows written.
+    """
+    achievements = compute_outcome_achievements(student_ids)
+    with transaction.atomic():
+        stale = OutcomeAchievement.objects.all()
+        if student_ids is not None:
+            stale = stale.filter(student_id__in=student_ids)
+        stale.delete()
+        _write_achievements(achievements)
+    return len(achievements)
@@ -5,3 +5,6 @@ class CbcConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cbc'
     verbose_name = 'CBC (Competency-Based Curriculum)'
+
+    def ready(self):
+        from . import signals  # noqa: F401
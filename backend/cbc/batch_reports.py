@@ -0,0 +1,181 @@
+"""
+CBC Batch Report Service
+Generates progress reports for a whole grade level or learning area in one job
+"""
+
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from core.background import launch_command
+from students.models import Student
+from cbc.models import LearningArea, OutcomeAchievement, ReportBatchJob
+from cbc.curriculum import get_curriculum
+from cbc.report_generator import student_info
+from cbc.report_rendering import init_worker, render_student_report
+
+logger = logging.getLogger(__name__)
+
+
+class BatchReportRunner:
+    """
+    Prefetches everything a batch of reports needs in a handful of queries, then
+    renders the per-student documents across a process pool and streams them
+    to a directory or zip archive as they complete.
+    """
+
+    # Persist progress every N students rather than on every report
+    PROGRESS_EVERY = 25
+
+    def __init__(self, job: ReportBatchJob, workers: int = None, output_path: str = None):
+        self.job = job
+        self.workers = workers or os.cpu_count() or 1
+        if output_path:
+            self.job.output_path = output_path
+        elif not self.job.output_path:
+            suffix = '.zip' if self.job.archive else ''
+            self.job.output_path = os.path.join(settings.MEDIA_ROOT, 'reports', f'batch_{self.job.id}{suffix}')
+
+    def load(self):
+        """
+        Load students, their learning areas, achievements and the curriculum tree.
+
+        Returns:
+            (curriculum nodes, render tasks)
+        """
+        job = self.job
+        if job.learning_area_id:
+            students = list(Student.objects.filter(learning_areas=job.learning_area_id).order_by('id'))
+            student_areas = {student.id: [job.learning_area_id] for student in students}
+            area_ids = {job.learning_area_id}
+        else:
+            students = list(Student.objects.filter(
+                grade_level=job.grade_level_id, is_superuser=False
+            ).order_by('id'))
+            student_areas = {student.id: [] for student in students}
+            enrolments = LearningArea.students.through.objects.filter(student_id__in=student_areas)
+            for student_id, area_id in enrolments.values_list('student_id', 'learningarea_id'):
+                student_areas[student_id].append(area_id)
+            area_ids = {area_id for ids in student_areas.values() for area_id in ids}
+
+        curriculum = get_curriculum()
+        areas = curriculum.area_tree(pk for pk in curriculum.areas if pk in area_ids)
+        area_order = {area['id']: position for position, area in enumerate(areas)}
+
+        achievements_qs = OutcomeAchievement.objects.filter(student_id__in=student_areas)
+        if job.learning_area_id:
+            achievements_qs = achievements_qs.filter(
+                learning_outcome__sub_strand__strand__learning_area_id=job.learning_area_id
+            )
+        achievements = {student_id: {} for student_id in student_areas}
+        for row in achievements_qs.values(
+            'student_id', 'learning_outcome_id', 'competency_level', 'assessment_date', 'comment'
+        ):
+            achievements[row.pop('student_id')][row['learning_outcome_id']] = row
+
+        report_date = datetime.now().strftime('%Y-%m-%d')
+        tasks = [
+            (
+                student.id,
+                student_info(student),
+                sorted(student_areas[student.id], key=area_order.get),
+                achievements[student.id],
+                report_date,
+                job.output_format,
+            )
+            for student in students
+        ]
+        return areas, tasks
+
+    def _results(self, areas, tasks):
+        if self.workers <= 1 or len(tasks) <= 1:
+            init_worker(areas)
+            for task in tasks:
+                yield render_student_report(task)
+            return
+
+        # Workers never touch the database; don't hand them our open connections
+        connections.close_all()
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(areas,)) as pool:
+            yield from pool.map(render_student_report, tasks, chunksize=chunksize)
+
+    def run(self):
+        """Run the job to completion and return it"""
+        job = self.job
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.error = ''
+        job.completed_students = 0
+        job.timings = {}
+        job.save()
+
+        started = time.perf_counter()
+        try:
+            areas, tasks = self.load()
+            job.total_students = len(tasks)
+            job.save(update_fields=['total_students', 'output_path'])
+
+            if job.archive:
+                os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+                with zipfile.ZipFile(job.output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    self._write(self._results(areas, tasks), archive.writestr)
+            else:
+                os.makedirs(job.output_path, exist_ok=True)
+                self._write(self._results(areas, tasks), self._write_file)
+
+            job.status = 'completed'
+        except Exception as e:
+            logger.exception(f"Report batch job {job.id} failed")
+            job.status = 'failed'
+            job.error = str(e)
+
+        job.finished_at = timezone.now()
+        job.save()
+        logger.info(
+            f"Report batch job {job.id} {job.status}: {job.completed_students}/{job.total_students} "
+            f"reports in {time.perf_counter() - started:.2f}s"
+        )
+        return job
+
+    def _write_file(self, filename, content):
+        with open(os.path.join(self.job.output_path, filename), 'wb') as f:
+            f.write(content)
+
+    def _write(self, results, write):
+        job = self.job
+        for student_pk, filename, content, elapsed_ms in results:
+            write(filename, content)
+            job.timings[str(student_pk)] = elapsed_ms
+            job.completed_students += 1
+            if job.completed_students % self.PROGRESS_EVERY == 0:
+                job.save(update_fields=['completed_students', 'timings'])
+
+
+def run_batch_job(job_id: int, workers: int = None, output_path: str = None) -> ReportBatchJob:
+    """
+    Helper function to run a pending batch job
+    """
+    job = ReportBatchJob.objects.get(id=job_id)
+    return BatchReportRunner(job, workers=workers, output_path=output_path).run()
+
+
+def launch_batch_job(job: ReportBatchJob):
+    """
+    Run a batch job in a separate management command process so web workers
+    are never tied up rendering reports (see core.background for its log).
+    """
+    try:
+        launch_command('generate_batch_reports', '--job', str(job.id))
+    except OSError as e:
+        logger.exception(f"Could not start batch report job {job.id}")
+        job.status = 'failed'
+        job.error = f'Could not start the worker: {e}'
+        job.save(update_fields=['status', 'error'])
@@ -0,0 +1,371 @@
+"""
+Curriculum Bundles
+A learning area's or grade's whole curriculum tree (strands, sub-strands and
+learning outcomes) as one precomputed document, so a client loads it in a
+single round trip instead of one request per level.
+
+Bundles are stored gzip-compressed (CurriculumBundle) with the SHA-256 of
+their tree, which is served as a strong ETag. A row is added only when a
+tree's content changes, and its `version` is the curriculum version at which
+that content appeared. The last KEEP_VERSIONS contents are kept, so a client
+holding an older version can ask for `?since=<version>` and download only the
+nodes that changed.
+
+After every registry commit the bundles are rebuilt in a background thread
+(schedule_bundle_rebuild, debounced by DELAY seconds). A request that arrives
+before the rebuild has caught up builds its own bundle, so responses are never
+older than the caller's curriculum snapshot.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .curriculum import CurriculumSnapshot, forget_curriculum, get_curriculum
+from .models import CurriculumBundle
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Past contents kept per bundle as bases for ?since= deltas
+    'KEEP_VERSIONS': 10,
+    # Rebuild in a background thread after registry commits
+    'BACKGROUND_REBUILD': True,
+    # Seconds to wait for more registry writes before a background rebuild
+    'DELAY': 2,
+    'COMPRESS_LEVEL': 9,
+    'CACHE_CONTROL': 'private, no-cache',
+}
+
+SCOPES = ('area', 'grade')
+# Delta responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+
+def get_bundle_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'CURRICULUM_BUNDLES', {})}
+
+
+# Trees
+
+def _outcome_tree(outcome) -> Dict:
+    return {
+        'id': outcome.id,
+        'code': outcome.code,
+        'description': outcome.description,
+        'suggested_activities': outcome.suggested_activities,
+        'order': outcome.order,
+    }
+
+
+def _sub_strand_tree(sub_strand) -> Dict:
+    return {
+        'id': sub_strand.id,
+        'name': sub_strand.name,
+        'code': sub_strand.code,
+        'description': sub_strand.description,
+        'order': sub_strand.order,
+        'learning_outcomes': [_outcome_tree(outcome) for outcome in sub_strand.outcomes],
+    }
+
+
+def _strand_tree(strand) -> Dict:
+    return {
+        'id': strand.id,
+        'name': strand.name,
+        'code': strand.code,
+        'description': strand.description,
+        'order': strand.order,
+        'sub_strands': [_sub_strand_tree(sub_strand) for sub_strand in strand.sub_strands],
+    }
+
+
+def _area_tree(area) -> Dict:
+    return {
+        'id': area.id,
+        'name': area.name,
+        'code': area.code,
+        'description': area.description,
+        'is_active': area.is_active,
+        'grade_level': area.grade.id,
+        'grade_level_name': area.grade.name,
+        'strands': [_strand_tree(strand) for strand in area.strands],
+    }
+
+
+def _grade_tree(grade) -> Dict:
+    return {
+        'id': grade.id,
+        'name': grade.name,
+        'curriculum_type': grade.curriculum_type,
+        'order': grade.order,
+        'is_active': grade.is_active,
+        'learning_areas': [_area_tree(area) for area in grade.areas],
+    }
+
+
+_TREES = {'area': _area_tree, 'grade': _grade_tree}
+
+# node type -> (children key, child node type)
+_CHILDREN = {
+    'grade': ('learning_areas', 'area'),
+    'area': ('strands', 'strand'),
+    'strand': ('sub_strands', 'sub_strand'),
+    'sub_strand': ('learning_outcomes', 'outcome'),
+}
+
+
+def _scope_nodes(curriculum: CurriculumSnapshot, scope: str):
+    if scope == 'area':
+        return curriculum.areas
+    return {grade.id: grade for grade in curriculum.grades}
+
+
+def _canonical(data) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _new_bundle(scope: str, object_id: int, version: int, tree: Dict, etag: str) -> CurriculumBundle:
+    document = _canonical({'scope': scope, 'id': object_id, 'version': version, 'tree': tree})
+    return CurriculumBundle(
+        scope=scope, object_id=object_id, version=version, built_version=version, etag=etag,
+        content=gzip.compress(document, compresslevel=get_bundle_config()['COMPRESS_LEVEL']),
+        size=len(document),
+    )
+
+
+def _prune(scope: str, object_id: int):
+    keep = get_bundle_config()['KEEP_VERSIONS']
+    stale = list(CurriculumBundle.objects.filter(scope=scope, object_id=object_id).order_by(
+        '-version'
+    ).values_list('id', flat=True)[keep:])
+    if stale:
+        CurriculumBundle.objects.filter(id__in=stale).delete()
+
+
+# Building
+
+def build_bundles(curriculum: CurriculumSnapshot = None) -> Dict[str, int]:
+    """
+    Bring every bundle up to date with the curriculum: store a new version of
+    each tree that changed, mark the rest as checked, drop the bundles of
+    deleted areas and grades and prune old versions.
+
+    Returns:
+        Counts of 'changed', 'unchanged' and 'removed' bundles
+    """
+    started = time.perf_counter()
+    curriculum = curriculum or get_curriculum()
+
+    # (scope, object_id) -> (id, version, etag) of the latest stored content
+    latest = {}
+    for pk, scope, object_id, version, etag in CurriculumBundle.objects.order_by(
+        'scope', 'object_id', '-version'
+    ).values_list('id', 'scope', 'object_id', 'version', 'etag'):
+        latest.setdefault((scope, object_id), (pk, version, etag))
+
+    changed, unchanged, current = [], [], set()
+    for scope in SCOPES:
+        for object_id, node in _scope_nodes(curriculum, scope).items():
+            current.add((scope, object_id))
+            tree = _TREES[scope](node)
+            etag = hashlib.sha256(_canonical(tree)).hexdigest()
+            stored = latest.get((scope, object_id))
+            if stored and stored[2] == etag:
+                unchanged.append(stored[0])
+            elif not stored or stored[1] < curriculum.version:
+                changed.append(_new_bundle(scope, object_id, curriculum.version, tree, etag))
+            # else: stored by a builder with a newer snapshot than ours
+
+    removed = [key for key in latest if key not in current]
+    with transaction.atomic():
+        for start in range(0, len(unchanged), 500):
+            CurriculumBundle.objects.filter(
+                id__in=unchanged[start:start + 500], built_version__lt=curriculum.version,
+            ).update(built_version=curriculum.version)
+        # Conflicts are the same content stored by a concurrent builder
+        CurriculumBundle.objects.bulk_create(changed, batch_size=100, ignore_conflicts=True)
+        for bundle in changed:
+            _prune(bundle.scope, bundle.object_id)
+        for scope, object_id in removed:
+            CurriculumBundle.objects.filter(scope=scope, object_id=object_id).delete()
+
+    logger.info(
+        f"Curriculum bundles at v{curriculum.version}: {len(changed)} changed, {len(unchanged)} unchanged, "
+        f"{len(removed)} removed in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+    return {'changed': len(changed), 'unchanged': len(unchanged), 'removed': len(removed)}
+
+
+def get_bundle(scope: str, object_id: int) -> Optional[CurriculumBundle]:
+    """
+    The latest bundle of a learning area or grade, built now if the
+    background rebuild has not caught up with the caller's snapshot; None when
+    the area or grade does not exist.
+    """
+    curriculum = get_curriculum()
+    bundle = CurriculumBundle.objects.filter(scope=scope, object_id=object_id).order_by('-version').first()
+    if bundle is not None and bundle.built_version >= curriculum.version:
+        return bundle
+
+    node = _scope_nodes(curriculum, scope).get(object_id)
+    if node is None:
+        # Possibly added by another process since the last version check
+        forget_curriculum()
+        curriculum = get_curriculum()
+        node = _scope_nodes(curriculum, scope).get(object_id)
+        if node is None:
+            return None
+
+    tree = _TREES[scope](node)
+    etag = hashlib.sha256(_canonical(tree)).hexdigest()
+    if bundle is not None and (bundle.etag == etag or bundle.version >= curriculum.version):
+        CurriculumBundle.objects.filter(id=bundle.id, built_version__lt=curriculum.version).update(
+            built_version=curriculum.version
+        )
+        return bundle
+
+    bundle = _new_bundle(scope, object_id, curriculum.version, tree, etag)
+    try:
+        with transaction.atomic():
+            bundle.save()
+    except IntegrityError:
+        # Built by a concurrent request
+        return CurriculumBundle.objects.get(scope=scope, object_id=object_id, version=curriculum.version)
+    _prune(scope, object_id)
+    return bundle
+
+
+# Background rebuilds
+
+_rebuild_lock = threading.Lock()
+_rebuild_state = {'running': False, 'pending': False}
+
+
+def schedule_bundle_rebuild():
+    """
+    Rebuild the bundles in a background thread after DELAY seconds. Calls
+    made while a rebuild is waiting or running fold into one more pass.
+    """
+    if not get_bundle_config()['BACKGROUND_REBUILD']:
+        return
+    with _rebuild_lock:
+        if _rebuild_state['running']:
+            _rebuild_state['pending'] = True
+            return
+        _rebuild_state['running'] = True
+    threading.Thread(target=_rebuild_in_background, name='curriculum-bundle-rebuild', daemon=True).start()
+
+
+def _rebuild_in_background():
+    try:
+        while True:
+            time.sleep(get_bundle_config()['DELAY'])
+            with _rebuild_lock:
+                _rebuild_state['pending'] = False
+            try:
+                build_bundles()
+            except Exception as e:
+                logger.error(f"Background curriculum bundle rebuild failed: {str(e)}")
+            with _rebuild_lock:
+                if not _rebuild_state['pending']:
+                    _rebuild_state['running'] = False
+                    return
+    finally:
+        close_old_connections()
+
+
+# Deltas
+
+def bundle_document(bundle: CurriculumBundle) -> Dict:
+    return json.loads(gzip.decompress(bundle.content))
+
+
+def _flatten(node_type: str, node: Dict, parent: Optional[str], nodes: Dict[str, Dict]) -> Dict[str, Dict]:
+    """'type:id' -> the node's own fields, parents before children"""
+    children_key, child_type = _CHILDREN.get(node_type, (None, None))
+    nodes[f"{node_type}:{node['id']}"] = {
+        'type': node_type, 'parent': parent, **{key: value for key, value in node.items() if key != children_key},
+    }
+    for child in node.get(children_key, ()) if children_key else ():
+        _flatten(child_type, child, f"{node_type}:{node['id']}", nodes)
+    return nodes
+
+
+def bundle_delta(base: CurriculumBundle, bundle: CurriculumBundle) -> Dict:
+    """
+    The changes from `base` to `bundle`: every added or changed node with its
+    fields and 'type:id' parent (parents first), and the keys of removed nodes
+    """
+    old = _flatten(base.scope, bundle_document(base)['tree'], None, {})
+    new = _flatten(bundle.scope, bundle_document(bundle)['tree'], None, {})
+    return {
+        'scope': bundle.scope,
+        'id': bundle.object_id,
+        'version': bundle.version,
+        'since': base.version,
+        'changed': [node for key, node in new.items() if old.get(key) != node],
+        'removed': [key for key in old if key not in new],
+    }
+
+
+# Responses
+
+def accepts_gzip(request) -> bool:
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip().lower()
+        try:
+            return not quality.startswith('q=') or float(quality[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def _json_response(body: bytes, compressed: bool) -> HttpResponse:
+    response = HttpResponse(body, content_type='application/json')
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    response['Cache-Control'] = get_bundle_config()['CACHE_CONTROL']
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def bundle_response(request, bundle: CurriculumBundle) -> HttpResponse:
+    """
+    The stored document, sent compressed as stored when the client accepts
+    gzip, with the tree hash as a strong ETag (suffixed per coding)
+    """
+    compressed = accepts_gzip(request)
+    etag = f'"{bundle.etag}-gzip"' if compressed else f'"{bundle.etag}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        # A 304 must repeat the validator the 200 would have carried
+        not_modified['ETag'] = etag
+        not_modified['Cache-Control'] = get_bundle_config()['CACHE_CONTROL']
+        patch_vary_headers(not_modified, ['Accept-Encoding'])
+        return not_modified
+
+    response = _json_response(bundle.content if compressed else gzip.decompress(bundle.content), compressed)
+    response['ETag'] = etag
+    response['X-Curriculum-Version'] = str(bundle.version)
+    return response
+
+
+def delta_response(request, base: CurriculumBundle, bundle: CurriculumBundle) -> HttpResponse:
+    body = _canonical(bundle_delta(base, bundle))
+    compressed = accepts_gzip(request) and len(body) >= MIN_COMPRESS_SIZE
+    response = _json_response(gzip.compress(body, compresslevel=6) if compressed else body, compressed)
+    response['X-Curriculum-Version'] = str(bundle.version)
+    return response
@@ -0,0 +1,385 @@
+"""
+Curriculum Snapshot
+An immutable, in-memory copy of the CBC registry (grade levels, learning
+areas, strands, sub-strands and learning outcomes). The registry changes a few
+times a year but is read on almost every request, so each process loads it
+once and then serves every reader from that one snapshot.
+
+Nodes use __slots__ and hold their children as tuples, with a link to their
+parent. A snapshot keeps an id -> node index per level, and each outcome keeps
+its (area, strand, sub-strand) path. Resolving outcome -> strand -> area is
+therefore a dict lookup and two attribute reads, with no queries.
+
+Every registry write bumps the CurriculumVersion row (see cbc.signals). A
+process compares its snapshot's version with that row at most once every
+CHECK_INTERVAL seconds and reloads when they differ. A write made by the
+process itself drops its own snapshot at once.
+
+Curriculum releases (cbc.releases) layer copy-on-write rows over the base
+registry. The rows of every layer are read once per version; the snapshot a
+release sees is resolved from them the first time it is asked for and kept
+until the version changes. Nodes keep the id of their first row, so outcome
+ids stay valid in every release; `row_id` is the row that supplied the content.
+"""
+
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Iterable, List
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CurriculumRelease, CurriculumVersion, GradeLevel, LearningArea, LearningOutcome, Strand, SubStrand
+
+logger = logging.getLogger(__name__)
+
+# get_curriculum(BASE): the base registry, without any release
+BASE = 0
+
+DEFAULTS = {
+    # Seconds between version checks; other processes see a write within this
+    'CHECK_INTERVAL': 5,
+}
+
+
+def get_curriculum_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'CURRICULUM_SNAPSHOT', {})}
+
+
+class _Node:
+    """Read-only once built; the loader fills slots with object.__setattr__"""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.id}: {getattr(self, 'code', None) or self.name}>"
+
+
+class GradeNode(_Node):
+    __slots__ = ('id', 'name', 'curriculum_type', 'order', 'is_active', 'release_id', 'areas')
+
+    @property
+    def is_cbc(self):
+        return self.curriculum_type == 'CBC'
+
+
+class AreaNode(_Node):
+    __slots__ = ('id', 'row_id', 'name', 'code', 'description', 'is_active', 'grade', 'strands')
+
+    @property
+    def outcomes(self):
+        return tuple(outcome for strand in self.strands for sub_strand in strand.sub_strands
+                     for outcome in sub_strand.outcomes)
+
+
+class StrandNode(_Node):
+    __slots__ = ('id', 'row_id', 'name', 'code', 'description', 'order', 'area', 'sub_strands')
+
+
+class SubStrandNode(_Node):
+    __slots__ = ('id', 'row_id', 'name', 'code', 'description', 'order', 'strand', 'outcomes')
+
+
+class OutcomeNode(_Node):
+    __slots__ = ('id', 'row_id', 'code', 'description', 'order', 'suggested_activities', 'sub_strand', 'path')
+
+    @property
+    def strand(self):
+        return self.path[1]
+
+    @property
+    def area(self):
+        return self.path[0]
+
+    @property
+    def full_path(self):
+        """Same text as LearningOutcome.full_path"""
+        area, strand, sub_strand = self.path
+        return f"{area.name} > {strand.name} > {sub_strand.name} > {self.description}"
+
+
+class CurriculumSnapshot:
+    """
+    The whole registry at one version, as one release sees it. `lineages`
+    maps each grade id to the layers its subtree sees, base (None) first.
+    """
+    __slots__ = ('version', 'release', 'grades', 'areas', 'strands', 'sub_strands', 'outcomes', 'lineages',
+                 'loaded_at')
+
+    def __init__(self, version: int, grades, areas, strands, sub_strands, outcomes, release=None, lineages=None):
+        self.version = version
+        self.release = release
+        self.lineages = MappingProxyType(lineages or {})
+        self.grades = tuple(grades)
+        self.areas = MappingProxyType(areas)
+        self.strands = MappingProxyType(strands)
+        self.sub_strands = MappingProxyType(sub_strands)
+        self.outcomes = MappingProxyType(outcomes)
+        self.loaded_at = timezone.now()
+
+    def __repr__(self):
+        return f"<CurriculumSnapshot v{self.version}: {len(self.areas)} areas, {len(self.outcomes)} outcomes>"
+
+    def area_tree(self, area_ids: Iterable[int]) -> List[Dict]:
+        """
+        The given learning areas as plain, picklable dicts for report
+        rendering, in the order given; unknown IDs are skipped:
+        {'id', 'name', 'code', 'strands': [{'name', 'sub_strands': [{'name', 'outcomes': [(id, description, code)]}]}]}
+        """
+        return [
+            {
+                'id': area.id,
+                'name': area.name,
+                'code': area.code,
+                'strands': [
+                    {
+                        'name': strand.name,
+                        'sub_strands': [
+                            {
+                                'name': sub_strand.name,
+                                'outcomes': [
+                                    (outcome.id, outcome.description, outcome.code)
+                                    for outcome in sub_strand.outcomes
+                                ]
+                            }
+                            for sub_strand in strand.sub_strands
+                        ]
+                    }
+                    for strand in area.strands
+                ]
+            }
+            for area in (self.areas.get(area_id) for area_id in area_ids) if area is not None
+        ]
+
+
+# level, model, parent foreign key, content fields; a node's row tuple is
+# (id, release_id, replaces_id, is_removed, parent_id, *fields)
+LEVELS = (
+    ('areas', LearningArea, 'grade_level_id', ('name', 'code', 'description', 'is_active')),
+    ('strands', Strand, 'learning_area_id', ('name', 'code', 'description', 'order')),
+    ('sub_strands', SubStrand, 'strand_id', ('name', 'code', 'description', 'order')),
+    ('outcomes', LearningOutcome, 'sub_strand_id', ('code', 'description', 'order', 'suggested_activities')),
+)
+_PARENT_LEVEL = {'areas': 'grades', 'strands': 'areas', 'sub_strands': 'strands', 'outcomes': 'sub_strands'}
+
+
+def load_layers(version: int) -> dict:
+    """
+    Every registry row of every release, as tuples: one query per level.
+    Resolving a release (resolve_curriculum) works from these, so the rows are
+    read once per version however many releases are in use.
+    """
+    started = time.perf_counter()
+    layers = {
+        'version': version,
+        'releases': dict(CurriculumRelease.objects.values_list('id', 'parent_id')),
+        'grades': list(GradeLevel.objects.order_by('order').values_list(
+            'id', 'name', 'curriculum_type', 'order', 'is_active', 'curriculum_release_id'
+        )),
+    }
+    for level, model, parent, fields in LEVELS:
+        layers[level] = list(model.objects.order_by('id').values_list(
+            'id', 'release_id', 'replaces_id', 'is_removed', parent, *fields
+        ))
+    logger.info(f"Loaded curriculum v{version} rows in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return layers
+
+
+def release_ranks(releases: Dict[int, int], release_id) -> Dict:
+    """
+    {release_id: rank} for the layers a release sees: the base registry
+    (None) ranks 0, the release itself ranks highest.
+    """
+    lineage = []
+    while release_id is not None and release_id in releases and release_id not in lineage:
+        lineage.append(release_id)
+        release_id = releases[release_id]
+    return {layer: rank for rank, layer in enumerate([None] + lineage[::-1])}
+
+
+def _effective_rows(rows, parent_ranks: Dict[int, Dict]) -> Dict:
+    """
+    identity -> (rank, row, ranks) of the row each node's release sees, for
+    nodes under a visible parent; the row may be a removal. `parent_ranks`
+    maps each visible parent (by identity) to the ranks of the release its
+    subtree follows.
+    """
+    best = {}
+    for row in rows:
+        ranks = parent_ranks.get(row[4])
+        if ranks is None:
+            continue
+        rank = ranks.get(row[1])
+        if rank is None:
+            continue
+        node_id = row[2] or row[0]
+        current = best.get(node_id)
+        if current is None or rank > current[0]:
+            best[node_id] = (rank, row, ranks)
+    return best
+
+
+def _sibling_order(node):
+    return node.order, node.id
+
+
+# level -> (node id, row, parent node) -> node; rows as in LEVELS
+_BUILDERS = {
+    'areas': lambda node_id, row, grade: AreaNode(
+        id=node_id, row_id=row[0], name=row[5], code=row[6], description=row[7], is_active=row[8], grade=grade,
+    ),
+    'strands': lambda node_id, row, area: StrandNode(
+        id=node_id, row_id=row[0], name=row[5], code=row[6], description=row[7], order=row[8], area=area,
+    ),
+    'sub_strands': lambda node_id, row, strand: SubStrandNode(
+        id=node_id, row_id=row[0], name=row[5], code=row[6], description=row[7], order=row[8], strand=strand,
+    ),
+    'outcomes': lambda node_id, row, sub_strand: OutcomeNode(
+        id=node_id, row_id=row[0], code=row[5], description=row[6], order=row[7], suggested_activities=row[8],
+        sub_strand=sub_strand, path=(sub_strand.strand.area, sub_strand.strand, sub_strand),
+    ),
+}
+
+
+def resolve_curriculum(layers: dict, release=None) -> CurriculumSnapshot:
+    """
+    Build the snapshot one release sees from the layered rows. Each node takes
+    the row of the highest layer in the release's lineage that has one, under
+    the node's first row id; removed nodes drop out with their subtree. With
+    release None every grade follows its own curriculum_release.
+    """
+    started = time.perf_counter()
+    releases = layers['releases']
+
+    grades, grade_ranks = {}, {}
+    for pk, name, curriculum_type, order, is_active, grade_release in layers['grades']:
+        grades[pk] = GradeNode(id=pk, name=name, curriculum_type=curriculum_type, order=order, is_active=is_active,
+                               release_id=grade_release)
+        grade_ranks[pk] = release_ranks(releases, grade_release if release is None else release or None)
+
+    children = {'grades': {pk: [] for pk in grades}}
+    nodes = {'grades': grades}
+    parents, parent_ranks = grades, grade_ranks
+    for level, _, _, _ in LEVELS:
+        build, siblings = _BUILDERS[level], children[_PARENT_LEVEL[level]]
+        level_nodes, level_ranks, level_children = {}, {}, {}
+        for node_id, (_, row, ranks) in _effective_rows(layers[level], parent_ranks).items():
+            if row[3]:
+                continue
+            node = build(node_id, row, parents[row[4]])
+            level_nodes[node_id] = node
+            level_ranks[node_id] = ranks
+            level_children[node_id] = []
+            siblings[row[4]].append(node)
+        nodes[level] = level_nodes
+        children[level] = level_children
+        parents, parent_ranks = level_nodes, level_ranks
+
+    # Freeze the child lists; overrides may reorder siblings
+    for level, field, key in (
+        ('grades', 'areas', lambda area: (area.name, area.id)),
+        ('areas', 'strands', _sibling_order),
+        ('strands', 'sub_strands', _sibling_order),
+        ('sub_strands', 'outcomes', _sibling_order),
+    ):
+        for pk, node in nodes[level].items():
+            object.__setattr__(node, field, tuple(sorted(children[level][pk], key=key)))
+
+    # Areas are indexed in tree order (grade order, then name)
+    areas = {area.id: area for grade in grades.values() for area in grade.areas}
+
+    snapshot = CurriculumSnapshot(layers['version'], grades.values(), areas, nodes['strands'], nodes['sub_strands'],
+                                  nodes['outcomes'], release=release,
+                                  lineages={pk: tuple(sorted(ranks, key=ranks.get)) for pk, ranks in grade_ranks.items()})
+    logger.info(f"Resolved {snapshot!r} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return snapshot
+
+
+def load_curriculum(version: int, release=None) -> CurriculumSnapshot:
+    """Build a snapshot from the database"""
+    return resolve_curriculum(load_layers(version), release)
+
+
+# Per-process snapshots, one per release asked for
+
+_lock = threading.Lock()
+_state = {'layers': None, 'snapshots': {}, 'checked_at': 0.0}
+
+
+def curriculum_version() -> int:
+    return CurriculumVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def get_curriculum(release=None) -> CurriculumSnapshot:
+    """
+    The current snapshot, (re)loading it when the registry has changed.
+    `release` picks the curriculum: None (each grade follows its own release),
+    BASE (the base registry only) or a CurriculumRelease id (every grade).
+    """
+    snapshot = _state['snapshots'].get(release)
+    if snapshot is not None and time.monotonic() - _state['checked_at'] < get_curriculum_config()['CHECK_INTERVAL']:
+        return snapshot
+
+    with _lock:
+        # The version is read before the rows, so the rows are never older than it
+        version = curriculum_version()
+        layers = _state['layers']
+        if layers is None or layers['version'] != version:
+            layers = load_layers(version)
+            _state['layers'] = layers
+            _state['snapshots'] = {}
+        snapshot = _state['snapshots'].get(release)
+        if snapshot is None:
+            snapshot = resolve_curriculum(layers, release)
+            _state['snapshots'] = {**_state['snapshots'], release: snapshot}
+        _state['checked_at'] = time.monotonic()
+    return snapshot
+
+
+def forget_curriculum():
+    """Drop this process's snapshots; the next reader reloads them"""
+    _state['layers'] = None
+    _state['snapshots'] = {}
+
+
+def bump_curriculum_version():
+    """
+    Mark the registry as changed. Called for every registry write; bulk
+    changes that bypass save() and delete() must call it themselves.
+    """
+    updated = CurriculumVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        try:
+            with transaction.atomic():
+                CurriculumVersion.objects.create(pk=1, version=1)
+        except IntegrityError:
+            # Another writer created it first
+            CurriculumVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+    forget_curriculum()
+    # Threads that reloaded before the write committed would otherwise keep
+    # the old rows until the next version check
+    transaction.on_commit(forget_curriculum)
+
+
+def get_area(area_id: int):
+    """
+    Snapshot node of a learning area, or None. On a miss the registry version
+    is checked: only when another process has changed it since the last check
+    is the snapshot reloaded, so unknown ids cost one query, not a reload.
+    """
+    snapshot = get_curriculum()
+    area = snapshot.areas.get(area_id)
+    if area is None and snapshot.version != curriculum_version():
+        forget_curriculum()
+        area = get_curriculum().areas.get(area_id)
+    return area
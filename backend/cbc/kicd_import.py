@@ -0,0 +1,407 @@
+"""
+KICD Curriculum Import
+Imports the KICD curriculum JSON (grade levels > learning areas > strands >
+sub-strands > outcomes) as one diff that is written in bulk.
+
+The file is read incrementally. The top-level array is decoded one grade level
+at a time and flattened into rows, so the whole document is never parsed at
+once. Existing rows are loaded into dicts keyed by code (grade levels by name),
+and every row in the file is classified as a create, an update or unchanged.
+The diff is written with bulk_update and bulk_create in chunks inside one
+transaction. An import therefore applies completely or not at all, and takes a
+few dozen queries rather than a round trip per row.
+
+A file row whose code matches nothing takes over the existing row in the same
+slot (same parent and order), provided that row's code is no longer in the
+file. A renamed code is updated in place, as the old per-row importer did.
+Rows missing from the file are left alone.
+"""
+
+import json
+import time
+from typing import Dict, Iterator, List, Optional
+import logging
+
+from django.db import connection, transaction
+
+from .bundles import schedule_bundle_rebuild
+from .curriculum import bump_curriculum_version
+from .models import GradeLevel, LearningArea, LearningOutcome, Strand, SubStrand
+from .outcome_search import reindex_outcomes_under
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+
+def iter_json_array(stream, read_size: int = READ_SIZE) -> Iterator:
+    """
+    Yield the elements of the JSON array in `stream` one at a time, reading
+    only as much text as the current element needs.
+
+    Raises:
+        ValueError: The text is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def read(size):
+        nonlocal buffer, position, eof
+        chunk = stream.read(size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            read(read_size)
+
+    skip_whitespace()
+    if buffer[position:position + 1] != '[':
+        raise ValueError('Expected a JSON array')
+    position += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ValueError('Unexpected end of file')
+        if buffer[position] == ']':
+            return
+        if not first:
+            if buffer[position] != ',':
+                raise ValueError(f"Expected ',' or ']' but found {buffer[position]!r}")
+            position += 1
+            skip_whitespace()
+        first = False
+
+        # Read more until the element decodes; doubling keeps re-parsing linear
+        size = read_size
+        while True:
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read(size)
+                size *= 2
+        yield value
+
+
+class ImportLevel:
+    """
+    One level of the curriculum tree: how its rows are keyed, the field that
+    places them under their parent (their slot) and the parent foreign key.
+    """
+
+    def __init__(self, name: str, model, key: str, slot: str, parent: str = None):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.slot = slot
+        self.parent = parent
+
+        self.records: List[Dict] = []
+        self.creates: List = []
+        self.updates: List = []  # (instance, [changed fields])
+        self.unchanged = 0
+        self.instances: Dict[str, object] = {}  # file key -> planned instance
+
+    def summary(self) -> Dict[str, int]:
+        return {'created': len(self.creates), 'updated': len(self.updates), 'unchanged': self.unchanged}
+
+
+def _levels() -> List[ImportLevel]:
+    return [
+        ImportLevel('grade_levels', GradeLevel, key='name', slot='order'),
+        ImportLevel('learning_areas', LearningArea, key='code', slot='name', parent='grade_level'),
+        ImportLevel('strands', Strand, key='code', slot='order', parent='learning_area'),
+        ImportLevel('sub_strands', SubStrand, key='code', slot='order', parent='strand'),
+        ImportLevel('outcomes', LearningOutcome, key='code', slot='order', parent='sub_strand'),
+    ]
+
+
+def _base_rows(model):
+    """KICD files describe the base registry; curriculum releases layer their own rows over it"""
+    if model is GradeLevel:
+        return model.objects.all()
+    return model.objects.filter(release__isnull=True)
+
+
+def _require(data, field: str, where: str):
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: expected an object")
+    value = data.get(field)
+    if value in (None, ''):
+        raise ValueError(f"{where}: missing '{field}'")
+    return value
+
+
+class CurriculumImport:
+    """
+    The diff between a KICD file and the database: rows to create, rows to
+    update (with the fields that change) and rows already up to date.
+    """
+
+    MAX_CHANGES_IN_REPORT = 1000
+
+    def __init__(self):
+        self.levels = _levels()
+        self.grades, self.areas, self.strands, self.sub_strands, self.outcomes = self.levels
+        self.errors: List[str] = []
+        self.timings: Dict[str, float] = {}
+
+    # Reading
+
+    def add_grade(self, data, position: int):
+        """Flatten one top-level grade level object into rows"""
+        where = f'grade level #{position + 1}'
+        name = _require(data, 'grade_level', where)
+        self._add(self.grades, name, None, where, {
+            'name': name,
+            'curriculum_type': _require(data, 'curriculum_type', where),
+            'order': _require(data, 'order', where),
+            'is_active': True,
+        })
+        for area in data.get('learning_areas', []):
+            area_where = f'{name} > {area.get("code") if isinstance(area, dict) else "?"}'
+            code = _require(area, 'code', area_where)
+            self._add(self.areas, code, name, area_where, {
+                'name': _require(area, 'name', area_where),
+                'code': code,
+                'is_active': True,
+                **({'description': area['description']} if 'description' in area else {}),
+            })
+            for strand in area.get('strands', []):
+                self._add_ordered(self.strands, strand, code, area_where, 'description')
+                for sub_strand in strand.get('sub_strands', []):
+                    self._add_ordered(self.sub_strands, sub_strand, strand['code'], f'{area_where} > {strand["code"]}',
+                                      'description')
+                    for outcome in sub_strand.get('outcomes', []):
+                        self._add_ordered(self.outcomes, outcome, sub_strand['code'],
+                                          f'{area_where} > {strand["code"]} > {sub_strand["code"]}',
+                                          'suggested_activities', name_field='description')
+
+    def _add_ordered(self, level: ImportLevel, data, parent_key: str, parent_where: str, optional: str,
+                     name_field: str = 'name'):
+        where = f'{parent_where} > {data.get("code") if isinstance(data, dict) else "?"}'
+        code = _require(data, 'code', where)
+        self._add(level, code, parent_key, where, {
+            name_field: _require(data, name_field, where),
+            'code': code,
+            'order': data.get('order', 1),
+            **({optional: data[optional]} if optional in data else {}),
+        })
+
+    def _add(self, level: ImportLevel, key: str, parent_key: Optional[str], where: str, values: Dict):
+        level.records.append({'key': key, 'parent': parent_key, 'where': where, 'values': values})
+
+    # Diffing
+
+    def diff(self):
+        """Classify every file row against the database, top level first"""
+        started = time.perf_counter()
+        parents_by_pk = {}
+        parent_level = None
+        for level in self.levels:
+            self._check_duplicates(level)
+            existing = list(_base_rows(level.model))
+            self._diff_level(level, existing, parent_level, parents_by_pk)
+            parents_by_pk = {instance.pk: instance for instance in existing}
+            parent_level = level
+        self.timings['diff_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _check_duplicates(self, level: ImportLevel):
+        seen = set()
+        for record in level.records:
+            if record['key'] in seen:
+                self.errors.append(f"{record['where']}: duplicate {level.key} {record['key']!r}")
+            seen.add(record['key'])
+
+    @staticmethod
+    def _token(parent):
+        """Identity of a parent row, saved or still to be created"""
+        if parent is None:
+            return None
+        return ('pk', parent.pk) if parent.pk else ('new', id(parent))
+
+    def _diff_level(self, level: ImportLevel, existing: List, parent_level: Optional[ImportLevel], parents_by_pk):
+        by_key = {getattr(instance, level.key): instance for instance in existing}
+        by_slot = {}
+        for instance in existing:
+            parent = parents_by_pk.get(getattr(instance, f'{level.parent}_id')) if level.parent else None
+            by_slot[(self._token(parent), getattr(instance, level.slot))] = instance
+        file_keys = {record['key'] for record in level.records}
+        claimed = set()
+        slots = {}
+
+        for record in level.records:
+            values = dict(record['values'])
+            parent = None
+            if level.parent:
+                parent = parent_level.instances[record['parent']]
+                values[level.parent] = parent
+
+            instance = by_key.get(record['key'])
+            if instance is None:
+                # A renamed code keeps the row in its slot
+                candidate = by_slot.get((self._token(parent), values[level.slot]))
+                if (candidate is not None and candidate.pk not in claimed
+                        and getattr(candidate, level.key) not in file_keys):
+                    instance = candidate
+
+            if instance is None:
+                instance = level.model(**values)
+                level.creates.append(instance)
+            else:
+                claimed.add(instance.pk)
+                changed = []
+                for field, value in values.items():
+                    if field == level.parent:
+                        differs = value.pk is None or getattr(instance, f'{field}_id') != value.pk
+                    else:
+                        differs = getattr(instance, field) != value
+                    if differs:
+                        setattr(instance, field, value)
+                        changed.append(field)
+                if changed:
+                    level.updates.append((instance, changed))
+                else:
+                    level.unchanged += 1
+            level.instances[record['key']] = instance
+
+            slot = (self._token(parent), values[level.slot])
+            if slot in slots:
+                self.errors.append(f"{record['where']}: {level.slot} {values[level.slot]!r} is also used by {slots[slot]}")
+            slots[slot] = record['where']
+
+        # Rows missing from the file keep their slots
+        for slot, instance in by_slot.items():
+            if instance.pk not in claimed and slot in slots:
+                self.errors.append(
+                    f"{slots[slot]}: {level.slot} {slot[1]!r} is taken by "
+                    f"{getattr(instance, level.key)!r}, which is not in the file"
+                )
+
+    # Writing
+
+    def apply(self, chunk_size: int = CHUNK_SIZE):
+        """
+        Write the diff in one transaction.
+
+        Raises:
+            ValueError: The diff has errors; nothing is written
+        """
+        if self.errors:
+            raise ValueError(f'{len(self.errors)} errors; first: {self.errors[0]}')
+        started = time.perf_counter()
+        with transaction.atomic():
+            for level in self.levels:
+                self._apply_level(level, chunk_size)
+            bump_curriculum_version()
+            self._reindex_outcomes()
+            transaction.on_commit(schedule_bundle_rebuild)
+        self.timings['apply_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _apply_level(self, level: ImportLevel, chunk_size: int):
+        model = level.model
+        moved = [instance for instance, changed in level.updates if level.slot in changed or level.parent in changed]
+        if moved:
+            # Park moved rows on unique placeholder slots first, so swaps never collide
+            final = [getattr(instance, level.slot) for instance in moved]
+            for instance in moved:
+                setattr(instance, level.slot, -instance.pk if level.slot == 'order' else f'~{instance.pk}')
+            model.objects.bulk_update(moved, [level.slot], batch_size=chunk_size)
+            for instance, value in zip(moved, final):
+                setattr(instance, level.slot, value)
+
+        if level.updates:
+            fields = sorted({field for _, changed in level.updates for field in changed})
+            model.objects.bulk_update([instance for instance, _ in level.updates], fields, batch_size=chunk_size)
+
+        if level.creates:
+            model.objects.bulk_create(level.creates, batch_size=chunk_size)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                ids = dict(_base_rows(model).filter(
+                    **{f'{level.key}__in': [getattr(instance, level.key) for instance in level.creates]}
+                ).values_list(level.key, 'pk'))
+                for instance in level.creates:
+                    instance.pk = ids[getattr(instance, level.key)]
+
+    def _reindex_outcomes(self):
+        """bulk_create/bulk_update send no signals, so re-index what changed here"""
+        updated = {level.model: [instance.pk for instance, _ in level.updates] for level in self.levels}
+        created_outcomes = [
+            instance.pk for level in self.levels if level.model is LearningOutcome for instance in level.creates
+        ]
+        reindex_outcomes_under(
+            area_ids=updated[LearningArea],
+            strand_ids=updated[Strand],
+            sub_strand_ids=updated[SubStrand],
+            outcome_ids=updated[LearningOutcome] + created_outcomes,
+        )
+
+    # Reporting
+
+    @property
+    def has_changes(self) -> bool:
+        return any(level.creates or level.updates for level in self.levels)
+
+    def summary(self) -> Dict:
+        return {
+            **{level.name: level.summary() for level in self.levels},
+            'errors': len(self.errors),
+            'timings': self.timings,
+        }
+
+    def changes(self) -> List[str]:
+        """One line per created or updated row, up to MAX_CHANGES_IN_REPORT"""
+        lines = []
+        for level in self.levels:
+            for instance in level.creates:
+                lines.append(f'create {level.name} {getattr(instance, level.key)}')
+            for instance, changed in level.updates:
+                lines.append(f"update {level.name} {getattr(instance, level.key)}: {', '.join(changed)}")
+        return lines[:self.MAX_CHANGES_IN_REPORT]
+
+
+def plan_curriculum_import(stream) -> CurriculumImport:
+    """
+    Read a KICD curriculum file and diff it against the database without writing.
+
+    Raises:
+        ValueError: Malformed JSON or a row missing a required field
+    """
+    plan = CurriculumImport()
+    started = time.perf_counter()
+    for position, grade in enumerate(iter_json_array(stream)):
+        plan.add_grade(grade, position)
+    plan.timings['read_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    plan.diff()
+    return plan
+
+
+def import_curriculum(stream, dry_run: bool = False, chunk_size: int = CHUNK_SIZE) -> CurriculumImport:
+    """
+    Import a KICD curriculum file.
+
+    Returns:
+        The applied (or, for a dry run, planned) import
+
+    Raises:
+        ValueError: The file is invalid or the diff has errors; nothing is written
+    """
+    plan = plan_curriculum_import(stream)
+    if not dry_run:
+        if plan.errors:
+            raise ValueError(f'{len(plan.errors)} errors; first: {plan.errors[0]}')
+        if plan.has_changes:
+            plan.apply(chunk_size)
+    logger.info(f"KICD import{' (dry run)' if dry_run else ''}: {plan.summary()}")
+    return plan
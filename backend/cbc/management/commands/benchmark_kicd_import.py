@@ -0,0 +1,95 @@
+import json
+import math
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from cbc.kicd_import import import_curriculum
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate_curriculum(outcomes: int, grades: int = 12, areas: int = 8, strands: int = 6, sub_strands: int = 5,
+                        revision: int = 0):
+    """
+    A synthetic KICD file with about `outcomes` outcomes. A non-zero revision
+    rewords every 50th outcome and swaps the first two strands of every area.
+    """
+    per_sub_strand = math.ceil(outcomes / (grades * areas * strands * sub_strands))
+    data = []
+    for g in range(grades):
+        grade = {'grade_level': f'Bench Grade {g}', 'curriculum_type': 'CBC', 'order': 9000 + g, 'learning_areas': []}
+        for a in range(areas):
+            area_code = f'BN-G{g}-A{a}'
+            area = {'name': f'Bench Area {a}', 'code': area_code, 'strands': []}
+            for s in range(strands):
+                order = s + 1
+                if revision and s < 2:
+                    order = 2 - s
+                strand_code = f'{area_code}-S{s}'
+                strand = {'name': f'Strand {s}', 'code': strand_code, 'order': order, 'sub_strands': []}
+                for u in range(sub_strands):
+                    sub_code = f'{strand_code}-U{u}'
+                    sub_strand = {'name': f'Sub-strand {u}', 'code': sub_code, 'order': u + 1, 'outcomes': []}
+                    for o in range(per_sub_strand):
+                        code = f'{sub_code}-{o:02d}'
+                        reworded = revision and (g + a + s + u + o) % 50 == 0
+                        sub_strand['outcomes'].append({
+                            'code': code,
+                            'description': f'Outcome {o} of {sub_code}' + (f' (rev {revision})' if reworded else ''),
+                            'order': o + 1,
+                        })
+                    strand['sub_strands'].append(sub_strand)
+                area['strands'].append(strand)
+            grade['learning_areas'].append(area)
+        data.append(grade)
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Measures KICD imports of a generated curriculum: initial load, no-op and revision (all changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outcomes', type=int, default=50000)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for revision in (0, 1):
+                path = os.path.join(tmp, f'kicd_{revision}.json')
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(generate_curriculum(options['outcomes'], revision=revision), f)
+                files.append(path)
+            self.stdout.write(f'Generated {os.path.getsize(files[0]) / 1e6:.1f}MB file')
+
+            try:
+                with transaction.atomic():
+                    for label, path in (('initial', files[0]), ('no-op', files[0]), ('revision', files[1])):
+                        self.run(label, path, options['chunk_size'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, label, path, chunk_size):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            with open(path, encoding='utf-8') as stream:
+                plan = import_curriculum(stream, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - started
+
+        summary = plan.summary()
+        counts = ', '.join(
+            f"{name} {totals['created']}/{totals['updated']}/{totals['unchanged']}"
+            for name, totals in summary.items() if name not in ('errors', 'timings')
+        )
+        self.stdout.write(
+            f'{label:>8}: {len(queries)} queries, {elapsed:.2f}s {summary["timings"]}\n'
+            f'          created/updated/unchanged: {counts}'
+        )
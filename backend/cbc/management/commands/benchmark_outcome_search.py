@@ -0,0 +1,72 @@
+import io
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+
+from cbc.curriculum import get_curriculum
+from cbc.kicd_import import import_curriculum
+from cbc.outcome_search import rebuild_index, search_outcomes
+from .benchmark_kicd_import import Rollback, generate_curriculum
+
+
+class Command(BaseCommand):
+    help = 'Measures outcome search latency on a generated curriculum, per backend (all changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outcomes', type=int, default=50000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--backend', action='append', choices=['fts5', 'table'],
+                            help='Backends to measure (default: both)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                import_curriculum(io.StringIO(json.dumps(generate_curriculum(options['outcomes']))))
+                self.stdout.write(f'Imported {options["outcomes"]} outcomes in {time.perf_counter() - started:.1f}s')
+                for backend in options['backend'] or ['fts5', 'table']:
+                    if backend == 'fts5' and connection.vendor != 'sqlite':
+                        continue
+                    with override_settings(OUTCOME_SEARCH={'BACKEND': backend}):
+                        self.run(backend, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, backend, options):
+        started = time.perf_counter()
+        indexed = rebuild_index()
+        self.stdout.write(f'{backend}: {indexed} outcomes indexed in {time.perf_counter() - started:.2f}s')
+
+        rng = random.Random(options['seed'])
+        outcomes = list(get_curriculum().outcomes.values())
+        samples = {
+            'code': lambda outcome: outcome.code,
+            'prefix': lambda outcome: outcome.sub_strand.code[:9].lower(),
+            'words': lambda outcome: f'outcome {outcome.order - 1} sub',
+            'filtered': lambda outcome: 'outcome',
+        }
+        for label, make in samples.items():
+            timings, queries, hits = [], 0, 0
+            for _ in range(options['queries']):
+                outcome = rng.choice(outcomes)
+                area = outcome.area.id if label == 'filtered' else None
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    result = search_outcomes(make(outcome), learning_area_id=area)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = max(queries, len(captured))
+                hits += bool(result['count'])
+            timings.sort()
+            self.stdout.write(
+                f'{label:>10}: p50 {statistics.median(timings):.1f}ms, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.1f}ms, {queries} queries, '
+                f'{hits}/{options["queries"]} found'
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from cbc.bundles import build_bundles
+from cbc.curriculum import forget_curriculum
+
+
+class Command(BaseCommand):
+    help = 'Brings the precomputed learning area and grade curriculum bundles up to date'
+
+    def handle(self, *args, **options):
+        forget_curriculum()
+        counts = build_bundles()
+        self.stdout.write(self.style.SUCCESS(
+            f"Curriculum bundles: {counts['changed']} changed, {counts['unchanged']} unchanged, "
+            f"{counts['removed']} removed"
+        ))
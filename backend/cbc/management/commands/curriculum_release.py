@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cbc import releases
+from cbc.curriculum import get_curriculum
+from cbc.models import CurriculumRelease, GradeLevel
+
+
+class Command(BaseCommand):
+    help = 'Lists, creates and assigns curriculum releases (see cbc.releases)'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='subcommand', required=True)
+
+        subcommands.add_parser('list', help='Releases, their grades and how many nodes each changes')
+
+        create = subcommands.add_parser('create', help='Create an empty release')
+        create.add_argument('code')
+        create.add_argument('--name', required=True)
+        create.add_argument('--parent', help='Code of the release this one builds on (default: the base registry)')
+        create.add_argument('--description', default='')
+
+        assign = subcommands.add_parser('assign', help='Make grade levels follow a release')
+        assign.add_argument('code', help="Release code, or 'base' for the base registry")
+        assign.add_argument('--grades', nargs='+', required=True, help='Grade level names')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['subcommand']}")(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def handle_list(self, options):
+        for release in CurriculumRelease.objects.select_related('parent').order_by('created_at'):
+            curriculum = get_curriculum(release.id)
+            changed = sum(
+                getattr(release, f'{model._meta.model_name}_nodes').count() for model in releases.PARENTS
+            )
+            grades = ', '.join(release.grade_levels.values_list('name', flat=True)) or '-'
+            self.stdout.write(
+                f"{release.code}: {release.name} (on {release.parent.code if release.parent else 'base'})\n"
+                f"  {changed} rows over its parent, {len(curriculum.areas)} areas, "
+                f"{len(curriculum.outcomes)} outcomes; grades: {grades}"
+            )
+
+    def handle_create(self, options):
+        parent = releases.get_release(options['parent']) if options['parent'] else None
+        release = releases.create_release(options['name'], options['code'], parent, options['description'])
+        self.stdout.write(self.style.SUCCESS(f'Created curriculum release {release.code}'))
+
+    def handle_assign(self, options):
+        release = None if options['code'] == 'base' else releases.get_release(options['code'])
+        grades = GradeLevel.objects.filter(name__in=options['grades'])
+        missing = set(options['grades']) - set(grades.values_list('name', flat=True))
+        if missing:
+            raise CommandError(f"Unknown grade levels: {', '.join(sorted(missing))}")
+        updated = releases.assign_release(release, grades)
+        self.stdout.write(self.style.SUCCESS(f"{updated} grade levels now follow {options['code']}"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from cbc.models import GradeLevel, LearningArea, ReportBatchJob
+from cbc.batch_reports import BatchReportRunner
+
+
+class Command(BaseCommand):
+    help = 'Generates CBC progress reports for a whole grade level or learning area'
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument('--grade-level', type=int, help='GradeLevel ID to report on')
+        scope.add_argument('--learning-area', type=int, help='LearningArea ID to report on')
+        scope.add_argument('--job', type=int, help='Run an existing pending ReportBatchJob')
+        parser.add_argument('--format', choices=['json', 'txt'], default='json', help='Report document format')
+        parser.add_argument('--output', type=str, help='Output directory, or zip path with --zip')
+        parser.add_argument('--zip', action='store_true', help='Stream reports into a single zip archive')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        if options['job']:
+            try:
+                job = ReportBatchJob.objects.get(id=options['job'])
+            except ReportBatchJob.DoesNotExist:
+                raise CommandError(f"Report batch job {options['job']} does not exist")
+        else:
+            job = ReportBatchJob(output_format=options['format'], archive=options['zip'])
+            try:
+                if options['grade_level']:
+                    job.grade_level = GradeLevel.objects.get(id=options['grade_level'])
+                else:
+                    job.learning_area = LearningArea.objects.get(id=options['learning_area'])
+            except (GradeLevel.DoesNotExist, LearningArea.DoesNotExist):
+                raise CommandError('Grade level or learning area not found')
+            job.save()
+
+        job = BatchReportRunner(job, workers=options['workers'], output_path=options['output']).run()
+
+        if job.status != 'completed':
+            raise CommandError(f'Report batch job {job.id} failed: {job.error}')
+
+        timings = list(job.timings.values())
+        average = sum(timings) / len(timings) if timings else 0
+        elapsed = (job.finished_at - job.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {job.completed_students} reports in {elapsed:.2f}s '
+            f'(avg render {average:.2f}ms) -> {job.output_path}'
+        ))
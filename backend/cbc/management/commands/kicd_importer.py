@@ -1,82 +1,37 @@
 import json
-import os
-from django.core.management.base import BaseCommand
-from cbc.models import GradeLevel, LearningArea, Strand, SubStrand, LearningOutcome
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cbc.kicd_import import CHUNK_SIZE, import_curriculum
+
 
 class Command(BaseCommand):
-    help = 'Imports KICD curriculum data from a JSON file'
+    help = 'Imports KICD curriculum data from a JSON file as one bulk diff (see cbc.kicd_import)'
 
     def add_arguments(self, parser):
         parser.add_argument('--file', type=str, default='kicd_curriculum.json', help='Path to the JSON data file')
+        parser.add_argument('--dry-run', action='store_true', help='Print the diff without writing')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per bulk INSERT/UPDATE')
 
     def handle(self, *args, **options):
-        file_path = options['file']
-        
-        if not os.path.exists(file_path):
-            self.stdout.write(self.style.ERROR(f'File "{file_path}" does not exist.'))
-            return
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        for grade_data in data:
-            # Update or create GradeLevel
-            grade_level, _ = GradeLevel.objects.update_or_create(
-                name=grade_data['grade_level'],
-                defaults={
-                    'curriculum_type': grade_data['curriculum_type'],
-                    'order': grade_data['order'],
-                    'is_active': True
-                }
-            )
-            self.stdout.write(self.style.SUCCESS(f'Processed Grade Level: {grade_level.name}'))
-
-            for area_data in grade_data.get('learning_areas', []):
-                # Update or create LearningArea
-                learning_area, _ = LearningArea.objects.update_or_create(
-                    code=area_data['code'],
-                    defaults={
-                        'name': area_data['name'],
-                        'grade_level': grade_level,
-                        'is_active': True
-                    }
-                )
-                self.stdout.write(self.style.SUCCESS(f'  Processed Learning Area: {learning_area.name} ({learning_area.code})'))
-
-                for strand_data in area_data.get('strands', []):
-                    # Update or create Strand based on area and order to avoid unique constraint errors
-                    strand, _ = Strand.objects.update_or_create(
-                        learning_area=learning_area,
-                        order=strand_data.get('order', 1),
-                        defaults={
-                            'name': strand_data['name'],
-                            'code': strand_data['code']
-                        }
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'    Processed Strand: {strand.name}'))
-
-                    for sub_strand_data in strand_data.get('sub_strands', []):
-                        # Update or create SubStrand
-                        sub_strand, _ = SubStrand.objects.update_or_create(
-                            strand=strand,
-                            order=sub_strand_data.get('order', 1),
-                            defaults={
-                                'name': sub_strand_data['name'],
-                                'code': sub_strand_data['code']
-                            }
-                        )
-                        self.stdout.write(self.style.SUCCESS(f'      Processed Sub-Strand: {sub_strand.name}'))
-
-                        for outcome_data in sub_strand_data.get('outcomes', []):
-                            # Update or create LearningOutcome
-                            outcome, _ = LearningOutcome.objects.update_or_create(
-                                sub_strand=sub_strand,
-                                order=outcome_data.get('order', 1),
-                                defaults={
-                                    'description': outcome_data['description'],
-                                    'code': outcome_data['code']
-                                }
-                            )
-                            self.stdout.write(self.style.SUCCESS(f'        Processed Outcome: {outcome.code}'))
-
-        self.stdout.write(self.style.SUCCESS('KICD Ingestion Complete!'))
+        try:
+            with open(options['file'], encoding='utf-8-sig') as stream:
+                plan = import_curriculum(stream, dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not import {options["file"]}: {e}')
+
+        if options['dry_run']:
+            for line in plan.changes():
+                self.stdout.write(line)
+            for error in plan.errors:
+                self.stdout.write(self.style.ERROR(error))
+
+        self.stdout.write(json.dumps(plan.summary(), indent=2))
+        totals = [level.summary() for level in plan.levels]
+        counts = ', '.join(
+            f"{sum(total[key] for total in totals)} {key}" for key in ('created', 'updated', 'unchanged')
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written: would have {counts}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'KICD Ingestion Complete! {counts}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from cbc.achievements import rebuild_outcome_achievements
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized student x learning outcome achievement table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', dest='student_ids',
+                            help='Only rebuild rows for this student ID (repeatable)')
+
+    def handle(self, *args, **options):
+        written = rebuild_outcome_achievements(options['student_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} outcome achievement rows'))
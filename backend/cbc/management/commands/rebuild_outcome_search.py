@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cbc.outcome_search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the learning outcome search index from the CBC registry'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} learning outcomes ({search_backend()})'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_achievements(apps, schema_editor):
+    """Fill the table from the assessments and graded quiz attempts recorded before it existed"""
+    # The rebuild only reads the id, level, score and date columns these tables have at this point
+    from cbc.achievements import rebuild_outcome_achievements
+
+    rebuild_outcome_achievements()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0003_alter_learningarea_teacher'),
+        ('courses', '0012_quiz_due_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutcomeAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competency_level', models.CharField(choices=[('EE', 'Exceeding Expectations'), ('ME', 'Meeting Expectations'), ('AE', 'Approaching Expectations'), ('BE', 'Below Expectations')], max_length=2)),
+                ('assessment_date', models.DateField()),
+                ('source', models.CharField(choices=[('assessment', 'Competency Assessment'), ('quiz', 'Quiz Submission')], max_length=10)),
+                ('source_id', models.PositiveBigIntegerField(help_text='ID of the assessment or quiz submission')),
+                ('comment', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('learning_outcome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='cbc.learningoutcome')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outcome_achievements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Outcome Achievement',
+                'verbose_name_plural': 'Outcome Achievements',
+                'unique_together': {('student', 'learning_outcome')},
+            },
+        ),
+        migrations.RunPython(populate_achievements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0004_outcomeachievement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('output_format', models.CharField(choices=[('json', 'JSON'), ('txt', 'Plain Text')], default='json', max_length=4)),
+                ('archive', models.BooleanField(default=True, help_text='Write a single zip archive instead of a directory')),
+                ('output_path', models.CharField(blank=True, max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_students', models.IntegerField(default=0)),
+                ('completed_students', models.IntegerField(default=0)),
+                ('timings', models.JSONField(blank=True, default=dict, help_text='Render time in ms per student ID')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+                ('grade_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='cbc.gradelevel')),
+                ('learning_area', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='cbc.learningarea')),
+            ],
+            options={
+                'verbose_name': 'Report Batch Job',
+                'verbose_name_plural': 'Report Batch Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
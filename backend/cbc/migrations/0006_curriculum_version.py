@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0005_reportbatchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Curriculum Version',
+                'verbose_name_plural': 'Curriculum Versions',
+            },
+        ),
+    ]
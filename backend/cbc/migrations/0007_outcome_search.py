@@ -0,0 +1,103 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:30
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models
+
+# Mirrors cbc.outcome_search.FTS_TABLE / FIELDS
+FTS_TABLE = 'cbc_outcome_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    """SQLite with FTS5 only; other databases use the OutcomeSearch* tables"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "code, description, suggested_activities, strand, sub_strand, filters, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+    except OperationalError:
+        pass  # SQLite built without FTS5
+
+
+def index_existing_outcomes(apps, schema_editor):
+    """Index the outcomes that existed before the search tables did"""
+    from cbc.outcome_search import FIELDS, _fts_filters, _weighted_terms, get_outcome_search_config
+
+    LearningOutcome = apps.get_model('cbc', 'LearningOutcome')
+    OutcomeSearchDocument = apps.get_model('cbc', 'OutcomeSearchDocument')
+    OutcomeSearchTerm = apps.get_model('cbc', 'OutcomeSearchTerm')
+    rows = [
+        (pk, area_id, grade_id, {
+            'code': code, 'description': description, 'suggested_activities': activities or '',
+            'strand': strand, 'sub_strand': sub_strand,
+        })
+        for pk, area_id, grade_id, code, description, activities, strand, sub_strand in LearningOutcome.objects.values_list(
+            'id', 'sub_strand__strand__learning_area_id', 'sub_strand__strand__learning_area__grade_level_id',
+            'code', 'description', 'suggested_activities', 'sub_strand__strand__name', 'sub_strand__name',
+        ).order_by('id').iterator()
+    ]
+
+    connection = schema_editor.connection
+    if (get_outcome_search_config()['BACKEND'] != 'table' and connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}, filters) "
+                f"VALUES (%s, {', '.join(['%s'] * len(FIELDS))}, %s)",
+                [
+                    (pk, *(fields[field] for field in FIELDS), _fts_filters(learning_area_id=area_id, grade_level_id=grade_id))
+                    for pk, area_id, grade_id, fields in rows
+                ],
+            )
+        return
+
+    for pk, area_id, grade_id, fields in rows:
+        frequencies, length = _weighted_terms(fields)
+        OutcomeSearchDocument.objects.create(
+            outcome_id=pk, learning_area_id=area_id, grade_level_id=grade_id, length=length,
+        )
+        OutcomeSearchTerm.objects.bulk_create(
+            OutcomeSearchTerm(document_id=pk, term=term, frequency=frequency) for term, frequency in frequencies.items()
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0006_curriculum_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutcomeSearchDocument',
+            fields=[
+                ('outcome', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='cbc.learningoutcome')),
+                ('learning_area_id', models.IntegerField(db_index=True)),
+                ('grade_level_id', models.IntegerField(db_index=True)),
+                ('length', models.FloatField(help_text='Field-weighted number of words, for BM25 length normalisation')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutcomeSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.FloatField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='cbc.outcomesearchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'document'], name='cbc_outcome_term_idx')],
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(index_existing_outcomes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0007_outcome_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('area', 'Learning Area'), ('grade', 'Grade Level')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('version', models.PositiveBigIntegerField(help_text='Curriculum version at which this content first appeared')),
+                ('built_version', models.PositiveBigIntegerField(help_text='Latest curriculum version this content was checked against')),
+                ('etag', models.CharField(help_text="SHA-256 of the tree's canonical JSON", max_length=64)),
+                ('content', models.BinaryField(help_text='gzip-compressed JSON document')),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Curriculum Bundle',
+                'verbose_name_plural': 'Curriculum Bundles',
+                'ordering': ['scope', 'object_id', '-version'],
+                'unique_together': {('scope', 'object_id', 'version')},
+            },
+        ),
+    ]
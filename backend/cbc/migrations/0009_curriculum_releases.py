@@ -0,0 +1,203 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0008_curriculum_bundle'),
+        ('teachers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='learningarea',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='learningoutcome',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='strand',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='substrand',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='learningarea',
+            name='is_removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='learningarea',
+            name='replaces',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='replacements', to='cbc.learningarea'),
+        ),
+        migrations.AddField(
+            model_name='learningoutcome',
+            name='is_removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='learningoutcome',
+            name='replaces',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='replacements', to='cbc.learningoutcome'),
+        ),
+        migrations.AddField(
+            model_name='strand',
+            name='is_removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='strand',
+            name='replaces',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='replacements', to='cbc.strand'),
+        ),
+        migrations.AddField(
+            model_name='substrand',
+            name='is_removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='substrand',
+            name='replaces',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='replacements', to='cbc.substrand'),
+        ),
+        migrations.AlterField(
+            model_name='learningarea',
+            name='code',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='learningoutcome',
+            name='code',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='strand',
+            name='code',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='substrand',
+            name='code',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.CreateModel(
+            name='CurriculumRelease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.SlugField(unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='cbc.curriculumrelease')),
+            ],
+            options={
+                'verbose_name': 'Curriculum Release',
+                'verbose_name_plural': 'Curriculum Releases',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='competencyassessment',
+            name='curriculum_release',
+            field=models.ForeignKey(blank=True, help_text="Release the outcome was assessed against (the student's grade's release when recorded); empty for the base registry", null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assessments', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddField(
+            model_name='gradelevel',
+            name='curriculum_release',
+            field=models.ForeignKey(blank=True, help_text="Release this grade's students follow; empty for the base registry", null=True, on_delete=django.db.models.deletion.PROTECT, related_name='grade_levels', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddField(
+            model_name='learningarea',
+            name='release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_nodes', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddField(
+            model_name='learningoutcome',
+            name='release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_nodes', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddField(
+            model_name='strand',
+            name='release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_nodes', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddField(
+            model_name='substrand',
+            name='release',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_nodes', to='cbc.curriculumrelease'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('code',), name='cbc_area_code_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'code'), name='cbc_area_code_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('name', 'grade_level'), name='cbc_area_name_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'name', 'grade_level'), name='cbc_area_name_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningoutcome',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('code',), name='cbc_outcome_code_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningoutcome',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'code'), name='cbc_outcome_code_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningoutcome',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('sub_strand', 'order'), name='cbc_outcome_slot_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='learningoutcome',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'sub_strand', 'order'), name='cbc_outcome_slot_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='strand',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('code',), name='cbc_strand_code_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='strand',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'code'), name='cbc_strand_code_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='strand',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('learning_area', 'order'), name='cbc_strand_slot_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='strand',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'learning_area', 'order'), name='cbc_strand_slot_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='substrand',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('code',), name='cbc_sub_strand_code_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='substrand',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'code'), name='cbc_sub_strand_code_release_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='substrand',
+            constraint=models.UniqueConstraint(condition=models.Q(('release__isnull', True)), fields=('strand', 'order'), name='cbc_sub_strand_slot_base_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='substrand',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_removed', False), ('release__isnull', False)), fields=('release', 'strand', 'order'), name='cbc_sub_strand_slot_release_uniq'),
+        ),
+    ]
@@ -4,6 +4,103 @@ from teachers.models import Teacher
 from students.models import Student
 
 
+class CurriculumRelease(models.Model):
+    """
+    A version of the CBC registry, such as the rationalized curriculum. A
+    release stores only the learning areas, strands, sub-strands and outcomes
+    it adds, changes or removes, and inherits every other node from its parent
+    release (or from the base registry, the rows without a release). Grade
+    levels choose the release their students follow. See cbc.releases.
+    """
+    name = models.CharField(max_length=100, unique=True)  # "Rationalized CBC 2024"
+    code = models.SlugField(max_length=50, unique=True)  # "rationalized-2024"
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Curriculum Release'
+        verbose_name_plural = 'Curriculum Releases'
+
+    def __str__(self):
+        return self.name
+
+
+class ReleasedNodeQuerySet(models.QuerySet):
+    def current(self):
+        """
+        Rows of the nodes the current curriculum has (cbc.curriculum): a
+        release's override rows and tombstones are not nodes of their own, and
+        nodes their grade's release removed or never added, or that sit under
+        such a node, are left out. Releases are resolved in the query, one
+        Exists per layer, so it does not grow with the registry.
+        """
+        from .curriculum import LEVELS, get_curriculum
+
+        depth = next(depth for depth, (_, model, _, _) in enumerate(LEVELS) if model is self.model)
+        grade_path = '__'.join(parent[:-len('_id')] for _, _, parent, _ in LEVELS[depth::-1]) + '_id'
+
+        grades = {}
+        for grade_id, lineage in get_curriculum().lineages.items():
+            grades.setdefault(lineage[1:], []).append(grade_id)
+        if not grades:
+            return self.none()
+
+        visible = models.Q()
+        for releases, grade_ids in grades.items():
+            rows = self.model.objects.filter(replaces=models.OuterRef('pk'))
+            layer = models.Q(**{f'{grade_path}__in': grade_ids})
+            layer &= models.Q(release__isnull=True) | models.Q(release__in=releases)
+            for rank, release_id in enumerate(releases, 1):
+                # Removed by this layer, unless a later layer of the lineage overrides it again
+                removed = models.Q(models.Exists(rows.filter(release=release_id, is_removed=True)))
+                if releases[rank:]:
+                    removed &= ~models.Exists(rows.filter(release__in=releases[rank:]))
+                layer &= ~removed
+            visible |= layer
+
+        queryset = self.filter(visible, replaces__isnull=True)
+        if depth:
+            parent_model, parent = LEVELS[depth - 1][1], LEVELS[depth][2]
+            queryset = queryset.filter(**{f'{parent}__in': parent_model.objects.current().values('id')})
+        return queryset
+
+
+class ReleasedNode(models.Model):
+    """
+    Copy-on-write fields of the versioned registry levels. A row with no
+    release belongs to the base registry. A row in a release either adds a
+    node or overrides the node whose first row it `replaces`; an `is_removed`
+    override drops the node and its subtree from that release. The first row
+    is the node's identity: foreign keys, including the parent keys of
+    override rows, always point at it.
+    """
+    release = models.ForeignKey(
+        CurriculumRelease, on_delete=models.PROTECT, null=True, blank=True, related_name='%(class)s_nodes'
+    )
+    replaces = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='replacements')
+    is_removed = models.BooleanField(default=False)
+
+    objects = ReleasedNodeQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+
+def release_unique(prefix: str, *fields: str):
+    """Unique `fields` within the base registry, and among each release's live rows"""
+    return [
+        models.UniqueConstraint(
+            fields=list(fields), condition=models.Q(release__isnull=True), name=f'{prefix}_base_uniq',
+        ),
+        models.UniqueConstraint(
+            fields=['release', *fields], condition=models.Q(release__isnull=False, is_removed=False),
+            name=f'{prefix}_release_uniq',
+        ),
+    ]
+
+
 class GradeLevel(models.Model):
     """Represents a grade level in the school (e.g., Grade 4, Form 3)"""
     CURRICULUM_CHOICES = [
@@ -15,6 +112,10 @@ class GradeLevel(models.Model):
     curriculum_type = models.CharField(max_length=10, choices=CURRICULUM_CHOICES)
     order = models.IntegerField(unique=True)  # For sorting (1-12)
     is_active = models.BooleanField(default=True)
+    curriculum_release = models.ForeignKey(
+        CurriculumRelease, on_delete=models.PROTECT, null=True, blank=True, related_name='grade_levels',
+        help_text="Release this grade's students follow; empty for the base registry"
+    )
     
     class Meta:
         ordering = ['order']
@@ -29,10 +130,10 @@ class GradeLevel(models.Model):
         return self.curriculum_type == 'CBC'
 
 
-class LearningArea(models.Model):
+class LearningArea(ReleasedNode):
     """CBC Learning Area (replaces traditional 'subject' for CBC)"""
     name = models.CharField(max_length=100)  # "Mathematics", "Science & Technology"
-    code = models.CharField(max_length=20, unique=True)  # "MATH-G4"
+    code = models.CharField(max_length=20)  # "MATH-G4"
     grade_level = models.ForeignKey(GradeLevel, on_delete=models.CASCADE, related_name='learning_areas')
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, related_name='learning_areas', null=True, blank=True)
     students = models.ManyToManyField(Student, related_name='learning_areas', blank=True)
@@ -45,7 +146,7 @@ class LearningArea(models.Model):
         ordering = ['grade_level', 'name']
         verbose_name = 'Learning Area'
         verbose_name_plural = 'Learning Areas'
-        unique_together = ['name', 'grade_level']
+        constraints = release_unique('cbc_area_code', 'code') + release_unique('cbc_area_name', 'name', 'grade_level')
     
     def __str__(self):
         return f"{self.name} - {self.grade_level.name}"
@@ -58,11 +159,11 @@ class LearningArea(models.Model):
         return self.students.count()
 
 
-class Strand(models.Model):
+class Strand(ReleasedNode):
     """CBC Strand - major theme within a Learning Area"""
     learning_area = models.ForeignKey(LearningArea, on_delete=models.CASCADE, related_name='strands')
     name = models.CharField(max_length=200)  # "Numbers", "Measurement", "Geometry"
-    code = models.CharField(max_length=50, unique=True)  # "MATH-G4-NUMBERS"
+    code = models.CharField(max_length=50)  # "MATH-G4-NUMBERS"
     description = models.TextField(blank=True)
     order = models.IntegerField()
     
@@ -70,17 +171,17 @@ class Strand(models.Model):
         ordering = ['learning_area', 'order']
         verbose_name = 'Strand'
         verbose_name_plural = 'Strands'
-        unique_together = ['learning_area', 'order']
+        constraints = release_unique('cbc_strand_code', 'code') + release_unique('cbc_strand_slot', 'learning_area', 'order')
     
     def __str__(self):
         return f"{self.learning_area.name} - {self.name}"
 
 
-class SubStrand(models.Model):
+class SubStrand(ReleasedNode):
     """CBC Sub-Strand - specific topic within a Strand"""
     strand = models.ForeignKey(Strand, on_delete=models.CASCADE, related_name='sub_strands')
     name = models.CharField(max_length=200)  # "Whole Numbers", "Fractions", "Addition"
-    code = models.CharField(max_length=50, unique=True)  # "MATH-G4-NUM-WHOLE"
+    code = models.CharField(max_length=50)  # "MATH-G4-NUM-WHOLE"
     description = models.TextField(blank=True)
     order = models.IntegerField()
     
@@ -88,17 +189,17 @@ class SubStrand(models.Model):
         ordering = ['strand', 'order']
         verbose_name = 'Sub-Strand'
         verbose_name_plural = 'Sub-Strands'
-        unique_together = ['strand', 'order']
+        constraints = release_unique('cbc_sub_strand_code', 'code') + release_unique('cbc_sub_strand_slot', 'strand', 'order')
     
     def __str__(self):
         return f"{self.strand.name} - {self.name}"
 
 
-class LearningOutcome(models.Model):
+class LearningOutcome(ReleasedNode):
     """Specific competency students must achieve"""
     sub_strand = models.ForeignKey(SubStrand, on_delete=models.CASCADE, related_name='learning_outcomes')
     description = models.TextField()  # "Add numbers up to 10,000 with regrouping"
-    code = models.CharField(max_length=50, unique=True)  # "MATH-G4-NUM-WHOLE-01"
+    code = models.CharField(max_length=50)  # "MATH-G4-NUM-WHOLE-01"
     order = models.IntegerField()
     suggested_activities = models.TextField(blank=True, help_text="Suggested teaching activities")
     
@@ -106,7 +207,7 @@ class LearningOutcome(models.Model):
         ordering = ['sub_strand', 'order']
         verbose_name = 'Learning Outcome'
         verbose_name_plural = 'Learning Outcomes'
-        unique_together = ['sub_strand', 'order']
+        constraints = release_unique('cbc_outcome_code', 'code') + release_unique('cbc_outcome_slot', 'sub_strand', 'order')
     
     def __str__(self):
         return f"{self.code}: {self.description[:50]}..."
@@ -133,6 +234,10 @@ class CompetencyAssessment(models.Model):
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, related_name='competency_assessments')
     teacher_comment = models.TextField(blank=True, help_text="Specific feedback on student's performance")
     evidence = models.TextField(help_text="What the student did to demonstrate this competency")
+    curriculum_release = models.ForeignKey(
+        CurriculumRelease, on_delete=models.PROTECT, null=True, blank=True, related_name='assessments',
+        help_text="Release the outcome was assessed against (the student's grade's release when recorded); empty for the base registry"
+    )
     
     # Link to assignment submission if applicable
     assignment_submission = models.ForeignKey(
@@ -158,3 +263,164 @@ class CompetencyAssessment(models.Model):
     def get_competency_display_full(self):
         """Returns full competency level description"""
         return dict(self.COMPETENCY_LEVELS).get(self.competency_level)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.curriculum_release_id is None:
+            # Pin the assessment to the release the student follows today
+            from .releases import release_for_student
+            self.curriculum_release_id = release_for_student(self.student_id)
+        super().save(*args, **kwargs)
+        # Keep the materialized per-outcome table current
+        from .achievements import refresh_outcome_achievements
+        refresh_outcome_achievements(self.student_id, [self.learning_outcome_id])
+
+    def delete(self, *args, **kwargs):
+        student_id, outcome_id = self.student_id, self.learning_outcome_id
+        result = super().delete(*args, **kwargs)
+        from .achievements import refresh_outcome_achievements
+        refresh_outcome_achievements(student_id, [outcome_id])
+        return result
+
+
+class OutcomeAchievement(models.Model):
+    """
+    Materialized latest competency level per student per learning outcome.
+    Maintained incrementally from CompetencyAssessment and QuizSubmission saves.
+    """
+    SOURCE_CHOICES = [
+        ('assessment', 'Competency Assessment'),
+        ('quiz', 'Quiz Submission'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='outcome_achievements')
+    learning_outcome = models.ForeignKey(LearningOutcome, on_delete=models.CASCADE, related_name='achievements')
+    competency_level = models.CharField(max_length=2, choices=CompetencyAssessment.COMPETENCY_LEVELS)
+    assessment_date = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    source_id = models.PositiveBigIntegerField(help_text="ID of the assessment or quiz submission")
+    comment = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Outcome Achievement'
+        verbose_name_plural = 'Outcome Achievements'
+        unique_together = ['student', 'learning_outcome']
+
+    def __str__(self):
+        return f"{self.student_id} - {self.learning_outcome_id} - {self.competency_level}"
+
+
+class ReportBatchJob(models.Model):
+    """
+    Batch generation of CBC progress reports for a whole grade or learning area
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('json', 'JSON'),
+        ('txt', 'Plain Text'),
+    ]
+
+    grade_level = models.ForeignKey(GradeLevel, on_delete=models.CASCADE, null=True, blank=True, related_name='report_jobs')
+    learning_area = models.ForeignKey(LearningArea, on_delete=models.CASCADE, null=True, blank=True, related_name='report_jobs')
+    output_format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='json')
+    archive = models.BooleanField(default=True, help_text="Write a single zip archive instead of a directory")
+    output_path = models.CharField(max_length=500, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_students = models.IntegerField(default=0)
+    completed_students = models.IntegerField(default=0)
+    timings = models.JSONField(default=dict, blank=True, help_text="Render time in ms per student ID")
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Report Batch Job'
+        verbose_name_plural = 'Report Batch Jobs'
+
+    def __str__(self):
+        scope = self.learning_area or self.grade_level
+        return f"Reports for {scope} - {self.status} ({self.completed_students}/{self.total_students})"
+
+
+class CurriculumVersion(models.Model):
+    """
+    Single-row version stamp of the curriculum registry (grade levels down to
+    learning outcomes). Bumped on every registry write so each process knows
+    when its in-memory curriculum snapshot (cbc.curriculum) is out of date.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Curriculum Version'
+        verbose_name_plural = 'Curriculum Versions'
+
+    def __str__(self):
+        return f"Curriculum v{self.version}"
+
+
+class OutcomeSearchDocument(models.Model):
+    """
+    A learning outcome in the portable outcome search index (cbc.outcome_search),
+    used where SQLite FTS5 is not available
+    """
+    outcome = models.OneToOneField(LearningOutcome, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    learning_area_id = models.IntegerField(db_index=True)
+    grade_level_id = models.IntegerField(db_index=True)
+    length = models.FloatField(help_text="Field-weighted number of words, for BM25 length normalisation")
+
+    def __str__(self):
+        return f"Search document for outcome {self.outcome_id}"
+
+
+class OutcomeSearchTerm(models.Model):
+    """One distinct word of an OutcomeSearchDocument with its field-weighted frequency"""
+    document = models.ForeignKey(OutcomeSearchDocument, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=64)
+    frequency = models.FloatField()
+
+    class Meta:
+        indexes = [
+            # Postings lookup: term = ... or a 'prefix' range, then per-document checks
+            models.Index(fields=['term', 'document'], name='cbc_outcome_term_idx'),
+        ]
+
+
+class CurriculumBundle(models.Model):
+    """
+    A learning area's or grade's whole curriculum tree as one precomputed,
+    gzip-compressed JSON document (cbc.bundles). A row is added only when the
+    tree's content changes; earlier rows are kept as bases for delta sync.
+    """
+    SCOPE_CHOICES = [
+        ('area', 'Learning Area'),
+        ('grade', 'Grade Level'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.PositiveIntegerField()
+    version = models.PositiveBigIntegerField(help_text="Curriculum version at which this content first appeared")
+    built_version = models.PositiveBigIntegerField(help_text="Latest curriculum version this content was checked against")
+    etag = models.CharField(max_length=64, help_text="SHA-256 of the tree's canonical JSON")
+    content = models.BinaryField(help_text="gzip-compressed JSON document")
+    size = models.PositiveIntegerField(help_text="Uncompressed size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['scope', 'object_id', '-version']
+        unique_together = ['scope', 'object_id', 'version']
+        verbose_name = 'Curriculum Bundle'
+        verbose_name_plural = 'Curriculum Bundles'
+
+    def __str__(self):
+        return f"{self.get_scope_display()} {self.object_id} bundle v{self.version}"
@@ -0,0 +1,412 @@
+"""
+Outcome Search
+Ranked search over learning outcomes, for teachers choosing the outcomes an
+assignment or quiz tests. It matches the outcome code, description and
+suggested activities, and the names of the outcome's strand and sub-strand.
+Results are ranked with BM25 (FIELD_WEIGHTS favour codes and descriptions).
+The last word is matched as a prefix, so results appear while typing.
+
+Two interchangeable inverted indexes:
+- fts5: an SQLite FTS5 table (FTS_TABLE), created by migration 0007 when SQLite
+  has FTS5. SQLite does the matching and the bm25() ranking; the grade and
+  area filters are indexed tokens too.
+- table: OutcomeSearchDocument / OutcomeSearchTerm rows, for every other
+  database. The rarest query word picks the candidate outcomes, index lookups
+  check the other words, and the postings are scored with BM25 in Python.
+
+Outcomes are indexed by node id as the curriculum release of their grade
+level words them (cbc.releases). Signals (cbc.signals) re-index the outcomes
+under any registry row that is saved. The KICD importer re-indexes what it wrote.
+`manage.py rebuild_outcome_search` rebuilds everything.
+"""
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+
+from core.people_search import words
+from .curriculum import forget_curriculum, get_curriculum, release_ranks
+from .models import (
+    CurriculumRelease, LearningArea, LearningOutcome, OutcomeSearchDocument, OutcomeSearchTerm, Strand, SubStrand,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 'auto' (fts5 when the FTS table exists), 'fts5' or 'table'
+    'BACKEND': 'auto',
+}
+
+FTS_TABLE = 'cbc_outcome_fts'
+FIELDS = ['code', 'description', 'suggested_activities', 'strand', 'sub_strand']
+FILTER_TOKENS = {'learning_area_id': 'area', 'grade_level_id': 'grade'}
+FIELD_WEIGHTS = {'code': 4.0, 'description': 2.0, 'suggested_activities': 0.5, 'strand': 1.0, 'sub_strand': 1.5}
+K1, B = 1.2, 0.75
+MAX_TERM_LENGTH = 64
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+CHUNK_SIZE = 500
+
+
+def get_outcome_search_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'OUTCOME_SEARCH', {})}
+
+
+_fts_available: Dict[str, bool] = {}  # database name -> FTS table exists
+
+
+def search_backend() -> str:
+    backend = get_outcome_search_config()['BACKEND']
+    if backend == 'auto':
+        name = connection.settings_dict['NAME']
+        if name not in _fts_available:
+            _fts_available[name] = (
+                connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+            )
+        return 'fts5' if _fts_available[name] else 'table'
+    return backend
+
+
+# Source rows
+
+def _resolved(model, node_ids, ranks_of: Dict[int, Dict], *fields) -> Dict[int, Dict]:
+    """
+    node id -> {field: value} of the row the node's curriculum release sees
+    (cbc.releases); removed nodes are left out
+    """
+    best = {}
+    for row in model.objects.filter(Q(pk__in=node_ids) | Q(replaces_id__in=node_ids)).values(
+        'id', 'release_id', 'replaces_id', 'is_removed', *fields
+    ):
+        node_id = row['replaces_id'] or row['id']
+        rank = ranks_of[node_id].get(row['release_id'])
+        if rank is not None and (node_id not in best or rank > best[node_id][0]):
+            best[node_id] = (rank, row)
+    return {node_id: row for node_id, (_, row) in best.items() if not row['is_removed']}
+
+
+def _outcome_rows(outcome_ids: Iterable[int] = None):
+    """
+    (id, learning area ID, grade level ID, {field: text}) per outcome, as the
+    release its grade level follows words it
+    """
+    outcomes = LearningOutcome.objects.filter(replaces__isnull=True).order_by('id')
+    if outcome_ids is not None:
+        outcomes = outcomes.filter(id__in=list(outcome_ids))
+    releases = dict(CurriculumRelease.objects.values_list('id', 'parent_id'))
+    ranks = {}
+
+    def flush(paths):
+        # paths: outcome id -> (sub-strand, strand, area, grade, release)
+        if not paths:
+            return
+        for release_id in {path[4] for path in paths.values()} - ranks.keys():
+            ranks[release_id] = release_ranks(releases, release_id)
+        levels = {}
+        for position, model, fields in (
+            (None, LearningOutcome, ('code', 'description', 'suggested_activities')),
+            (0, SubStrand, ('name',)), (1, Strand, ('name',)), (2, LearningArea, ()),
+        ):
+            ranks_of = {}
+            for pk, path in paths.items():
+                ranks_of[pk if position is None else path[position]] = ranks[path[4]]
+            levels[model] = _resolved(model, list(ranks_of), ranks_of, *fields)
+        for pk, (sub_strand_id, strand_id, area_id, grade_id, _) in paths.items():
+            outcome, sub_strand = levels[LearningOutcome].get(pk), levels[SubStrand].get(sub_strand_id)
+            strand = levels[Strand].get(strand_id)
+            if outcome is None or sub_strand is None or strand is None or area_id not in levels[LearningArea]:
+                continue
+            yield pk, area_id, grade_id, {
+                'code': outcome['code'], 'description': outcome['description'],
+                'suggested_activities': outcome['suggested_activities'],
+                'strand': strand['name'], 'sub_strand': sub_strand['name'],
+            }
+
+    paths = {}
+    for pk, *path in outcomes.values_list(
+        'id', 'sub_strand_id', 'sub_strand__strand_id', 'sub_strand__strand__learning_area_id',
+        'sub_strand__strand__learning_area__grade_level_id',
+        'sub_strand__strand__learning_area__grade_level__curriculum_release_id',
+    ).iterator(chunk_size=CHUNK_SIZE):
+        paths[pk] = path
+        if len(paths) >= CHUNK_SIZE:
+            yield from flush(paths)
+            paths = {}
+    yield from flush(paths)
+
+
+def _weighted_terms(fields: Dict[str, str]) -> Tuple[Counter, float]:
+    """Field-weighted frequency of every word, and the document's weighted length"""
+    frequencies, length = Counter(), 0.0
+    for field, text in fields.items():
+        field_words = [word[:MAX_TERM_LENGTH] for word in words(text)]
+        for word in field_words:
+            frequencies[word] += FIELD_WEIGHTS[field]
+        length += FIELD_WEIGHTS[field] * len(field_words)
+    return frequencies, length
+
+
+# Index maintenance
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def remove_outcomes(outcome_ids: Iterable[int]):
+    outcome_ids = list(outcome_ids)
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            for chunk in _chunks(outcome_ids):
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+    else:
+        for chunk in _chunks(outcome_ids):
+            OutcomeSearchDocument.objects.filter(outcome_id__in=chunk).delete()
+
+
+def _fts_filters(**filters) -> str:
+    """
+    Filter values as tokens of the FTS table's `filters` column. FTS5 looks
+    them up in its index like words; an UNINDEXED column would be read from
+    every matching row.
+    """
+    return ' '.join(f'{FILTER_TOKENS[column]}{value}' for column, value in filters.items())
+
+
+def _write(rows):
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}, filters) "
+                f"VALUES (%s, {', '.join(['%s'] * len(FIELDS))}, %s)",
+                [
+                    (pk, *(fields[field] for field in FIELDS), _fts_filters(learning_area_id=area_id, grade_level_id=grade_id))
+                    for pk, area_id, grade_id, fields in rows
+                ],
+            )
+        return
+
+    documents, terms = [], []
+    for pk, area_id, grade_id, fields in rows:
+        frequencies, length = _weighted_terms(fields)
+        documents.append(OutcomeSearchDocument(
+            outcome_id=pk, learning_area_id=area_id, grade_level_id=grade_id, length=length,
+        ))
+        terms.extend(
+            OutcomeSearchTerm(document_id=pk, term=term, frequency=frequency)
+            for term, frequency in frequencies.items()
+        )
+    OutcomeSearchDocument.objects.bulk_create(documents)
+    OutcomeSearchTerm.objects.bulk_create(terms, batch_size=5000)
+
+
+def index_outcomes(outcome_ids: Iterable[int]) -> int:
+    """(Re)index the given outcomes; IDs that no longer exist are dropped from the index"""
+    outcome_ids = list(outcome_ids)
+    indexed = 0
+    with transaction.atomic():
+        for chunk in _chunks(outcome_ids):
+            remove_outcomes(chunk)
+            rows = list(_outcome_rows(chunk))
+            _write(rows)
+            indexed += len(rows)
+    return indexed
+
+
+def reindex_outcomes_under(area_ids: Iterable[int] = (), strand_ids: Iterable[int] = (),
+                           sub_strand_ids: Iterable[int] = (), outcome_ids: Iterable[int] = (),
+                           grade_ids: Iterable[int] = ()) -> int:
+    """
+    Reindex the given outcomes and every outcome below the given grades,
+    areas, strands and sub-strands (all by node id, see cbc.releases)
+    """
+    area_ids, strand_ids, sub_strand_ids = list(area_ids), list(strand_ids), list(sub_strand_ids)
+    grade_ids = list(grade_ids)
+    ids = set(outcome_ids)
+    if grade_ids or area_ids or strand_ids or sub_strand_ids:
+        ids.update(LearningOutcome.objects.filter(replaces__isnull=True).filter(
+            Q(sub_strand__strand__learning_area__grade_level_id__in=grade_ids)
+            | Q(sub_strand__strand__learning_area_id__in=area_ids)
+            | Q(sub_strand__strand_id__in=strand_ids)
+            | Q(sub_strand_id__in=sub_strand_ids)
+        ).values_list('id', flat=True))
+    return index_outcomes(sorted(ids)) if ids else 0
+
+
+def rebuild_index() -> int:
+    """Re-index every outcome from scratch; returns the number indexed"""
+    with transaction.atomic():
+        if search_backend() == 'fts5':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            OutcomeSearchTerm.objects.all().delete()
+            OutcomeSearchDocument.objects.all().delete()
+        rows, indexed = [], 0
+        for row in _outcome_rows():
+            rows.append(row)
+            if len(rows) >= CHUNK_SIZE:
+                _write(rows)
+                indexed += len(rows)
+                rows = []
+        _write(rows)
+        indexed += len(rows)
+
+    logger.info(f"Outcome search index rebuilt: {indexed} outcomes ({search_backend()})")
+    return indexed
+
+
+# Search
+
+def _fts5_search(query_words: List[str], filters: Dict[str, int], limit: int, offset: int) -> Tuple[int, List]:
+    # Quoted words can never be read as FTS5 syntax; the last is a prefix.
+    # Only the text columns are searched, so "area1" never matches a filter token
+    text = ' '.join(f'"{word}"' for word in query_words[:-1]) + f' "{query_words[-1]}"*'
+    match = ' AND '.join(
+        [f'filters : "{token}"' for token in _fts_filters(**filters).split()]
+        + [f"{{{' '.join(FIELDS)}}} : ({text.strip()})"]
+    )
+    # The filters column carries no weight
+    weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS) + ', 0'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        total = cursor.fetchone()[0]
+        if not total:
+            return 0, []
+        cursor.execute(
+            f'SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY score DESC, rowid LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        return total, cursor.fetchall()
+
+
+def _table_search(query_words: List[str], filters: Dict[str, int], limit: int, offset: int) -> Tuple[int, List]:
+    exact, prefix = query_words[:-1], query_words[-1]
+    # A range rather than LIKE, so every database can use the term index
+    word_matches = [Q(term=word) for word in dict.fromkeys(exact)] + [Q(term__gte=prefix, term__lt=prefix + '\uffff')]
+    any_word = Q(term__in=exact) | word_matches[-1]
+
+    # Document frequency of every matching term; ranking needs it anyway, and
+    # it picks the rarest query word to drive the search
+    document_frequency = dict(OutcomeSearchTerm.objects.filter(any_word).values('term').annotate(
+        df=Count('id')
+    ).values_list('term', 'df'))
+    sizes = [sum(df for term, df in document_frequency.items() if term == word) for word in dict.fromkeys(exact)]
+    sizes.append(sum(df for term, df in document_frequency.items() if term.startswith(prefix)))
+    if not all(sizes):
+        return 0, []
+
+    # Postings of the rarest word's documents; an index lookup per document
+    # checks every other word, so common words never load their whole lists
+    rarest = min(range(len(word_matches)), key=sizes.__getitem__)
+    postings = OutcomeSearchTerm.objects.filter(any_word, document_id__in=OutcomeSearchTerm.objects.filter(
+        word_matches[rarest]
+    ).values('document_id'))
+    for position, word_match in enumerate(word_matches):
+        if position != rarest:
+            postings = postings.filter(Exists(OutcomeSearchTerm.objects.filter(
+                word_match, document_id=OuterRef('document_id'),
+            )))
+    if filters:
+        postings = postings.filter(**{f'document__{column}': value for column, value in filters.items()})
+    postings = list(postings.values_list('document_id', 'term', 'frequency', 'document__length'))
+    if not postings:
+        return 0, []
+
+    stats = OutcomeSearchDocument.objects.aggregate(documents=Count('outcome_id'), average=Avg('length'))
+    total_documents, average_length = stats['documents'], stats['average'] or 1.0
+
+    # Best BM25 contribution of each query word per document
+    contributions: Dict[int, List[float]] = {}
+    for document_id, term, frequency, length in postings:
+        df = document_frequency[term]
+        idf = math.log(1 + (total_documents - df + 0.5) / (df + 0.5))
+        score = idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+        best = contributions.setdefault(document_id, [0.0] * len(query_words))
+        for position, word in enumerate(query_words):
+            last = position == len(query_words) - 1
+            if term == word or (last and term.startswith(word)):
+                best[position] = max(best[position], score)
+
+    ranked = sorted(
+        ((document_id, sum(best)) for document_id, best in contributions.items()),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return len(ranked), ranked[offset:offset + limit]
+
+
+def _result(outcome, score: float) -> Dict:
+    area, strand, sub_strand = outcome.path
+    return {
+        'id': outcome.id,
+        'code': outcome.code,
+        'description': outcome.description,
+        'sub_strand': sub_strand.id,
+        'sub_strand_name': sub_strand.name,
+        'strand': strand.id,
+        'strand_name': strand.name,
+        'learning_area': area.id,
+        'learning_area_name': area.name,
+        'grade_level': area.grade.id,
+        'grade_level_name': area.grade.name,
+        'full_path': outcome.full_path,
+        'score': round(score, 3),
+    }
+
+
+def search_outcomes(q: str, learning_area_id: Optional[int] = None, grade_level_id: Optional[int] = None,
+                    page: int = 1, page_size: int = PAGE_SIZE) -> Dict:
+    """
+    Ranked, paginated outcomes matching `q`.
+
+    Args:
+        q: Words from the code, description, suggested activities, strand or
+            sub-strand name; the last word may be partial
+        learning_area_id: Only outcomes of this learning area
+        grade_level_id: Only outcomes of this grade level
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    empty = {'count': 0, 'page': 1, 'page_size': page_size, 'num_pages': 1, 'results': []}
+    query_words = [word[:MAX_TERM_LENGTH] for word in words(q)]
+    if not query_words:
+        return empty
+
+    filters = {}
+    if learning_area_id:
+        filters['learning_area_id'] = learning_area_id
+    if grade_level_id:
+        filters['grade_level_id'] = grade_level_id
+
+    page = max(1, page)
+    search = _fts5_search if search_backend() == 'fts5' else _table_search
+    total, hits = search(query_words, filters, page_size, (page - 1) * page_size)
+    num_pages = max(1, -(-total // page_size))
+    if page > num_pages:
+        page = num_pages
+        total, hits = search(query_words, filters, page_size, (page - 1) * page_size)
+    if not total:
+        return empty
+
+    curriculum = get_curriculum()
+    if any(outcome_id not in curriculum.outcomes for outcome_id, _ in hits):
+        # Indexed by another process since our last version check
+        forget_curriculum()
+        curriculum = get_curriculum()
+    return {
+        'count': total,
+        'page': page,
+        'page_size': page_size,
+        'num_pages': num_pages,
+        'results': [
+            _result(curriculum.outcomes[outcome_id], score)
+            for outcome_id, score in hits if outcome_id in curriculum.outcomes
+        ],
+    }
@@ -0,0 +1,184 @@
+"""
+Curriculum Releases
+Copy-on-write versions of the CBC registry. The base registry (rows without a
+release) is the original curriculum; a release such as the rationalized
+curriculum stores only the nodes it adds, changes or removes and inherits the
+rest from its parent release, down to the base. Old and new curricula
+therefore coexist: each grade level follows one release, and every
+competency assessment records the release it was made against.
+
+Nodes keep the id of their first row across every release, so assessments,
+enrolments, quizzes and achievements keep pointing at the same outcome when a
+release rewords it. Writes go through edit(), add() and remove(), which never
+touch rows of other layers; reads go through cbc.curriculum, which resolves
+and caches the snapshot each release sees.
+"""
+
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Q
+
+from .curriculum import release_ranks
+from .models import CurriculumRelease, GradeLevel, LearningArea, LearningOutcome, Strand, SubStrand
+
+# model -> parent foreign key (its parent is fixed: a move is a remove and an add)
+PARENTS = {
+    LearningArea: 'grade_level',
+    Strand: 'learning_area',
+    SubStrand: 'strand',
+    LearningOutcome: 'sub_strand',
+}
+
+# Fields an override row never takes from its caller
+LAYER_FIELDS = ('id', 'release', 'replaces', 'is_removed', 'created_at', 'updated_at')
+
+
+def create_release(name: str, code: str, parent: Optional[CurriculumRelease] = None,
+                   description: str = '') -> CurriculumRelease:
+    """A new, empty release: it sees exactly what its parent (or the base registry) sees"""
+    return CurriculumRelease.objects.create(name=name, code=code, parent=parent, description=description)
+
+
+def get_release(code: str) -> CurriculumRelease:
+    try:
+        return CurriculumRelease.objects.get(code=code)
+    except CurriculumRelease.DoesNotExist:
+        raise ValueError(f"Unknown curriculum release '{code}'")
+
+
+def identity_of(row) -> int:
+    """Id of the node a registry row belongs to (its first row)"""
+    return row.replaces_id or row.pk
+
+
+def release_for_student(student_id) -> Optional[int]:
+    """Id of the release the student's grade level follows, or None for the base registry"""
+    from students.models import Student
+    return Student.objects.filter(pk=student_id).values_list(
+        'grade_level__curriculum_release_id', flat=True
+    ).first()
+
+
+def assign_release(release: Optional[CurriculumRelease], grade_levels) -> int:
+    """Move grade levels (a queryset) to a release; None moves them back to the base registry"""
+    updated = 0
+    for grade in grade_levels:
+        grade.curriculum_release = release
+        grade.save(update_fields=['curriculum_release'])
+        updated += 1
+    return updated
+
+
+def _ranks(release: CurriculumRelease) -> Dict:
+    return release_ranks(dict(CurriculumRelease.objects.values_list('id', 'parent_id')), release.id)
+
+
+def _resolve(rows, ranks: Dict) -> Dict:
+    """node id -> the row the release sees (removed rows included)"""
+    best = {}
+    for row in rows:
+        rank = ranks.get(row.release_id)
+        if rank is None:
+            continue
+        node_id = identity_of(row)
+        if node_id not in best or rank > best[node_id][0]:
+            best[node_id] = (rank, row)
+    return {node_id: row for node_id, (_, row) in best.items()}
+
+
+def _rows_of(model, node_ids):
+    return model.objects.filter(Q(pk__in=node_ids) | Q(replaces_id__in=node_ids))
+
+
+def effective_row(release: CurriculumRelease, model, node_id: int, ranks: Dict = None):
+    """The row of a node the release sees, or None if it does not see the node"""
+    row = _resolve(_rows_of(model, [node_id]), ranks or _ranks(release)).get(node_id)
+    return None if row is None or row.is_removed else row
+
+
+def _check_clashes(model, row, node_id: int, ranks: Dict):
+    """Raise ValueError if another node the release sees has the row's code or sibling slot"""
+    same_code = set(model.objects.filter(code=row.code).values_list('replaces_id', 'id'))
+    candidates = {replaces or pk for replaces, pk in same_code} - {node_id}
+    for other in _resolve(_rows_of(model, candidates), ranks).values():
+        if not other.is_removed and other.code == row.code:
+            raise ValueError(f"{model.__name__} code '{row.code}' is already used in this release")
+
+    parent = PARENTS[model]
+    slot = 'name' if model is LearningArea else 'order'
+    siblings = _resolve(model.objects.filter(**{f'{parent}_id': getattr(row, f'{parent}_id')}), ranks)
+    for other_id, other in siblings.items():
+        if other_id != node_id and not other.is_removed and getattr(other, slot) == getattr(row, slot):
+            raise ValueError(f"{model.__name__} {slot} {getattr(row, slot)!r} is already used under this parent")
+
+
+def _parent_visible(release: CurriculumRelease, model, parent_id: int, ranks: Dict) -> bool:
+    parent_model = model._meta.get_field(PARENTS[model]).related_model
+    if parent_model is GradeLevel:
+        return GradeLevel.objects.filter(pk=parent_id).exists()
+    return effective_row(release, parent_model, parent_id, ranks) is not None
+
+
+@transaction.atomic
+def edit(release: CurriculumRelease, row, **fields):
+    """
+    Change a node in a release. The first change copies the row the release
+    currently sees into the release; later changes update that copy. Rows of
+    the base registry and of other releases are never written.
+    """
+    model, node_id = type(row), identity_of(row)
+    fixed = set(fields) & {*LAYER_FIELDS, PARENTS[model], f'{PARENTS[model]}_id'}
+    if fixed:
+        raise ValueError(f"Cannot change {', '.join(sorted(fixed))} in a release; remove the node and add a new one")
+
+    ranks = _ranks(release)
+    current = effective_row(release, model, node_id, ranks)
+    if current is None:
+        raise ValueError(f"{model.__name__} {node_id} is not part of release '{release.code}'")
+
+    if current.release_id != release.id:
+        current.pk = None
+        current._state.adding = True
+        current.release, current.replaces_id = release, node_id
+    for name, value in fields.items():
+        setattr(current, name, value)
+    _check_clashes(model, current, node_id, ranks)
+    current.save()
+    return current
+
+
+@transaction.atomic
+def add(release: CurriculumRelease, model, parent_id: int, **fields):
+    """Add a node that only this release (and its descendants) sees"""
+    fixed = set(fields) & {*LAYER_FIELDS, PARENTS[model], f'{PARENTS[model]}_id'}
+    if fixed:
+        raise ValueError(f"Cannot set {', '.join(sorted(fixed))} on a new node")
+
+    ranks = _ranks(release)
+    if not _parent_visible(release, model, parent_id, ranks):
+        raise ValueError(f"Parent {parent_id} of the new {model.__name__} is not part of release '{release.code}'")
+    row = model(release=release, **{f'{PARENTS[model]}_id': parent_id}, **fields)
+    _check_clashes(model, row, None, ranks)
+    row.save()
+    return row
+
+
+@transaction.atomic
+def remove(release: CurriculumRelease, row):
+    """
+    Drop a node and its subtree from a release with a tombstone row. Nothing is
+    deleted, so assessments of the node stay valid in the releases that keep it.
+    """
+    model, node_id = type(row), identity_of(row)
+    current = effective_row(release, model, node_id)
+    if current is None:
+        raise ValueError(f"{model.__name__} {node_id} is not part of release '{release.code}'")
+
+    if current.release_id != release.id:
+        current.pk = None
+        current._state.adding = True
+        current.release, current.replaces_id = release, node_id
+    current.is_removed = True
+    current.save()
+    return current
@@ -0,0 +1,139 @@
+"""
+CBC Report Rendering
+Pure-Python report assembly shared by the single-student and batch report paths.
+Nothing in this module touches the ORM, so it can run inside worker processes.
+"""
+
+import json
+import time
+
+
+def assemble_report(student_info, areas, achievements, report_date):
+    """
+    Build the report document for one student.
+
+    Args:
+        student_info: dict with name, student_id, grade, email
+        areas: CurriculumSnapshot.area_tree() nodes for the student's learning areas
+        achievements: {outcome_id: {'competency_level', 'assessment_date', 'comment'}}
+        report_date: YYYY-MM-DD string
+    """
+    # Derive counts from unique achieved outcomes
+    breakdown_dict = {}
+    for row in achievements.values():
+        breakdown_dict[row['competency_level']] = breakdown_dict.get(row['competency_level'], 0) + 1
+
+    areas_progress = []
+    for area in areas:
+        area_breakdown = {}
+        area_total = 0
+
+        strands_data = []
+        for strand in area['strands']:
+            sub_strands_data = []
+            for sub_strand in strand['sub_strands']:
+                outcomes_data = []
+                for outcome_id, description, code in sub_strand['outcomes']:
+                    achieved = achievements.get(outcome_id)
+                    if achieved:
+                        area_total += 1
+                        lvl = achieved['competency_level']
+                        area_breakdown[lvl] = area_breakdown.get(lvl, 0) + 1
+
+                    outcomes_data.append({
+                        'outcome': description,
+                        'code': code,
+                        'competency_level': achieved['competency_level'] if achieved else None,
+                        'assessment_date': achieved['assessment_date'] if achieved else None,
+                        'teacher_comment': achieved['comment'] if achieved else None
+                    })
+
+                sub_strands_data.append({
+                    'name': sub_strand['name'],
+                    'outcomes': outcomes_data
+                })
+
+            strands_data.append({
+                'name': strand['name'],
+                'sub_strands': sub_strands_data
+            })
+
+        areas_progress.append({
+            'name': area['name'],
+            'code': area['code'],
+            'strands': strands_data,
+            'total_assessments': area_total,
+            'breakdown': area_breakdown
+        })
+
+    return {
+        'student': student_info,
+        'report_date': report_date,
+        'overall_stats': {
+            'total_assessments': len(achievements),
+            'breakdown': breakdown_dict
+        },
+        'learning_areas': areas_progress
+    }
+
+
+def format_summary_text(data):
+    """
+    Generate a text summary of student progress from report data
+    """
+    stats = data['overall_stats']
+
+    summary = f"CBC Progress Report for {data['student']['name']}\n"
+    summary += f"Student ID: {data['student']['student_id']}\n"
+    summary += f"Grade: {data['student']['grade']}\n"
+    summary += f"Report Date: {data['report_date']}\n\n"
+
+    summary += f"Overall Progress:\n"
+    summary += f"Total Assessments: {stats['total_assessments']}\n"
+    summary += f"Exceeding Expectations (EE): {stats['breakdown'].get('EE', 0)}\n"
+    summary += f"Meeting Expectations (ME): {stats['breakdown'].get('ME', 0)}\n"
+    summary += f"Approaching Expectations (AE): {stats['breakdown'].get('AE', 0)}\n"
+    summary += f"Below Expectations (BE): {stats['breakdown'].get('BE', 0)}\n\n"
+
+    for area in data['learning_areas']:
+        summary += f"\n{area['name']}:\n"
+        summary += f"  Assessments: {area['total_assessments']}\n"
+        for strand in area['strands']:
+            summary += f"  - {strand['name']}\n"
+
+    return summary
+
+
+# Curriculum nodes by learning area ID, installed once per worker process
+_curriculum = {}
+
+
+def init_worker(areas):
+    """Process pool initializer: share the curriculum tree instead of pickling it per task"""
+    _curriculum.clear()
+    _curriculum.update((area['id'], area) for area in areas)
+
+
+def render_student_report(task):
+    """
+    Worker entry point for batch report generation.
+
+    Args:
+        task: (student_pk, student_info, area_ids, achievements, report_date, output_format)
+
+    Returns:
+        (student_pk, filename, content bytes, elapsed milliseconds)
+    """
+    started = time.perf_counter()
+    student_pk, student_info, area_ids, achievements, report_date, output_format = task
+    areas = [_curriculum[area_id] for area_id in area_ids]
+    data = assemble_report(student_info, areas, achievements, report_date)
+
+    if output_format == 'txt':
+        content = format_summary_text(data).encode('utf-8')
+    else:
+        content = json.dumps(data, default=str, indent=2).encode('utf-8')
+
+    filename = f"cbc_report_{student_info['student_id']}.{output_format}"
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return student_pk, filename, content, elapsed_ms
@@ -7,8 +7,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from .models import ReportBatchJob
+from .serializers import ReportBatchJobSerializer
 from .report_generator import generate_student_report, generate_class_summary, CBCReportGenerator
+from .batch_reports import launch_batch_job
+from core.downloads import serve_file
 import json
+import os
 
 
 @api_view(['GET'])
@@ -67,3 +73,70 @@ def class_summary(request, learning_area_id):
         return Response({
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _can_batch(user):
+    return user.is_superuser or hasattr(user, 'teacher')
+
+
+def _batch_job_for(request, job_id):
+    """The job if the user may see it: superusers, or the teacher who queued it"""
+    job = get_object_or_404(ReportBatchJob, id=job_id)
+    if not _can_batch(request.user) or not (request.user.is_superuser or job.created_by_id == request.user.id):
+        return None
+    return job
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_reports(request):
+    """
+    Queue report generation for a whole grade level or learning area
+    POST /api/cbc/reports/batch/
+    Body: { "grade_level": 1 } or { "learning_area": 3 }, optional "output_format", "archive"
+    """
+    if not _can_batch(request.user):
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = ReportBatchJobSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    job = serializer.save(created_by=request.user)
+    launch_batch_job(job)
+    return Response(ReportBatchJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def batch_report_status(request, job_id):
+    """
+    Progress and per-student timings of a batch report job
+    GET /api/cbc/reports/batch/{job_id}/
+    """
+    job = _batch_job_for(request, job_id)
+    if job is None:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    return Response(ReportBatchJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def batch_report_download(request, job_id):
+    """
+    Download the zip archive produced by a completed batch job
+    GET /api/cbc/reports/batch/{job_id}/download/
+    """
+    job = _batch_job_for(request, job_id)
+    if job is None:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    if job.status != 'completed' or not job.archive or not os.path.exists(job.output_path):
+        return Response({'error': 'Archive not available'}, status=status.HTTP_404_NOT_FOUND)
+
+    return serve_file(
+        request,
+        job.output_path,
+        as_attachment=True,
+        filename=f'cbc_reports_batch_{job.id}.zip',
+        content_type='application/zip'
+    )
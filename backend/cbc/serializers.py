@@ -5,8 +5,9 @@ Serializers for CBC models
 from rest_framework import serializers
 from .models import (
     GradeLevel, LearningArea, Strand, SubStrand, 
-    LearningOutcome, CompetencyAssessment
+    LearningOutcome, CompetencyAssessment, ReportBatchJob
 )
+from .curriculum import BASE, get_area, get_curriculum
 from teachers.models import Teacher
 from students.models import Student
 
@@ -20,8 +21,25 @@ class GradeLevelSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class LearningAreaListSerializer(serializers.ModelSerializer):
+class ReleaseContentMixin:
+    """
+    Registry rows are node identities (cbc.releases); when the current
+    curriculum sees a release's override of the node, its wording wins.
+    """
+    snapshot_level = None
+    snapshot_fields = ('name', 'code', 'description', 'order')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        node = getattr(get_curriculum(), self.snapshot_level).get(instance.pk)
+        if node is not None and node.row_id != instance.pk:
+            data.update({field: getattr(node, field) for field in self.snapshot_fields if field in data})
+        return data
+
+
+class LearningAreaListSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing Learning Areas"""
+    snapshot_level = 'areas'
     grade_level_name = serializers.CharField(source='grade_level.name', read_only=True)
     teacher_name = serializers.CharField(source='teacher.user.get_full_name', read_only=True)
     student_count = serializers.IntegerField(source='get_enrolled_students_count', read_only=True)
@@ -38,15 +56,19 @@ class LearningAreaListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'grade_level_name', 'teacher_name', 'student_count', 'strands_count', 'outcomes_count']
 
     def get_strands_count(self, obj):
-        return obj.strands.count()
+        node = get_area(obj.id)
+        return len(node.strands) if node else obj.strands.current().count()
     
     def get_outcomes_count(self, obj):
-        from .models import LearningOutcome
-        return LearningOutcome.objects.filter(sub_strand__strand__learning_area=obj).count()
+        node = get_area(obj.id)
+        if node:
+            return len(node.outcomes)
+        return LearningOutcome.objects.current().filter(sub_strand__strand__learning_area=obj).count()
 
 
-class LearningAreaDetailSerializer(serializers.ModelSerializer):
+class LearningAreaDetailSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Detailed serializer for Learning Area with nested data"""
+    snapshot_level = 'areas'
     grade_level = GradeLevelSerializer(read_only=True)
     teacher_name = serializers.CharField(source='teacher.user.get_full_name', read_only=True)
     student_count = serializers.IntegerField(source='get_enrolled_students_count', read_only=True)
@@ -64,18 +86,25 @@ class LearningAreaDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'teacher_name', 'student_count', 'is_cbc', 'strands', 'strands_count', 'outcomes_count']
     
     def get_strands_count(self, obj):
-        return obj.strands.count()
+        node = get_area(obj.id)
+        return len(node.strands) if node else obj.strands.current().count()
     
     def get_outcomes_count(self, obj):
-        from .models import LearningOutcome
-        return LearningOutcome.objects.filter(sub_strand__strand__learning_area=obj).count()
+        node = get_area(obj.id)
+        if node:
+            return len(node.outcomes)
+        return LearningOutcome.objects.current().filter(sub_strand__strand__learning_area=obj).count()
 
     def get_strands(self, obj):
-        return StrandDetailSerializer(obj.strands.all(), many=True).data
+        node = get_area(obj.id)
+        if node:
+            return [strand_detail_data(strand) for strand in node.strands]
+        return StrandDetailSerializer(obj.strands.current(), many=True).data
 
 
-class StrandListSerializer(serializers.ModelSerializer):
+class StrandListSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing Strands"""
+    snapshot_level = 'strands'
     learning_area_name = serializers.CharField(source='learning_area.name', read_only=True)
     
     class Meta:
@@ -84,8 +113,9 @@ class StrandListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'learning_area_name']
 
 
-class SubStrandListSerializer(serializers.ModelSerializer):
+class SubStrandListSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing Sub-Strands"""
+    snapshot_level = 'sub_strands'
     strand_name = serializers.CharField(source='strand.name', read_only=True)
     
     class Meta:
@@ -94,8 +124,10 @@ class SubStrandListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'strand_name']
 
 
-class LearningOutcomeListSerializer(serializers.ModelSerializer):
+class LearningOutcomeListSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing Learning Outcomes"""
+    snapshot_level = 'outcomes'
+    snapshot_fields = ('code', 'description', 'order')
     sub_strand_name = serializers.CharField(source='sub_strand.name', read_only=True)
     sub_strand_id = serializers.IntegerField(source='sub_strand.id', read_only=True)
     
@@ -105,8 +137,10 @@ class LearningOutcomeListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'sub_strand_name', 'sub_strand_id']
 
 
-class LearningOutcomeDetailSerializer(serializers.ModelSerializer):
+class LearningOutcomeDetailSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Detailed serializer for Learning Outcome with full hierarchy"""
+    snapshot_level = 'outcomes'
+    snapshot_fields = ('code', 'description', 'order', 'suggested_activities', 'full_path')
     sub_strand = SubStrandListSerializer(read_only=True)
     full_path = serializers.CharField(read_only=True)
     
@@ -119,8 +153,9 @@ class LearningOutcomeDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'full_path']
 
 
-class SubStrandDetailSerializer(serializers.ModelSerializer):
+class SubStrandDetailSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Detailed serializer for Sub-Strand with learning outcomes"""
+    snapshot_level = 'sub_strands'
     learning_outcomes = LearningOutcomeListSerializer(many=True, read_only=True)
     strand_name = serializers.CharField(source='strand.name', read_only=True)
     
@@ -133,8 +168,9 @@ class SubStrandDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'strand_name']
 
 
-class StrandDetailSerializer(serializers.ModelSerializer):
+class StrandDetailSerializer(ReleaseContentMixin, serializers.ModelSerializer):
     """Detailed serializer for Strand with sub-strands"""
+    snapshot_level = 'strands'
     sub_strands = SubStrandDetailSerializer(many=True, read_only=True)
     learning_area_name = serializers.CharField(source='learning_area.name', read_only=True)
     
@@ -147,11 +183,91 @@ class StrandDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'learning_area_name']
 
 
+# Snapshot nodes (cbc.curriculum) in the same shapes as the serializers above
+
+def outcome_list_data(outcome):
+    """LearningOutcomeListSerializer data"""
+    return {
+        'id': outcome.id,
+        'code': outcome.code,
+        'description': outcome.description,
+        'sub_strand': outcome.sub_strand.id,
+        'sub_strand_id': outcome.sub_strand.id,
+        'sub_strand_name': outcome.sub_strand.name,
+        'order': outcome.order,
+    }
+
+
+def strand_list_data(strand):
+    """StrandListSerializer data"""
+    return {
+        'id': strand.id,
+        'name': strand.name,
+        'code': strand.code,
+        'learning_area': strand.area.id,
+        'learning_area_name': strand.area.name,
+        'order': strand.order,
+    }
+
+
+def sub_strand_list_data(sub_strand):
+    """SubStrandListSerializer data"""
+    return {
+        'id': sub_strand.id,
+        'name': sub_strand.name,
+        'code': sub_strand.code,
+        'strand': sub_strand.strand.id,
+        'strand_name': sub_strand.strand.name,
+        'order': sub_strand.order,
+    }
+
+
+def outcome_detail_data(outcome):
+    """LearningOutcomeDetailSerializer data"""
+    return {
+        'id': outcome.id,
+        'code': outcome.code,
+        'description': outcome.description,
+        'order': outcome.order,
+        'suggested_activities': outcome.suggested_activities,
+        'sub_strand': sub_strand_list_data(outcome.sub_strand),
+        'full_path': outcome.full_path,
+    }
+
+
+def sub_strand_detail_data(sub_strand):
+    """SubStrandDetailSerializer data"""
+    return {
+        'id': sub_strand.id,
+        'name': sub_strand.name,
+        'code': sub_strand.code,
+        'description': sub_strand.description,
+        'order': sub_strand.order,
+        'strand': sub_strand.strand.id,
+        'strand_name': sub_strand.strand.name,
+        'learning_outcomes': [outcome_list_data(outcome) for outcome in sub_strand.outcomes],
+    }
+
+
+def strand_detail_data(strand):
+    """StrandDetailSerializer data"""
+    return {
+        'id': strand.id,
+        'name': strand.name,
+        'code': strand.code,
+        'description': strand.description,
+        'order': strand.order,
+        'learning_area': strand.area.id,
+        'learning_area_name': strand.area.name,
+        'sub_strands': [sub_strand_detail_data(sub_strand) for sub_strand in strand.sub_strands],
+    }
+
+
 class CompetencyAssessmentSerializer(serializers.ModelSerializer):
     """Serializer for Competency Assessment"""
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
     teacher_name = serializers.CharField(source='teacher.user.get_full_name', read_only=True)
-    learning_outcome_description = serializers.CharField(source='learning_outcome.description', read_only=True)
+    learning_outcome_description = serializers.SerializerMethodField()
     competency_level_display = serializers.CharField(source='get_competency_display_full', read_only=True)
     
     class Meta:
@@ -161,13 +277,18 @@ class CompetencyAssessmentSerializer(serializers.ModelSerializer):
             'learning_outcome_description', 'competency_level',
             'competency_level_display', 'assessment_date', 'teacher',
             'teacher_name', 'teacher_comment', 'evidence',
-            'assignment_submission'
+            'assignment_submission', 'curriculum_release'
         ]
         read_only_fields = [
             'id', 'assessment_date', 'student_name', 'teacher_name',
-            'learning_outcome_description', 'competency_level_display'
+            'learning_outcome_description', 'competency_level_display', 'curriculum_release'
         ]
 
+    def get_learning_outcome_description(self, obj):
+        """The outcome as worded in the release the assessment was recorded against"""
+        node = get_curriculum(obj.curriculum_release_id or BASE).outcomes.get(obj.learning_outcome_id)
+        return node.description if node else obj.learning_outcome.description
+
 
 class CompetencyAssessmentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating Competency Assessments"""
@@ -187,3 +308,30 @@ class CompetencyAssessmentCreateSerializer(serializers.ModelSerializer):
                 f"Invalid competency level. Must be one of: {', '.join(valid_levels)}"
             )
         return value
+
+
+class ReportBatchJobSerializer(serializers.ModelSerializer):
+    """Serializer for batch report generation jobs"""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportBatchJob
+        fields = [
+            'id', 'grade_level', 'learning_area', 'output_format', 'archive', 'status',
+            'total_students', 'completed_students', 'progress', 'timings', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'total_students', 'completed_students', 'progress', 'timings',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
+
+    def get_progress(self, obj):
+        if not obj.total_students:
+            return 0
+        return round(obj.completed_students * 100 / obj.total_students, 1)
+
+    def validate(self, attrs):
+        if bool(attrs.get('grade_level')) == bool(attrs.get('learning_area')):
+            raise serializers.ValidationError("Provide exactly one of grade_level or learning_area.")
+        return attrs
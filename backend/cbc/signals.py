@@ -0,0 +1,109 @@
+"""
+CBC signal handlers
+Bump the curriculum version (cbc.curriculum) whenever the registry changes,
+rebuild the curriculum bundles (cbc.bundles) once it commits, and keep the
+outcome search index (cbc.outcome_search) in step with it. Quiz changes that
+bypass QuizSubmission.save (deleted attempts, tested outcomes, question points
+that change the quiz total) keep the outcome achievements (cbc.achievements)
+current.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Quiz, QuizQuestion, QuizSubmission
+from . import outcome_search
+from .achievements import quiz_outcome_map, refresh_quiz_outcomes, refresh_removed_submission
+from .bundles import schedule_bundle_rebuild
+from .curriculum import bump_curriculum_version
+from .models import CurriculumRelease, GradeLevel, LearningArea, LearningOutcome, Strand, SubStrand
+from .releases import identity_of
+
+REGISTRY_MODELS = [CurriculumRelease, GradeLevel, LearningArea, Strand, SubStrand, LearningOutcome]
+
+
+def registry_changed(sender, **kwargs):
+    bump_curriculum_version()
+    transaction.on_commit(schedule_bundle_rebuild)
+
+
+for model in REGISTRY_MODELS:
+    post_save.connect(registry_changed, sender=model, dispatch_uid=f'curriculum_saved_{model.__name__}')
+    post_delete.connect(registry_changed, sender=model, dispatch_uid=f'curriculum_deleted_{model.__name__}')
+
+
+@receiver(post_save, sender=LearningOutcome)
+def index_saved_outcome(sender, instance, raw=False, **kwargs):
+    if not raw:
+        outcome_search.index_outcomes([identity_of(instance)])
+
+
+@receiver(post_delete, sender=LearningOutcome)
+def unindex_deleted_outcome(sender, instance, **kwargs):
+    if instance.replaces_id:
+        outcome_search.index_outcomes([instance.replaces_id])
+    else:
+        outcome_search.remove_outcomes([instance.id])
+
+
+# Outcomes are indexed by node id with their strand and sub-strand names and
+# their area and grade; a release's override rows re-index the node they override
+
+@receiver(post_save, sender=SubStrand)
+def reindex_sub_strand(sender, instance, raw=False, created=False, **kwargs):
+    # A new override (or tombstone) changes the outcomes below its node
+    if not raw and (not created or instance.replaces_id):
+        outcome_search.reindex_outcomes_under(sub_strand_ids=[identity_of(instance)])
+
+
+@receiver(post_save, sender=Strand)
+def reindex_strand(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and (not created or instance.replaces_id):
+        outcome_search.reindex_outcomes_under(strand_ids=[identity_of(instance)])
+
+
+@receiver(post_save, sender=LearningArea)
+def reindex_learning_area(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and (not created or instance.replaces_id):
+        outcome_search.reindex_outcomes_under(area_ids=[identity_of(instance)])
+
+
+@receiver(post_save, sender=GradeLevel)
+def reindex_grade_level(sender, instance, raw=False, created=False, **kwargs):
+    # The grade may have moved to another curriculum release
+    if not raw and not created:
+        outcome_search.reindex_outcomes_under(grade_ids=[instance.id])
+
+
+@receiver(post_delete, sender=QuizSubmission)
+def refresh_deleted_submission(sender, instance, **kwargs):
+    refresh_removed_submission(instance)
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def refresh_quiz_total(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Levels are scores out of the quiz's total points, so every graded attempt re-levels
+    if raw or (update_fields is not None and not {'points', 'quiz'} & set(update_fields)):
+        return
+    refresh_quiz_outcomes([instance.quiz_id], quiz_outcome_map([instance.quiz_id])[instance.quiz_id])
+
+
+@receiver(m2m_changed, sender=Quiz.tested_outcomes.through)
+def refresh_tested_outcomes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is empty on clear; remember what is about to go
+        rows = sender.objects.filter(**{'learningoutcome_id' if reverse else 'quiz_id': instance.pk})
+        instance._cleared_tested_outcomes = set(rows.values_list('quiz_id' if reverse else 'learningoutcome_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_tested_outcomes', set())
+    if not changed:
+        return
+    if reverse:
+        # outcome.quizzes.add(...): instance is the outcome, pk_set the quizzes
+        refresh_quiz_outcomes(list(changed), [instance.pk])
+    else:
+        refresh_quiz_outcomes([instance.pk], list(changed))
@@ -0,0 +1,770 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from students.models import Student
+from teachers.models import Teacher
+from courses.models import Quiz, QuizQuestion, QuizSubmission
+import json
+import os
+import tempfile
+import zipfile
+
+from .models import (
+    GradeLevel, LearningArea, Strand, SubStrand, LearningOutcome,
+    CompetencyAssessment, CurriculumVersion, OutcomeAchievement, ReportBatchJob
+)
+from .achievements import rebuild_outcome_achievements
+from .batch_reports import BatchReportRunner
+from .curriculum import get_area, get_curriculum
+from .report_generator import generate_student_report
+
+
+class OutcomeAchievementTest(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create_user(student_id='S001', email='s@example.com')
+        teacher_user = Student.objects.create_user(student_id='T001', email='t@example.com')
+        self.teacher = Teacher.objects.create(
+            user=teacher_user, teacher_id='TT001', date_of_birth='1990-01-01', qualification='Masters',
+            specialization='Math', experience_years=5, address='-', phone='-',
+        )
+        grade = GradeLevel.objects.create(name='Grade 4', curriculum_type='CBC', order=4)
+        self.area = LearningArea.objects.create(name='Mathematics', code='MATH-G4', grade_level=grade)
+        self.area.students.add(self.student)
+        strand = Strand.objects.create(learning_area=self.area, name='Numbers', code='MATH-G4-NUM', order=1)
+        sub = SubStrand.objects.create(strand=strand, name='Whole Numbers', code='MATH-G4-NUM-W', order=1)
+        self.outcome_a = LearningOutcome.objects.create(sub_strand=sub, description='Add', code='O-01', order=1)
+        self.outcome_b = LearningOutcome.objects.create(sub_strand=sub, description='Subtract', code='O-02', order=2)
+
+        self.quiz = Quiz.objects.create(title='Quiz', learning_area=self.area, learning_outcome=self.outcome_b)
+        QuizQuestion.objects.create(quiz=self.quiz, prompt='?', correct_answer='a', points=10, order=1)
+
+    def test_saves_maintain_table_and_report_reads_it(self):
+        CompetencyAssessment.objects.create(
+            student=self.student, learning_outcome=self.outcome_a, competency_level='AE',
+            teacher=self.teacher, evidence='-', teacher_comment='Keep practising',
+        )
+        QuizSubmission.objects.create(quiz=self.quiz, student=self.student, score=9, status='auto_graded')
+        QuizSubmission.objects.create(
+            quiz=self.quiz, student=self.student, attempt_number=2, score=5, status='auto_graded'
+        )
+
+        rows = dict(OutcomeAchievement.objects.values_list('learning_outcome_id', 'competency_level'))
+        self.assertEqual(rows, {self.outcome_a.id: 'AE', self.outcome_b.id: 'EE'})
+
+        # The curriculum tree comes from the in-memory snapshot once it is loaded
+        get_curriculum()
+        with self.assertNumQueries(3):
+            report = generate_student_report(self.student.id)
+        self.assertEqual(report['overall_stats'], {'total_assessments': 2, 'breakdown': {'AE': 1, 'EE': 1}})
+        outcomes = report['learning_areas'][0]['strands'][0]['sub_strands'][0]['outcomes']
+        self.assertEqual(outcomes[0]['teacher_comment'], 'Keep practising')
+        self.assertEqual(outcomes[1]['competency_level'], 'EE')
+
+    def test_rebuild_matches_incremental_updates(self):
+        CompetencyAssessment.objects.create(
+            student=self.student, learning_outcome=self.outcome_b, competency_level='BE',
+            teacher=self.teacher, evidence='-',
+        )
+        QuizSubmission.objects.create(quiz=self.quiz, student=self.student, score=7, status='graded')
+        incremental = list(OutcomeAchievement.objects.values_list('learning_outcome_id', 'competency_level', 'source'))
+
+        self.assertEqual(rebuild_outcome_achievements(), 1)
+        rebuilt = list(OutcomeAchievement.objects.values_list('learning_outcome_id', 'competency_level', 'source'))
+        # Same day: the teacher's direct assessment wins over the quiz
+        self.assertEqual(incremental, [(self.outcome_b.id, 'BE', 'assessment')])
+        self.assertEqual(rebuilt, incremental)
+
+    def test_deletes_regrades_and_tested_outcome_changes_refresh_table(self):
+        def rows():
+            return dict(OutcomeAchievement.objects.values_list('learning_outcome_id', 'competency_level'))
+
+        first = QuizSubmission.objects.create(quiz=self.quiz, student=self.student, score=9, status='graded')
+        second = QuizSubmission.objects.create(
+            quiz=self.quiz, student=self.student, attempt_number=2, score=3, status='graded'
+        )
+        self.assertEqual(rows(), {self.outcome_b.id: 'EE'})
+
+        # The quiz starts and stops testing another outcome
+        self.quiz.tested_outcomes.add(self.outcome_a)
+        self.assertEqual(rows(), {self.outcome_a.id: 'EE', self.outcome_b.id: 'EE'})
+        self.quiz.tested_outcomes.clear()
+        self.assertEqual(rows(), {self.outcome_b.id: 'EE'})
+        self.outcome_a.quizzes_m2m.add(self.quiz)
+        self.outcome_a.quizzes_m2m.remove(self.quiz)
+        self.assertEqual(rows(), {self.outcome_b.id: 'EE'})
+
+        # The best attempt goes back to review, then is deleted
+        first = QuizSubmission.objects.get(pk=first.pk)
+        first.status = 'in_review'
+        first.save()
+        self.assertEqual(rows(), {self.outcome_b.id: 'BE'})
+        second.delete()
+        self.assertEqual(rows(), {})
+
+    def test_question_point_changes_relevel_attempts(self):
+        QuizSubmission.objects.create(quiz=self.quiz, student=self.student, score=7, status='graded')
+        self.assertEqual(OutcomeAchievement.objects.get().competency_level, 'ME')
+
+        # 7 out of 20 once another question is added, 7 out of 10 again once it goes
+        question = QuizQuestion.objects.create(quiz=self.quiz, prompt='?', correct_answer='b', points=10, order=2)
+        self.assertEqual(OutcomeAchievement.objects.get().competency_level, 'BE')
+        question.points = 1
+        question.save()
+        self.assertEqual(OutcomeAchievement.objects.get().competency_level, 'ME')
+        question.delete()
+        self.assertEqual(OutcomeAchievement.objects.get().competency_level, 'ME')
+
+    def test_migration_backfills_existing_records(self):
+        from importlib import import_module
+        from types import SimpleNamespace
+        from django.apps import apps
+
+        QuizSubmission.objects.create(quiz=self.quiz, student=self.student, score=9, status='graded')
+        OutcomeAchievement.objects.all().delete()
+
+        migration = import_module('cbc.migrations.0004_outcomeachievement')
+        migration.populate_achievements(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(
+            list(OutcomeAchievement.objects.values_list('learning_outcome_id', 'competency_level')),
+            [(self.outcome_b.id, 'EE')],
+        )
+
+
+class BatchReportRunnerTest(TestCase):
+    def setUp(self):
+        self.teacher_user = teacher_user = Student.objects.create_user(student_id='T001', email='t@example.com')
+        teacher = Teacher.objects.create(
+            user=teacher_user, teacher_id='TT001', date_of_birth='1990-01-01', qualification='Masters',
+            specialization='Math', experience_years=5, address='-', phone='-',
+        )
+        self.grade = GradeLevel.objects.create(name='Grade 5', curriculum_type='CBC', order=5)
+        self.area = LearningArea.objects.create(name='Science', code='SCI-G5', grade_level=self.grade)
+        strand = Strand.objects.create(learning_area=self.area, name='Living Things', code='SCI-G5-LT', order=1)
+        sub = SubStrand.objects.create(strand=strand, name='Plants', code='SCI-G5-LT-P', order=1)
+        outcome = LearningOutcome.objects.create(sub_strand=sub, description='Name parts', code='SCI-01', order=1)
+
+        # Saving with a grade level enrols the student in the grade's learning areas
+        for i in range(4):
+            student = Student.objects.create_user(
+                student_id=f'S{i:03d}', email=f's{i}@example.com', grade_level=self.grade,
+            )
+            CompetencyAssessment.objects.create(
+                student=student, learning_outcome=outcome, competency_level='ME',
+                teacher=teacher, evidence='-',
+            )
+
+    def test_grade_level_batch_to_zip_with_process_pool(self):
+        job = ReportBatchJob.objects.create(grade_level=self.grade, archive=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'reports.zip')
+            job = BatchReportRunner(job, workers=2, output_path=path).run()
+
+            self.assertEqual(job.status, 'completed', job.error)
+            self.assertEqual((job.total_students, job.completed_students), (4, 4))
+            self.assertEqual(len(job.timings), 4)
+            with zipfile.ZipFile(path) as archive:
+                self.assertEqual(len(archive.namelist()), 4)
+                report = json.loads(archive.read('cbc_report_S000.json'))
+        self.assertEqual(report['overall_stats']['breakdown'], {'ME': 1})
+        self.assertEqual(report['learning_areas'][0]['code'], 'SCI-G5')
+
+    def test_learning_area_batch_to_directory(self):
+        job = ReportBatchJob.objects.create(learning_area=self.area, archive=False, output_format='txt')
+        with tempfile.TemporaryDirectory() as tmp:
+            job = BatchReportRunner(job, workers=1, output_path=tmp).run()
+            self.assertEqual(job.status, 'completed', job.error)
+            self.assertEqual(sorted(os.listdir(tmp))[0], 'cbc_report_S000.txt')
+
+    def test_only_the_requesting_teacher_sees_a_job(self):
+        from unittest import mock
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.teacher_user)
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(BACKGROUND_COMMANDS={'LOG_DIR': tmp}), \
+                mock.patch('core.background.subprocess.Popen') as popen:
+            response = client.post('/api/cbc/reports/batch/', {'grade_level': self.grade.id}, format='json')
+            self.assertEqual(response.status_code, 202)
+            # The worker's output goes to a log file, not /dev/null
+            self.assertEqual(popen.call_args.kwargs['stdout'].name, os.path.join(tmp, 'generate_batch_reports.log'))
+        job_id = response.data['id']
+        self.assertEqual(client.get(f'/api/cbc/reports/batch/{job_id}/').status_code, 200)
+
+        student = Student.objects.get(student_id='S000')
+        client.force_authenticate(student)
+        self.assertEqual(client.get(f'/api/cbc/reports/batch/{job_id}/').status_code, 403)
+        self.assertEqual(client.get(f'/api/cbc/reports/batch/{job_id}/download/').status_code, 403)
+
+
+class CurriculumSnapshotTest(TestCase):
+    def setUp(self):
+        self.user = Student.objects.create_user(student_id='S001', email='s@example.com')
+        grade = GradeLevel.objects.create(name='Grade 6', curriculum_type='CBC', order=6)
+        self.area = LearningArea.objects.create(name='English', code='ENG-G6', grade_level=grade)
+        self.strand = Strand.objects.create(learning_area=self.area, name='Reading', code='ENG-G6-R', order=1)
+        # Created out of order: the snapshot sorts like the querysets do
+        later = SubStrand.objects.create(strand=self.strand, name='Fluency', code='ENG-G6-R-F', order=2)
+        self.sub = SubStrand.objects.create(strand=self.strand, name='Comprehension', code='ENG-G6-R-C', order=1)
+        LearningOutcome.objects.create(sub_strand=later, description='Read aloud', code='ENG-03', order=1)
+        self.outcome = LearningOutcome.objects.create(sub_strand=self.sub, description='Infer', code='ENG-02', order=2)
+        LearningOutcome.objects.create(sub_strand=self.sub, description='Recall', code='ENG-01', order=1)
+
+    def test_paths_resolve_without_queries_and_writes_invalidate(self):
+        curriculum = get_curriculum()
+        with self.assertNumQueries(0):
+            node = get_curriculum().outcomes[self.outcome.id]
+            self.assertEqual((node.area.code, node.strand.code, node.sub_strand.code),
+                             ('ENG-G6', 'ENG-G6-R', 'ENG-G6-R-C'))
+            self.assertEqual(node.full_path, self.outcome.full_path)
+            self.assertEqual([outcome.code for outcome in node.area.outcomes], ['ENG-01', 'ENG-02', 'ENG-03'])
+        with self.assertRaises(AttributeError):
+            node.description = 'Changed'
+
+        self.strand.name = 'Reading Skills'
+        self.strand.save()
+        self.assertGreater(CurriculumVersion.objects.get().version, curriculum.version)
+        self.assertEqual(get_curriculum().outcomes[self.outcome.id].strand.name, 'Reading Skills')
+
+        self.sub.delete()
+        self.assertNotIn(self.outcome.id, get_curriculum().outcomes)
+
+    def test_other_processes_writes_are_seen_after_the_check_interval(self):
+        get_curriculum()
+        # Another process: neither signal nor local invalidation here
+        Strand.objects.filter(id=self.strand.id).update(name='Renamed')
+        CurriculumVersion.objects.update(version=999)
+
+        self.assertEqual(get_curriculum().strands[self.strand.id].name, 'Reading')
+        with override_settings(CURRICULUM_SNAPSHOT={'CHECK_INTERVAL': 0}):
+            self.assertEqual(get_curriculum().version, 999)
+            self.assertEqual(get_curriculum().strands[self.strand.id].name, 'Renamed')
+
+    def test_area_misses_reload_only_after_other_writes(self):
+        get_curriculum()
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_area(0))
+
+        # Another process adds an area within the check interval: no signals here
+        area, = LearningArea.objects.bulk_create([
+            LearningArea(name='Kiswahili', code='KIS-G6', grade_level=self.area.grade_level),
+        ])
+        self.assertIsNone(get_area(area.id))
+        CurriculumVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(get_area(area.id).code, 'KIS-G6')
+
+    def test_api_reads_match_the_model_serializers(self):
+        from rest_framework.test import APIClient
+        from .serializers import (
+            LearningOutcomeDetailSerializer, LearningOutcomeListSerializer, StrandDetailSerializer,
+        )
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        outcomes = LearningOutcome.objects.all()
+
+        response = client.get('/api/cbc/learning-outcomes/')
+        self.assertEqual(response.json(), LearningOutcomeListSerializer(outcomes, many=True).data)
+        response = client.get(f'/api/cbc/learning-outcomes/?sub_strand={self.sub.id}')
+        self.assertEqual([row['code'] for row in response.json()], ['ENG-01', 'ENG-02'])
+        response = client.get(f'/api/cbc/learning-outcomes/{self.outcome.id}/')
+        self.assertEqual(response.json(), LearningOutcomeDetailSerializer(self.outcome).data)
+        self.assertEqual(client.get('/api/cbc/learning-outcomes/0/').status_code, 404)
+
+        response = client.get(f'/api/cbc/learning-areas/{self.area.id}/')
+        self.assertEqual(response.json()['strands'], StrandDetailSerializer(self.area.strands.all(), many=True).data)
+        self.assertEqual(response.json()['outcomes_count'], 3)
+
+
+class KicdImportTest(TestCase):
+    def curriculum(self, outcome_code='MATH-G4-01', strand_orders=(1, 2)):
+        return [{
+            'grade_level': 'Grade 4', 'curriculum_type': 'CBC', 'order': 4,
+            'learning_areas': [{
+                'name': 'Mathematics', 'code': 'MATH-G4',
+                'strands': [
+                    {'name': 'Numbers', 'code': 'MATH-G4-NUM', 'order': strand_orders[0], 'sub_strands': [
+                        {'name': 'Whole Numbers', 'code': 'MATH-G4-NUM-W', 'order': 1, 'outcomes': [
+                            {'code': outcome_code, 'description': 'Add', 'order': 1},
+                            {'code': 'MATH-G4-02', 'description': 'Subtract', 'order': 2},
+                        ]},
+                    ]},
+                    {'name': 'Measurement', 'code': 'MATH-G4-MEA', 'order': strand_orders[1]},
+                ],
+            }],
+        }]
+
+    def run_import(self, data, **options):
+        import io
+        from .kicd_import import import_curriculum
+        return import_curriculum(io.StringIO(json.dumps(data)), **options)
+
+    def test_streaming_reader_decodes_across_small_reads(self):
+        import io
+        from .kicd_import import iter_json_array
+
+        data = self.curriculum() * 3
+        self.assertEqual(list(iter_json_array(io.StringIO(json.dumps(data, indent=2)), read_size=7)), data)
+        self.assertEqual(list(iter_json_array(io.StringIO(' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"grade_level": "Grade 4"}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"a": 1}, {"a": ')))
+
+    def test_diff_then_bulk_apply(self):
+        plan = self.run_import(self.curriculum(), dry_run=True)
+        self.assertEqual(plan.summary()['outcomes'], {'created': 2, 'updated': 0, 'unchanged': 0})
+        self.assertFalse(LearningOutcome.objects.exists())
+
+        self.run_import(self.curriculum())
+        outcome = LearningOutcome.objects.get(code='MATH-G4-01')
+        self.assertEqual(outcome.full_path, 'Mathematics > Numbers > Whole Numbers > Add')
+        self.assertEqual(get_curriculum().outcomes[outcome.id].area.code, 'MATH-G4')
+
+        # Unchanged: nothing but the five existing-row reads
+        with self.assertNumQueries(5):
+            plan = self.run_import(self.curriculum())
+        self.assertFalse(plan.has_changes)
+
+        # A renamed code keeps its row; swapped strand orders do not collide
+        plan = self.run_import(self.curriculum(outcome_code='MATH-G4-01A', strand_orders=(2, 1)))
+        self.assertEqual(plan.summary()['strands']['updated'], 2)
+        self.assertEqual(plan.changes()[-1], 'update outcomes MATH-G4-01A: code')
+        self.assertEqual(LearningOutcome.objects.get(id=outcome.id).code, 'MATH-G4-01A')
+        self.assertEqual(list(Strand.objects.order_by('order').values_list('code', flat=True)),
+                         ['MATH-G4-MEA', 'MATH-G4-NUM'])
+
+    def test_conflicts_are_reported_and_nothing_is_written(self):
+        self.run_import(self.curriculum())
+        data = self.curriculum()
+        sub_strand = data[0]['learning_areas'][0]['strands'][0]['sub_strands'][0]
+        sub_strand['outcomes'].append({'code': 'MATH-G4-03', 'description': 'Multiply', 'order': 2})
+        data[0]['learning_areas'][0]['strands'].append({'name': 'Geometry', 'code': 'MATH-G4-GEO', 'order': 9})
+
+        plan = self.run_import(data, dry_run=True)
+        self.assertEqual(len(plan.errors), 1)
+        self.assertIn('order 2 is also used by', plan.errors[0])
+        with self.assertRaises(ValueError):
+            self.run_import(data)
+        self.assertFalse(Strand.objects.filter(code='MATH-G4-GEO').exists())
+
+
+def fts5_available():
+    import sqlite3
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+    except sqlite3.OperationalError:
+        return False
+    return connection.vendor == 'sqlite'
+
+
+class OutcomeSearchTest(TestCase):
+    def setUp(self):
+        self.user = Student.objects.create_user(student_id='S001', email='s@example.com')
+        grade = GradeLevel.objects.create(name='Grade 5', curriculum_type='CBC', order=5)
+        self.area = LearningArea.objects.create(name='Science', code='SCI-G5', grade_level=grade)
+        strand = Strand.objects.create(learning_area=self.area, name='Living Things', code='SCI-G5-L', order=1)
+        self.sub = SubStrand.objects.create(strand=strand, name='Plants', code='SCI-G5-L-P', order=1)
+        self.roots = LearningOutcome.objects.create(
+            sub_strand=self.sub, code='SCI-G5-01', order=1, description='Identify the parts of a plant',
+            suggested_activities='Draw roots and leaves',
+        )
+        self.leaves = LearningOutcome.objects.create(
+            sub_strand=self.sub, code='SCI-G5-02', order=2, description='Explain how leaves make food',
+        )
+        self.other_grade = GradeLevel.objects.create(name='Grade 6', curriculum_type='CBC', order=6)
+        other_area = LearningArea.objects.create(name='Agriculture', code='AGR-G6', grade_level=self.other_grade)
+        other_strand = Strand.objects.create(learning_area=other_area, name='Crops', code='AGR-G6-C', order=1)
+        other_sub = SubStrand.objects.create(strand=other_strand, name='Planting', code='AGR-G6-C-P', order=1)
+        self.planting = LearningOutcome.objects.create(
+            sub_strand=other_sub, code='AGR-G6-01', order=1, description='Prepare a seedbed for planting',
+        )
+
+    def ids(self, q, **options):
+        from .outcome_search import search_outcomes
+        return [result['id'] for result in search_outcomes(q, **options)['results']]
+
+    def check_search(self):
+        # Descriptions outrank suggested activities; the last word is a prefix
+        self.assertEqual(self.ids('leaves'), [self.leaves.id, self.roots.id])
+        self.assertEqual(set(self.ids('pla')), {self.roots.id, self.leaves.id, self.planting.id})
+        self.assertEqual(self.ids('plant par'), [self.roots.id])
+        self.assertEqual(self.ids('SCI-G5-02'), [self.leaves.id])
+        self.assertEqual(self.ids('pla', grade_level_id=self.other_grade.id), [self.planting.id])
+        self.assertEqual(set(self.ids('pla', learning_area_id=self.area.id)), {self.roots.id, self.leaves.id})
+        # Filter values are not searchable text
+        self.assertEqual(self.ids(f'area{self.area.id}'), [])
+        self.assertEqual(self.ids(' - '), [])
+
+        # Renames and deletes are re-indexed as they are saved
+        self.sub.name = 'Flowering Plants'
+        self.sub.save()
+        self.assertEqual(set(self.ids('flowering')), {self.roots.id, self.leaves.id})
+        self.leaves.description = 'Describe photosynthesis'
+        self.leaves.save()
+        self.assertEqual(self.ids('food'), [])
+        self.roots.delete()
+        self.assertEqual(self.ids('draw'), [])
+
+        from .outcome_search import search_outcomes
+        result = search_outcomes('photo', page_size=1)
+        self.assertEqual((result['count'], result['num_pages']), (1, 1))
+        self.assertEqual(result['results'][0]['full_path'],
+                         'Science > Living Things > Flowering Plants > Describe photosynthesis')
+
+    @skipUnless(fts5_available(), 'SQLite without FTS5')
+    def test_fts5_backend(self):
+        from .outcome_search import search_backend
+        self.assertEqual(search_backend(), 'fts5')
+        self.check_search()
+
+    def test_migration_indexes_existing_outcomes(self):
+        from importlib import import_module
+        from types import SimpleNamespace
+        from django.apps import apps
+        from .outcome_search import rebuild_index, remove_outcomes, search_backend
+
+        index_existing_outcomes = import_module('cbc.migrations.0007_outcome_search').index_existing_outcomes
+        for backend in filter(None, ['table', 'fts5' if fts5_available() else None]):
+            with self.subTest(backend=backend), override_settings(OUTCOME_SEARCH={'BACKEND': backend}):
+                rebuild_index()
+                remove_outcomes([self.roots.id, self.leaves.id, self.planting.id])
+                self.assertEqual(self.ids('pla'), [])
+
+                index_existing_outcomes(apps, SimpleNamespace(connection=connection))
+                self.assertEqual(search_backend(), backend)
+                self.assertEqual(set(self.ids('pla')), {self.roots.id, self.leaves.id, self.planting.id})
+                self.assertEqual(self.ids('pla', grade_level_id=self.other_grade.id), [self.planting.id])
+
+    @override_settings(OUTCOME_SEARCH={'BACKEND': 'table'})
+    def test_table_backend(self):
+        from .outcome_search import rebuild_index
+        # Outcomes saved in setUp went to the FTS table
+        self.assertEqual(rebuild_index(), 3)
+        self.check_search()
+
+    def test_api_and_kicd_import_keep_index_current(self):
+        import io
+        from rest_framework.test import APIClient
+        from .kicd_import import import_curriculum
+
+        def curriculum(description):
+            return [{'grade_level': 'Grade 4', 'curriculum_type': 'CBC', 'order': 4, 'learning_areas': [{
+                'name': 'Mathematics', 'code': 'MATH-G4', 'strands': [{
+                    'name': 'Numbers', 'code': 'MATH-G4-NUM', 'order': 1, 'sub_strands': [{
+                        'name': 'Whole Numbers', 'code': 'MATH-G4-NUM-W', 'order': 1, 'outcomes': [
+                            {'code': 'MATH-G4-01', 'description': description, 'order': 1},
+                        ],
+                    }],
+                }],
+            }]}]
+
+        import_curriculum(io.StringIO(json.dumps(curriculum('Add whole numbers'))))
+        import_curriculum(io.StringIO(json.dumps(curriculum('Add fractions'))))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/cbc/learning-outcomes/search/', {'q': 'fract'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['code'] for result in response.json()['results']], ['MATH-G4-01'])
+        response = client.get('/api/cbc/learning-outcomes/search/', {'q': 'add', 'grade_level': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CurriculumBundleTest(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+        self.client.force_authenticate(Student.objects.create_user(student_id='S001', email='s@example.com'))
+        self.grade = GradeLevel.objects.create(name='Grade 7', curriculum_type='CBC', order=7)
+        self.area = LearningArea.objects.create(name='Mathematics', code='MATH-G7', grade_level=self.grade)
+        strand = Strand.objects.create(learning_area=self.area, name='Numbers', code='MATH-G7-N', order=1)
+        self.sub = SubStrand.objects.create(strand=strand, name='Integers', code='MATH-G7-N-I', order=1)
+        self.add = LearningOutcome.objects.create(sub_strand=self.sub, code='M7-01', order=1, description='Add integers')
+        self.subtract = LearningOutcome.objects.create(
+            sub_strand=self.sub, code='M7-02', order=2, description='Subtract integers',
+        )
+
+    def url(self, scope='area', object_id=None, **params):
+        from urllib.parse import urlencode
+        path = f'/api/cbc/bundles/{scope}/{object_id or self.area.id}/'
+        return f'{path}?{urlencode(params)}' if params else path
+
+    def test_whole_tree_compressed_with_strong_etag(self):
+        import gzip
+        from .bundles import build_bundles
+
+        response = self.client.get(self.url(), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        document = json.loads(gzip.decompress(response.content))
+        self.assertEqual(
+            [[outcome['code'] for outcome in sub['learning_outcomes']]
+             for strand in document['tree']['strands'] for sub in strand['sub_strands']],
+            [['M7-01', 'M7-02']],
+        )
+
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"') and etag.endswith('-gzip"'))
+        response = self.client.get(self.url(), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Identity coding, and a grade bundle containing the area
+        response = self.client.get(self.url(), HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(json.loads(response.content), document)
+        response = self.client.get(self.url('grade', self.grade.id))
+        self.assertEqual(json.loads(response.content)['tree']['learning_areas'][0], document['tree'])
+        self.assertEqual(self.client.get(self.url('strand')).status_code, 404)
+        self.assertEqual(self.client.get(self.url(object_id=99999)).status_code, 404)
+
+        # Rebuilding an unchanged registry keeps the content, version and ETag
+        GradeLevel.objects.create(name='Grade 8', curriculum_type='CBC', order=8)
+        self.assertEqual(build_bundles()['changed'], 1)  # only the new grade
+        response = self.client.get(self.url(), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_since_returns_only_the_changes(self):
+        from .models import CurriculumBundle
+
+        version = int(self.client.get(self.url())['X-Curriculum-Version'])
+        self.add.description = 'Add positive and negative integers'
+        self.add.save()
+        LearningOutcome.objects.create(sub_strand=self.sub, code='M7-03', order=3, description='Multiply integers')
+        subtract_id = self.subtract.id
+        self.subtract.delete()
+
+        # Built on request; the background rebuild only runs after commits
+        delta = self.client.get(self.url(since=version)).json()
+        self.assertGreater(delta['version'], version)
+        self.assertEqual([(node['type'], node['code']) for node in delta['changed']],
+                         [('outcome', 'M7-01'), ('outcome', 'M7-03')])
+        self.assertEqual(delta['changed'][0]['parent'], f'sub_strand:{self.sub.id}')
+        self.assertEqual(delta['removed'], [f'outcome:{subtract_id}'])
+
+        nothing = self.client.get(self.url(since=delta['version'])).json()
+        self.assertEqual((nothing['changed'], nothing['removed']), ([], []))
+        # A version that is not kept gets the whole document
+        CurriculumBundle.objects.filter(version=version).delete()
+        self.assertIn('tree', self.client.get(self.url(since=version)).json())
+        self.assertEqual(self.client.get(self.url(since='x')).status_code, 400)
+
+    def test_registry_commit_schedules_one_background_rebuild(self):
+        from unittest import mock
+
+        with mock.patch('cbc.bundles.threading.Thread') as thread, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.add.description = 'Add integers on a number line'
+            self.add.save()
+            self.sub.save()
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        from .bundles import _rebuild_state
+        self.assertTrue(_rebuild_state['running'])
+        _rebuild_state['running'] = False
+
+
+class CurriculumReleaseTest(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        teacher_user = Student.objects.create_user(student_id='T001', email='t@example.com')
+        self.teacher = Teacher.objects.create(
+            user=teacher_user, teacher_id='TT001', date_of_birth='1990-01-01', qualification='Masters',
+            specialization='Math', experience_years=5, address='-', phone='-',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(teacher_user)
+        self.grade = GradeLevel.objects.create(name='Grade 4', curriculum_type='CBC', order=4)
+        self.student = Student.objects.create_user(student_id='S001', email='s@example.com', grade_level=self.grade)
+        self.area = LearningArea.objects.create(name='Mathematics', code='MATH-G4', grade_level=self.grade)
+        self.strand = Strand.objects.create(learning_area=self.area, name='Numbers', code='MATH-G4-NUM', order=1)
+        self.sub = SubStrand.objects.create(strand=self.strand, name='Whole Numbers', code='MATH-G4-NUM-W', order=1)
+        self.add = LearningOutcome.objects.create(sub_strand=self.sub, description='Add', code='O-01', order=1)
+        self.subtract = LearningOutcome.objects.create(
+            sub_strand=self.sub, description='Subtract', code='O-02', order=2,
+        )
+
+    def test_release_stores_only_its_changes(self):
+        from . import releases
+        from .curriculum import BASE
+
+        release = releases.create_release('Rationalized', 'rationalized')
+        reworded = releases.edit(release, self.add, description='Add numbers up to 10,000')
+        releases.edit(release, reworded, suggested_activities='Use counters')
+        releases.remove(release, self.subtract)
+        divide = releases.add(release, LearningOutcome, self.sub.id, description='Divide', code='O-03', order=2)
+        # One override, one tombstone and one new row; nothing in the base was written
+        self.assertEqual(LearningOutcome.objects.filter(release=release).count(), 3)
+        self.assertEqual(Strand.objects.count(), 1)
+        with self.assertRaises(ValueError):
+            releases.add(release, LearningOutcome, self.sub.id, description='Again', code='O-01', order=5)
+        with self.assertRaises(ValueError):
+            releases.edit(release, self.add, sub_strand=self.sub)
+
+        base, rationalized = get_curriculum(BASE), get_curriculum(release.id)
+        self.assertEqual([(o.id, o.description) for o in base.sub_strands[self.sub.id].outcomes],
+                         [(self.add.id, 'Add'), (self.subtract.id, 'Subtract')])
+        outcomes = rationalized.sub_strands[self.sub.id].outcomes
+        self.assertEqual([(o.id, o.description) for o in outcomes],
+                         [(self.add.id, 'Add numbers up to 10,000'), (divide.id, 'Divide')])
+        self.assertEqual(outcomes[0].row_id, reworded.id)
+        self.assertEqual(outcomes[0].suggested_activities, 'Use counters')
+        self.assertEqual(rationalized.lineages[self.grade.id], (None, release.id))
+        # Unchanged nodes come from the base rows
+        self.assertEqual(rationalized.strands[self.strand.id].row_id, self.strand.id)
+
+        # A release built on it inherits its changes
+        child = releases.create_release('Rationalized 2', 'rationalized-2', parent=release)
+        releases.edit(child, self.strand, name='Number Work')
+        curriculum = get_curriculum(child.id)
+        self.assertEqual(curriculum.strands[self.strand.id].name, 'Number Work')
+        self.assertEqual(curriculum.outcomes[self.add.id].description, 'Add numbers up to 10,000')
+        self.assertEqual(get_curriculum(release.id).strands[self.strand.id].name, 'Numbers')
+
+        # Grades follow the base registry until they are assigned a release
+        self.assertEqual(get_curriculum().outcomes[self.add.id].description, 'Add')
+        releases.assign_release(release, GradeLevel.objects.filter(pk=self.grade.pk))
+        self.assertEqual(get_curriculum().outcomes[self.add.id].description, 'Add numbers up to 10,000')
+        self.assertNotIn(self.subtract.id, get_curriculum().outcomes)
+
+    def test_current_rows_match_the_snapshot(self):
+        from . import releases
+
+        base_grade = GradeLevel.objects.create(name='Grade 5', curriculum_type='CBC', order=5)
+        english = LearningArea.objects.create(name='English', code='ENG-G5', grade_level=base_grade)
+        release = releases.create_release('Rationalized', 'rationalized')
+        child = releases.create_release('Rationalized 2', 'rationalized-2', parent=release)
+        releases.remove(release, self.subtract)
+        divide = releases.add(release, LearningOutcome, self.sub.id, description='Divide', code='O-03', order=3)
+        releases.edit(child, self.sub, name='Counting')
+        releases.remove(child, self.add)
+        releases.add(child, Strand, english.id, name='Reading', code='ENG-G5-READ', order=1)
+        releases.assign_release(child, GradeLevel.objects.filter(pk=self.grade.pk))
+
+        curriculum = get_curriculum()
+        for model, nodes in ((LearningArea, curriculum.areas), (Strand, curriculum.strands),
+                             (SubStrand, curriculum.sub_strands), (LearningOutcome, curriculum.outcomes)):
+            self.assertEqual(set(model.objects.current().values_list('id', flat=True)), set(nodes))
+        # Each layer's removals and additions count; a release no grade follows changes nothing
+        self.assertEqual(list(LearningOutcome.objects.current().values_list('id', flat=True)), [divide.id])
+        self.assertEqual(list(Strand.objects.current().filter(learning_area=english)), [])
+
+        releases.remove(child, self.area)
+        self.assertFalse(LearningOutcome.objects.current().exists())
+
+    def test_assessments_stay_pinned_to_their_release(self):
+        from . import releases
+
+        before = CompetencyAssessment.objects.create(
+            student=self.student, learning_outcome=self.add, competency_level='ME', teacher=self.teacher, evidence='-',
+        )
+        release = releases.create_release('Rationalized', 'rationalized')
+        releases.edit(release, self.add, description='Add numbers up to 10,000')
+        releases.remove(release, self.subtract)
+        releases.assign_release(release, GradeLevel.objects.filter(pk=self.grade.pk))
+        after = CompetencyAssessment.objects.create(
+            student=self.student, learning_outcome=self.add, competency_level='EE', teacher=self.teacher, evidence='-',
+        )
+        self.assertIsNone(before.curriculum_release_id)
+        self.assertEqual(after.curriculum_release_id, release.id)
+
+        response = self.client.get(f'/api/cbc/competency-assessments/?student={self.student.id}')
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        descriptions = {row['id']: row['learning_outcome_description'] for row in results}
+        self.assertEqual(descriptions, {before.id: 'Add', after.id: 'Add numbers up to 10,000'})
+
+        # The registry endpoints show the current curriculum, by node id
+        response = self.client.get(f'/api/cbc/learning-outcomes/?sub_strand={self.sub.id}')
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([(row['id'], row['description']) for row in results],
+                         [(self.add.id, 'Add numbers up to 10,000')])
+        response = self.client.get(f'/api/cbc/sub-strands/{self.sub.id}/')
+        self.assertEqual([row['id'] for row in response.data['learning_outcomes']], [self.add.id])
+
+    def test_search_and_import_respect_releases(self):
+        import io
+        from . import releases
+        from .kicd_import import import_curriculum
+        from .outcome_search import rebuild_index, search_outcomes
+
+        release = releases.create_release('Rationalized', 'rationalized')
+        releases.edit(release, self.add, description='Addition with regrouping')
+        releases.assign_release(release, GradeLevel.objects.filter(pk=self.grade.pk))
+
+        def ids(q):
+            return [result['id'] for result in search_outcomes(q)['results']]
+
+        for _ in range(2):
+            self.assertEqual(ids('regrouping'), [self.add.id])
+            self.assertEqual(ids('subtract'), [self.subtract.id])
+            rebuild_index()
+
+        # A KICD import only diffs and writes the base registry
+        data = [{'grade_level': 'Grade 4', 'curriculum_type': 'CBC', 'order': 4, 'learning_areas': [{
+            'name': 'Mathematics', 'code': 'MATH-G4', 'strands': [{
+                'name': 'Numbers', 'code': 'MATH-G4-NUM', 'order': 1, 'sub_strands': [{
+                    'name': 'Whole Numbers', 'code': 'MATH-G4-NUM-W', 'order': 1, 'outcomes': [
+                        {'code': 'O-01', 'description': 'Add two numbers', 'order': 1},
+                        {'code': 'O-02', 'description': 'Subtract', 'order': 2},
+                    ],
+                }],
+            }],
+        }]}]
+        plan = import_curriculum(io.StringIO(json.dumps(data)))
+        self.assertEqual(plan.summary()['outcomes'], {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.add.refresh_from_db()
+        self.assertEqual(self.add.description, 'Add two numbers')
+        self.assertEqual(get_curriculum().outcomes[self.add.id].description, 'Addition with regrouping')
+
+    def test_enrolment_and_module_sync_follow_the_release(self):
+        from courses.models import Lesson, Module
+        from . import releases
+
+        release = releases.create_release('Rationalized', 'rationalized')
+        releases.edit(release, self.area, name='Mathematical Activities')
+        releases.edit(release, self.strand, name='Number Work')
+        science = LearningArea.objects.create(name='Science', code='SCI-G4', grade_level=self.grade)
+        releases.remove(release, science)
+        releases.assign_release(release, GradeLevel.objects.filter(pk=self.grade.pk))
+
+        student = Student.objects.create_user(student_id='S002', email='s2@example.com', grade_level=self.grade)
+        self.assertEqual(list(student.learning_areas.values_list('id', flat=True)), [self.area.id])
+
+        LearningArea.objects.filter(id=self.area.id).update(teacher=self.teacher)
+        response = self.client.post(f'/teachers/api/courses/{self.area.id}/sync-from-registry/')
+        self.assertEqual((response.data['modules_created'], response.data['lessons_created']), (1, 1))
+        self.assertEqual(list(Module.objects.values_list('title', flat=True)), ['Number Work'])
+        self.assertEqual(list(Lesson.objects.values_list('title', flat=True)), ['Whole Numbers'])
+        override = LearningArea.objects.get(replaces=self.area)
+        self.assertEqual(self.client.post(f'/teachers/api/courses/{override.id}/sync-from-registry/').status_code, 404)
+
+    def test_teacher_views_list_each_area_once(self):
+        from . import releases
+
+        LearningArea.objects.filter(id=self.area.id).update(teacher=self.teacher)
+        release = releases.create_release('Rationalized', 'rationalized')
+        releases.edit(release, LearningArea.objects.get(id=self.area.id), name='Mathematical Activities')
+        releases.assign_release(release, GradeLevel.objects.filter(pk=self.grade.pk))
+        # The override row copies the teacher too
+        self.assertEqual(LearningArea.objects.filter(teacher=self.teacher).count(), 2)
+
+        response = self.client.get('/teachers/api/courses/')
+        self.assertEqual([area['id'] for area in response.data['courses']], [self.area.id])
+        override = LearningArea.objects.get(replaces=self.area)
+        self.assertEqual(self.client.get(f'/courses/api/{override.id}/gradebook/').status_code, 404)
+
+    def test_deleting_a_node_a_release_changes_is_a_conflict(self):
+        from . import releases
+
+        releases.edit(releases.create_release('Rationalized', 'rationalized'), self.sub, name='Counting')
+        self.assertEqual(self.client.delete(f'/api/cbc/strands/{self.strand.id}/').status_code, 409)
+        self.assertEqual(self.client.delete(f'/api/cbc/sub-strands/{self.sub.id}/').status_code, 409)
+        self.assertTrue(SubStrand.objects.filter(id=self.sub.id).exists())
+        self.assertEqual(self.client.delete(f'/api/cbc/learning-outcomes/{self.subtract.id}/').status_code, 204)
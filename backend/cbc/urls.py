@@ -26,8 +26,12 @@ app_name = 'cbc'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('bundles/<str:scope>/<int:object_id>/', views.curriculum_bundle, name='curriculum-bundle'),
     # Report generation endpoints
     path('reports/student/<int:student_id>/', report_views.student_report, name='student-report'),
     path('reports/student/<int:student_id>/pdf/', report_views.student_report_pdf, name='student-report-pdf'),
     path('reports/class/<int:learning_area_id>/', report_views.class_summary, name='class-summary'),
+    path('reports/batch/', report_views.batch_reports, name='batch-reports'),
+    path('reports/batch/<int:job_id>/', report_views.batch_report_status, name='batch-report-status'),
+    path('reports/batch/<int:job_id>/download/', report_views.batch_report_download, name='batch-report-download'),
 ]
@@ -3,14 +3,15 @@ Views for CBC API endpoints
 """
 
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import ProtectedError
 from django.shortcuts import get_object_or_404
 
 from .models import (
     GradeLevel, LearningArea, Strand, SubStrand,
-    LearningOutcome, CompetencyAssessment
+    LearningOutcome, CompetencyAssessment, CurriculumBundle
 )
 from .serializers import (
     GradeLevelSerializer,
@@ -18,8 +19,35 @@ from .serializers import (
     StrandListSerializer, StrandDetailSerializer,
     SubStrandListSerializer, SubStrandDetailSerializer,
     LearningOutcomeListSerializer, LearningOutcomeDetailSerializer,
-    CompetencyAssessmentSerializer, CompetencyAssessmentCreateSerializer
+    CompetencyAssessmentSerializer, CompetencyAssessmentCreateSerializer,
+    outcome_detail_data, outcome_list_data, strand_detail_data, strand_list_data,
+    sub_strand_detail_data, sub_strand_list_data,
 )
+from .curriculum import get_curriculum
+from . import bundles, outcome_search
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReleasedNodeDestroyMixin:
+    """
+    A base registry node that a curriculum release overrides or removes is
+    protected by the release's rows (cbc.releases); deleting it is a conflict
+    """
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {'error': 'A curriculum release changes this node or one below it; remove it in the release instead'},
+                status=status.HTTP_409_CONFLICT,
+            )
 
 
 class GradeLevelViewSet(viewsets.ReadOnlyModelViewSet):
@@ -32,7 +60,7 @@ class GradeLevelViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
 
-class LearningAreaViewSet(viewsets.ModelViewSet):
+class LearningAreaViewSet(ReleasedNodeDestroyMixin, viewsets.ModelViewSet):
     """
     ViewSet for Learning Areas
     Supports CRUD operations and nested endpoints
@@ -46,7 +74,7 @@ class LearningAreaViewSet(viewsets.ModelViewSet):
         return LearningAreaDetailSerializer
 
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = self.queryset.current()
         grade_level = self.request.query_params.get('grade_level')
         if grade_level:
             queryset = queryset.filter(grade_level_id=grade_level)
@@ -76,8 +104,11 @@ class LearningAreaViewSet(viewsets.ModelViewSet):
         Get all strands for a learning area
         GET /api/cbc/learning-areas/{id}/strands/
         """
+        node = get_curriculum().areas.get(_int_or_none(pk))
+        if node:
+            return Response([strand_list_data(strand) for strand in node.strands])
         learning_area = self.get_object()
-        strands = learning_area.strands.all()
+        strands = learning_area.strands.current()
         serializer = StrandListSerializer(strands, many=True)
         return Response(serializer.data)
 
@@ -124,7 +155,7 @@ class LearningAreaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class StrandViewSet(viewsets.ModelViewSet):
+class StrandViewSet(ReleasedNodeDestroyMixin, viewsets.ModelViewSet):
     """
     ViewSet for Strands
     Supports CRUD operations and nested endpoints
@@ -138,7 +169,7 @@ class StrandViewSet(viewsets.ModelViewSet):
         return StrandDetailSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().current()
         learning_area_id = self.request.query_params.get('learning_area')
         if learning_area_id:
             queryset = queryset.filter(learning_area_id=learning_area_id)
@@ -150,13 +181,22 @@ class StrandViewSet(viewsets.ModelViewSet):
         Get all sub-strands for a strand
         GET /api/cbc/strands/{id}/sub-strands/
         """
+        node = get_curriculum().strands.get(_int_or_none(pk))
+        if node:
+            return Response([sub_strand_list_data(sub_strand) for sub_strand in node.sub_strands])
         strand = self.get_object()
-        sub_strands = strand.sub_strands.all()
+        sub_strands = strand.sub_strands.current()
         serializer = SubStrandListSerializer(sub_strands, many=True)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        node = get_curriculum().strands.get(_int_or_none(kwargs.get('pk')))
+        if node is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(strand_detail_data(node))
+
 
-class SubStrandViewSet(viewsets.ModelViewSet):
+class SubStrandViewSet(ReleasedNodeDestroyMixin, viewsets.ModelViewSet):
     """
     ViewSet for Sub-Strands
     Supports CRUD operations and nested endpoints
@@ -170,7 +210,7 @@ class SubStrandViewSet(viewsets.ModelViewSet):
         return SubStrandDetailSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().current()
         strand_id = self.request.query_params.get('strand')
         if strand_id:
             queryset = queryset.filter(strand_id=strand_id)
@@ -182,16 +222,26 @@ class SubStrandViewSet(viewsets.ModelViewSet):
         Get all learning outcomes for a sub-strand
         GET /api/cbc/sub-strands/{id}/learning-outcomes/
         """
+        node = get_curriculum().sub_strands.get(_int_or_none(pk))
+        if node:
+            return Response([outcome_list_data(outcome) for outcome in node.outcomes])
         sub_strand = self.get_object()
-        outcomes = sub_strand.learning_outcomes.all()
+        outcomes = sub_strand.learning_outcomes.current()
         serializer = LearningOutcomeListSerializer(outcomes, many=True)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        node = get_curriculum().sub_strands.get(_int_or_none(kwargs.get('pk')))
+        if node is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(sub_strand_detail_data(node))
+
 
-class LearningOutcomeViewSet(viewsets.ModelViewSet):
+class LearningOutcomeViewSet(ReleasedNodeDestroyMixin, viewsets.ModelViewSet):
     """
     ViewSet for Learning Outcomes
-    Supports CRUD operations
+    Supports CRUD operations. Reads are answered from the curriculum snapshot;
+    anything it cannot answer falls through to the database.
     """
     queryset = LearningOutcome.objects.all().select_related('sub_strand__strand__learning_area')
     permission_classes = [IsAuthenticated]
@@ -202,7 +252,7 @@ class LearningOutcomeViewSet(viewsets.ModelViewSet):
         return LearningOutcomeDetailSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().current()
         sub_strand_id = self.request.query_params.get('sub_strand')
         learning_area_id = self.request.query_params.get('learning_area')
         
@@ -213,6 +263,56 @@ class LearningOutcomeViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def _snapshot_outcomes(self):
+        """Outcomes matching the filters from the snapshot, in queryset order, or None"""
+        curriculum = get_curriculum()
+        sub_strand_id = self.request.query_params.get('sub_strand')
+        learning_area_id = self.request.query_params.get('learning_area')
+
+        if sub_strand_id:
+            node = curriculum.sub_strands.get(_int_or_none(sub_strand_id))
+            return list(node.outcomes) if node else None
+        if learning_area_id:
+            node = curriculum.areas.get(_int_or_none(learning_area_id))
+            return list(node.outcomes) if node else None
+        return [outcome for area in curriculum.areas.values() for outcome in area.outcomes]
+
+    def list(self, request, *args, **kwargs):
+        outcomes = self._snapshot_outcomes()
+        if outcomes is None:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(outcomes)
+        if page is not None:
+            return self.get_paginated_response([outcome_list_data(outcome) for outcome in page])
+        return Response([outcome_list_data(outcome) for outcome in outcomes])
+
+    def retrieve(self, request, *args, **kwargs):
+        node = get_curriculum().outcomes.get(_int_or_none(kwargs.get('pk')))
+        if node is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(outcome_detail_data(node))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked outcome search, matching while the user types
+        GET /api/cbc/learning-outcomes/search/?q=
+        Query params: q (code, description, activities, strand or sub-strand words),
+        learning_area, grade_level, page, page_size
+        """
+        params = request.query_params
+        try:
+            data = outcome_search.search_outcomes(
+                params.get('q', ''),
+                learning_area_id=int(params['learning_area']) if params.get('learning_area') else None,
+                grade_level_id=int(params['grade_level']) if params.get('grade_level') else None,
+                page=int(params.get('page', 1)),
+                page_size=int(params.get('page_size', outcome_search.PAGE_SIZE)),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
 
 class CompetencyAssessmentViewSet(viewsets.ModelViewSet):
     """
@@ -313,3 +413,30 @@ class CompetencyAssessmentViewSet(viewsets.ModelViewSet):
             return Response(result)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def curriculum_bundle(request, scope, object_id):
+    """
+    A learning area's or grade's whole curriculum tree in one response
+    GET /api/cbc/bundles/area/{id}/ or /api/cbc/bundles/grade/{id}/
+    Full document: {scope, id, version, tree}, with a strong ETag for If-None-Match.
+    Query params: since (a version the client holds) answers with
+    {scope, id, version, since, changed, removed} instead; a version that is no
+    longer kept gets the full document.
+    """
+    if scope not in bundles.SCOPES:
+        return Response({'error': 'Unknown bundle scope'}, status=status.HTTP_404_NOT_FOUND)
+    bundle = bundles.get_bundle(scope, object_id)
+    if bundle is None:
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    since = request.query_params.get('since')
+    if since:
+        if _int_or_none(since) is None:
+            return Response({'error': 'since must be a version number'}, status=status.HTTP_400_BAD_REQUEST)
+        base = CurriculumBundle.objects.filter(scope=scope, object_id=object_id, version=int(since)).first()
+        if base is not None:
+            return bundles.delta_response(request, base, bundle)
+    return bundles.bundle_response(request, bundle)
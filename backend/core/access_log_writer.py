@@ -0,0 +1,163 @@
+"""
+Buffered Access Log Writer
+Collects AccessLog rows in a bounded in-process ring buffer and writes them
+with bulk_create from a background thread.
+"""
+
+import atexit
+import logging
+import random
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,        # fraction of successful requests to keep; errors are always kept
+    'BATCH_SIZE': 200,         # flush as soon as this many rows are buffered
+    'FLUSH_INTERVAL': 2.0,     # ...or after this many seconds
+    'MAX_BUFFER': 10000,       # hard cap on buffered rows
+    'OVERFLOW': 'drop_oldest',  # or 'drop_newest' once MAX_BUFFER is reached
+}
+
+
+class AccessLogWriter:
+    """
+    Thread-safe, bounded access log buffer with a background flusher
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_buffer=10000,
+                 overflow='drop_oldest', sample_rate=1.0):
+        if overflow not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+
+        self._buffer = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def should_log(self, status_code: int) -> bool:
+        """Errors are always logged; everything else is sampled"""
+        if status_code >= 500 or self.sample_rate >= 1:
+            return True
+        return random.random() < self.sample_rate
+
+    def append(self, entry: dict):
+        """
+        Queue one AccessLog row (as field kwargs). Never blocks on the database.
+        """
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                if self.overflow == 'drop_newest':
+                    return
+            # deque(maxlen) evicts the oldest entry itself
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self) -> int:
+        """
+        Write everything currently buffered, batch_size rows per INSERT.
+
+        Returns:
+            Number of rows written
+        """
+        from core.models import AccessLog
+
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    break
+                try:
+                    AccessLog.objects.bulk_create([AccessLog(**entry) for entry in batch])
+                    written += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"Failed to write {len(batch)} access log rows: {str(e)}")
+                    break
+
+        self.written += written
+        return written
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='access-log-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+        close_old_connections()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flusher and write whatever is left (called at interpreter exit)"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+# Singleton instance
+_writer_instance = None
+_writer_lock = threading.Lock()
+
+
+def get_access_log_writer() -> AccessLogWriter:
+    """
+    Get singleton instance of the access log writer, configured from settings.ACCESS_LOG
+
+    Returns:
+        AccessLogWriter instance
+    """
+    global _writer_instance
+    if _writer_instance is None:
+        with _writer_lock:
+            if _writer_instance is None:
+                config = {**DEFAULTS, **getattr(settings, 'ACCESS_LOG', {})}
+                _writer_instance = AccessLogWriter(
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    max_buffer=config['MAX_BUFFER'],
+                    overflow=config['OVERFLOW'],
+                    sample_rate=config['SAMPLE_RATE'],
+                )
+                atexit.register(_writer_instance.stop)
+    return _writer_instance
+
+
+def access_logging_enabled() -> bool:
+    return {**DEFAULTS, **getattr(settings, 'ACCESS_LOG', {})}['ENABLED']
@@ -0,0 +1,48 @@
+"""
+Background Commands
+Start a management command in its own process, so web workers are never tied
+up by long jobs (batch reports, invoice rendering). The process outlives the
+request; its stdout and stderr are appended to a per-command log file under
+BACKGROUND_COMMANDS['LOG_DIR'], so a crashing worker leaves a traceback.
+"""
+
+import os
+import subprocess
+import sys
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Directory of the <command>.log files; created on first launch
+    'LOG_DIR': os.path.join(settings.BASE_DIR, 'logs'),
+}
+
+
+def get_background_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'BACKGROUND_COMMANDS', {})}
+
+
+def launch_command(command: str, *args: str) -> str:
+    """
+    Run `manage.py <command> <args>` detached from this process.
+    Returns the log file its output goes to.
+    """
+    log_dir = get_background_config()['LOG_DIR']
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f'{command}.log')
+    manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+
+    with open(log_path, 'ab') as log:
+        # The child keeps its own copy of the descriptor
+        subprocess.Popen(
+            [sys.executable, manage_py, command, *args],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    logger.info(f"Started {command} {' '.join(args)}; output in {log_path}")
+    return log_path
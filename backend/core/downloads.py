@@ -0,0 +1,188 @@
+"""
+File Downloads
+Serves stored files (invoice documents, report archives) with validators and
+byte ranges, optionally handing the transfer to the front-end web server.
+
+Every response carries a Last-Modified and an ETag derived from the file's
+size and nanosecond modification time, so a same-size rewrite within one
+second still changes the tag. Conditional requests are answered with 304/412
+from a stat() alone, and a single `Range: bytes=...` is answered with 206. With BACKEND set to 'x-accel-redirect' (nginx) or 'x-sendfile'
+(Apache, lighttpd) the view only authorises and stats the file; the web server
+reads it, so Python workers never stream the bytes.
+"""
+
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+DEFAULTS = {
+    # 'python', 'x-accel-redirect' or 'x-sendfile'
+    'BACKEND': 'python',
+    # (filesystem root, internal URL prefix) pairs for X-Accel-Redirect; files
+    # outside every root are served by Python
+    'ACCEL_ROOTS': [],
+    'CACHE_CONTROL': 'private, no-cache',
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_download_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'DOWNLOADS', {})}
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong ETag from modification time (in nanoseconds) and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range against a file of `size` bytes.
+
+    Returns:
+        (first byte, last byte) inclusive, or None when the header should be
+        ignored (malformed or several ranges: the whole file is sent)
+
+    Raises:
+        ValueError: The range is well formed but not satisfiable
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            # An empty file has no last bytes to send
+            raise ValueError('Range not satisfiable')
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise ValueError('Range not satisfiable')
+    return first, last
+
+
+def _if_range_passes(request, etag: str, mtime: int) -> bool:
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        # Strong comparison only
+        return if_range == etag
+    return parse_http_date_safe(if_range) == mtime
+
+
+def _accel_uri(path: str, roots) -> Optional[str]:
+    for root, prefix in roots:
+        root = os.path.join(os.path.abspath(root), '')
+        if path.startswith(root):
+            return prefix.rstrip('/') + '/' + path[len(root):].replace(os.sep, '/')
+    return None
+
+
+def _read_range(path: str, first: int, length: int, chunk_size: int):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, source, content_type: str = None, filename: str = None,
+               as_attachment: bool = False) -> HttpResponse:
+    """
+    Response for downloading a stored file.
+
+    Args:
+        request: The download request
+        source: Filesystem path or FieldFile; files in non-local storage are
+            redirected to their storage URL
+        content_type: Defaults to a guess from the file name
+        filename: Name offered to the browser; defaults to the file's name
+        as_attachment: Content-Disposition attachment rather than inline
+
+    Returns:
+        200/206 with the file (or an offload header), 304, 412 or 416
+
+    Raises:
+        FileNotFoundError: The file does not exist
+    """
+    if isinstance(source, File):
+        try:
+            path = source.path
+        except NotImplementedError:
+            return HttpResponseRedirect(source.url)
+    else:
+        path = source
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    config = get_download_config()
+    etag = file_etag(stat)
+    mtime = int(stat.st_mtime)
+    filename = filename or os.path.basename(path)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        response['Cache-Control'] = config['CACHE_CONTROL']
+        if response.status_code in (200, 206):
+            response['Accept-Ranges'] = 'bytes'
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if conditional is not None:
+        return finish(conditional)
+
+    backend = config['BACKEND']
+    if backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return finish(response)
+    if backend == 'x-accel-redirect':
+        uri = _accel_uri(path, config['ACCEL_ROOTS'])
+        if uri:
+            # nginx answers Range itself from the internal location
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = uri
+            return finish(response)
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method in ('GET', 'HEAD') and _if_range_passes(request, etag, mtime):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return finish(response)
+
+    if byte_range is None:
+        return finish(FileResponse(open(path, 'rb'), content_type=content_type))
+
+    first, last = byte_range
+    length = last - first + 1
+    response = StreamingHttpResponse(
+        _read_range(path, first, length, config['CHUNK_SIZE']), status=206, content_type=content_type
+    )
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    return finish(response)
@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.people_search import rebuild_index, search_people
+from students.models import Parent, Student
+
+FIRST_NAMES = ['Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Faith', 'George', 'Hassan', 'Irene', 'James',
+               'Kevin', 'Lucy', 'Mercy', 'Njeri', 'Otieno', 'Purity', 'Wanjiru', 'Yusuf', 'Zawadi', 'Achieng']
+LAST_NAMES = ['Kamau', 'Otieno', 'Wanjiku', 'Mwangi', 'Odhiambo', 'Njoroge', 'Kiptoo', 'Chebet', 'Mutua',
+              'Akinyi', 'Omondi', 'Kariuki', 'Wafula', 'Nyambura', 'Korir', 'Barasa', 'Atieno', 'Mohamed']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures people search latency on synthetic users (all changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        names = [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for _ in range(options['users'])]
+        parents = options['users'] // 5
+        Student.objects.bulk_create([
+            Student(email=f'{first}.{last}{i}@bench.example.com'.lower(), username=f'pbench{i}',
+                    student_id=f'PB{i:06}', first_name=first, last_name=last)
+            for i, (first, last) in enumerate(names[parents:])
+        ], batch_size=1000)
+        Parent.objects.bulk_create([
+            Parent(email=f'parent.{last}{i}@bench.example.com'.lower(), first_name=first, last_name=last, phone='0700')
+            for i, (first, last) in enumerate(names[:parents])
+        ], batch_size=1000)
+
+        started = time.perf_counter()
+        counts = rebuild_index()
+        rebuild_s = time.perf_counter() - started
+
+        def typo(word):
+            i = rng.randrange(len(word) - 1)
+            return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+        samples = {
+            'prefix': lambda first, last: first[:3],
+            'full name': lambda first, last: f'{first} {last}',
+            'typo': lambda first, last: f'{first} {typo(last)}',
+            'student ID': lambda first, last: f'PB{rng.randrange(options["users"] - parents):06}',
+        }
+        self.stdout.write(f'{sum(counts.values())} people indexed in {rebuild_s:.2f}s')
+        for label, make in samples.items():
+            timings, queries, hits = [], 0, 0
+            for _ in range(options['queries']):
+                first, last = rng.choice(names)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    result = search_people(make(first, last))
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = max(queries, len(captured))
+                hits += bool(result['count'])
+            timings.sort()
+            self.stdout.write(
+                f'{label:>10}: p50 {statistics.median(timings):.1f}ms, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.1f}ms, {queries} queries, '
+                f'{hits}/{options["queries"]} found'
+            )
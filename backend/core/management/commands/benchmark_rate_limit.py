@@ -0,0 +1,81 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.middleware.rate_limit import RateLimitMiddleware
+from core.rate_limiting import CacheBackend, LocalMemoryBackend, RateLimiter
+
+
+class Command(BaseCommand):
+    help = 'Measures rate limiter overhead per request and lost increments under concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per thread')
+        parser.add_argument('--backend', choices=['local', 'cache'], default='local')
+
+    def run_threads(self, threads, work):
+        barrier = threading.Barrier(threads)
+        durations = []
+
+        def worker():
+            barrier.wait()
+            started = time.perf_counter()
+            work()
+            durations.append(time.perf_counter() - started)
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return max(durations)
+
+    def handle(self, *args, **options):
+        threads, per_thread = options['threads'], options['requests']
+        total = threads * per_thread
+        backend = LocalMemoryBackend() if options['backend'] == 'local' else CacheBackend()
+        limiter = RateLimiter(backend, {'student': f'{total * 10}/h'})
+        window_start = int(time.time() // 3600) * 3600 + 1
+
+        # 1. Raw counter: every thread hammers the same key
+        def hammer():
+            for _ in range(per_thread):
+                limiter.hit('user:1', 'bench', total * 10, 3600, now=window_start)
+
+        elapsed = self.run_threads(threads, hammer)
+        counted = backend.hit('bench:user:1', int(window_start // 3600), 7200)[0] - 1
+        self.stdout.write(
+            f"[{options['backend']}] counter: {elapsed / per_thread * 1e6:.2f}us/request per thread, "
+            f"{total / elapsed:,.0f} req/s aggregate, lost increments: {total - counted}"
+        )
+
+        # 2. Full middleware path: JWT identity resolution + rule lookup + counter
+        middleware = RateLimitMiddleware(lambda request: None)
+        factory = RequestFactory()
+
+        def requests_for(user_id):
+            token = AccessToken()
+            token['user_id'] = user_id
+            token['role'] = 'student'
+            return [factory.get('/api/cbc/learning-areas/', HTTP_AUTHORIZATION=f'Bearer {token}')
+                    for _ in range(per_thread)]
+
+        batches = [requests_for(1000 + i) for i in range(threads)]
+        batch_iter = iter(batches)
+        lock = threading.Lock()
+
+        def run_middleware():
+            with lock:
+                batch = next(batch_iter)
+            for request in batch:
+                middleware.process_request(request)
+
+        elapsed = self.run_threads(threads, run_middleware)
+        self.stdout.write(
+            f"[{options['backend']}] middleware: {elapsed / per_thread * 1e6:.2f}us/request per thread "
+            f"with {threads} concurrent threads"
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.people_search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the people search index from students, teachers and parents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='People written per bulk insert')
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {sum(counts.values())} people ("
+            + ', '.join(f'{count} {kind}s' for kind, count in counts.items()) + ')'
+        ))
@@ -0,0 +1,49 @@
+"""
+Metrics Endpoint
+Prometheus /metrics, restricted to scrapers. Counters reveal traffic, cache
+behaviour and error rates, so the endpoint answers only clients in
+METRICS['ALLOWED_IPS'] or requests bearing METRICS['TOKEN'].
+"""
+
+import hmac
+import ipaddress
+
+from django.conf import settings
+from django.http import JsonResponse
+from django_prometheus.exports import ExportToDjangoView
+
+DEFAULTS = {
+    # Addresses or networks that may scrape without a token
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+    # Bearer token for scrapers elsewhere; empty disables token access
+    'TOKEN': '',
+}
+
+
+def get_metrics_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def _ip_allowed(address: str, allowed) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in ipaddress.ip_network(network, strict=False) for network in allowed if network)
+
+
+def can_scrape(request) -> bool:
+    config = get_metrics_config()
+    # REMOTE_ADDR only: X-Forwarded-For is set by the client
+    if _ip_allowed(request.META.get('REMOTE_ADDR', ''), config['ALLOWED_IPS']):
+        return True
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(config['TOKEN']) and header.startswith('Bearer ') and hmac.compare_digest(
+        header[7:].strip().encode(), config['TOKEN'].encode()
+    )
+
+
+def metrics(request):
+    if not can_scrape(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return ExportToDjangoView(request)
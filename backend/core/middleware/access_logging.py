@@ -1,22 +1,43 @@
 # core/middleware/access_logging.py
-from core.models import AccessLog
+import time
+
+from django.utils import timezone
+
+from core.access_log_writer import access_logging_enabled, get_access_log_writer
+
 
 class AccessLoggingMiddleware:
+    """
+    Records path, method, status and latency for every sampled request.
+    Rows are buffered in-process and written in batches off the response path.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.enabled = access_logging_enabled()
 
     def __call__(self, request):
+        started = time.perf_counter()
         response = self.get_response(request)
+        if not self.enabled:
+            return response
+
+        writer = get_access_log_writer()
+        if not writer.should_log(response.status_code):
+            return response
+
         user = request.user if request.user.is_authenticated else None
         # AccessLog.user is a FK to Student (AUTH_USER_MODEL)
         # ParentWrapper is not a standard Django model instance
         if hasattr(user, '_is_parent'):
             user = None
-            
-        AccessLog.objects.create(
-            user=user,
-            path=request.path,
-            method=request.method,
-            status_code=response.status_code
-        )
-        return response
\ No newline at end of file
+
+        writer.append({
+            'user_id': user.pk if user else None,
+            'path': request.path[:255],
+            'method': request.method,
+            'status_code': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'timestamp': timezone.now(),
+        })
+        return response
@@ -1,56 +1,99 @@
 # core/middleware/rate_limit.py
+import time
+from functools import lru_cache
+
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
-import time
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.rate_limiting import get_rate_limit_config, get_rate_limiter
+from core.utils import get_user_role
+
+
+@lru_cache(maxsize=4096)
+def token_identity(raw_token):
+    """
+    Validate an access token once and remember (identity, role, expiry).
+    The same token arrives on every request a client makes until it expires,
+    so this keeps signature checks off the hot path.
+    """
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+
+    if token.get('user_type') == 'parent':
+        return f"parent:{token.get('parent_id')}", 'parent', token['exp']
+    user_id = token.get(settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id'))
+    if user_id is None:
+        return None
+    # Tokens issued before the role claim existed count as students
+    return f'user:{user_id}', token.get('role', 'student'), token['exp']
 
 
 class RateLimitMiddleware(MiddlewareMixin):
     """
-    Simple rate limiting middleware using Django cache.
-    Different limits for authenticated vs unauthenticated users.
+    Sliding-window rate limiting with atomic counters (see core.rate_limiting).
+    Authenticated users are keyed by user ID so a school behind one NAT does not
+    share a bucket; anonymous clients are keyed by IP. Limits are configured per
+    route and per role in settings.RATE_LIMITS.
     """
-    
-    def process_request(self, request):
-        # Skip rate limiting for admin users
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            if request.user.is_staff or request.user.is_superuser:
-                return None
-        
-        # Get client IP
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.enabled = get_rate_limit_config()['ENABLED']
+
+    def identify(self, request):
+        """
+        Resolve (identity, role) for the request without touching the database
+        for token-authenticated API calls.
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            # Session-authenticated (admin site / server-rendered pages)
+            return f'user:{user.pk}', get_user_role(user)
+
+        # JWT authentication only runs inside DRF views, so read the token here
+        raw_token = None
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if header.startswith('Bearer '):
+            raw_token = header[7:].strip()
+        else:
+            raw_token = request.COOKIES.get(settings.SIMPLE_JWT.get('AUTH_COOKIE', 'access_token'))
+
+        if raw_token:
+            claims = token_identity(raw_token)
+            # Invalid or expired tokens are rejected by DRF; count them against the IP
+            if claims is not None and claims[2] > time.time():
+                return claims[0], claims[1]
+
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
+            ip = x_forwarded_for.split(',')[0].strip()
         else:
             ip = request.META.get('REMOTE_ADDR')
-        
-        # Set rate limits - INCREASED for development
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            limit = 1000  # 1000 requests per hour for authenticated (was 200)
-        else:
-            limit = 500  # 500 requests per hour for anonymous (was 100)
-        
-        # Cache key
-        cache_key = f'rate_limit_{ip}'
-        
-        # Get current request count
-        request_data = cache.get(cache_key, {'count': 0, 'start_time': time.time()})
-        
-        # Reset if hour has passed
-        if time.time() - request_data['start_time'] > 3600:
-            request_data = {'count': 0, 'start_time': time.time()}
-        
-        # Increment count
-        request_data['count'] += 1
-        
-        # Check if limit exceeded
-        if request_data['count'] > limit:
-            return JsonResponse({
-                'error': 'Rate limit exceeded. Please try again later.',
-                'detail': f'Maximum {limit} requests per hour allowed.'
-            }, status=429)
-        
-        # Save to cache
-        cache.set(cache_key, request_data, 3600)  # 1 hour timeout
-        
-        return None
\ No newline at end of file
+        return f'ip:{ip}', 'anonymous'
+
+    def process_request(self, request):
+        if not self.enabled:
+            return None
+
+        identity, role = self.identify(request)
+        limiter = get_rate_limiter()
+        rule = limiter.resolve(request.path, role)
+        if rule is None:
+            return None
+
+        scope, limit, window = rule
+        allowed, retry_after = limiter.hit(identity, scope, limit, window)
+        if allowed:
+            return None
+
+        response = JsonResponse({
+            'error': 'Rate limit exceeded. Please try again later.',
+            'detail': f'Maximum {limit} requests per {window} seconds allowed.'
+        }, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_academicterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accesslog',
+            name='duration_ms',
+            field=models.FloatField(blank=True, help_text='Time spent producing the response', null=True),
+        ),
+        migrations.AlterField(
+            model_name='accesslog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
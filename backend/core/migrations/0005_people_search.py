@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_accesslog_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Student'), ('teacher', 'Teacher'), ('admin', 'Admin'), ('parent', 'Parent')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('identifier', models.CharField(blank=True, help_text='Student ID or teacher ID', max_length=50)),
+                ('is_active', models.BooleanField(default=True)),
+                ('words', models.TextField(help_text='Normalised words the trigrams were built from, for re-ranking')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PersonSearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='core.personsearchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'document'], name='core_person_trigram_idx')],
+            },
+        ),
+    ]
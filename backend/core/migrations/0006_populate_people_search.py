@@ -0,0 +1,50 @@
+from django.db import migrations
+
+from core.people_search import document_words, trigrams
+
+
+def populate_people_search(apps, schema_editor):
+    # Index the people that existed before the search tables did
+    Student = apps.get_model('students', 'Student')
+    Teacher = apps.get_model('teachers', 'Teacher')
+    Parent = apps.get_model('students', 'Parent')
+    PersonSearchDocument = apps.get_model('core', 'PersonSearchDocument')
+    PersonSearchTrigram = apps.get_model('core', 'PersonSearchTrigram')
+
+    def full_name(person):
+        return f'{person.first_name} {person.last_name}'.strip()
+
+    people = [
+        ('teacher', teacher.id, full_name(teacher.user) or teacher.user.username, teacher.user.email,
+         teacher.teacher_id, teacher.user.is_active)
+        for teacher in Teacher.objects.select_related('user').iterator()
+    ] + [
+        ('admin' if user.is_superuser else 'student', user.id, full_name(user) or user.username, user.email,
+         user.student_id, user.is_active)
+        for user in Student.objects.filter(teacher__isnull=True).iterator()
+    ] + [
+        ('parent', parent.id, f'{parent.first_name} {parent.last_name}', parent.email, '', parent.is_active)
+        for parent in Parent.objects.iterator()
+    ]
+
+    for kind, object_id, name, email, identifier, is_active in people:
+        document = PersonSearchDocument.objects.create(
+            kind=kind, object_id=object_id, name=name, email=email or '', identifier=identifier or '',
+            is_active=is_active, words=' '.join(document_words(name, email or '', identifier or '')),
+        )
+        PersonSearchTrigram.objects.bulk_create(
+            PersonSearchTrigram(document=document, trigram=gram) for gram in sorted(trigrams(document.words.split()))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_people_search'),
+        ('students', '0008_student_courses_student_credit_balance'),
+        ('teachers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_people_search, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings  # Changed import
+from django.utils import timezone
 
 class StudentProfile(models.Model):
     user = models.OneToOneField(
@@ -112,7 +113,49 @@ class AccessLog(models.Model):
     path = models.CharField(max_length=255)
     method = models.CharField(max_length=10)
     status_code = models.IntegerField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    duration_ms = models.FloatField(null=True, blank=True, help_text="Time spent producing the response")
+    # Set by the request, not the (batched, delayed) insert
+    timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
-        return f"{self.path} - {self.method} - {self.status_code}"
\ No newline at end of file
+        return f"{self.path} - {self.method} - {self.status_code}"
+
+
+class PersonSearchDocument(models.Model):
+    """
+    A student, teacher, admin or parent as indexed by core.people_search.
+    Kept in step with the source rows by signals (core.signals).
+    """
+    KINDS = [
+        ('student', 'Student'),
+        ('teacher', 'Teacher'),
+        ('admin', 'Admin'),
+        ('parent', 'Parent'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    name = models.CharField(max_length=200)
+    email = models.CharField(max_length=254, blank=True)
+    identifier = models.CharField(max_length=50, blank=True, help_text="Student ID or teacher ID")
+    is_active = models.BooleanField(default=True)
+    words = models.TextField(help_text="Normalised words the trigrams were built from, for re-ranking")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.name}"
+
+
+class PersonSearchTrigram(models.Model):
+    """One distinct trigram of a PersonSearchDocument"""
+    document = models.ForeignKey(PersonSearchDocument, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            # Candidate lookup: trigram IN (...) GROUP BY document
+            models.Index(fields=['trigram', 'document'], name='core_person_trigram_idx'),
+        ]
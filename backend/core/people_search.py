@@ -0,0 +1,326 @@
+"""
+People Search
+Prefix and typo-tolerant lookup of students, teachers, admins and parents by
+name, email, student ID or teacher ID.
+
+Each person is one PersonSearchDocument with its distinct trigrams in
+PersonSearchTrigram. Words are padded pg_trgm style ("  john "), so a query's
+leading trigrams are shared by every word it prefixes. A search runs one
+grouped query, trigram IN (query trigrams), to find the documents sharing the
+most trigrams with the query. It then re-ranks those candidates in Python:
+exact words beat prefixes, and prefixes beat near misses. A near miss is a word
+one letter inserted, deleted, changed or swapped away, which covers most typos.
+Every query word has to match something. Only the CANDIDATES documents sharing
+the most trigrams are ranked; when a query reaches that many, results report
+`capped` and their count is a lower bound.
+
+Signals (core.signals) re-index a person whenever they are saved.
+`manage.py rebuild_people_search` rebuilds everything, for example after bulk
+imports that bypass save().
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import PersonSearchDocument, PersonSearchTrigram
+
+logger = logging.getLogger(__name__)
+
+CANDIDATES = 300  # documents re-ranked per search
+MIN_TYPO_LENGTH = 4  # shorter words only match exactly or as prefixes
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+KINDS = [kind for kind, _ in PersonSearchDocument.KINDS]
+
+# Student fields the index is built from; saves touching none of them (e.g. last_login) are skipped
+INDEXED_USER_FIELDS = {'first_name', 'last_name', 'email', 'student_id', 'is_active', 'is_superuser'}
+
+
+def normalise(text: str) -> str:
+    """Lower case without accents"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r'[a-z0-9]+', normalise(text))
+
+
+def document_words(name: str, email: str, identifier: str) -> List[str]:
+    found = words(name) + words(email) + words(identifier)
+    # IDs are also searched without their separators: "TCH-001" as "tch001"
+    compact = ''.join(words(identifier))
+    if compact and compact not in found:
+        found.append(compact)
+    return found
+
+
+def trigrams(word_list: Iterable[str], prefix: bool = False) -> Set[str]:
+    """
+    Distinct trigrams of padded words. With prefix the last word gets no end
+    padding, as the user may still be typing it.
+    """
+    word_list = list(word_list)
+    grams = set()
+    for position, word in enumerate(word_list):
+        padded = f'  {word}' if prefix and position == len(word_list) - 1 else f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _documents_for(people: Iterable[Dict]) -> List[PersonSearchDocument]:
+    return [
+        PersonSearchDocument(**person, words=' '.join(document_words(person['name'], person['email'], person['identifier'])))
+        for person in people
+    ]
+
+
+def _trigram_rows(documents: Iterable[PersonSearchDocument]) -> List[PersonSearchTrigram]:
+    return [
+        PersonSearchTrigram(document_id=document.id, trigram=gram)
+        for document in documents
+        for gram in sorted(trigrams(document.words.split()))
+    ]
+
+
+# Source rows -> document fields
+
+def user_person(user) -> Dict:
+    return {
+        'kind': 'admin' if user.is_superuser else 'student',
+        'object_id': user.id,
+        'name': user.get_full_name() or user.username,
+        'email': user.email or '',
+        'identifier': user.student_id or '',
+        'is_active': user.is_active,
+    }
+
+
+def teacher_person(teacher) -> Dict:
+    user = teacher.user
+    return {
+        'kind': 'teacher',
+        'object_id': teacher.id,
+        'name': user.get_full_name() or user.username,
+        'email': user.email or '',
+        'identifier': teacher.teacher_id,
+        'is_active': user.is_active,
+    }
+
+
+def parent_person(parent) -> Dict:
+    return {
+        'kind': 'parent',
+        'object_id': parent.id,
+        'name': parent.get_full_name(),
+        'email': parent.email,
+        'identifier': '',
+        'is_active': parent.is_active,
+    }
+
+
+# Incremental maintenance
+
+def index_person(person: Dict):
+    """Insert or refresh one document; its trigrams are rewritten only if the text changed"""
+    with transaction.atomic():
+        document = PersonSearchDocument.objects.filter(kind=person['kind'], object_id=person['object_id']).first()
+        if document is not None:
+            text_changed = any(getattr(document, field) != person[field] for field in ('name', 'email', 'identifier'))
+            if not text_changed and document.is_active == person['is_active']:
+                return
+            if not text_changed:
+                PersonSearchDocument.objects.filter(pk=document.pk).update(is_active=person['is_active'])
+                return
+            document.delete()
+        document, = _documents_for([person])
+        document.save()
+        PersonSearchTrigram.objects.bulk_create(_trigram_rows([document]))
+
+
+def remove_person(kinds: Iterable[str], object_id: int):
+    PersonSearchDocument.objects.filter(kind__in=list(kinds), object_id=object_id).delete()
+
+
+def index_user(user):
+    """Index a user as their teacher profile if they have one, else as a student or admin"""
+    from teachers.models import Teacher
+
+    teacher = Teacher.objects.filter(user=user).select_related('user').first()
+    if teacher is not None:
+        remove_person(['student', 'admin'], user.id)
+        index_person(teacher_person(teacher))
+        return
+    person = user_person(user)
+    remove_person({'student', 'admin'} - {person['kind']}, user.id)
+    index_person(person)
+
+
+def index_teacher(teacher):
+    remove_person(['student', 'admin'], teacher.user_id)
+    index_person(teacher_person(teacher))
+
+
+def index_parent(parent):
+    index_person(parent_person(parent))
+
+
+def rebuild_index(chunk_size: int = 1000) -> Dict[str, int]:
+    """
+    Re-index everybody from scratch in bulk.
+
+    Returns:
+        {kind: documents written}
+    """
+    from students.models import Parent, Student
+    from teachers.models import Teacher
+
+    people = [
+        *(teacher_person(teacher) for teacher in Teacher.objects.select_related('user').iterator(chunk_size=chunk_size)),
+        *(user_person(user) for user in Student.objects.filter(teacher__isnull=True).iterator(chunk_size=chunk_size)),
+        *(parent_person(parent) for parent in Parent.objects.iterator(chunk_size=chunk_size)),
+    ]
+    with transaction.atomic():
+        PersonSearchTrigram.objects.all().delete()
+        PersonSearchDocument.objects.all().delete()
+        counts = {kind: 0 for kind in KINDS}
+        for start in range(0, len(people), chunk_size):
+            documents = PersonSearchDocument.objects.bulk_create(_documents_for(people[start:start + chunk_size]))
+            if documents and documents[0].pk is None:
+                # Backends that cannot return IDs from bulk inserts
+                keys = [(document.kind, document.object_id) for document in documents]
+                ids = {
+                    (kind, object_id): pk
+                    for pk, kind, object_id in PersonSearchDocument.objects.filter(
+                        object_id__in=[object_id for _, object_id in keys]
+                    ).values_list('id', 'kind', 'object_id')
+                }
+                for document in documents:
+                    document.pk = ids[(document.kind, document.object_id)]
+            PersonSearchTrigram.objects.bulk_create(_trigram_rows(documents), batch_size=5000)
+            for document in documents:
+                counts[document.kind] += 1
+
+    logger.info(f"People search index rebuilt: {counts}")
+    return counts
+
+
+# Search
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True when b is a with one letter inserted, deleted or changed, or two adjacent letters swapped"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    swapped = a[i:i + 2] == b[i + 1::-1][:2] if i + 1 < len(a) else False
+    return a[i + 1:] == b[i + 1:] or (swapped and a[i + 2:] == b[i + 2:])
+
+
+def _word_score(query_word: str, doc_words: List[str], is_last: bool) -> float:
+    # IDs and short words are not typo-matched: S001 should not find S002
+    typos = len(query_word) >= MIN_TYPO_LENGTH and query_word.isalpha()
+    best = 0.0
+    for word in doc_words:
+        if word == query_word:
+            return 1.0
+        if word.startswith(query_word):
+            # A prefix of the word still being typed is nearly as good as a match
+            best = max(best, 0.9 if is_last else 0.8)
+        elif typos and within_one_edit(query_word, word):
+            best = max(best, 0.6)
+    return best
+
+
+def score_document(query_words: List[str], document: PersonSearchDocument) -> float:
+    """0 when some query word matches nothing, otherwise up to 1"""
+    doc_words = document.words.split()
+    total = 0.0
+    for position, query_word in enumerate(query_words):
+        score = _word_score(query_word, doc_words, position == len(query_words) - 1)
+        if not score:
+            return 0.0
+        total += score
+    return total / len(query_words)
+
+
+def search_people(q: str, kinds: Iterable[str] = None, is_active: Optional[bool] = None,
+                  page: int = 1, page_size: int = PAGE_SIZE) -> Dict:
+    """
+    Ranked, paginated people matching `q`. With `capped` set, more people
+    may match than `count` says; a narrower query finds them.
+
+    Args:
+        q: Names, email, student ID or teacher ID; partial and misspelt words match
+        kinds: Subset of KINDS (default: all)
+        is_active: Only active (True) or inactive (False) people
+
+    Raises:
+        ValueError: Unknown kind
+    """
+    kinds = list(kinds or [])
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown kind: {', '.join(sorted(unknown))}")
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    empty = {'count': 0, 'capped': False, 'page': 1, 'page_size': page_size, 'num_pages': 1, 'results': []}
+
+    query_words = words(q)
+    if not query_words:
+        return empty
+
+    candidates = PersonSearchTrigram.objects.filter(trigram__in=trigrams(query_words, prefix=True))
+    if kinds:
+        candidates = candidates.filter(document__kind__in=kinds)
+    if is_active is not None:
+        candidates = candidates.filter(document__is_active=is_active)
+    candidate_ids = list(candidates.values('document_id').annotate(shared=Count('id')).order_by(
+        '-shared', 'document_id'
+    ).values_list('document_id', flat=True)[:CANDIDATES])
+    # Documents past the cut were never scored, so the count may be short
+    capped = len(candidate_ids) == CANDIDATES
+
+    ranked = []
+    for document in PersonSearchDocument.objects.filter(id__in=candidate_ids):
+        score = score_document(query_words, document)
+        if score:
+            ranked.append((score, document))
+    ranked.sort(key=lambda item: (-item[0], item[1].name, item[1].id))
+    if not ranked:
+        return {**empty, 'capped': capped}
+
+    num_pages = -(-len(ranked) // page_size)
+    page = max(1, min(page, num_pages))
+    start = (page - 1) * page_size
+    return {
+        'count': len(ranked),
+        'capped': capped,
+        'page': page,
+        'page_size': page_size,
+        'num_pages': num_pages,
+        'results': [
+            {
+                'id': f'{document.kind}_{document.object_id}',
+                'kind': document.kind,
+                'object_id': document.object_id,
+                'name': document.name,
+                'email': document.email,
+                'identifier': document.identifier,
+                'is_active': document.is_active,
+                'score': round(score, 3),
+            }
+            for score, document in ranked[start:start + page_size]
+        ],
+    }
@@ -0,0 +1,197 @@
+"""
+Rate Limiting
+Sliding-window request counters with pluggable storage backends
+"""
+
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'ENABLED': True,
+    # 'auto' uses the in-process backend when the default cache is local memory anyway
+    'BACKEND': 'auto',
+    'DEFAULT': {
+        'anonymous': '500/h',
+        'student': '1000/h',
+        'teacher': '1000/h',
+        'parent': '1000/h',
+        # Any other role (e.g. 'unknown' for accounts without a profile)
+        '*': '500/h',
+    },
+    # (path prefix, {role: rate}); first match wins, missing roles fall back to DEFAULT
+    'ROUTES': [],
+    # Roles that are never limited
+    'EXEMPT_ROLES': ['admin'],
+}
+
+# Rate key that matches every role without a rate of its own
+ANY_ROLE = '*'
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\w*\s*$')
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """
+    Parse '100/m', '1000/h' or '5/10s' into (limit, window seconds)
+    """
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate: {rate}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * RATE_UNITS[unit]
+
+
+class CacheBackend:
+    """
+    Shared counters in Django's cache using atomic incr, one key per window
+    """
+
+    def __init__(self, cache_instance=None):
+        self.cache = cache_instance or cache
+
+    def hit(self, key: str, window_index: int, ttl: int) -> Tuple[int, int]:
+        current_key = f'rl:{key}:{window_index}'
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # First hit in this window; add() is a no-op if another request won the race
+            self.cache.add(current_key, 0, ttl)
+            current = self.cache.incr(current_key)
+        previous = self.cache.get(f'rl:{key}:{window_index - 1}', 0)
+        return current, previous
+
+
+class LocalMemoryBackend:
+    """
+    In-process counters guarded by a lock. Used when the cache is per-process
+    local memory, where a round trip through the cache buys nothing.
+    """
+
+    MAX_ENTRIES = 50000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, window_index: int, ttl: int) -> Tuple[int, int]:
+        with self._lock:
+            state = self._counters.get(key)
+            if state is None or state[0] < window_index - 1:
+                state = [window_index, 0, 0]
+            elif state[0] == window_index - 1:
+                state = [window_index, 0, state[1]]
+            state[1] += 1
+            self._counters[key] = state
+            if len(self._counters) > self.MAX_ENTRIES:
+                self._prune(window_index)
+            return state[1], state[2]
+
+    def _prune(self, window_index: int):
+        # Windows differ per rule, so only drop entries that are clearly idle
+        self._counters = {k: v for k, v in self._counters.items() if v[0] >= window_index - 1}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class RateLimiter:
+    """
+    Sliding-window counter limiter.
+
+    Keeps a counter for the current and previous fixed window and weights the
+    previous one by how much of it still overlaps the sliding window, which
+    approximates a sliding log with two integers per client.
+    """
+
+    def __init__(self, backend, default_rates: dict, routes=(), exempt_roles=()):
+        self.backend = backend
+        self.default_rates = {role: parse_rate(rate) for role, rate in default_rates.items()}
+        self.routes = [
+            (prefix, {role: parse_rate(rate) for role, rate in rates.items()})
+            for prefix, rates in routes
+        ]
+        self.exempt_roles = set(exempt_roles)
+
+    def resolve(self, path: str, role: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Find the rule for a request.
+
+        A role without a rate of its own uses the ANY_ROLE rate of the same
+        route or of the defaults, so only exempt roles go unlimited.
+
+        Returns:
+            (scope, limit, window seconds) or None if the request is not limited
+        """
+        if role in self.exempt_roles:
+            return None
+        for prefix, rates in self.routes:
+            if path.startswith(prefix):
+                rate = rates.get(role) or rates.get(ANY_ROLE)
+                if rate:
+                    return (prefix, *rate)
+        rate = self.default_rates.get(role) or self.default_rates.get(ANY_ROLE)
+        if rate:
+            return ('default', *rate)
+        return None
+
+    def hit(self, identity: str, scope: str, limit: int, window: int, now: float = None) -> Tuple[bool, int]:
+        """
+        Count one request.
+
+        Returns:
+            (allowed, seconds until the current window resets)
+        """
+        now = time.time() if now is None else now
+        window_index, offset = divmod(now, window)
+        window_index = int(window_index)
+        current, previous = self.backend.hit(f'{scope}:{identity}', window_index, window * 2)
+        estimated = previous * (1 - offset / window) + current
+        return estimated <= limit, int(window - offset) + 1
+
+
+# Singleton instance
+_limiter_instance = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limit_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'RATE_LIMITS', {})}
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Get singleton instance of the rate limiter, configured from settings.RATE_LIMITS
+
+    Returns:
+        RateLimiter instance
+    """
+    global _limiter_instance
+    if _limiter_instance is None:
+        with _limiter_lock:
+            if _limiter_instance is None:
+                config = get_rate_limit_config()
+                backend = config['BACKEND']
+                if backend == 'auto':
+                    backend = LocalMemoryBackend() if isinstance(caches['default'], LocMemCache) else CacheBackend()
+                elif backend == 'cache':
+                    backend = CacheBackend()
+                elif backend == 'local':
+                    backend = LocalMemoryBackend()
+                else:
+                    backend = import_string(backend)()
+                _limiter_instance = RateLimiter(
+                    backend,
+                    config['DEFAULT'],
+                    config['ROUTES'],
+                    config['EXEMPT_ROLES'],
+                )
+    return _limiter_instance
@@ -0,0 +1,67 @@
+"""
+Core signal handlers
+Keep the people search index (core.people_search) and the admin directory's
+cached totals (core.user_directory) in step with students, teachers and
+parents.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from students.models import Parent, Student
+from teachers.models import Teacher
+from . import people_search, user_directory
+
+
+@receiver(post_save, sender=Student)
+def index_saved_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not people_search.INDEXED_USER_FIELDS.intersection(update_fields)):
+        return
+    people_search.index_user(instance)
+
+
+@receiver(post_delete, sender=Student)
+def unindex_deleted_user(sender, instance, **kwargs):
+    people_search.remove_person(['student', 'admin'], instance.id)
+
+
+@receiver(post_save, sender=Teacher)
+def index_saved_teacher(sender, instance, raw=False, **kwargs):
+    if not raw:
+        people_search.index_teacher(instance)
+
+
+@receiver(post_delete, sender=Teacher)
+def unindex_deleted_teacher(sender, instance, **kwargs):
+    people_search.remove_person(['teacher'], instance.id)
+    # The account stays behind as a student or admin
+    user = Student.objects.filter(id=instance.user_id).first()
+    if user is not None:
+        people_search.index_user(user)
+
+
+@receiver(post_save, sender=Parent)
+def index_saved_parent(sender, instance, raw=False, **kwargs):
+    if not raw:
+        people_search.index_parent(instance)
+
+
+@receiver(post_delete, sender=Parent)
+def unindex_deleted_parent(sender, instance, **kwargs):
+    people_search.remove_person(['parent'], instance.id)
+
+
+@receiver(post_save, sender=Student)
+def recount_saved_user(sender, instance, created=False, update_fields=None, **kwargs):
+    # Logins save last_login alone; that changes no total
+    if created or update_fields is None or user_directory.COUNTED_FIELDS.intersection(update_fields):
+        user_directory.invalidate_directory_count()
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Parent)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Parent)
+def recount_directory(sender, **kwargs):
+    user_directory.invalidate_directory_count()
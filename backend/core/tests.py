@@ -1,5 +1,6 @@
-from django.test import TestCase
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from .models import StudentProfile
 from django.contrib.auth.models import User
 
@@ -9,3 +10,374 @@ class StudentModelTest(TestCase):
         student = StudentProfile.objects.create(user=user, student_id='12345', name='Test Student')
         self.assertEqual(student.name, 'Test Student')
 # Create your tests here.
+
+
+class AccessLogWriterTest(TestCase):
+    def _entry(self, status_code=200):
+        from django.utils import timezone
+        return {'user_id': None, 'path': '/api/x/', 'method': 'GET', 'status_code': status_code,
+                'duration_ms': 1.5, 'timestamp': timezone.now()}
+
+    def test_flush_writes_in_batches(self):
+        from .access_log_writer import AccessLogWriter
+        from .models import AccessLog
+
+        writer = AccessLogWriter(batch_size=2, flush_interval=60)
+        writer._stopped.set()  # keep the background thread out of the test transaction
+        for _ in range(5):
+            writer.append(self._entry())
+        with self.assertNumQueries(3):
+            self.assertEqual(writer.flush(), 5)
+        self.assertEqual(AccessLog.objects.count(), 5)
+        self.assertEqual(writer.pending(), 0)
+
+    def test_overflow_policy_bounds_memory(self):
+        from .access_log_writer import AccessLogWriter
+
+        for policy, kept_status in (('drop_oldest', 202), ('drop_newest', 200)):
+            writer = AccessLogWriter(max_buffer=2, overflow=policy)
+            writer._stopped.set()
+            for status_code in (200, 201, 202):
+                writer.append(self._entry(status_code))
+            self.assertEqual(writer.pending(), 2)
+            self.assertEqual(writer.dropped, 1)
+            self.assertIn(kept_status, [e['status_code'] for e in writer._buffer])
+
+    def test_sampling_always_keeps_errors(self):
+        from .access_log_writer import AccessLogWriter
+
+        writer = AccessLogWriter(sample_rate=0)
+        self.assertFalse(writer.should_log(200))
+        self.assertTrue(writer.should_log(503))
+
+
+class RateLimiterTest(TestCase):
+    def test_concurrent_hits_are_not_lost(self):
+        import threading
+        from .rate_limiting import LocalMemoryBackend, RateLimiter
+
+        backend = LocalMemoryBackend()
+        limiter = RateLimiter(backend, {'student': '100000/h'})
+
+        def hammer():
+            for _ in range(500):
+                limiter.hit('user:1', 'default', 100000, 3600, now=7200.0)
+
+        threads = [threading.Thread(target=hammer) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(backend.hit('default:user:1', 2, 7200), (4001, 0))
+
+    def test_sliding_window_weights_previous_window(self):
+        from .rate_limiting import LocalMemoryBackend, RateLimiter
+
+        limiter = RateLimiter(LocalMemoryBackend(), {'anonymous': '10/m'})
+        for _ in range(10):
+            self.assertTrue(limiter.hit('ip:1', 'default', 10, 60, now=60.0)[0])
+        # Halfway into the next window half of the previous 10 still count
+        for _ in range(5):
+            self.assertTrue(limiter.hit('ip:1', 'default', 10, 60, now=150.0)[0])
+        self.assertFalse(limiter.hit('ip:1', 'default', 10, 60, now=150.0)[0])
+
+    def test_roles_without_a_rate_use_the_catch_all(self):
+        from .rate_limiting import LocalMemoryBackend, RateLimiter
+
+        limiter = RateLimiter(
+            LocalMemoryBackend(),
+            {'student': '100/h', '*': '10/h'},
+            routes=[('/api/auth/login/', {'anonymous': '5/m'}), ('/api/open/', {'*': '20/m'})],
+            exempt_roles=['admin'],
+        )
+        self.assertEqual(limiter.resolve('/api/x/', 'unknown'), ('default', 10, 3600))
+        self.assertEqual(limiter.resolve('/api/x/', 'student'), ('default', 100, 3600))
+        self.assertEqual(limiter.resolve('/api/auth/login/', 'unknown'), ('default', 10, 3600))
+        self.assertEqual(limiter.resolve('/api/open/', 'unknown'), ('/api/open/', 20, 60))
+        self.assertIsNone(limiter.resolve('/api/x/', 'admin'))
+
+    def test_middleware_keys_token_users_by_id_not_ip(self):
+        from django.test import RequestFactory
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .middleware.rate_limit import RateLimitMiddleware
+        from .rate_limiting import LocalMemoryBackend, RateLimiter
+        from . import rate_limiting
+
+        rate_limiting._limiter_instance = RateLimiter(
+            LocalMemoryBackend(), {'anonymous': '1/h', 'student': '2/h'}
+        )
+        self.addCleanup(setattr, rate_limiting, '_limiter_instance', None)
+        middleware = RateLimitMiddleware(lambda request: None)
+
+        def request_as(user_id):
+            token = AccessToken()
+            token['user_id'] = user_id
+            return RequestFactory().get('/api/x/', HTTP_AUTHORIZATION=f'Bearer {token}', REMOTE_ADDR='10.0.0.1')
+
+        for user_id in (1, 2):
+            self.assertIsNone(middleware.process_request(request_as(user_id)))
+            self.assertIsNone(middleware.process_request(request_as(user_id)))
+        self.assertEqual(middleware.process_request(request_as(1)).status_code, 429)
+
+        anonymous = RequestFactory().get('/api/x/', REMOTE_ADDR='10.0.0.1')
+        self.assertIsNone(middleware.process_request(anonymous))
+        self.assertEqual(middleware.process_request(anonymous).status_code, 429)
+
+
+class MetricsEndpointTest(TestCase):
+    @override_settings(METRICS={'ALLOWED_IPS': ['10.1.0.0/16'], 'TOKEN': 'scrape-secret'})
+    def test_only_scrapers_see_metrics(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='8.8.8.8').status_code, 403)
+        self.assertEqual(
+            self.client.get('/metrics', REMOTE_ADDR='8.8.8.8', HTTP_X_FORWARDED_FOR='10.1.2.3').status_code, 403
+        )
+        self.assertEqual(
+            self.client.get('/metrics', REMOTE_ADDR='8.8.8.8', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403
+        )
+        response = self.client.get('/metrics', REMOTE_ADDR='8.8.8.8', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'finance_cache_lookups_total', response.content)
+
+
+class ServeFileTest(TestCase):
+    def setUp(self):
+        import tempfile
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.path = f'{self.root}/invoice.html'
+        with open(self.path, 'wb') as f:
+            f.write(b'0123456789')
+
+    def get(self, **headers):
+        from django.test import RequestFactory
+        from .downloads import serve_file
+        return serve_file(RequestFactory().get('/download/', **headers), self.path)
+
+    def test_validators_and_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'text/html')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_same_second_rewrite_changes_the_etag(self):
+        import os
+        os.utime(self.path, ns=(1_700_000_000_100_000_000, 1_700_000_000_100_000_000))
+        etag = self.get()['ETag']
+        with open(self.path, 'wb') as f:
+            f.write(b'9876543210')
+        os.utime(self.path, ns=(1_700_000_000_900_000_000, 1_700_000_000_900_000_000))
+
+        self.assertNotEqual(self.get()['ETag'], etag)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag).status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-4/10', '3'))
+
+        self.assertEqual(b''.join(self.get(HTTP_RANGE='bytes=-3').streaming_content), b'789')
+        self.assertEqual(self.get(HTTP_RANGE='bytes=20-').status_code, 416)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"').status_code, 200)
+
+        open(self.path, 'wb').close()
+        self.assertEqual(self.get(HTTP_RANGE='bytes=-3').status_code, 416)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-').status_code, 416)
+
+    def test_offload_to_web_server(self):
+        with override_settings(DOWNLOADS={'BACKEND': 'x-accel-redirect', 'ACCEL_ROOTS': [(self.root, '/protected/')]}):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/invoice.html')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(DOWNLOADS={'BACKEND': 'x-sendfile'}):
+            self.assertEqual(self.get()['X-Sendfile'], self.path)
+
+
+class UserDirectoryTest(TestCase):
+    def setUp(self):
+        from datetime import date
+        from django.core.cache import cache
+        from students.models import Parent, Student
+        from teachers.models import Teacher
+
+        cache.clear()
+        self.admin = Student.objects.create(
+            email='admin@example.com', username='admin', student_id='ADM', first_name='Ada', last_name='Admin',
+            is_superuser=True, is_staff=True,
+        )
+        self.students = [
+            Student.objects.create(email=f's{i}@example.com', username=f's{i}', student_id=f'S{i:03}',
+                                   first_name='Stu', last_name=f'Dent{i}')
+            for i in range(5)
+        ]
+        teacher_user = Student.objects.create(
+            email='t@example.com', username='t', student_id='T-USER', first_name='Tess', last_name='Cher',
+        )
+        self.teacher = Teacher.objects.create(
+            user=teacher_user, teacher_id='TCH001', date_of_birth=date(1990, 1, 1), qualification='Masters',
+            specialization='Maths', experience_years=5, address='Nairobi', phone='0700000000',
+        )
+        self.parent = Parent.objects.create(email='p@example.com', first_name='Pat', last_name='Rent', phone='0711')
+        self.parent.children.set(self.students[:2])
+
+    def test_page_query_count_is_fixed(self):
+        from .user_directory import directory_page
+
+        data = directory_page(page_size=3)
+        self.assertEqual((data['count'], data['num_pages']), (8, 3))
+        self.assertEqual([entry['name'] for entry in data['results']], ['Ada Admin', 'Tess Cher', 'Stu Dent0'])
+        self.assertEqual([entry['role'] for entry in data['results']], ['admin', 'teacher', 'student'])
+
+        # Page query + parents' child IDs; the total is cached
+        with self.assertNumQueries(2):
+            last = directory_page(page=3, page_size=3)
+        parent = last['results'][-1]
+        self.assertEqual((parent['id'], parent['children_count']), (f'parent_{self.parent.id}', 2))
+        self.assertEqual(parent['child_ids'], [self.students[0].id, self.students[1].id])
+
+    def test_filters_and_sorting(self):
+        from .user_directory import directory_page
+
+        data = directory_page(['student', 'parent'], sort='-name')
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(data['results'][0]['name'], 'Pat Rent')
+        self.assertEqual(directory_page(q='tch001')['results'][0]['id'], f'teacher_{self.teacher.id}')
+        with self.assertRaises(ValueError):
+            directory_page(sort='password')
+
+    def test_endpoints(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.get('/api/admin/directory/').status_code, 403)
+
+        client.force_authenticate(self.admin)
+        response = client.get('/api/admin/directory/', {'role': 'teacher,admin', 'sort': 'role'})
+        self.assertEqual([entry['role'] for entry in response.data['results']], ['admin', 'teacher'])
+        self.assertEqual(len(client.get('/api/admin/users/').data), 8)
+
+    def test_user_writes_refresh_the_cached_count(self):
+        from django.utils import timezone
+        from students.models import Student
+        from .user_directory import directory_page
+
+        self.assertEqual(directory_page()['count'], 8)
+        self.students[4].last_login = timezone.now()
+        self.students[4].save(update_fields=['last_login'])
+        with self.assertNumQueries(2):
+            directory_page()
+
+        Student.objects.create(email='new@example.com', username='new', student_id='S100', first_name='New', last_name='Comer')
+        self.assertEqual(directory_page()['count'], 9)
+        self.students[0].is_active = False
+        self.students[0].save(update_fields=['is_active'])
+        self.assertEqual(directory_page(is_active=True)['count'], 8)
+        self.parent.delete()
+        self.assertEqual(directory_page()['count'], 8)
+
+    def test_teachers_keep_their_profile_join_date(self):
+        from datetime import date
+        from students.models import Student
+        from teachers.models import Teacher
+        from .user_directory import directory_page
+
+        Teacher.objects.filter(id=self.teacher.id).update(date_joined=date(2020, 1, 6))
+        Student.objects.filter(id=self.teacher.user_id).update(date_joined=date(2024, 9, 2))
+        self.assertEqual(directory_page(['teacher'])['results'][0]['date_joined'], date(2020, 1, 6))
+
+
+class PeopleSearchTest(TestCase):
+    def setUp(self):
+        from datetime import date
+        from students.models import Parent, Student
+        from teachers.models import Teacher
+
+        self.student = Student.objects.create(
+            email='john.kamau@example.com', username='jk', student_id='S001', first_name='John', last_name='Kamau',
+        )
+        Student.objects.create(email='s2@example.com', username='s2', student_id='S002', first_name='Jane', last_name='Otieno')
+        teacher_user = Student.objects.create(
+            email='mwangi@example.com', username='t', student_id='T-USER', first_name='Grace', last_name='Mwangi',
+        )
+        self.teacher = Teacher.objects.create(
+            user=teacher_user, teacher_id='TCH-001', date_of_birth=date(1990, 1, 1), qualification='Masters',
+            specialization='Maths', experience_years=5, address='Nairobi', phone='0700000000',
+        )
+        self.parent = Parent.objects.create(email='p.kamau@example.com', first_name='Peter', last_name='Kamau', phone='0711')
+
+    def ids(self, q, **options):
+        from .people_search import search_people
+        return [entry['id'] for entry in search_people(q, **options)['results']]
+
+    def test_prefix_typo_and_identifier_matches(self):
+        self.assertEqual(self.ids('kam'), [f'student_{self.student.id}', f'parent_{self.parent.id}'])
+        self.assertEqual(self.ids('jhon kamau'), [f'student_{self.student.id}'])
+        self.assertEqual(self.ids('tch001'), [f'teacher_{self.teacher.id}'])
+        self.assertEqual(self.ids('S001'), [f'student_{self.student.id}'])
+        self.assertEqual(self.ids('kamau', kinds=['parent']), [f'parent_{self.parent.id}'])
+        self.assertEqual(self.ids('zzz'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        from .models import PersonSearchDocument
+        from .people_search import rebuild_index
+
+        # The teacher's account is indexed once, as the teacher
+        self.assertFalse(PersonSearchDocument.objects.filter(kind='student', object_id=self.teacher.user_id).exists())
+
+        self.student.last_name = 'Njoroge'
+        self.student.save()
+        self.assertEqual(self.ids('john njoroge'), [f'student_{self.student.id}'])
+
+        self.parent.delete()
+        self.assertEqual(self.ids('peter'), [])
+
+        with mock.patch('core.people_search.index_user') as index_user:
+            self.student.save(update_fields=['last_login'])
+        index_user.assert_not_called()
+
+        PersonSearchDocument.objects.all().delete()
+        self.assertEqual(rebuild_index(), {'student': 2, 'teacher': 1, 'admin': 0, 'parent': 0})
+        self.assertEqual(self.ids('grace'), [f'teacher_{self.teacher.id}'])
+
+    def test_endpoint_is_for_staff_and_teachers(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.student)
+        self.assertEqual(client.get('/api/search/people/', {'q': 'kamau'}).status_code, 403)
+
+        client.force_authenticate(self.teacher.user)
+        response = client.get('/api/search/people/', {'q': 'kamau', 'kind': 'student'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(response.data['capped'])
+
+    def test_count_reports_the_candidate_cap(self):
+        from .people_search import search_people
+
+        with mock.patch('core.people_search.CANDIDATES', 1):
+            data = search_people('kamau')
+        self.assertEqual((data['count'], data['capped']), (1, True))
+        self.assertEqual((search_people('kamau')['count'], search_people('kamau')['capped']), (2, False))
+
+    def test_migration_indexes_existing_people(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import PersonSearchDocument
+
+        PersonSearchDocument.objects.all().delete()
+        import_module('core.migrations.0006_populate_people_search').populate_people_search(apps, None)
+        self.assertEqual(PersonSearchDocument.objects.count(), 4)
+        self.assertEqual(self.ids('jhon kamau'), [f'student_{self.student.id}'])
+        self.assertEqual(self.ids('tch001'), [f'teacher_{self.teacher.id}'])
+        self.assertEqual(self.ids('peter'), [f'parent_{self.parent.id}'])
@@ -80,9 +80,12 @@ urlpatterns = [
         # Additional API endpoints
         path('notifications/', NotificationListView.as_view(), name='api_notifications'),
         
+        path('search/people/', views.search_people, name='search_people'),
+
         # Admin endpoints
         path('admin/stats/', views.admin_stats, name='admin_stats'),
         path('admin/users/', views.admin_users, name='admin_users'),
+        path('admin/directory/', views.admin_user_directory, name='admin_user_directory'),
         path('admin/teachers/', admin_views.admin_teachers, name='admin_teachers'),
         path('admin/users/<str:user_id>/', views.admin_update_user, name='admin_update_user'),
         path('admin/add-user/', views.admin_add_user, name='admin_add_user'),
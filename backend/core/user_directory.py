@@ -0,0 +1,227 @@
+"""
+Admin User Directory
+Teachers, students, admins and parents as one sorted, filtered, paginated
+list. The three tables are combined in a single UNION query, so a page costs
+one query, plus one for the child IDs of the parents on it. The total for a
+filter is cached. The work per page does not depend on how many users there
+are.
+"""
+
+import hashlib
+import json
+import math
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Concat
+
+from students.models import Parent, Student
+from teachers.models import Teacher
+
+ROLES = ['admin', 'teacher', 'student', 'parent']
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+COUNT_TTL = 300  # seconds; user, teacher and parent writes invalidate sooner (core.signals)
+COUNT_VERSION_KEY = 'user_directory:count_version'
+
+# Fields the per-filter totals depend on (role, search and active filters)
+COUNTED_FIELDS = frozenset({'first_name', 'last_name', 'email', 'student_id', 'is_active', 'is_superuser'})
+
+COLUMNS = [
+    'role', 'db_id', 'first_name', 'last_name', 'sort_name', 'email', 'username',
+    'date_joined', 'is_active', 'system_id', 'grade_level', 'children_count',
+]
+
+# Sort parameter -> directory columns (a leading '-' reverses the first)
+SORTS = {
+    'name': ['sort_name', 'role', 'db_id'],
+    'email': ['email', 'role', 'db_id'],
+    'date_joined': ['date_joined', 'role', 'db_id'],
+    'role': ['role', 'sort_name', 'db_id'],
+}
+
+
+def _text(value: Optional[str]):
+    return Value(value, output_field=CharField())
+
+
+def _columns(**expressions) -> Dict:
+    """Annotations for every column in COLUMNS order, prefixed so they cannot clash with model fields"""
+    return {f'dir_{name}': expressions[name] for name in COLUMNS}
+
+
+def _user_columns(prefix: str = '', **overrides) -> Dict:
+    """Directory columns of a Student row, read directly or through Teacher.user"""
+    first, last = F(f'{prefix}first_name'), F(f'{prefix}last_name')
+    columns = {
+        'role': Case(When(**{f'{prefix}is_superuser': True}, then=_text('admin')), default=_text('student')),
+        'db_id': F('id'),
+        'first_name': first,
+        'last_name': last,
+        'sort_name': Concat(last, _text(' '), first, output_field=CharField()),
+        'email': F(f'{prefix}email'),
+        'username': F(f'{prefix}username'),
+        'date_joined': F(f'{prefix}date_joined'),
+        'is_active': F(f'{prefix}is_active'),
+        'system_id': F(f'{prefix}student_id'),
+        'grade_level': _text(None),
+        'children_count': Value(None, output_field=IntegerField()),
+    }
+    columns.update(overrides)
+    return _columns(**columns)
+
+
+def _search(fields: Iterable[str], q: str) -> Q:
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': q})
+    return condition
+
+
+def directory_queryset(roles: Iterable[str] = None, q: str = None, is_active: bool = None):
+    """
+    UNION of the selected roles as `dir_<column>` value dicts, unordered.
+
+    Args:
+        roles: Subset of ROLES (default: all)
+        q: Case-insensitive match on first name, last name, email or system ID
+        is_active: Only active (True) or inactive (False) accounts
+    """
+    roles = set(roles or ROLES)
+    querysets = []
+
+    if 'teacher' in roles:
+        teachers = Teacher.objects.order_by()
+        if is_active is not None:
+            teachers = teachers.filter(user__is_active=is_active)
+        if q:
+            teachers = teachers.filter(_search(['user__first_name', 'user__last_name', 'user__email', 'teacher_id'], q))
+        querysets.append(teachers.annotate(**_user_columns(
+            'user__', role=_text('teacher'), system_id=F('teacher_id'),
+            # The teacher profile's own join date, not its account's
+            date_joined=F('date_joined'),
+        )))
+
+    # Users without a Teacher profile are admins (superusers) or students
+    if roles & {'admin', 'student'}:
+        users = Student.objects.order_by().filter(teacher__isnull=True)
+        if 'admin' not in roles:
+            users = users.filter(is_superuser=False)
+        elif 'student' not in roles:
+            users = users.filter(is_superuser=True)
+        if is_active is not None:
+            users = users.filter(is_active=is_active)
+        if q:
+            users = users.filter(_search(['first_name', 'last_name', 'email', 'student_id'], q))
+        querysets.append(users.annotate(**_user_columns(grade_level=F('grade_level__name'))))
+
+    if 'parent' in roles:
+        parents = Parent.objects.order_by()
+        if is_active is not None:
+            parents = parents.filter(is_active=is_active)
+        if q:
+            parents = parents.filter(_search(['first_name', 'last_name', 'email'], q))
+        querysets.append(parents.annotate(**_columns(
+            role=_text('parent'),
+            db_id=F('id'),
+            first_name=F('first_name'),
+            last_name=F('last_name'),
+            sort_name=Concat(F('last_name'), _text(' '), F('first_name'), output_field=CharField()),
+            email=F('email'),
+            username=F('email'),  # Parents sign in with their email
+            date_joined=F('created_at'),
+            is_active=F('is_active'),
+            system_id=_text(None),
+            grade_level=_text(None),
+            children_count=Count('children'),
+        )))
+
+    names = [f'dir_{name}' for name in COLUMNS]
+    querysets = [queryset.values(*names) for queryset in querysets]
+    if not querysets:
+        return Student.objects.none().values()
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def invalidate_directory_count():
+    """Forget cached totals, e.g. after a user is added, deactivated or removed"""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 2, None)
+
+
+def directory_count(roles: Iterable[str] = None, q: str = None, is_active: bool = None) -> int:
+    """Total for a filter, cached for COUNT_TTL"""
+    version = cache.get_or_set(COUNT_VERSION_KEY, 1, None)
+    digest = hashlib.md5(json.dumps([sorted(roles or ROLES), q or '', is_active]).encode()).hexdigest()
+    key = f'user_directory:count:{version}:{digest}'
+    total = cache.get(key)
+    if total is None:
+        total = directory_queryset(roles, q, is_active).count()
+        cache.set(key, total, COUNT_TTL)
+    return total
+
+
+def _entry(row: Dict) -> Dict:
+    entry = {name: row[f'dir_{name}'] for name in COLUMNS if name != 'sort_name'}
+    entry['id'] = f"{entry['role']}_{entry['db_id']}"
+    entry['name'] = f"{entry['first_name']} {entry['last_name']}".strip() or entry['email']
+    if entry['role'] == 'parent':
+        entry['system_id'] = 'PAR-' + str(entry['db_id']).zfill(3)
+    return entry
+
+
+def attach_child_ids(entries: List[Dict]):
+    """Add child_ids to the parent entries with one query"""
+    parents = {entry['db_id']: entry for entry in entries if entry['role'] == 'parent'}
+    for entry in parents.values():
+        entry['child_ids'] = []
+    links = Parent.children.through.objects.filter(parent_id__in=parents).order_by('student_id')
+    for parent_id, student_id in links.values_list('parent_id', 'student_id'):
+        parents[parent_id]['child_ids'].append(student_id)
+
+
+def directory_page(roles: Iterable[str] = None, q: str = None, is_active: bool = None,
+                   sort: str = 'name', page: int = 1, page_size: int = PAGE_SIZE) -> Dict:
+    """
+    One page of the directory.
+
+    Raises:
+        ValueError: Unknown role or sort
+    """
+    roles = list(roles or ROLES)
+    unknown = set(roles) - set(ROLES)
+    if unknown:
+        raise ValueError(f"Unknown role: {', '.join(sorted(unknown))}")
+    descending = sort.startswith('-')
+    columns = SORTS.get(sort.lstrip('-'))
+    if columns is None:
+        raise ValueError(f"Unknown sort: {sort}")
+
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    total = directory_count(roles, q, is_active)
+    num_pages = max(1, math.ceil(total / page_size))
+    page = max(1, min(page, num_pages))
+
+    ordering = [f"{'-' if descending and position == 0 else ''}dir_{column}" for position, column in enumerate(columns)]
+    start = (page - 1) * page_size
+    entries = [_entry(row) for row in directory_queryset(roles, q, is_active).order_by(*ordering)[start:start + page_size]]
+    attach_child_ids(entries)
+
+    return {
+        'count': total,
+        'page': page,
+        'page_size': page_size,
+        'num_pages': num_pages,
+        'results': entries,
+    }
+
+
+def directory_entries(sort: str = 'name') -> List[Dict]:
+    """Every user, for the legacy unpaginated listing"""
+    columns = SORTS[sort]
+    entries = [_entry(row) for row in directory_queryset().order_by(*[f'dir_{column}' for column in columns])]
+    attach_child_ids(entries)
+    return entries
@@ -22,6 +22,7 @@ from .serializers import UserSerializer, TeacherSerializer, AnnouncementSerializ
     StudentSerializer, UserRegistrationSerializer, DynamicUserRegistrationSerializer, \
     AcademicYearSerializer, AcademicTermSerializer
 from .utils import get_user_role
+from . import people_search, user_directory
 from rest_framework import generics
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -108,6 +109,13 @@ class ProfileView(APIView):
         return Response(response_data)
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Lets middleware (rate limiting) resolve the role without a DB lookup
+        token['role'] = get_user_role(user)
+        return token
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -347,11 +355,13 @@ def admin_stats(request):
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied'}, status=403)
     
-    from cbc.models import LearningArea, Strand
+    # Nodes of the current curriculum, not every release's rows
+    from cbc.curriculum import get_curriculum
+    curriculum = get_curriculum()
     stats = {
-        'totalLearningAreas': LearningArea.objects.count(),
-        'activeLearningAreas': LearningArea.objects.filter(is_active=True).count(),
-        'totalStrands': Strand.objects.count(),
+        'totalLearningAreas': len(curriculum.areas),
+        'activeLearningAreas': sum(area.is_active for area in curriculum.areas.values()),
+        'totalStrands': len(curriculum.strands),
         'totalTeachers': Teacher.objects.count(),
         'totalStudents': Student.objects.count(),
     }
@@ -360,76 +370,71 @@ def admin_stats(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_users(request):
-    """List all users (teachers and students) for admin management"""
+    """List all users (teachers, students, admins and parents) for admin management"""
     if not request.user.is_superuser:
         return Response({'error': 'Permission denied'}, status=403)
-    
-    # AUTH_USER_MODEL is students.Student, so Student objects ARE the base users.
-    # Teacher has a OneToOneField named 'user' pointing to AUTH_USER_MODEL (Student).
-    teachers = Teacher.objects.all().select_related('user')
-    
-    # We query all students, but we'll categorize them.
-    # We don't use select_related('user') because Student IS the user model.
-    all_base_users = Student.objects.all()
-    
-    data = []
-    processed_user_ids = set()
-    
-    # Process Teachers first to ensure they get the correct role
-    for teacher in teachers:
-        processed_user_ids.add(teacher.user.id)
-        data.append({
-            'id': f"teacher_{teacher.id}",
-            'db_id': teacher.id,
-            'name': f"{teacher.user.first_name} {teacher.user.last_name}".strip() or teacher.user.email,
-            'email': teacher.user.email,
-            'role': 'teacher',
-            'username': teacher.user.username,
-            'date_joined': teacher.date_joined,
-            'is_active': teacher.user.is_active,
-            'system_id': teacher.teacher_id,
-        })
-        
-    # Process remaining users
-    for user in all_base_users:
-        if user.id in processed_user_ids:
-            continue
-            
-        role = 'student'
-        if user.is_superuser:
-            role = 'admin'
-        
-        data.append({
-            'id': f"{role}_{user.id}",
-            'db_id': user.id,
-            'name': f"{user.first_name} {user.last_name}".strip() or user.email,
-            'email': user.email,
-            'role': role,
-            'username': user.username,
-            'date_joined': user.date_joined,
-            'is_active': user.is_active,
-            'system_id': user.student_id if hasattr(user, 'student_id') else None,
-            'grade_level': user.grade_level.name if hasattr(user, 'grade_level') and user.grade_level else None,
-        })
 
-    # Process Parents
-    from students.models import Parent
-    parents = Parent.objects.all()
-    for parent in parents:
-        data.append({
-            'id': f"parent_{parent.id}",
-            'db_id': parent.id,
-            'name': parent.get_full_name() or parent.email,
-            'email': parent.email,
-            'role': 'parent',
-            'username': parent.email, # Parents use email as username
-            'date_joined': parent.created_at,
-            'is_active': parent.is_active,
-            'system_id': 'PAR-' + str(parent.id).zfill(3),
-            'children_count': parent.children.count(),
-            'child_ids': list(parent.children.values_list('id', flat=True))
-        })
-            
+    # Unpaginated for existing clients; admin_user_directory pages the same rows
+    return Response(user_directory.directory_entries())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_user_directory(request):
+    """
+    Paginated, filterable user directory for admin management
+    GET /api/admin/directory/
+    Query params: role (comma separated: admin, teacher, student, parent), q,
+    is_active (true/false), sort (name, email, date_joined, role; prefix - to reverse),
+    page, page_size
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Permission denied'}, status=403)
+
+    params = request.query_params
+    roles = [role.strip() for role in params.get('role', '').split(',') if role.strip()]
+    is_active = params.get('is_active')
+    if is_active not in (None, ''):
+        is_active = is_active.lower() in ('1', 'true')
+    else:
+        is_active = None
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', user_directory.PAGE_SIZE))
+        data = user_directory.directory_page(
+            roles, params.get('q', '').strip(), is_active,
+            sort=params.get('sort', 'name'), page=page, page_size=page_size,
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_people(request):
+    """
+    Ranked people search for admins and teachers
+    GET /api/search/people/?q=
+    Query params: q (names, email, student or teacher ID; partial or misspelt words match),
+    kind (comma separated: student, teacher, admin, parent), is_active, page, page_size
+    With "capped": true in the response, count is a lower bound (see core.people_search)
+    """
+    if get_user_role(request.user) not in ('admin', 'teacher'):
+        return Response({'error': 'Permission denied'}, status=403)
+
+    params = request.query_params
+    kinds = [kind.strip() for kind in params.get('kind', '').split(',') if kind.strip()]
+    is_active = params.get('is_active')
+    is_active = None if is_active in (None, '') else is_active.lower() in ('1', 'true')
+    try:
+        data = people_search.search_people(
+            params.get('q', ''), kinds, is_active,
+            page=int(params.get('page', 1)),
+            page_size=int(params.get('page_size', people_search.PAGE_SIZE)),
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     return Response(data)
 
 
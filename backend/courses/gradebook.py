@@ -0,0 +1,150 @@
+"""
+Gradebook Engine
+Builds the student x assessment gradebook matrix from a fixed number of bulk queries
+"""
+
+from django.db.models import Count, F
+
+from cbc.models import CompetencyAssessment
+from .models import Grade, QuizSubmission, competency_level_for_score
+
+
+class GradebookEngine:
+    """
+    Set-based gradebook builder.
+
+    Cells live in a dense grid: one row per student, one column per assignment
+    followed by one column per quiz. Every data source (grades, competency
+    assessments, best quiz attempts, quiz totals) is loaded with a single query
+    and scattered into the grid, so the query count does not grow with the
+    size of the class.
+    """
+
+    def __init__(self, students, assignments, quizzes):
+        self.students = list(students)
+        self.assignments = list(
+            assignments
+            .select_related(
+                'learning_area__teacher', 'course__teacher',
+                'learning_outcome__sub_strand__strand',
+            )
+            .prefetch_related('tested_outcomes__sub_strand')
+            .annotate(submission_count=Count('submissions', distinct=True))
+        )
+        self.quizzes = list(quizzes.prefetch_related('questions', 'tested_outcomes__sub_strand'))
+
+        self.row_index = {student.id: row for row, student in enumerate(self.students)}
+        self.assignment_columns = {a.id: col for col, a in enumerate(self.assignments)}
+        offset = len(self.assignments)
+        self.quiz_columns = {q.id: offset + col for col, q in enumerate(self.quizzes)}
+        self.grid = [[None] * (offset + len(self.quizzes)) for _ in self.students]
+
+        # Computed once per quiz from the prefetched questions
+        self.quiz_totals = {quiz.id: quiz.total_points for quiz in self.quizzes}
+
+    def build(self):
+        """Populate the grid and return it"""
+        if self.students and (self.assignments or self.quizzes):
+            self._fill_competencies()
+            self._fill_grades()
+            self._fill_quizzes()
+        return self.grid
+
+    def _fill_grades(self):
+        """Traditional numerical grades take precedence over competency fallbacks"""
+        grades = Grade.objects.filter(
+            student_id__in=self.row_index,
+            assignment_id__in=self.assignment_columns,
+        ).order_by('id').values_list('id', 'student_id', 'assignment_id', 'score', 'letter_grade')
+
+        for grade_id, student_id, assignment_id, score, letter_grade in grades:
+            self.grid[self.row_index[student_id]][self.assignment_columns[assignment_id]] = {
+                'score': float(score),
+                'letter_grade': letter_grade or '',
+                'grade_id': grade_id
+            }
+
+    def _fill_competencies(self):
+        """CBC fallback: latest competency assessment for the assignment's outcome"""
+        columns_by_outcome = {}
+        for assignment in self.assignments:
+            if assignment.learning_outcome_id:
+                columns_by_outcome.setdefault(assignment.learning_outcome_id, []).append(
+                    self.assignment_columns[assignment.id]
+                )
+        if not columns_by_outcome:
+            return
+
+        assessments = CompetencyAssessment.objects.filter(
+            student_id__in=self.row_index,
+            learning_outcome_id__in=columns_by_outcome,
+        ).order_by('-assessment_date', '-id').values_list(
+            'id', 'student_id', 'learning_outcome_id', 'competency_level'
+        )
+
+        seen = set()
+        for assessment_id, student_id, outcome_id, level in assessments:
+            if (student_id, outcome_id) in seen:
+                continue
+            seen.add((student_id, outcome_id))
+            row = self.grid[self.row_index[student_id]]
+            for col in columns_by_outcome[outcome_id]:
+                row[col] = {
+                    'score': 0,  # CBC uses labels not numerical scores in this view
+                    'letter_grade': level,
+                    'grade_id': assessment_id
+                }
+
+    def _fill_quizzes(self):
+        """Highest scoring graded attempt per student per quiz"""
+        if not self.quiz_columns:
+            return
+
+        submissions = QuizSubmission.objects.filter(
+            student_id__in=self.row_index,
+            quiz_id__in=self.quiz_columns,
+            status__in=['graded', 'auto_graded'],
+        ).order_by('student_id', 'quiz_id', F('score').desc(nulls_last=True), '-id').values_list(
+            'id', 'student_id', 'quiz_id', 'score', 'status'
+        )
+
+        seen = set()
+        for submission_id, student_id, quiz_id, score, submission_status in submissions:
+            if (student_id, quiz_id) in seen:
+                continue
+            seen.add((student_id, quiz_id))
+            total = self.quiz_totals[quiz_id]
+            self.grid[self.row_index[student_id]][self.quiz_columns[quiz_id]] = {
+                'score': float(score or 0),
+                'total': float(total),
+                'status': submission_status,
+                'submission_id': submission_id,
+                'competency_level': competency_level_for_score(score, total)
+            }
+
+    def student_rows(self):
+        """Render the grid in the shape expected by the gradebook API"""
+        grid = self.build()
+        rows = []
+        for student, cells in zip(self.students, grid):
+            rows.append({
+                'student_id': student.id,
+                'student_name': student.get_full_name(),
+                'email': student.email,
+                'student_number': student.student_id,
+                'grades': {
+                    str(a.id): cells[self.assignment_columns[a.id]] for a in self.assignments
+                },
+                'quiz_grades': {
+                    str(q.id): cells[self.quiz_columns[q.id]] for q in self.quizzes
+                }
+            })
+        return rows
+
+
+def build_gradebook(students, assignments, quizzes):
+    """
+    Helper function to build gradebook rows plus the column querysets used to render them
+    """
+    engine = GradebookEngine(students, assignments, quizzes)
+    return engine.student_rows(), engine.assignments, engine.quizzes
@@ -3,6 +3,23 @@ from django.db import models
 from teachers.models import Teacher
 from students.models import Student
 
+def competency_level_for_score(score, total):
+    """Maps a raw score out of `total` to a CBC competency level (EE/ME/AE/BE)"""
+    if score is None or not total:
+        return None
+
+    percentage = (float(score) / float(total)) * 100
+
+    if percentage >= 80:
+        return 'EE'
+    elif percentage >= 60:
+        return 'ME'
+    elif percentage >= 40:
+        return 'AE'
+    else:
+        return 'BE'
+
+
 class Course(models.Model):
     SEMESTER_CHOICES = [
         ('1', 'First'),
@@ -311,25 +328,32 @@ class QuizSubmission(models.Model):
     def __str__(self):
         return f"{self.quiz.title} · {self.student.get_full_name()} · Attempt {self.attempt_number}"
 
-    def get_competency_level(self):
-        """Calculates competency level based on score percentage"""
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Graded attempts feed the materialized CBC outcome achievements; an
+        # attempt moved out of 'graded' must stop feeding them
+        was_graded = getattr(self, '_loaded_status', None) in ('graded', 'auto_graded')
+        if self.status in ('graded', 'auto_graded') or was_graded:
+            from cbc.achievements import refresh_quiz_achievements
+            refresh_quiz_achievements(self)
+        self._loaded_status = self.status
+
+    def get_competency_level(self, total=None):
+        """
+        Calculates competency level based on score percentage.
+        Pass `total` when the quiz total is already known to avoid reloading questions.
+        """
         if self.score is None:
             return None
-        
-        total = self.quiz.total_points
-        if not total or total == 0:
-            return None
-            
-        percentage = (float(self.score) / float(total)) * 100
-        
-        if percentage >= 80:
-            return 'EE'
-        elif percentage >= 60:
-            return 'ME'
-        elif percentage >= 40:
-            return 'AE'
-        else:
-            return 'BE'
+        if total is None:
+            total = self.quiz.total_points
+        return competency_level_for_score(self.score, total)
 
 
 class QuizResponse(models.Model):
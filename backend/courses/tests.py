@@ -1,3 +1,4 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -86,3 +87,92 @@ class CourseDetailAPITest(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class GradebookQueryCountTest(APITestCase):
+    """Benchmark: gradebook query count must not grow with class size"""
+
+    def setUp(self):
+        from cbc.models import GradeLevel, LearningArea, Strand, SubStrand, LearningOutcome
+        from .models import Assignment, Quiz, QuizQuestion
+
+        self.admin = Student.objects.create_superuser(
+            student_id='A001', email='admin@example.com', password='testpass123',
+        )
+        self.teacher = Teacher.objects.create(
+            user=self.admin, teacher_id='TT900', date_of_birth='1990-01-01', qualification='Masters',
+            specialization='Math', experience_years=5, address='-', phone='-',
+        )
+        self.course = Course.objects.create(
+            name='Maths', code='MATH4', description='-', credits=3, semester='1',
+            start_date='2025-01-10', end_date='2025-05-20', teacher=self.teacher,
+        )
+        grade = GradeLevel.objects.create(name='Grade 4', curriculum_type='CBC', order=4)
+        self.area = LearningArea.objects.create(name='Mathematics', code='MATH-G4', grade_level=grade)
+        strand = Strand.objects.create(learning_area=self.area, name='Numbers', code='MATH-G4-NUM', order=1)
+        sub = SubStrand.objects.create(strand=strand, name='Whole Numbers', code='MATH-G4-NUM-W', order=1)
+        self.outcome = LearningOutcome.objects.create(
+            sub_strand=sub, description='Add numbers', code='MATH-G4-NUM-W-01', order=1
+        )
+        for i in range(5):
+            assignment = Assignment.objects.create(
+                title=f'Assignment {i}', description='-', due_date='2025-02-01T00:00:00Z',
+                learning_area=self.area, learning_outcome=self.outcome,
+            )
+            assignment.tested_outcomes.add(self.outcome)
+        for i in range(4):
+            quiz = Quiz.objects.create(title=f'Quiz {i}', learning_area=self.area, is_published=True)
+            quiz.tested_outcomes.add(self.outcome)
+            QuizQuestion.objects.create(quiz=quiz, prompt='?', correct_answer='a', points=5, order=1)
+            QuizQuestion.objects.create(quiz=quiz, prompt='?', correct_answer='b', points=5, order=2)
+
+    def _enroll(self, count, start):
+        from cbc.models import CompetencyAssessment
+        from .models import Assignment, Grade, Quiz, QuizSubmission
+
+        assignments = list(Assignment.objects.filter(learning_area=self.area))
+        quizzes = list(Quiz.objects.filter(learning_area=self.area))
+        for i in range(start, start + count):
+            student = Student.objects.create_user(
+                student_id=f'S{i:04d}', email=f's{i}@example.com',
+            )
+            self.area.students.add(student)
+            Grade.objects.create(student=student, course=self.course, assignment=assignments[0], score=70)
+            CompetencyAssessment.objects.create(
+                student=student, learning_outcome=self.outcome, competency_level='ME',
+                teacher=self.teacher, evidence='-',
+            )
+            for quiz in quizzes:
+                QuizSubmission.objects.create(quiz=quiz, student=student, score=8, status='graded')
+
+    def _query_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('courses:course_gradebook_api', args=[self.area.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response.json()
+
+    @override_settings(CURRICULUM_SNAPSHOT={'CHECK_INTERVAL': 3600})
+    def test_query_count_is_constant_as_class_grows(self):
+        from cbc.curriculum import get_curriculum
+
+        # Outcome serializers read the process-wide curriculum snapshot; load it once up front
+        get_curriculum()
+        self._enroll(3, start=0)
+        small, _ = self._query_count()
+        self._enroll(30, start=3)
+        large, data = self._query_count()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data['students']), 33)
+        row = data['students'][0]
+        quiz_cell = next(iter(row['quiz_grades'].values()))
+        self.assertEqual(quiz_cell['total'], 10.0)
+        self.assertEqual(quiz_cell['competency_level'], 'EE')
+        grade_cells = list(row['grades'].values())
+        self.assertEqual(grade_cells[0]['score'], 70.0)
+        self.assertEqual(grade_cells[1]['letter_grade'], 'ME')
@@ -32,8 +32,9 @@ from .models import (
 )
 from students.models import Student
 from teachers.models import Teacher
-from cbc.models import LearningArea, CompetencyAssessment
+from cbc.models import LearningArea
 from datetime import datetime, timedelta
+from .gradebook import build_gradebook
 from .serializers import (
     AssignmentSerializer,
     AssignmentSubmissionSerializer,
@@ -576,6 +577,7 @@ class DiscussionCommentViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def course_detail_api(request, pk):
+    from cbc.curriculum import get_area
     from cbc.models import LearningArea
     from teachers.serializers import AssignmentSerializer as TeacherAssignmentSerializer
     
@@ -645,8 +647,7 @@ def course_detail_api(request, pk):
 
         except Course.DoesNotExist:
             # 2. Fallback to CBC LearningArea
-            area = LearningArea.objects.prefetch_related(
-                'strands__sub_strands__learning_outcomes',
+            area = LearningArea.objects.current().prefetch_related(
                 'assignments',
                 'students'
             ).get(pk=pk)
@@ -691,9 +692,10 @@ def course_detail_api(request, pk):
                 }
             }
 
-            # Map Strands -> Modules and Sub-strands -> Lessons
+            # Map Strands -> Modules and Sub-strands -> Lessons, from the curriculum snapshot
             total_lessons = 0
-            for strand in area.strands.all().order_by('order'):
+            area_node = get_area(area.id)
+            for strand in area_node.strands if area_node else []:
                 module = {
                     'id': strand.id,
                     'title': strand.name,
@@ -702,7 +704,7 @@ def course_detail_api(request, pk):
                     'lessons': []
                 }
                 
-                for sub in strand.sub_strands.all().order_by('order'):
+                for sub in strand.sub_strands:
                     total_lessons += 1
                     
                     # Try to find a real Lesson object matching this sub-strand
@@ -723,7 +725,7 @@ def course_detail_api(request, pk):
                         'order': sub.order,
                         'teacher_contents': teacher_contents,
                         'content_count': len(teacher_contents),
-                        'outcomes_count': sub.learning_outcomes.count(),
+                        'outcomes_count': len(sub.outcomes),
                         'learning_outcomes': [
                             {
                                 'id': outcome.id,
@@ -731,9 +733,9 @@ def course_detail_api(request, pk):
                                 'body': outcome.description,
                                 'content_type': 'outcome'
                             }
-                            for outcome in sub.learning_outcomes.all().order_by('order')
+                            for outcome in sub.outcomes
                         ],
-                        'quizzes': QuizSerializer(Quiz.objects.filter(lesson_id=None, learning_area=area, learning_outcome__sub_strand=sub, is_published=True), many=True).data
+                        'quizzes': QuizSerializer(Quiz.objects.filter(lesson_id=None, learning_area=area, learning_outcome__sub_strand_id=sub.id, is_published=True), many=True).data
                     }
                     module['lessons'].append(lesson)
                 
@@ -864,7 +866,7 @@ def course_gradebook_api(request, pk):
     
     # Try finding as LearningArea first (CBC subjects)
     try:
-        learning_area = LearningArea.objects.get(pk=pk)
+        learning_area = LearningArea.objects.current().get(pk=pk)
     except LearningArea.DoesNotExist:
         # Try finding as Course (8-4-4 legacy)
         try:
@@ -894,66 +896,7 @@ def course_gradebook_api(request, pk):
         assignments = course.assignment_set.all().order_by('due_date')
         quizzes = Quiz.objects.filter(learning_area=course.learning_area).order_by('id') if course.learning_area else Quiz.objects.none()
     
-    gradebook = []
-    for student in students:
-        student_data = {
-            'student_id': student.id,
-            'student_name': student.get_full_name(),
-            'email': student.email,
-            'student_number': student.student_id,
-            'grades': {},
-            'quiz_grades': {}
-        }
-        
-        # Assignment Grades
-        for assignment in assignments:
-            try:
-                # Try to find a traditional numerical grade first
-                grade = Grade.objects.get(student=student, assignment=assignment)
-                student_data['grades'][str(assignment.id)] = {
-                    'score': float(grade.score),
-                    'letter_grade': grade.letter_grade or '',
-                    'grade_id': grade.id
-                }
-            except Grade.DoesNotExist:
-                # Fallback for CBC: Check if there's a competency assessment for this outcome
-                if assignment.learning_outcome:
-                    assessment = CompetencyAssessment.objects.filter(
-                        student=student,
-                        learning_outcome=assignment.learning_outcome
-                    ).order_by('-assessment_date').first()
-                    
-                    if assessment:
-                        student_data['grades'][str(assignment.id)] = {
-                            'score': 0, # CBC uses labels not numerical scores in this view
-                            'letter_grade': assessment.competency_level,
-                            'grade_id': assessment.id
-                        }
-                    else:
-                        student_data['grades'][str(assignment.id)] = None
-                else:
-                    student_data['grades'][str(assignment.id)] = None
-        
-        # Quiz Grades (Highest score per quiz)
-        for quiz in quizzes:
-            submission = QuizSubmission.objects.filter(
-                student=student, 
-                quiz=quiz, 
-                status__in=['graded', 'auto_graded']
-            ).order_by('-score').first()
-            
-            if submission:
-                student_data['quiz_grades'][str(quiz.id)] = {
-                    'score': float(submission.score or 0),
-                    'total': float(quiz.total_points),
-                    'status': submission.status,
-                    'submission_id': submission.id,
-                    'competency_level': submission.get_competency_level()
-                }
-            else:
-                student_data['quiz_grades'][str(quiz.id)] = None
-        
-        gradebook.append(student_data)
+    gradebook, assignments, quizzes = build_gradebook(students, assignments, quizzes)
     
     return Response({
         'students': gradebook,
@@ -0,0 +1,202 @@
+"""
+Fee Aging
+Buckets every outstanding fee by days past its due date (the earliest
+uncancelled invoice due date, or the billing date for fees without invoices)
+and stores the result in FeeAging, with per grade x term x bucket totals in
+FeeAgingRollup.
+
+One query reads every outstanding fee with its due date and last payment as
+subqueries; buckets are assigned in a single Python pass and upserted on the
+fee, so concurrent refreshes of the same fee never race on its one row, and
+rollups on their grade x term x bucket the same way. Fee
+and invoice writes (saves, deletes and queryset updates) and bulk payment
+recording refresh just the fees they touch. Ages move with the calendar, so `manage.py refresh_fee_aging` should run
+daily to re-age everything else.
+"""
+
+from datetime import date
+from typing import Iterable, List, Optional, Set, Tuple
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FeeAging, FeeAgingRollup, Invoice, Payment, StudentFee
+
+logger = logging.getLogger(__name__)
+
+# (upper bound in days overdue, bucket); anything later is '90_plus'
+BUCKET_LIMITS = [(0, 'current'), (30, '1_30'), (60, '31_60'), (90, '61_90')]
+
+# Columns rewritten when a fee's aging row already exists
+UPSERT_FIELDS = [
+    'student', 'grade_level', 'academic_term', 'balance', 'due_date',
+    'days_overdue', 'bucket', 'last_payment_date', 'as_of',
+]
+
+# Columns a rollup row's totals are written to
+ROLLUP_FIELDS = ['fee_count', 'total_balance', 'as_of']
+
+# (grade level ID, academic term ID)
+Group = Tuple[Optional[int], Optional[int]]
+
+
+def bucket_for(days_overdue: int) -> str:
+    for limit, bucket in BUCKET_LIMITS:
+        if days_overdue <= limit:
+            return bucket
+    return '90_plus'
+
+
+def compute_aging(fees, as_of: date) -> List[FeeAging]:
+    """
+    Aging rows for the outstanding fees in the `fees` queryset, in one query
+    """
+    first_due = Invoice.objects.filter(
+        student_fee=OuterRef('pk')
+    ).exclude(status='cancelled').order_by('due_date').values('due_date')[:1]
+    last_paid = Payment.objects.filter(
+        student_fee=OuterRef('pk')
+    ).order_by('-payment_date').values('payment_date')[:1]
+
+    rows = fees.filter(balance__gt=0).order_by().annotate(
+        first_due=Subquery(first_due),
+        last_paid=Subquery(last_paid),
+        grade_id=Coalesce('fee_structure__grade_level_id', 'student__grade_level_id'),
+    ).values_list(
+        'id', 'student_id', 'grade_id', 'fee_structure__academic_term_id',
+        'balance', 'first_due', 'created_at', 'last_paid',
+    )
+
+    aging = []
+    for fee_id, student_id, grade_id, term_id, balance, first_due, created_at, last_paid in rows:
+        due_date = first_due or timezone.localdate(created_at)
+        days_overdue = (as_of - due_date).days
+        aging.append(FeeAging(
+            student_fee_id=fee_id,
+            student_id=student_id,
+            grade_level_id=grade_id,
+            academic_term_id=term_id,
+            balance=balance,
+            due_date=due_date,
+            days_overdue=days_overdue,
+            bucket=bucket_for(days_overdue),
+            last_payment_date=last_paid,
+            as_of=as_of,
+        ))
+    return aging
+
+
+def refresh_fee_aging(fee_ids: Iterable[int] = None, as_of: date = None) -> int:
+    """
+    Recompute the aging of the given fees (all fees when None) and the rollups
+    of every grade x term they were or now are in.
+
+    Returns:
+        Number of outstanding fees written
+    """
+    as_of = as_of or timezone.localdate()
+    fees = StudentFee.objects.all()
+    snapshot = FeeAging.objects.all()
+    if fee_ids is not None:
+        fee_ids = set(fee_ids)
+        if not fee_ids:
+            return 0
+        fees = fees.filter(id__in=fee_ids)
+        snapshot = snapshot.filter(student_fee_id__in=fee_ids)
+
+    with transaction.atomic():
+        groups = None if fee_ids is None else set(snapshot.values_list('grade_level_id', 'academic_term_id'))
+        rows = compute_aging(fees, as_of)
+        # Settled (and deleted) fees leave the snapshot; the rest are upserted
+        snapshot.exclude(student_fee_id__in=[row.student_fee_id for row in rows]).delete()
+        FeeAging.objects.bulk_create(
+            rows, batch_size=1000, update_conflicts=True, unique_fields=['student_fee'],
+            update_fields=UPSERT_FIELDS,
+        )
+        if groups is not None:
+            groups |= {(row.grade_level_id, row.academic_term_id) for row in rows}
+        _write_rollups(groups)
+
+    if fee_ids is None:
+        logger.info(f"Fee aging refreshed as of {as_of}: {len(rows)} outstanding fees")
+    return len(rows)
+
+
+def discard_fee_aging(fee_ids: Iterable[int]):
+    """Drop fees that are being deleted from the snapshot and their groups' rollups"""
+    snapshot = FeeAging.objects.filter(student_fee_id__in=list(fee_ids))
+    with transaction.atomic():
+        groups = set(snapshot.values_list('grade_level_id', 'academic_term_id'))
+        snapshot.delete()
+        _write_rollups(groups)
+
+
+def rebuild_aging_rollups(groups: Set[Group] = None) -> int:
+    """
+    Recompute FeeAgingRollup from the snapshot (all, or only the given
+    grade x term groups). Returns the number of rows written.
+    """
+    with transaction.atomic():
+        return _write_rollups(groups)
+
+
+def _write_rollups(groups: Optional[Set[Group]]) -> int:
+    aging = FeeAging.objects.all()
+    rollups = FeeAgingRollup.objects.all()
+    if groups is not None:
+        if not groups:
+            return 0
+        scope = Q()
+        for grade_id, term_id in groups:
+            scope |= Q(grade_level_id=grade_id, academic_term_id=term_id)
+        aging, rollups = aging.filter(scope), rollups.filter(scope)
+
+    rows = [
+        FeeAgingRollup(**row)
+        for row in aging.order_by().values('grade_level_id', 'academic_term_id', 'bucket').annotate(
+            fee_count=Count('id'),
+            total_balance=Sum('balance'),
+            as_of=Min('as_of'),
+        )
+    ]
+    # Upserted on grade x term x bucket rather than deleted and recreated, so two
+    # refreshes of the same group update its rows instead of adding a second set
+    existing = {
+        (grade_id, term_id, bucket): pk
+        for pk, grade_id, term_id, bucket in rollups.values_list('id', 'grade_level_id', 'academic_term_id', 'bucket')
+    }
+    for row in rows:
+        row.pk = existing.pop((row.grade_level_id, row.academic_term_id, row.bucket), None)
+    FeeAgingRollup.objects.filter(id__in=existing.values()).delete()
+    FeeAgingRollup.objects.bulk_update([row for row in rows if row.pk], ROLLUP_FIELDS)
+    created = [row for row in rows if not row.pk]
+    if not created:
+        return len(rows)
+    try:
+        with transaction.atomic():
+            FeeAgingRollup.objects.bulk_create(created)
+    except IntegrityError:
+        # Another refresh created some of these rows first
+        for row in created:
+            FeeAgingRollup.objects.update_or_create(
+                grade_level_id=row.grade_level_id, academic_term_id=row.academic_term_id, bucket=row.bucket,
+                defaults={field: getattr(row, field) for field in ROLLUP_FIELDS},
+            )
+    return len(rows)
+
+
+def summarise_buckets(rows: Iterable[dict]) -> List[dict]:
+    """
+    Fold {'bucket', 'fee_count', 'total_balance'} rows into one entry per
+    bucket, in bucket order, including empty buckets
+    """
+    totals = {bucket: {'bucket': bucket, 'label': label, 'fee_count': 0, 'total_balance': 0.0}
+              for bucket, label in FeeAging.BUCKETS}
+    for row in rows:
+        entry = totals[row['bucket']]
+        entry['fee_count'] += row['fee_count']
+        entry['total_balance'] += float(row['total_balance'] or 0)
+    return list(totals.values())
@@ -0,0 +1,121 @@
+"""
+Bulk Billing Service
+Set-based term billing: a fixed number of queries regardless of how many
+students are billed.
+"""
+
+from decimal import Decimal
+from typing import Dict, Iterable, List
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+
+from students.models import Student
+from .aging import refresh_fee_aging
+from .cache_service import FinanceCacheService
+from .models import FeeStructure, StudentFee
+from .rollups import add_fee_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class BulkBillingPlan:
+    """
+    What billing a term would do: the fees to create and why everyone else is skipped
+    """
+
+    def __init__(self, term):
+        self.term = term
+        self.new_fees: List[StudentFee] = []
+        self.skipped_count = 0
+        self.no_structure_count = 0
+        self.by_grade: Dict[int, dict] = {}
+
+    @property
+    def total_amount(self) -> Decimal:
+        return sum((fee.final_amount for fee in self.new_fees), Decimal('0'))
+
+    def summary(self) -> dict:
+        return {
+            'created': len(self.new_fees),
+            'skipped_already_exists': self.skipped_count,
+            'no_structure_found': self.no_structure_count,
+            'total_amount': float(self.total_amount),
+            'by_grade': list(self.by_grade.values()),
+        }
+
+
+def plan_bulk_billing(term, grade_ids: Iterable[int] = (), student_ids: Iterable[int] = ()) -> BulkBillingPlan:
+    """
+    Work out which students need a fee for `term` in three queries: students,
+    the term's fee structures for their grades, and the fees already billed
+    against those structures. Amounts are computed in Python.
+    """
+    plan = BulkBillingPlan(term)
+    grade_ids, student_ids = list(grade_ids), list(student_ids)
+    if not grade_ids and not student_ids:
+        return plan
+
+    students = list(Student.objects.filter(
+        Q(grade_level_id__in=grade_ids) | Q(id__in=student_ids), is_superuser=False
+    ).values_list('id', 'grade_level_id'))
+
+    structures = {}
+    for structure in FeeStructure.objects.filter(
+        academic_term=term, is_active=True,
+        grade_level_id__in={grade_id for _, grade_id in students if grade_id},
+    ).select_related('grade_level'):
+        structures.setdefault(structure.grade_level_id, structure)
+
+    billed = set(StudentFee.objects.filter(
+        fee_structure__in=structures.values()
+    ).values_list('student_id', 'fee_structure_id'))
+
+    for student_id, grade_id in students:
+        if not grade_id:
+            plan.skipped_count += 1
+            continue
+
+        structure = structures.get(grade_id)
+        if structure is None:
+            plan.no_structure_count += 1
+            continue
+
+        if (student_id, structure.id) in billed:
+            plan.skipped_count += 1
+            continue
+
+        fee = StudentFee(student_id=student_id, fee_structure=structure)
+        fee.calculate_amounts()
+        plan.new_fees.append(fee)
+
+        grade = plan.by_grade.setdefault(grade_id, {
+            'grade_level': grade_id,
+            'grade_name': structure.grade_level.name,
+            'fee_structure': structure.id,
+            'students': 0,
+            'amount': 0.0,
+        })
+        grade['students'] += 1
+        grade['amount'] += float(fee.final_amount)
+
+    return plan
+
+
+def apply_bulk_billing(plan: BulkBillingPlan, batch_size: int = 500) -> int:
+    """
+    Insert the planned fees, add them to the fee rollups and aging snapshot and
+    invalidate the billed students' finance caches.
+
+    Returns:
+        Number of fees created
+    """
+    with transaction.atomic():
+        StudentFee.objects.bulk_create(plan.new_fees, batch_size=batch_size)
+        add_fee_rollups(plan.new_fees)
+        refresh_fee_aging([fee.id for fee in plan.new_fees])
+        FinanceCacheService.invalidate_many({fee.student_id for fee in plan.new_fees})
+
+    logger.info(f"Billed {len(plan.new_fees)} students for term {plan.term.id}")
+    return len(plan.new_fees)
@@ -0,0 +1,74 @@
+"""
+Bulk Payment Recording
+Writes many payments at once without Payment.save's per-row re-aggregation:
+payments are inserted with bulk_create and each affected StudentFee is
+recomputed once from a single grouped SUM, then re-aged.
+"""
+
+from typing import Iterable, List, Set
+import logging
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .aging import refresh_fee_aging
+from .models import Payment, StudentFee
+from .rollups import add_revenue_rollups, move_fee_rollups
+
+logger = logging.getLogger(__name__)
+
+
+def recompute_fee_balances(fee_ids: Iterable[int]) -> List[StudentFee]:
+    """
+    Recompute amount_paid, balance and status for the given fees with one grouped
+    SUM over their payments and one bulk_update.
+
+    Returns:
+        The updated StudentFee instances
+    """
+    fee_ids = set(fee_ids)
+    if not fee_ids:
+        return []
+
+    paid = dict(
+        Payment.objects.filter(student_fee_id__in=fee_ids).order_by()
+        .values('student_fee_id').annotate(total=Sum('amount'))
+        .values_list('student_fee_id', 'total')
+    )
+    fees = list(StudentFee.objects.filter(id__in=fee_ids).select_related('fee_structure', 'event_notice'))
+    now = timezone.now()
+    for fee in fees:
+        fee.amount_paid = paid.get(fee.id) or 0
+        fee.calculate_amounts()
+        fee.updated_at = now
+
+    StudentFee.objects.bulk_update(
+        fees, ['amount_paid', 'final_amount', 'balance', 'status', 'updated_at'], batch_size=500
+    )
+    move_fee_rollups(fees)
+    refresh_fee_aging(fee_ids)
+    return fees
+
+
+def record_payments(payments: List[Payment], batch_size: int = 500) -> Set[int]:
+    """
+    Insert payments and bring their fees, rollups and caches up to date.
+    Must be called inside a transaction; cache invalidation is deferred to commit.
+
+    Returns:
+        IDs of the students whose fees changed
+    """
+    from .cache_service import FinanceCacheService
+
+    if not payments:
+        return set()
+
+    Payment.objects.bulk_create(payments, batch_size=batch_size)
+    add_revenue_rollups(payments)
+    fees = recompute_fee_balances({payment.student_fee_id for payment in payments})
+
+    student_ids = {fee.student_id for fee in fees}
+    transaction.on_commit(lambda: FinanceCacheService.invalidate_many(student_ids))
+    logger.info(f"Recorded {len(payments)} payments across {len(fees)} fees")
+    return student_ids
@@ -1,12 +1,23 @@
 """
 Finance Cache Service
-Manages caching of external API data with staleness checking
+Tiered cache for external finance API data: an in-process LRU in front of
+Django's cache framework, with FinanceCache rows as an optional durable fallback.
 """
 
-from datetime import timedelta
-from django.utils import timezone
-from typing import Dict, Optional, Any
+import copy
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from prometheus_client import Counter, Histogram
 
 from .models import FinanceCache
 from .external_api import get_finance_api
@@ -14,65 +25,264 @@ from students.models import Student
 
 logger = logging.getLogger(__name__)
 
+DATA_TYPES = ['fees', 'payments', 'balance', 'invoices']
+
+DEFAULTS = {
+    'TTL': 3600,               # seconds an entry is served as fresh
+    'STALE_TTL': 600,          # ...then served stale while it is refreshed in the background
+    'LOCAL_TTL': 15,           # in-process copies; bounds how long other processes miss an invalidation
+    'LOCAL_MAX_ENTRIES': 5000,
+    'CACHE_ALIAS': 'default',
+    'DB_FALLBACK': True,       # also persist entries to FinanceCache rows
+    'FANOUT_WORKERS': 8,       # concurrent upstream lookups across all requests in this process
+    'FANOUT_TIMEOUT': 12,      # overall deadline for one fan-out, in seconds
+}
+
+CACHE_LOOKUPS = Counter(
+    'finance_cache_lookups_total',
+    'Finance cache lookups by data type and the tier that answered',
+    ['data_type', 'tier', 'result'],
+)
+CACHE_LATENCY = Histogram(
+    'finance_cache_lookup_seconds',
+    'Time to answer a finance cache lookup, including any upstream fetch',
+    ['data_type', 'result'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+def get_cache_config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'FINANCE_CACHE', {})}
+
+
+class LocalLRUCache:
+    """
+    Thread-safe, size-bounded LRU with per-entry expiry. Values are copied in
+    and out, so callers never share (or mutate) the cached objects.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 15):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+# Keys with a background refresh in flight, so a burst of stale reads triggers one fetch
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+_fanout_pool = None
+
+
+def get_fanout_pool() -> ThreadPoolExecutor:
+    """
+    Get the shared, bounded pool used for concurrent cache lookups
+    """
+    global _fanout_pool
+    if _fanout_pool is None:
+        with _local_cache_lock:
+            if _fanout_pool is None:
+                _fanout_pool = ThreadPoolExecutor(
+                    max_workers=get_cache_config()['FANOUT_WORKERS'],
+                    thread_name_prefix='finance-fanout',
+                )
+    return _fanout_pool
+
+
+def get_local_cache() -> LocalLRUCache:
+    """
+    Get the per-process LRU tier, configured from settings.FINANCE_CACHE
+    """
+    global _local_cache
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                config = get_cache_config()
+                _local_cache = LocalLRUCache(config['LOCAL_MAX_ENTRIES'], config['LOCAL_TTL'])
+    return _local_cache
+
 
 class FinanceCacheService:
     """
-    Service for managing finance data cache
+    Service for managing finance data cache.
+
+    Entries are {'data', 'fresh_until', 'stale_until'} with epoch timestamps and
+    are looked up local LRU -> shared cache -> FinanceCache row. Fresh entries are
+    returned directly; entries inside the stale window are returned while a
+    background refresh runs; anything older (or invalidated) is fetched
+    synchronously, and kept only as a last resort if the API is unavailable.
     """
-    
-    # Cache duration in seconds (1 hour default)
-    CACHE_DURATION = 3600
-    
+
     @classmethod
     def get_or_fetch(cls, student_id: int, data_type: str) -> Optional[Dict]:
         """
         Get data from cache or fetch from API if stale/missing
-        
+
         Args:
             student_id: Student ID
             data_type: Type of data (fees/payments/invoices/balance)
-            
+
         Returns:
             Data dictionary or None if unavailable
         """
-        try:
-            student = Student.objects.get(id=student_id)
-        except Student.DoesNotExist:
+        started = time.perf_counter()
+        entry, tier = cls._lookup(student_id, data_type)
+        now = time.time()
+
+        if entry is not None and now < entry['fresh_until']:
+            cls._record(data_type, tier, 'hit', started)
+            return entry['data']
+
+        if entry is not None and now < entry['stale_until']:
+            cls._revalidate_async(student_id, data_type)
+            cls._record(data_type, tier, 'stale', started)
+            return entry['data']
+
+        logger.info(f"Cache miss for student {student_id}, type {data_type}")
+        student = cls._get_student(student_id)
+        if student is None:
             logger.error(f"Student {student_id} not found")
             return None
-        
-        # Try to get from cache
-        try:
-            cache_entry = FinanceCache.objects.get(student=student, data_type=data_type)
-            
-            # Check if stale
-            if not cache_entry.check_if_stale():
-                logger.info(f"Cache hit for student {student_id}, type {data_type}")
-                return cache_entry.cached_data
-            
-            logger.info(f"Cache stale for student {student_id}, type {data_type}")
-            
-        except FinanceCache.DoesNotExist:
-            logger.info(f"Cache miss for student {student_id}, type {data_type}")
-            cache_entry = None
-        
+
         # Fetch from API
         api_data = cls._fetch_from_api(student, data_type)
-        
-        if api_data is None:
-            # API failed, return stale cache if available
-            if cache_entry:
-                logger.warning(f"API failed, returning stale cache for student {student_id}")
-                return cache_entry.cached_data
-            
-            # No cache and API failed, try internal database
-            return cls._fetch_from_internal(student, data_type)
-        
-        # Update cache
-        cls._update_cache(student, data_type, api_data)
-        
-        return api_data
-    
+
+        if api_data is not None:
+            cls._update_cache(student.id, data_type, api_data)
+            cls._record(data_type, 'api', 'miss', started)
+            return api_data
+
+        # API failed, return expired or invalidated data if we still hold it
+        if entry is not None:
+            logger.warning(f"API failed, returning stale cache for student {student_id}")
+            cls._record(data_type, tier, 'expired', started)
+            return entry['data']
+
+        # No cache and API failed, try internal database
+        data = cls._fetch_from_internal(student, data_type)
+        cls._record(data_type, 'internal', 'miss', started)
+        return data
+
+    @staticmethod
+    def _key(student_id: int, data_type: str) -> str:
+        return f'finance:{student_id}:{data_type}'
+
+    @staticmethod
+    def _record(data_type: str, tier: str, result: str, started: float):
+        CACHE_LOOKUPS.labels(data_type, tier, result).inc()
+        CACHE_LATENCY.labels(data_type, result).observe(time.perf_counter() - started)
+
+    @classmethod
+    def _lookup(cls, student_id: int, data_type: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Find an entry in the fastest tier that has one, back-filling the faster tiers
+
+        Returns:
+            (entry, tier name) or (None, None)
+        """
+        key = cls._key(student_id, data_type)
+        local = get_local_cache()
+        entry = local.get(key)
+        if entry is not None:
+            return entry, 'local'
+
+        config = get_cache_config()
+        shared = caches[config['CACHE_ALIAS']]
+        entry = shared.get(key)
+        if entry is not None:
+            local.set(key, entry)
+            return entry, 'shared'
+
+        if not config['DB_FALLBACK']:
+            return None, None
+
+        row = FinanceCache.objects.filter(
+            student_id=student_id, data_type=data_type
+        ).values('cached_data', 'stale_after', 'is_stale').first()
+        if row is None:
+            return None, None
+
+        # Staleness is decided here rather than written back on every read
+        expires = row['stale_after'].timestamp()
+        entry = {
+            'data': row['cached_data'],
+            'fresh_until': 0 if row['is_stale'] else expires,
+            'stale_until': 0 if row['is_stale'] else expires + config['STALE_TTL'],
+        }
+        shared.set(key, entry, cls._shared_timeout(entry))
+        local.set(key, entry)
+        return entry, 'db'
+
+    @staticmethod
+    def _shared_timeout(entry: Dict) -> int:
+        # Expired entries are kept for one more TTL as a fallback when the API is down
+        return max(int(entry['stale_until'] - time.time()), 0) + get_cache_config()['TTL']
+
+    @staticmethod
+    def _get_student(student_id: int) -> Optional[Student]:
+        return Student.objects.only('id', 'student_id').filter(id=student_id).first()
+
+    @classmethod
+    def _revalidate_async(cls, student_id: int, data_type: str):
+        key = cls._key(student_id, data_type)
+        with _revalidating_lock:
+            if key in _revalidating:
+                return
+            _revalidating.add(key)
+        threading.Thread(
+            target=cls._revalidate, args=(student_id, data_type, key),
+            name='finance-cache-revalidate', daemon=True,
+        ).start()
+
+    @classmethod
+    def _revalidate(cls, student_id: int, data_type: str, key: str):
+        try:
+            student = cls._get_student(student_id)
+            if student is not None:
+                api_data = cls._fetch_from_api(student, data_type)
+                if api_data is not None:
+                    cls._update_cache(student.id, data_type, api_data)
+        except Exception as e:
+            logger.error(f"Background refresh failed for student {student_id}, type {data_type}: {str(e)}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+            close_old_connections()
+
     @classmethod
     def _fetch_from_api(cls, student: Student, data_type: str) -> Optional[Dict]:
         """
@@ -177,67 +387,218 @@ class FinanceCacheService:
             logger.error(f"Error fetching internal data: {str(e)}")
             return None
     
+    @staticmethod
+    def _entry(data: Dict) -> Dict:
+        config = get_cache_config()
+        now = time.time()
+        return {
+            'data': data,
+            'fresh_until': now + config['TTL'],
+            'stale_until': now + config['TTL'] + config['STALE_TTL'],
+        }
+
     @classmethod
-    def _update_cache(cls, student: Student, data_type: str, data: Dict):
+    def _update_cache(cls, student_id: int, data_type: str, data: Dict):
         """
-        Update cache entry
-        
+        Write an entry to every tier
+
         Args:
-            student: Student instance
+            student_id: Student ID
             data_type: Type of data
             data: Data to cache
         """
-        stale_after = timezone.now() + timedelta(seconds=cls.CACHE_DURATION)
-        
-        FinanceCache.objects.update_or_create(
-            student=student,
-            data_type=data_type,
-            defaults={
-                'cached_data': data,
-                'stale_after': stale_after,
-                'is_stale': False
-            }
-        )
-        
-        logger.info(f"Cache updated for student {student.id}, type {data_type}")
-    
+        config = get_cache_config()
+        entry = cls._entry(data)
+        key = cls._key(student_id, data_type)
+        caches[config['CACHE_ALIAS']].set(key, entry, cls._shared_timeout(entry))
+        get_local_cache().set(key, entry)
+
+        if config['DB_FALLBACK']:
+            FinanceCache.objects.update_or_create(
+                student_id=student_id,
+                data_type=data_type,
+                defaults={
+                    'cached_data': data,
+                    'stale_after': datetime.fromtimestamp(entry['fresh_until'], tz=dt_timezone.utc),
+                    'is_stale': False
+                }
+            )
+
+        logger.info(f"Cache updated for student {student_id}, type {data_type}")
+
+    @classmethod
+    def store_many(cls, data_type: str, data_by_student: Dict[int, Dict]) -> Tuple[int, int]:
+        """
+        Write one data type for many students: a single set_many on the shared
+        cache and, with DB_FALLBACK, one SELECT plus bulk_update/bulk_create.
+
+        Args:
+            data_type: Type of data
+            data_by_student: {student_id: data}
+
+        Returns:
+            (rows created, rows updated)
+        """
+        if not data_by_student:
+            return 0, 0
+
+        config = get_cache_config()
+        entries = {
+            cls._key(student_id, data_type): cls._entry(data)
+            for student_id, data in data_by_student.items()
+        }
+        timeout = cls._shared_timeout(next(iter(entries.values())))
+        caches[config['CACHE_ALIAS']].set_many(entries, timeout)
+        local = get_local_cache()
+        for key, entry in entries.items():
+            local.set(key, entry)
+
+        if not config['DB_FALLBACK']:
+            return 0, 0
+
+        stale_after = datetime.fromtimestamp(time.time() + config['TTL'], tz=dt_timezone.utc)
+        updated_at = timezone.now()
+        existing = FinanceCache.objects.filter(data_type=data_type, student_id__in=data_by_student).only('id', 'student_id')
+        to_update = []
+        for row in existing:
+            row.cached_data = data_by_student[row.student_id]
+            row.stale_after = stale_after
+            row.is_stale = False
+            row.last_updated = updated_at
+            to_update.append(row)
+        seen = {row.student_id for row in to_update}
+        to_create = [
+            FinanceCache(student_id=student_id, data_type=data_type, cached_data=data, stale_after=stale_after)
+            for student_id, data in data_by_student.items()
+            if student_id not in seen
+        ]
+
+        with transaction.atomic():
+            FinanceCache.objects.bulk_update(
+                to_update, ['cached_data', 'stale_after', 'is_stale', 'last_updated'], batch_size=500
+            )
+            FinanceCache.objects.bulk_create(to_create, batch_size=500)
+        return len(to_create), len(to_update)
+
     @classmethod
     def invalidate_cache(cls, student_id: int, data_type: str = None):
         """
-        Mark cache as stale
-        
+        Mark cache as stale. The next read fetches synchronously; the old data is
+        only kept to answer if the API is unavailable.
+
         Args:
             student_id: Student ID
             data_type: Specific data type to invalidate, or None for all
         """
+        cls.invalidate_many([student_id], data_type)
+        logger.info(f"Cache invalidated for student {student_id}")
+
+    @classmethod
+    def invalidate_many(cls, student_ids: Iterable[int], data_type: str = None):
+        """
+        Invalidate many students at once: one get_many/set_many round trip on the
+        shared cache and a single UPDATE of the durable rows.
+
+        Args:
+            student_ids: Student IDs
+            data_type: Specific data type to invalidate, or None for all
+        """
+        student_ids = list(student_ids)
+        if not student_ids:
+            return
+
+        config = get_cache_config()
+        data_types = [data_type] if data_type else DATA_TYPES
+        keys = [cls._key(student_id, dt) for student_id in student_ids for dt in data_types]
+
+        local = get_local_cache()
+        for key in keys:
+            local.delete(key)
+
+        shared = caches[config['CACHE_ALIAS']]
+        entries = shared.get_many(keys)
+        for entry in entries.values():
+            entry['fresh_until'] = entry['stale_until'] = 0
+        if entries:
+            shared.set_many(entries, config['TTL'])
+
+        if config['DB_FALLBACK']:
+            FinanceCache.objects.filter(
+                student_id__in=student_ids, data_type__in=data_types
+            ).update(is_stale=True)
+
+    @classmethod
+    def fetch_many(cls, student_ids: Iterable[int], data_types: List[str] = None,
+                   timeout: float = None) -> Tuple[Dict[int, Dict[str, Optional[Dict]]], List[Tuple[int, str]]]:
+        """
+        Look up several students and data types concurrently with one overall deadline.
+
+        Cache hits are answered inline; only lookups that may reach the API are
+        handed to the shared pool. Lookups still running at the deadline keep
+        going in the background and fill the cache when they finish.
+
+        Args:
+            student_ids: Student IDs
+            data_types: Types to fetch (all four by default)
+            timeout: Deadline in seconds (FINANCE_CACHE['FANOUT_TIMEOUT'] by default)
+
+        Returns:
+            ({student_id: {data_type: data or None}}, [(student_id, data_type) that missed the deadline])
+        """
+        data_types = data_types or DATA_TYPES
+        timeout = get_cache_config()['FANOUT_TIMEOUT'] if timeout is None else timeout
+        results = {student_id: {} for student_id in student_ids}
+
+        futures = {}
+        now = time.time()
+        for student_id in results:
+            for data_type in data_types:
+                entry = get_local_cache().get(cls._key(student_id, data_type))
+                if entry is not None and now < entry['fresh_until']:
+                    cls._record(data_type, 'local', 'hit', time.perf_counter())
+                    results[student_id][data_type] = entry['data']
+                    continue
+                future = get_fanout_pool().submit(cls._fetch_in_worker, student_id, data_type)
+                futures[future] = (student_id, data_type)
+
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            student_id, data_type = futures[future]
+            try:
+                results[student_id][data_type] = future.result()
+            except Exception as e:
+                logger.error(f"Finance lookup failed for student {student_id}, type {data_type}: {str(e)}")
+                results[student_id][data_type] = None
+
+        pending = sorted(futures[future] for future in not_done)
+        for student_id, data_type in pending:
+            results[student_id][data_type] = None
+        if pending:
+            logger.warning(f"Finance fan-out deadline of {timeout}s missed for {len(pending)} lookups")
+        return results, pending
+
+    @classmethod
+    def _fetch_in_worker(cls, student_id: int, data_type: str) -> Optional[Dict]:
         try:
-            student = Student.objects.get(id=student_id)
-            
-            if data_type:
-                FinanceCache.objects.filter(
-                    student=student,
-                    data_type=data_type
-                ).update(is_stale=True)
-            else:
-                FinanceCache.objects.filter(student=student).update(is_stale=True)
-            
-            logger.info(f"Cache invalidated for student {student_id}")
-            
-        except Student.DoesNotExist:
-            logger.error(f"Student {student_id} not found")
-    
+            return cls.get_or_fetch(student_id, data_type)
+        finally:
+            # Pool threads outlive requests; don't let them hold connections open
+            close_old_connections()
+
     @classmethod
-    def refresh_cache(cls, student_id: int):
+    def refresh_cache(cls, student_id: int, timeout: float = None) -> List[str]:
         """
-        Force refresh all cache entries for a student
-        
+        Force refresh all cache entries for a student, fetching the four data types in parallel
+
         Args:
             student_id: Student ID
+            timeout: Overall deadline in seconds
+
+        Returns:
+            Data types that did not finish before the deadline
         """
-        data_types = ['fees', 'payments', 'balance', 'invoices']
-        
-        for data_type in data_types:
-            cls.invalidate_cache(student_id, data_type)
-            cls.get_or_fetch(student_id, data_type)
-        
+        cls.invalidate_cache(student_id)
+        _, pending = cls.fetch_many([student_id], timeout=timeout)
+
         logger.info(f"Cache refreshed for student {student_id}")
+        return [data_type for _, data_type in pending]
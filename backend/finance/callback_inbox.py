@@ -0,0 +1,276 @@
+"""
+Payment Callback Inbox
+Provider callbacks are validated and appended to the PaymentCallback table,
+which is all the endpoint does before acknowledging. Appliers
+(`manage.py apply_payment_callbacks`) claim pending rows in batches and record
+them through the statement importer's matching: one payment insert per batch,
+one balance update per fee and one cache invalidation per student.
+
+Callbacks must carry an HMAC-SHA256 signature of the raw body, keyed with
+FINANCE_CALLBACKS['SECRET']; without a secret every callback is refused.
+The idempotency key (provider + transaction reference) makes redelivered
+callbacks no-ops at insert time; references already recorded by a statement
+import or an earlier callback are marked duplicate when applied.
+"""
+
+import hashlib
+import hmac
+import uuid
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .models import Payment, PaymentCallback
+from .statement_import import REFERENCE_MAX_LENGTH, StatementImporter, normalise_line, parse_amount, parse_date
+
+logger = logging.getLogger(__name__)
+
+# Provider -> payment method its callbacks are recorded with
+PROVIDERS = {
+    'mpesa': 'mpesa',
+    'bank': 'bank',
+    'card': 'card',
+}
+
+DEFAULTS = {
+    'SECRET': '',  # HMAC-SHA256 key of X-Callback-Signature; callbacks are refused until it is set
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 1.0,  # seconds an idle applier waits before polling again
+    'CLAIM_TIMEOUT': 300,  # seconds before a batch claimed by a dead applier is retried
+}
+
+ACCOUNT_MAX_LENGTH = PaymentCallback._meta.get_field('account').max_length
+
+# Importer outcome -> callback status
+OUTCOME_STATUS = {
+    'imported': 'applied',
+    'duplicate': 'duplicate',
+    'already_recorded': 'duplicate',
+    'unknown_account': 'unmatched',
+    'no_fee': 'unmatched',
+}
+
+
+def get_callback_config() -> Dict:
+    return {**DEFAULTS, **getattr(settings, 'FINANCE_CALLBACKS', {})}
+
+
+class CallbackRejected(Exception):
+    """A callback that fails validation; nothing is stored"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CallbackImporter(StatementImporter):
+    """Statement importer that labels payments as provider callbacks"""
+
+    RECEIPT_PREFIX = 'CB'
+    NOTE = 'Payment callback'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        # A claimed batch is bounded, so its payments are kept to link them to their callbacks
+        self.payments = []
+
+    def recorded(self, payments):
+        self.payments.extend(payments)
+
+
+def sign_callback(body: bytes, secret: str = None) -> str:
+    """Hex HMAC-SHA256 of a raw callback body, as expected in X-Callback-Signature"""
+    secret = get_callback_config()['SECRET'] if secret is None else secret
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str]):
+    """
+    Raises:
+        CallbackRejected: No secret configured, or a missing or wrong signature
+    """
+    secret = get_callback_config()['SECRET']
+    if not secret:
+        raise CallbackRejected('Payment callbacks are not configured', status_code=403)
+    signature = (signature or '').strip()
+    if signature.startswith('sha256='):
+        signature = signature[len('sha256='):]
+    if not hmac.compare_digest(sign_callback(body, secret), signature.lower()):
+        raise CallbackRejected('Invalid callback signature', status_code=403)
+
+
+def accept_callback(provider: str, payload: dict, body: bytes,
+                    signature: Optional[str] = None) -> Tuple[Optional[PaymentCallback], bool]:
+    """
+    Validate a provider callback and append it to the inbox.
+
+    Args:
+        provider: One of PROVIDERS
+        payload: Callback body, e.g. an M-Pesa C2B confirmation
+            (TransID, TransAmount, BillRefNumber, TransTime, ...)
+        body: The raw request body the signature covers
+        signature: Value of the X-Callback-Signature header
+
+    Returns:
+        (callback, True) when stored, or (None, False) for a redelivery
+
+    Raises:
+        CallbackRejected: Bad signature, unknown provider, missing or over-long fields
+    """
+    verify_signature(body, signature)
+    if provider not in PROVIDERS:
+        raise CallbackRejected(f'Unknown provider: {provider}', status_code=404)
+    if not isinstance(payload, dict):
+        raise CallbackRejected('Callback body must be a JSON object')
+
+    line = normalise_line(payload)
+    reference = line.get('reference')
+    if not reference:
+        raise CallbackRejected('Missing transaction reference')
+    if len(reference) > REFERENCE_MAX_LENGTH:
+        raise CallbackRejected('Transaction reference is too long')
+    account = line.get('invoice') or line.get('account') or ''
+    if len(account) > ACCOUNT_MAX_LENGTH:
+        raise CallbackRejected('Account is too long')
+    amount = parse_amount(line.get('amount'))
+    if amount is None:
+        raise CallbackRejected('Invalid amount')
+    paid_at = parse_date(line.get('date')) if line.get('date') else timezone.now()
+    if paid_at is None:
+        raise CallbackRejected('Invalid transaction time')
+
+    try:
+        with transaction.atomic():
+            callback = PaymentCallback.objects.create(
+                provider=provider,
+                idempotency_key=f'{provider}:{reference}',
+                transaction_reference=reference,
+                account=account,
+                amount=amount,
+                paid_at=paid_at,
+                payload=payload,
+            )
+    except IntegrityError:
+        return None, False
+    return callback, True
+
+
+def claim_batch(batch_size: int = None) -> List[PaymentCallback]:
+    """
+    Claim up to batch_size pending callbacks (and any whose claim has expired)
+    with a single UPDATE, so concurrent appliers never share rows.
+    """
+    config = get_callback_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    now = timezone.now()
+    claimable = Q(status='pending') | Q(status='processing', claimed_at__lt=now - timedelta(seconds=config['CLAIM_TIMEOUT']))
+
+    claim = uuid.uuid4().hex
+    ids = PaymentCallback.objects.filter(claimable).order_by('id').values('id')[:batch_size]
+    claimed = PaymentCallback.objects.filter(claimable, id__in=Subquery(ids)).update(
+        status='processing', claim=claim, claimed_at=now, attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    return list(PaymentCallback.objects.filter(claim=claim, status='processing'))
+
+
+def apply_callbacks(callbacks: List[PaymentCallback]) -> Dict[str, int]:
+    """
+    Record a claimed batch in one transaction and mark each callback with its outcome.
+    If recording fails the whole batch is marked failed (see requeue_callbacks).
+
+    Returns:
+        {status: count} for the batch
+    """
+    if not callbacks:
+        return {}
+
+    lines = {}
+    for callback in callbacks:
+        line = normalise_line(callback.payload)
+        line.update({
+            'reference': callback.transaction_reference,
+            'amount': str(callback.amount),
+            'account': callback.account,
+            'date': callback.paid_at.isoformat(),
+            'method': PROVIDERS.get(callback.provider, ''),
+        })
+        line.pop('invoice', None)
+        lines[callback.id] = line
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            importer = CallbackImporter(
+                received_by='Payment callback',
+                chunk_size=len(callbacks),
+                accounts=[line['account'] for line in lines.values()],
+            )
+            for callback_id, line in lines.items():
+                importer.feed(callback_id, line)
+            importer.finish()
+
+            payment_ids = {payment.transaction_reference: payment.id for payment in importer.payments}
+            recorded = [c.transaction_reference for c in callbacks if importer.outcomes.get(c.id) == 'already_recorded']
+            if recorded:
+                payment_ids.update(Payment.objects.filter(
+                    transaction_reference__in=recorded
+                ).values_list('transaction_reference', 'id'))
+
+            for callback in callbacks:
+                outcome = importer.outcomes.get(callback.id, 'missing')
+                callback.status = OUTCOME_STATUS.get(outcome, 'failed')
+                callback.error = '' if callback.status in ('applied', 'duplicate') else outcome
+                callback.payment_id = payment_ids.get(callback.transaction_reference)
+                callback.processed_at = now
+                callback.claim = ''
+            PaymentCallback.objects.bulk_update(
+                callbacks, ['status', 'error', 'payment', 'processed_at', 'claim'], batch_size=500
+            )
+    except Exception as e:
+        logger.exception(f"Failed to apply {len(callbacks)} payment callbacks")
+        PaymentCallback.objects.filter(id__in=[c.id for c in callbacks]).update(
+            status='failed', error=str(e)[:255], processed_at=now, claim='',
+        )
+        return {'failed': len(callbacks)}
+
+    counts = {}
+    for callback in callbacks:
+        counts[callback.status] = counts.get(callback.status, 0) + 1
+    logger.info(f"Applied payment callback batch: {counts}")
+    return counts
+
+
+def drain_inbox(batch_size: int = None, max_batches: int = None) -> Dict[str, int]:
+    """
+    Apply batches until the inbox has nothing claimable.
+
+    Returns:
+        {status: count} across all batches, plus 'batches'
+    """
+    totals = {'batches': 0}
+    while max_batches is None or totals['batches'] < max_batches:
+        callbacks = claim_batch(batch_size)
+        if not callbacks:
+            break
+        totals['batches'] += 1
+        for key, count in apply_callbacks(callbacks).items():
+            totals[key] = totals.get(key, 0) + count
+    return totals
+
+
+def requeue_callbacks(statuses: Iterable[str] = ('failed', 'unmatched'), ids: Iterable[int] = None) -> int:
+    """
+    Put callbacks back in the inbox, e.g. unmatched ones after the student's
+    account is fixed. Returns the number requeued.
+    """
+    callbacks = PaymentCallback.objects.filter(status__in=list(statuses))
+    if ids is not None:
+        callbacks = callbacks.filter(id__in=list(ids))
+    return callbacks.update(status='pending', error='', claim='', claimed_at=None, processed_at=None)
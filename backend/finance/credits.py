@@ -0,0 +1,168 @@
+"""
+Term-End Credit Carry-Forward
+Moves overpayments on a closing term's fees onto the next term's fees in one
+transaction: a grouped query finds each student's overpayment, the next term is
+billed for them if needed, credits are allocated oldest fee first in Python and
+written with bulk_update. Credit that the next term's fees cannot absorb stays
+on Student.credit_balance and is offered again at the following term end.
+
+Every student processed gets a CreditCarryForward ledger row, unique per
+closing term, so re-running a term (e.g. after a crash) skips them.
+"""
+
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Optional
+import logging
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import AcademicTerm
+from students.models import Student
+from .aging import refresh_fee_aging
+from .billing import apply_bulk_billing, plan_bulk_billing
+from .models import CreditCarryForward, StudentFee
+from .rollups import move_fee_rollups
+
+logger = logging.getLogger(__name__)
+
+FEE_UPDATE_FIELDS = ['credit_applied', 'balance', 'status', 'updated_at']
+
+
+def next_term(term: AcademicTerm) -> Optional[AcademicTerm]:
+    return AcademicTerm.objects.filter(start_date__gt=term.start_date).order_by('start_date').first()
+
+
+def carry_forward_credits(from_term: AcademicTerm, to_term: AcademicTerm = None,
+                          bill: bool = True, dry_run: bool = False) -> Dict:
+    """
+    Carry overpayments on `from_term` fees (plus any credit already held on the
+    student) to `to_term`'s fees.
+
+    Args:
+        from_term: Term being closed
+        to_term: Term receiving the credit; defaults to the next term by start date
+        bill: Bill to_term for students with credit who have no fee for it yet
+        dry_run: Do everything, report it, then roll back
+
+    Returns:
+        Summary of the run
+
+    Raises:
+        ValueError: There is no term to carry credit to
+    """
+    to_term = to_term or next_term(from_term)
+    if to_term is None or to_term.pk == from_term.pk:
+        raise ValueError(f"No later term to carry {from_term} credit to")
+
+    run_id = uuid.uuid4().hex
+    summary = {
+        'run_id': run_id,
+        'from_term': from_term.id,
+        'to_term': to_term.id,
+        'dry_run': dry_run,
+        'already_processed': 0,
+        'students': 0,
+        'fees_billed': 0,
+        'overpayment_total': Decimal('0'),
+        'applied_total': Decimal('0'),
+        'held_total': Decimal('0'),
+    }
+
+    with transaction.atomic():
+        # Serialises concurrent runs for the same term where the database supports row locks
+        AcademicTerm.objects.select_for_update().filter(pk=from_term.pk).first()
+
+        done = CreditCarryForward.objects.filter(from_term=from_term).values('student_id')
+        summary['already_processed'] = done.count()
+
+        # Grouped overpayment per student; balances below zero are overpaid
+        overpaid = {
+            student_id: -total
+            for student_id, total in StudentFee.objects.filter(
+                fee_structure__academic_term=from_term, balance__lt=0,
+            ).exclude(student_id__in=done).order_by().values('student_id').annotate(
+                total=Sum('balance')
+            ).values_list('student_id', 'total')
+        }
+        held = dict(Student.objects.filter(credit_balance__gt=0).exclude(id__in=done).values_list('id', 'credit_balance'))
+        student_ids = set(overpaid) | set(held)
+        if not student_ids:
+            return _finish(summary)
+
+        if bill:
+            summary['fees_billed'] = apply_bulk_billing(plan_bulk_billing(to_term, student_ids=student_ids))
+
+        sources = list(StudentFee.objects.filter(
+            fee_structure__academic_term=from_term, balance__lt=0, student_id__in=overpaid,
+        ).select_related('fee_structure', 'event_notice'))
+        targets = defaultdict(list)
+        for fee in StudentFee.objects.filter(
+            fee_structure__academic_term=to_term, balance__gt=0, student_id__in=student_ids,
+        ).select_related('fee_structure', 'event_notice').order_by('created_at', 'id'):
+            targets[fee.student_id].append(fee)
+
+        now = timezone.now()
+        source_fees = defaultdict(list)
+        for fee in sources:
+            source_fees[fee.student_id].append([fee.id, str(-fee.balance)])
+            fee.credit_applied += fee.balance
+            fee.calculate_amounts()
+            fee.updated_at = now
+
+        ledger, students, changed_targets = [], [], []
+        for student_id in student_ids:
+            opening = held.get(student_id, Decimal('0'))
+            available = overpaid.get(student_id, Decimal('0')) + opening
+            applied_to = []
+            for fee in targets.get(student_id, []):
+                if available <= 0:
+                    break
+                amount = min(available, fee.balance)
+                fee.credit_applied += amount
+                fee.calculate_amounts()
+                fee.updated_at = now
+                available -= amount
+                applied_to.append([fee.id, str(amount)])
+                changed_targets.append(fee)
+
+            applied = sum((Decimal(amount) for _, amount in applied_to), Decimal('0'))
+            students.append(Student(id=student_id, credit_balance=available))
+            ledger.append(CreditCarryForward(
+                student_id=student_id, from_term=from_term, to_term=to_term,
+                overpayment=overpaid.get(student_id, Decimal('0')), opening_credit=opening,
+                applied=applied, closing_credit=available,
+                source_fees=source_fees.get(student_id, []), target_fees=applied_to, run_id=run_id,
+            ))
+            summary['overpayment_total'] += overpaid.get(student_id, Decimal('0'))
+            summary['applied_total'] += applied
+            summary['held_total'] += available
+
+        fees = sources + changed_targets
+        StudentFee.objects.bulk_update(fees, FEE_UPDATE_FIELDS, batch_size=500)
+        move_fee_rollups(fees)
+        refresh_fee_aging([fee.id for fee in fees])
+        Student.objects.bulk_update(students, ['credit_balance'], batch_size=500)
+        CreditCarryForward.objects.bulk_create(ledger, batch_size=500)
+        summary['students'] = len(ledger)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            from .cache_service import FinanceCacheService
+            transaction.on_commit(lambda: FinanceCacheService.invalidate_many(student_ids))
+
+    logger.info(
+        f"Credit carry-forward {from_term.id} -> {to_term.id}{' (dry run)' if dry_run else ''}: "
+        f"{summary['students']} students, {summary['applied_total']} applied, {summary['held_total']} held"
+    )
+    return _finish(summary)
+
+
+def _finish(summary: Dict) -> Dict:
+    for key in ('overpayment_total', 'applied_total', 'held_total'):
+        summary[key] = float(summary[key])
+    return summary
@@ -0,0 +1,144 @@
+"""
+Defaulters Listing
+Keyset pagination over fees with an outstanding balance, largest balance first,
+and a streamed CSV export. Pages seek on (balance, id) through the composite
+index instead of counting or offsetting, so every page costs the same and the
+export holds one chunk in memory at a time.
+"""
+
+import base64
+import csv
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+
+from .models import StudentFee
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+# CSV header -> StudentFee lookup
+EXPORT_COLUMNS = [
+    ('Student ID', 'student__student_id'),
+    ('First Name', 'student__first_name'),
+    ('Last Name', 'student__last_name'),
+    ('Grade', 'student__grade_level__name'),
+    ('Term', 'fee_structure__academic_term__name'),
+    ('Fee', 'fee_structure__grade_level__name'),
+    ('Event', 'event_notice__title'),
+    ('Amount Due', 'final_amount'),
+    ('Amount Paid', 'amount_paid'),
+    ('Balance', 'balance'),
+    ('Status', 'status'),
+]
+
+
+def _parse_decimal(value: Optional[str], name: str) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    # NaN and Infinity parse but cannot be compared with a balance
+    if not number.is_finite():
+        raise ValueError(f"{name} must be a number")
+    return number
+
+
+def _parse_id(value: Optional[str], name: str) -> Optional[int]:
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ID")
+
+
+def defaulters_queryset(grade: str = None, term: str = None,
+                        min_balance: str = None, max_balance: str = None) -> QuerySet:
+    """
+    Fees with an outstanding balance, filtered by the student's current grade
+    level, the fee structure's term and a balance band (inclusive). Filter values
+    are taken as given in the query string.
+
+    Raises:
+        ValueError: A filter value is malformed
+    """
+    fees = StudentFee.objects.filter(balance__gt=0)
+    grade_id = _parse_id(grade, 'grade')
+    if grade_id is not None:
+        fees = fees.filter(student__grade_level_id=grade_id)
+    term_id = _parse_id(term, 'term')
+    if term_id is not None:
+        fees = fees.filter(fee_structure__academic_term_id=term_id)
+    minimum = _parse_decimal(min_balance, 'min_balance')
+    if minimum is not None:
+        fees = fees.filter(balance__gte=minimum)
+    maximum = _parse_decimal(max_balance, 'max_balance')
+    if maximum is not None:
+        fees = fees.filter(balance__lte=maximum)
+    return fees.order_by('-balance', '-id')
+
+
+def encode_cursor(balance: Decimal, fee_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{balance}:{fee_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Decimal, int]:
+    """
+    Raises:
+        ValueError: The cursor was not produced by encode_cursor
+    """
+    try:
+        balance, fee_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        balance, fee_id = Decimal(balance), int(fee_id)
+    except (ValueError, UnicodeDecodeError, InvalidOperation):
+        raise ValueError("Invalid cursor")
+    if not balance.is_finite():
+        raise ValueError("Invalid cursor")
+    return balance, fee_id
+
+
+def defaulters_page(fees: QuerySet, cursor: str = None, page_size: int = PAGE_SIZE) -> Tuple[List[StudentFee], Optional[str]]:
+    """
+    One page of defaulters_queryset() after `cursor`.
+
+    Returns:
+        (fees on this page, cursor for the next page or None on the last page)
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    if cursor:
+        balance, fee_id = decode_cursor(cursor)
+        # (balance, id) < cursor, phrased so the planner keeps one ordered range
+        # scan of the index rather than OR-ing two lookups and sorting
+        fees = fees.filter(Q(balance__lte=balance), Q(balance__lt=balance) | Q(id__lt=fee_id))
+
+    page = list(fees.select_related(
+        'student', 'fee_structure__grade_level', 'fee_structure__academic_term__year'
+    )[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1].balance, page[-1].id)
+
+
+class _Echo:
+    """File-like object whose write() returns the line for StreamingHttpResponse"""
+
+    def write(self, value):
+        return value
+
+
+def iter_defaulters_csv(fees: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Yield the CSV export of defaulters_queryset() line by line, reading
+    `chunk_size` rows at a time as plain tuples.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    rows = fees.values_list(*[lookup for _, lookup in EXPORT_COLUMNS]).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow(row)
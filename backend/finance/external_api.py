@@ -3,37 +3,160 @@ External Finance API Service
 Handles communication with external finance system
 """
 
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List, Optional
+from urllib.parse import urlencode
 from datetime import datetime
 import logging
 
+from prometheus_client import Counter, Histogram
+
 logger = logging.getLogger(__name__)
 
+DEFAULTS = {
+    'CONNECT_TIMEOUT': 3.05,   # seconds
+    'TIMEOUT': 10,             # read timeout, seconds
+    'POOL_CONNECTIONS': 4,     # hosts kept in the pool
+    'POOL_MAXSIZE': 16,        # keep-alive connections per host; match the fan-out worker count
+    'RETRIES': 2,              # retries for idempotent (GET) calls only
+    'BACKOFF': 0.3,            # base backoff in seconds, doubled per retry
+    'BACKOFF_JITTER': 0.3,     # up to this many seconds of random jitter per retry
+    'BREAKER_THRESHOLD': 5,    # consecutive failures before the circuit opens
+    'BREAKER_RESET': 30,       # seconds to fail fast before letting a trial request through
+    'BATCH_ENDPOINTS': False,  # upstream serves students/batch/<type> (see get_students_batch)
+    'BATCH_SIZE': 100,         # student IDs per batch request
+    'MAX_PAGES': 50,           # safety limit when following batch pagination
+}
+
+API_LATENCY = Histogram(
+    'finance_api_request_seconds',
+    'External finance API latency by endpoint and outcome',
+    ['endpoint', 'method', 'outcome'],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+API_SHORT_CIRCUITED = Counter(
+    'finance_api_short_circuited_total',
+    'External finance API calls skipped because the circuit breaker was open',
+    ['endpoint'],
+)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through. After `threshold` consecutive failures it opens and
+    calls fail fast for `reset_timeout` seconds; then one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Finance API circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
 
 class ExternalFinanceAPI:
     """
     Service class for interacting with external finance API
     """
     
-    def __init__(self, api_url: str = None, api_key: str = None):
+    def __init__(self, api_url: str = None, api_key: str = None, **options):
         """
         Initialize API connection
         
         Args:
             api_url: Base URL for external API
             api_key: API authentication key
+            options: Overrides for settings.FINANCE_API (TIMEOUT, RETRIES, ...)
         """
         from django.conf import settings
         
         self.api_url = api_url or getattr(settings, 'FINANCE_API_URL', None)
         self.api_key = api_key or getattr(settings, 'FINANCE_API_KEY', None)
-        self.timeout = 10  # seconds
+        config = {**DEFAULTS, **getattr(settings, 'FINANCE_API', {}), **options}
+        self.timeout = (config['CONNECT_TIMEOUT'], config['TIMEOUT'])
+        self.batch_endpoints = config['BATCH_ENDPOINTS']
+        self.batch_size = config['BATCH_SIZE']
+        self.max_pages = config['MAX_PAGES']
+        self.breaker = CircuitBreaker(config['BREAKER_THRESHOLD'], config['BREAKER_RESET'])
+        self.session = self._build_session(config)
         
         if not self.api_url:
             logger.warning("Finance API URL not configured. Using internal data only.")
+
+    def _build_session(self, config: Dict) -> requests.Session:
+        """
+        One keep-alive connection pool shared by every call (and thread) using this client
+        """
+        # Connection failures and 429/5xx answers are retried; a read timeout is not,
+        # as the API is already slow and each retry would wait out another TIMEOUT
+        retry = Retry(
+            total=config['RETRIES'],
+            read=0,
+            backoff_factor=config['BACKOFF'],
+            backoff_jitter=config['BACKOFF_JITTER'],
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=['GET'],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config['POOL_CONNECTIONS'],
+            pool_maxsize=config['POOL_MAXSIZE'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        })
+        return session
     
-    def _make_request(self, endpoint: str, method: str = 'GET', data: Dict = None) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, method: str = 'GET', data: Dict = None,
+                      name: str = None) -> Optional[Dict]:
         """
         Make HTTP request to external API
         
@@ -41,36 +164,59 @@ class ExternalFinanceAPI:
             endpoint: API endpoint path
             method: HTTP method (GET, POST, etc.)
             data: Request payload for POST/PUT
+            name: Endpoint label for metrics (defaults to the path)
             
         Returns:
-            Response data or None if failed
+            Response data or None if failed or the circuit is open
         """
         if not self.api_url:
             return None
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        name = name or endpoint
+        if not self.breaker.allow():
+            API_SHORT_CIRCUITED.labels(name).inc()
+            logger.debug(f"Finance API circuit open, skipping {endpoint}")
+            return None
         
         url = f"{self.api_url}/{endpoint}"
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+        started = time.perf_counter()
+        outcome = 'error'
         
         try:
             if method == 'GET':
-                response = requests.get(url, headers=headers, timeout=self.timeout)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, json=data, timeout=self.timeout)
+                response = self.session.get(url, timeout=self.timeout)
             else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+                response = self.session.post(url, json=data, timeout=self.timeout)
             
+            # Client errors mean the upstream is answering; only 5xx counts against the breaker
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
             response.raise_for_status()
+            outcome = 'success'
             return response.json()
             
         except requests.exceptions.Timeout:
+            self.breaker.record_failure()
+            outcome = 'timeout'
             logger.error(f"API request timeout: {url}")
             return None
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"API request failed: {url} - {str(e)}")
+            return None
         except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
             logger.error(f"API request failed: {url} - {str(e)}")
             return None
+        except Exception:
+            # Anything else still settles the call, so a half-open trial is never left in flight
+            self.breaker.record_failure()
+            raise
+        finally:
+            API_LATENCY.labels(name, method, outcome).observe(time.perf_counter() - started)
     
     def get_student_fees(self, student_id: str) -> Optional[Dict]:
         """
@@ -82,7 +228,7 @@ class ExternalFinanceAPI:
         Returns:
             Fee data dictionary or None
         """
-        return self._make_request(f'students/{student_id}/fees')
+        return self._make_request(f'students/{student_id}/fees', name='student_fees')
     
     def get_payment_history(self, student_id: str) -> Optional[List[Dict]]:
         """
@@ -94,7 +240,7 @@ class ExternalFinanceAPI:
         Returns:
             List of payment records or None
         """
-        return self._make_request(f'students/{student_id}/payments')
+        return self._make_request(f'students/{student_id}/payments', name='student_payments')
     
     def get_outstanding_balance(self, student_id: str) -> Optional[Dict]:
         """
@@ -106,7 +252,7 @@ class ExternalFinanceAPI:
         Returns:
             Balance data or None
         """
-        return self._make_request(f'students/{student_id}/balance')
+        return self._make_request(f'students/{student_id}/balance', name='student_balance')
     
     def get_invoices(self, student_id: str) -> Optional[List[Dict]]:
         """
@@ -118,7 +264,7 @@ class ExternalFinanceAPI:
         Returns:
             List of invoices or None
         """
-        return self._make_request(f'students/{student_id}/invoices')
+        return self._make_request(f'students/{student_id}/invoices', name='student_invoices')
     
     def verify_payment(self, transaction_ref: str) -> Optional[Dict]:
         """
@@ -130,7 +276,7 @@ class ExternalFinanceAPI:
         Returns:
             Payment verification data or None
         """
-        return self._make_request(f'payments/verify/{transaction_ref}')
+        return self._make_request(f'payments/verify/{transaction_ref}', name='verify_payment')
     
     def get_fee_structure(self, grade_level: str, term: str, year: str) -> Optional[Dict]:
         """
@@ -144,11 +290,73 @@ class ExternalFinanceAPI:
         Returns:
             Fee structure data or None
         """
-        return self._make_request(f'fee-structures/{grade_level}/{term}/{year}')
+        return self._make_request(f'fee-structures/{grade_level}/{term}/{year}', name='fee_structure')
+
+    def get_students_batch(self, data_type: str, student_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Fetch one data type for many students, batch_size IDs per request and
+        following `next_page` until the upstream has returned every page.
+
+        The batch endpoint is not part of the documented upstream API, so it is
+        only called when FINANCE_API['BATCH_ENDPOINTS'] is set. It is expected to
+        answer GET students/batch/<data_type>?ids=<id>,<id>&page=<n> with
+        {"results": {student_id: data}, "next_page": <n> or null}, where data has
+        the shape of the per-student endpoint.
+
+        Args:
+            data_type: fees, payments, balance or invoices
+            student_ids: Student identifiers
+
+        Returns:
+            {student_id: data} (students the upstream has no data for are absent),
+            or None if batch endpoints are disabled or any request failed
+        """
+        if not self.batch_endpoints:
+            logger.error("Finance API batch endpoints are disabled (FINANCE_API['BATCH_ENDPOINTS'])")
+            return None
+        results = {}
+        for start in range(0, len(student_ids), self.batch_size):
+            chunk = student_ids[start:start + self.batch_size]
+            page = 1
+            while page:
+                if page > self.max_pages:
+                    logger.error(f"Batch {data_type} request exceeded {self.max_pages} pages")
+                    return None
+                query = urlencode({'ids': ','.join(chunk), 'page': page})
+                response = self._make_request(f'students/batch/{data_type}?{query}', name=f'batch_{data_type}')
+                if response is None:
+                    return None
+                results.update(response.get('results', {}))
+                page = response.get('next_page')
+        return results
+
+    def get_student_fees_batch(self, student_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Fetch fee structures for many students
+        """
+        return self.get_students_batch('fees', student_ids)
+
+    def get_payment_history_batch(self, student_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Fetch payment histories for many students
+        """
+        return self.get_students_batch('payments', student_ids)
 
+    def get_outstanding_balance_batch(self, student_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Get outstanding balances for many students
+        """
+        return self.get_students_batch('balance', student_ids)
+
+    def get_invoices_batch(self, student_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Fetch invoices for many students
+        """
+        return self.get_students_batch('invoices', student_ids)
 
-# Singleton instance
+# Singleton instance; shared so every thread reuses one connection pool and breaker
 _api_instance = None
+_api_lock = threading.Lock()
 
 def get_finance_api() -> ExternalFinanceAPI:
     """
@@ -159,5 +367,7 @@ def get_finance_api() -> ExternalFinanceAPI:
     """
     global _api_instance
     if _api_instance is None:
-        _api_instance = ExternalFinanceAPI()
+        with _api_lock:
+            if _api_instance is None:
+                _api_instance = ExternalFinanceAPI()
     return _api_instance
@@ -0,0 +1,73 @@
+"""
+Invoice Rendering
+Turns plain invoice dicts into printable HTML documents. Nothing in this module
+touches the ORM, so it can run inside worker processes.
+"""
+
+import time
+from html import escape
+
+TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Invoice {number}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td, th {{ border-bottom: 1px solid #ccc; padding: 4px 8px; text-align: left; }}
+td.amount, th.amount {{ text-align: right; }}
+tr.total td {{ font-weight: bold; }}
+</style>
+</head>
+<body>
+<h1>Invoice {number}</h1>
+<p>Issued {issue_date} &middot; Due {due_date}</p>
+<p><strong>{student_name}</strong> ({student_id})<br>{grade}<br>{term}</p>
+<table>
+<tr><th>Item</th><th class="amount">Amount (KES)</th></tr>
+{lines}
+<tr class="total"><td>Amount due</td><td class="amount">{amount}</td></tr>
+</table>
+{notes}
+</body>
+</html>
+"""
+
+
+def _money(value) -> str:
+    return f'{float(value):,.2f}'
+
+
+def render_invoice(task):
+    """
+    Render one invoice.
+
+    Args:
+        task: (invoice ID, invoice dict with number, issue_date, due_date,
+            amount and notes, student dict with name, student_id and grade,
+            term label, [(item, amount)] lines)
+
+    Returns:
+        (invoice ID, filename, document bytes, render time in ms)
+    """
+    started = time.perf_counter()
+    invoice_pk, invoice, student, term, lines = task
+
+    document = TEMPLATE.format(
+        number=escape(invoice['number']),
+        issue_date=invoice['issue_date'],
+        due_date=invoice['due_date'],
+        student_name=escape(student['name']),
+        student_id=escape(student['student_id']),
+        grade=escape(student['grade']),
+        term=escape(term),
+        lines='\n'.join(
+            f'<tr><td>{escape(item)}</td><td class="amount">{_money(amount)}</td></tr>'
+            for item, amount in lines
+        ),
+        amount=_money(invoice['amount']),
+        notes=f"<p>{escape(invoice['notes'])}</p>" if invoice['notes'] else '',
+    )
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return invoice_pk, f"{invoice['number']}.html", document.encode('utf-8'), elapsed_ms
@@ -0,0 +1,321 @@
+"""
+Bulk Invoicing
+Issues invoices for every outstanding fee in a term in one job. Invoice numbers
+come from a per-term InvoiceSequence row: a batch reserves its whole block with
+a single UPDATE ... SET next_number = next_number + n inside the transaction
+that inserts the invoices, so concurrent issuers queue on the row instead of
+colliding, and a batch that rolls back never consumed its numbers (numbering
+stays gap-free per term).
+
+Invoice rows are built in memory and written with bulk_create in chunks; their
+documents are rendered afterwards by `manage.py render_invoices`, across a
+process pool, so issuing thousands of invoices never waits on rendering.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+import logging
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.background import launch_command
+from core.models import AcademicTerm
+from .aging import refresh_fee_aging
+from .invoice_rendering import render_invoice
+from .models import Invoice, InvoiceBatch, InvoiceSequence, StudentFee
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DUE_DAYS = 14
+CHUNK_SIZE = 500
+
+# Invoices in these states stop a fee from being invoiced again
+OPEN_STATUSES = ['draft', 'sent', 'paid']
+
+# FeeStructure component -> invoice line label
+FEE_COMPONENTS = [
+    ('tuition_amount', 'Tuition'),
+    ('books_amount', 'Books'),
+    ('activities_amount', 'Activities'),
+    ('transport_amount', 'Transport'),
+    ('boarding_amount', 'Boarding'),
+    ('other_amount', 'Other'),
+]
+
+
+def term_prefix(term: AcademicTerm) -> str:
+    """
+    Invoice number prefix for a term, e.g. INV-2025-TERM1-7. The names are
+    truncated, so the term ID keeps prefixes (and numbers) unique per term.
+    """
+    def part(value):
+        return re.sub(r'[^A-Z0-9]+', '', value.upper())[:12]
+    return f'INV-{part(term.year.name)}-{part(term.name)}-{term.pk}'
+
+
+def format_invoice_number(prefix: str, number: int) -> str:
+    return f'{prefix}-{number:06d}'
+
+
+def _sequence(term: AcademicTerm) -> InvoiceSequence:
+    try:
+        with transaction.atomic():
+            sequence, _ = InvoiceSequence.objects.get_or_create(
+                academic_term=term, defaults={'prefix': term_prefix(term)}
+            )
+    except IntegrityError:
+        # Another issuer created it first
+        sequence = InvoiceSequence.objects.get(academic_term=term)
+    return sequence
+
+
+def allocate_invoice_numbers(term: AcademicTerm, count: int) -> Tuple[str, int]:
+    """
+    Reserve `count` consecutive invoice numbers for `term`.
+
+    Must run inside the transaction that uses the numbers: the UPDATE holds the
+    sequence row until it commits, and rolling back returns the block.
+
+    Returns:
+        (prefix, first number of the block)
+
+    Raises:
+        ValueError: count is not positive
+    """
+    if count <= 0:
+        raise ValueError('count must be positive')
+    sequence = _sequence(term)
+    InvoiceSequence.objects.filter(pk=sequence.pk).update(
+        next_number=F('next_number') + count, updated_at=timezone.now()
+    )
+    sequence.refresh_from_db(fields=['next_number'])
+    return sequence.prefix, sequence.next_number - count
+
+
+def next_invoice_number(term: AcademicTerm) -> str:
+    """Reserve a single number, e.g. for an invoice generated on its own"""
+    prefix, number = allocate_invoice_numbers(term, 1)
+    return format_invoice_number(prefix, number)
+
+
+def invoiceable_fees(term: AcademicTerm, grade_ids: Iterable[int] = None):
+    """Fees of `term` with a balance and no open invoice, in issue order"""
+    fees = StudentFee.objects.filter(
+        fee_structure__academic_term=term, balance__gt=0,
+    ).exclude(invoices__status__in=OPEN_STATUSES)
+    if grade_ids:
+        fees = fees.filter(fee_structure__grade_level_id__in=list(grade_ids))
+    return fees.order_by('fee_structure__grade_level__order', 'student__last_name', 'student__first_name', 'id')
+
+
+def create_term_invoices(term: AcademicTerm, issue_date: date = None, due_date: date = None,
+                         grade_ids: Iterable[int] = None, created_by=None, notes: str = '',
+                         chunk_size: int = CHUNK_SIZE) -> Optional[InvoiceBatch]:
+    """
+    Invoice every fee of `term` that has a balance and no open invoice, for
+    the balance, numbered consecutively from the term's sequence.
+
+    Args:
+        term: Term to invoice
+        issue_date: Defaults to today
+        due_date: Defaults to DEFAULT_DUE_DAYS after issue_date
+        grade_ids: Limit to these grade levels' fee structures
+        created_by: User issuing the batch
+        notes: Printed on every invoice
+        chunk_size: Rows per INSERT
+
+    Returns:
+        The batch (status pending, documents not yet rendered), or None when
+        there is nothing to invoice
+    """
+    issue_date = issue_date or timezone.localdate()
+    due_date = due_date or issue_date + timedelta(days=DEFAULT_DUE_DAYS)
+    if due_date < issue_date:
+        raise ValueError('due_date is before issue_date')
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        fees = list(invoiceable_fees(term, grade_ids).values_list('id', 'balance'))
+        if not fees:
+            return None
+
+        prefix, first = allocate_invoice_numbers(term, len(fees))
+        batch = InvoiceBatch.objects.create(
+            academic_term=term,
+            first_number=format_invoice_number(prefix, first),
+            last_number=format_invoice_number(prefix, first + len(fees) - 1),
+            invoice_count=len(fees),
+            created_by=created_by,
+        )
+        now = timezone.now()
+        invoices = [
+            Invoice(
+                student_fee_id=fee_id,
+                invoice_number=format_invoice_number(prefix, first + offset),
+                issue_date=issue_date,
+                due_date=due_date,
+                amount=balance,
+                status='draft',
+                notes=notes,
+                batch=batch,
+                created_at=now,
+                updated_at=now,
+            )
+            for offset, (fee_id, balance) in enumerate(fees)
+        ]
+        for start in range(0, len(invoices), chunk_size):
+            Invoice.objects.bulk_create(invoices[start:start + chunk_size])
+        # Invoice due dates drive fee aging
+        refresh_fee_aging([fee_id for fee_id, _ in fees])
+
+    logger.info(
+        f"Invoice batch {batch.id}: {batch.invoice_count} invoices {batch.first_number}..{batch.last_number} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return batch
+
+
+def invoice_lines(fee: StudentFee) -> List[Tuple[str, float]]:
+    """(item, amount) lines explaining a fee's balance"""
+    if fee.custom_amount:
+        lines = [('Fees (adjusted)', fee.custom_amount)]
+    elif fee.event_notice_id:
+        lines = [(fee.event_notice.title, fee.event_notice.cost)]
+    elif fee.fee_structure_id:
+        lines = [
+            (label, getattr(fee.fee_structure, field))
+            for field, label in FEE_COMPONENTS if getattr(fee.fee_structure, field)
+        ]
+    else:
+        lines = []
+    if fee.discount_amount:
+        lines.append((f"Discount{': ' + fee.discount_reason if fee.discount_reason else ''}", -fee.discount_amount))
+    if fee.amount_paid:
+        lines.append(('Paid', -fee.amount_paid))
+    if fee.credit_applied:
+        lines.append(('Credit brought forward' if fee.credit_applied > 0 else 'Credit carried forward',
+                      -fee.credit_applied))
+    return [(item, float(amount)) for item, amount in lines]
+
+
+class InvoiceRenderer:
+    """
+    Renders the documents of a batch's invoices (those without one yet, so a
+    failed run can simply be repeated) across a process pool and attaches
+    them to the invoices in bulk.
+    """
+
+    # Persist progress every N invoices rather than on every document
+    PROGRESS_EVERY = 100
+
+    def __init__(self, batch: InvoiceBatch, workers: int = None):
+        self.batch = batch
+        self.workers = workers or os.cpu_count() or 1
+        self.field = Invoice._meta.get_field('pdf_file')
+
+    def load(self):
+        """Plain render tasks for the batch's unrendered invoices, in one query"""
+        invoices = Invoice.objects.filter(batch=self.batch, pdf_file__in=['', None]).select_related(
+            'student_fee__student__grade_level',
+            'student_fee__fee_structure__academic_term__year',
+            'student_fee__event_notice',
+        ).order_by('invoice_number')
+
+        tasks = []
+        for invoice in invoices:
+            fee = invoice.student_fee
+            student = fee.student
+            tasks.append((
+                invoice.id,
+                {
+                    'number': invoice.invoice_number,
+                    'issue_date': invoice.issue_date.isoformat(),
+                    'due_date': invoice.due_date.isoformat(),
+                    'amount': float(invoice.amount),
+                    'notes': invoice.notes,
+                },
+                {
+                    'name': student.get_full_name() or student.username,
+                    'student_id': student.student_id or '',
+                    'grade': student.grade_level.name if student.grade_level_id else '',
+                },
+                str(fee.fee_structure.academic_term) if fee.fee_structure_id else '',
+                invoice_lines(fee),
+            ))
+        return tasks
+
+    def _results(self, tasks):
+        if self.workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield render_invoice(task)
+            return
+
+        # Workers never touch the database; don't hand them our open connections
+        connections.close_all()
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(render_invoice, tasks, chunksize=chunksize)
+
+    def run(self) -> InvoiceBatch:
+        """Render the batch to completion and return it"""
+        batch = self.batch
+        batch.status = 'rendering'
+        batch.error = ''
+        batch.save(update_fields=['status', 'error'])
+
+        started = time.perf_counter()
+        try:
+            tasks = self.load()
+            self._write(self._results(tasks))
+            batch.status = 'completed'
+        except Exception as e:
+            logger.exception(f"Invoice batch {batch.id} rendering failed")
+            batch.status = 'failed'
+            batch.error = str(e)
+
+        batch.rendered_count = Invoice.objects.filter(batch=batch).exclude(pdf_file__in=['', None]).count()
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=['status', 'error', 'rendered_count', 'finished_at'])
+        logger.info(
+            f"Invoice batch {batch.id} {batch.status}: {batch.rendered_count}/{batch.invoice_count} "
+            f"documents in {time.perf_counter() - started:.2f}s"
+        )
+        return batch
+
+    def _write(self, results):
+        pending = []
+        for invoice_pk, filename, content, elapsed_ms in results:
+            name = self.field.storage.save(self.field.generate_filename(None, filename), ContentFile(content))
+            pending.append(Invoice(id=invoice_pk, pdf_file=name))
+            if len(pending) >= self.PROGRESS_EVERY:
+                self._flush(pending)
+                pending = []
+        self._flush(pending)
+
+    def _flush(self, invoices):
+        if not invoices:
+            return
+        Invoice.objects.bulk_update(invoices, ['pdf_file'])
+        InvoiceBatch.objects.filter(pk=self.batch.pk).update(rendered_count=F('rendered_count') + len(invoices))
+
+
+def render_invoice_batch(batch_id: int, workers: int = None) -> InvoiceBatch:
+    """
+    Helper function to render a batch's invoice documents
+    """
+    return InvoiceRenderer(InvoiceBatch.objects.get(id=batch_id), workers=workers).run()
+
+
+def launch_invoice_rendering(batch: InvoiceBatch):
+    """
+    Render a batch in a separate management command process so web workers
+    are never tied up rendering documents.
+    """
+    launch_command('render_invoices', '--batch', str(batch.id))
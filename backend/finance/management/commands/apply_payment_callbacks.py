@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from finance.callback_inbox import drain_inbox, get_callback_config
+
+
+class Command(BaseCommand):
+    help = 'Applies pending payment callbacks from the inbox in batches (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the inbox once and exit')
+        parser.add_argument('--batch-size', type=int, help='Callbacks per transaction')
+        parser.add_argument('--interval', type=float, help='Seconds to wait when the inbox is empty')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_callback_config()['POLL_INTERVAL']
+        try:
+            while True:
+                close_old_connections()
+                totals = drain_inbox(options['batch_size'])
+                batches = totals.pop('batches')
+                if batches or options['once']:
+                    summary = ', '.join(f'{count} {status}' for status, count in sorted(totals.items())) or 'nothing pending'
+                    self.stdout.write(self.style.SUCCESS(f'{batches} batches: {summary}'))
+                if options['once']:
+                    return
+                if not batches:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
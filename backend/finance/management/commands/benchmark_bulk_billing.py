@@ -0,0 +1,79 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from cbc.models import GradeLevel
+from core.models import AcademicTerm, AcademicYear
+from finance.billing import apply_bulk_billing, plan_bulk_billing
+from finance.models import FeeStructure, StudentFee
+from students.models import Student
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures bulk billing queries and time on synthetic students (all changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--grades', type=int, default=8)
+        parser.add_argument('--billed', type=float, default=0.1, help='Fraction of students already billed')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        year = AcademicYear.objects.create(name='Benchmark', start_date=date(2099, 1, 1), end_date=date(2099, 12, 31))
+        term = AcademicTerm.objects.create(year=year, name='Term 1', start_date=date(2099, 1, 1), end_date=date(2099, 4, 1))
+
+        base_order = 1000
+        grades = [
+            GradeLevel.objects.create(name=f'Bench {i}', curriculum_type='CBC', order=base_order + i)
+            for i in range(options['grades'])
+        ]
+        structures = [
+            FeeStructure.objects.create(grade_level=grade, academic_term=term, tuition_amount=15000, books_amount=2500)
+            for grade in grades
+        ]
+        Student.objects.bulk_create([
+            Student(email=f'bench{i}@example.com', username=f'bench{i}', student_id=f'BENCH{i:06}', grade_level=grades[i % len(grades)])
+            for i in range(options['students'])
+        ], batch_size=500)
+        students = list(Student.objects.filter(student_id__startswith='BENCH').values_list('id', 'grade_level_id'))
+
+        already = int(len(students) * options['billed'])
+        structure_by_grade = {s.grade_level_id: s for s in structures}
+        existing = []
+        for student_id, grade_id in students[:already]:
+            fee = StudentFee(student_id=student_id, fee_structure=structure_by_grade[grade_id])
+            fee.calculate_amounts()
+            existing.append(fee)
+        StudentFee.objects.bulk_create(existing, batch_size=500)
+
+        grade_ids = [grade.id for grade in grades]
+        with CaptureQueriesContext(connection) as plan_queries:
+            started = time.perf_counter()
+            plan = plan_bulk_billing(term, grade_ids)
+            plan_ms = (time.perf_counter() - started) * 1000
+
+        with CaptureQueriesContext(connection) as apply_queries:
+            started = time.perf_counter()
+            created = apply_bulk_billing(plan)
+            apply_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(
+            f'{len(students)} students, {len(grades)} grades, {already} already billed\n'
+            f'plan:  {len(plan_queries)} queries, {plan_ms:.1f}ms\n'
+            f'apply: {len(apply_queries)} queries, {apply_ms:.1f}ms, {created} fees created '
+            f'(KES {plan.total_amount:,.2f})'
+        )
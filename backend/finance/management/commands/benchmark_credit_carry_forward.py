@@ -0,0 +1,83 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from cbc.models import GradeLevel
+from core.models import AcademicTerm, AcademicYear
+from finance.credits import carry_forward_credits
+from finance.models import FeeStructure, StudentFee
+from finance.rollups import rebuild_fee_rollups
+from students.models import Student
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures term-end credit carry-forward on synthetic students (all changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--grades', type=int, default=8)
+        parser.add_argument('--overpaid', type=float, default=0.3, help='Fraction of students who overpaid')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        year = AcademicYear.objects.create(name='Benchmark', start_date=date(2099, 1, 1), end_date=date(2099, 12, 31))
+        term1 = AcademicTerm.objects.create(year=year, name='Term 1', start_date=date(2099, 1, 1), end_date=date(2099, 4, 1))
+        term2 = AcademicTerm.objects.create(year=year, name='Term 2', start_date=date(2099, 5, 1), end_date=date(2099, 8, 1))
+
+        grades = [
+            GradeLevel.objects.create(name=f'Bench {i}', curriculum_type='CBC', order=1000 + i)
+            for i in range(options['grades'])
+        ]
+        structures = {
+            term.id: {
+                grade.id: FeeStructure.objects.create(grade_level=grade, academic_term=term, tuition_amount=15000)
+                for grade in grades
+            }
+            for term in (term1, term2)
+        }
+        Student.objects.bulk_create([
+            Student(email=f'bench{i}@example.com', username=f'bench{i}', student_id=f'BENCH{i:06}', grade_level=grades[i % len(grades)])
+            for i in range(options['students'])
+        ], batch_size=500)
+        students = list(Student.objects.filter(student_id__startswith='BENCH').values_list('id', 'grade_level_id'))
+
+        overpaid = int(len(students) * options['overpaid'])
+        fees = []
+        for index, (student_id, grade_id) in enumerate(students):
+            fee = StudentFee(student_id=student_id, fee_structure=structures[term1.id][grade_id])
+            # Overpayers paid 500-2500 too much; half of everyone else is already billed for term 2
+            fee.amount_paid = fee.fee_structure.total_amount + (500 + index % 5 * 500 if index < overpaid else 0)
+            fee.calculate_amounts()
+            fees.append(fee)
+            if index % 2:
+                fee = StudentFee(student_id=student_id, fee_structure=structures[term2.id][grade_id])
+                fee.calculate_amounts()
+                fees.append(fee)
+        StudentFee.objects.bulk_create(fees, batch_size=500)
+        rebuild_fee_rollups()
+
+        for label in ('first run', 're-run'):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                summary = carry_forward_credits(term1, term2)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f"{label}: {len(queries)} queries, {elapsed_ms:.1f}ms, {summary['students']} students, "
+                f"{summary['fees_billed']} fees billed, KES {summary['applied_total']:,.2f} applied, "
+                f"{summary['already_processed']} already processed"
+            )
+        self.stdout.write(f'{len(students)} students, {overpaid} overpaid')
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import AcademicTerm
+from finance.credits import carry_forward_credits
+
+
+class Command(BaseCommand):
+    help = "Carries overpayments on a closing term's fees forward to the next term's fees (safe to re-run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', type=int, help='ID of the term being closed')
+        parser.add_argument('--to-term', type=int, help='ID of the term receiving the credit (default: next term)')
+        parser.add_argument('--no-bill', action='store_true',
+                            help='Do not bill the next term for students with credit but no fee yet')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would happen and roll back')
+
+    def handle(self, *args, **options):
+        try:
+            from_term = AcademicTerm.objects.get(pk=options['term'])
+            to_term = AcademicTerm.objects.get(pk=options['to_term']) if options['to_term'] else None
+            summary = carry_forward_credits(
+                from_term, to_term, bill=not options['no_bill'], dry_run=options['dry_run']
+            )
+        except AcademicTerm.DoesNotExist:
+            raise CommandError('Term not found')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would carry' if options['dry_run'] else 'Carried'} KES {summary['applied_total']:,.2f} forward "
+            f"for {summary['students']} students; KES {summary['held_total']:,.2f} held as credit"
+        ))
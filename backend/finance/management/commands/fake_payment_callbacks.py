@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.callback_inbox import get_callback_config
+from finance.testing import FakePaymentProvider
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Generates M-Pesa C2B callbacks for existing students and posts them to a callback endpoint or records them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='New callbacks to generate')
+        parser.add_argument('--url', help='Endpoint, e.g. http://127.0.0.1:8000/api/finance/callbacks/mpesa/')
+        parser.add_argument('--output', help='Also write the callbacks to this JSONL file for replay_payment_callbacks')
+        parser.add_argument('--students', type=int, default=500, help='Students to spread payments across')
+        parser.add_argument('--unknown-rate', type=float, default=0.0, help='Fraction paid to accounts that do not exist')
+        parser.add_argument('--redelivery-rate', type=float, default=0.05, help='Fraction delivered twice')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--secret', help='Key to sign the callbacks with (default: FINANCE_CALLBACKS SECRET)')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        if not options['url'] and not options['output']:
+            raise CommandError('Give --url to post the callbacks and/or --output to record them')
+
+        accounts = list(Student.objects.filter(is_superuser=False).exclude(student_id__isnull=True)
+                        .order_by('?').values_list('student_id', flat=True)[:options['students']])
+        unknown = int(len(accounts) * options['unknown_rate'])
+        accounts += [f'UNKNOWN{i:05}' for i in range(unknown)]
+        if not accounts:
+            raise CommandError('No students to pay for')
+
+        provider = FakePaymentProvider(accounts, redelivery_rate=options['redelivery_rate'], seed=options['seed'])
+        payloads = list(provider.callbacks(options['count']))
+
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                for payload in payloads:
+                    out.write(json.dumps(payload) + '\n')
+            self.stdout.write(f"Wrote {len(payloads)} callbacks to {options['output']}")
+
+        if options['url']:
+            secret = options['secret'] or get_callback_config()['SECRET']
+            result = provider.post(options['url'], payloads, options['concurrency'], secret)
+            self.stdout.write(json.dumps(result, indent=2))
+            self.stdout.write(self.style.SUCCESS(
+                f"Posted {result['sent']} callbacks in {result['seconds']}s "
+                f"({result['sent'] / max(result['seconds'], 0.001):.0f}/s), {result['errors']} errors"
+            ))
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.models import Payment
+from finance.statement_import import import_statement
+
+
+class Command(BaseCommand):
+    help = 'Imports an M-Pesa or bank payment statement (CSV or JSONL) and prints a reconciliation report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--method', choices=[m for m, _ in Payment.PAYMENT_METHODS], default='mpesa',
+                            help='Payment method for lines that do not name one')
+        parser.add_argument('--received-by', default='Statement import')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report without writing')
+        parser.add_argument('--unmatched-csv', help='Write unmatched and invalid lines to this CSV file')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_statement(
+                    stream, fmt,
+                    default_method=options['method'],
+                    received_by=options['received_by'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not import statement: {e}')
+
+        if options['unmatched_csv']:
+            with open(options['unmatched_csv'], 'w', newline='') as out:
+                writer = csv.DictWriter(out, fieldnames=['line', 'reference', 'account', 'amount', 'reason'])
+                writer.writeheader()
+                writer.writerows(report['unmatched_lines'])
+
+        summary = {key: value for key, value in report.items() if key != 'unmatched_lines'}
+        self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would import' if options['dry_run'] else 'Imported'} {report['imported']} of {report['lines']} lines "
+            f"(KES {report['imported_amount']:,.2f}); {report['unmatched'] + report['invalid']} need review"
+        ))
@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import AcademicTerm
+from finance.invoicing import InvoiceRenderer, create_term_invoices
+
+
+class Command(BaseCommand):
+    help = 'Issues invoices for every outstanding, uninvoiced fee in a term and renders them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', type=int, help='AcademicTerm ID to invoice')
+        parser.add_argument('--grade', type=int, action='append', dest='grade_ids',
+                            help='Only this grade level (repeatable)')
+        parser.add_argument('--issue-date', type=date.fromisoformat, help='YYYY-MM-DD (default: today)')
+        parser.add_argument('--due-date', type=date.fromisoformat, help='YYYY-MM-DD (default: two weeks after issue)')
+        parser.add_argument('--no-render', action='store_true', help='Only create the invoices')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        try:
+            term = AcademicTerm.objects.get(pk=options['term'])
+            batch = create_term_invoices(
+                term, options['issue_date'], options['due_date'], grade_ids=options['grade_ids']
+            )
+        except AcademicTerm.DoesNotExist:
+            raise CommandError('Term not found')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if batch is None:
+            self.stdout.write('Nothing to invoice')
+            return
+        self.stdout.write(f'Issued {batch.invoice_count} invoices {batch.first_number}..{batch.last_number} (batch {batch.id})')
+
+        if not options['no_render']:
+            batch = InvoiceRenderer(batch, workers=options['workers']).run()
+            if batch.status != 'completed':
+                raise CommandError(f'Rendering invoice batch {batch.id} failed: {batch.error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Invoice batch {batch.id}: {batch.rendered_count}/{batch.invoice_count} rendered'
+        ))
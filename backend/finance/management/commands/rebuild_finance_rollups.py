@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from finance.rollups import rebuild_fee_rollups, rebuild_revenue_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the fee (term x grade) and revenue (day x method) rollup tables from source rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=['fees', 'revenue'], help='Rebuild just one of the rollups')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['only'] != 'revenue':
+            rows = rebuild_fee_rollups()
+            self.stdout.write(f'Fee rollups: {rows} rows')
+        if options['only'] != 'fees':
+            rows = rebuild_revenue_rollups()
+            self.stdout.write(f'Revenue rollups: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt finance rollups in {time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,27 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.aging import refresh_fee_aging
+
+
+class Command(BaseCommand):
+    help = 'Re-ages every outstanding fee into the 30/60/90-day snapshot and its grade x term rollups (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Age balances as of this date (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = date.fromisoformat(options['as_of'])
+            except ValueError:
+                raise CommandError('--as-of must be YYYY-MM-DD')
+
+        started = time.perf_counter()
+        rows = refresh_fee_aging(as_of=as_of)
+        self.stdout.write(self.style.SUCCESS(
+            f'Aged {rows} outstanding fees in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.invoicing import InvoiceRenderer
+from finance.models import InvoiceBatch
+
+
+class Command(BaseCommand):
+    help = "Renders the documents of an invoice batch's invoices (only those not rendered yet)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, required=True, help='InvoiceBatch ID to render')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        try:
+            batch = InvoiceBatch.objects.get(id=options['batch'])
+        except InvoiceBatch.DoesNotExist:
+            raise CommandError(f"Invoice batch {options['batch']} does not exist")
+
+        batch = InvoiceRenderer(batch, workers=options['workers']).run()
+
+        if batch.status != 'completed':
+            raise CommandError(f'Invoice batch {batch.id} failed: {batch.error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {batch.rendered_count}/{batch.invoice_count} invoices '
+            f'({batch.first_number}..{batch.last_number})'
+        ))
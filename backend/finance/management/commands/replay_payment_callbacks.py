@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.callback_inbox import get_callback_config, requeue_callbacks
+from finance.models import PaymentCallback
+from finance.testing import FakePaymentProvider
+
+
+class Command(BaseCommand):
+    help = ('Replays payment callbacks: requeues inbox rows for the applier, exports them to JSONL, '
+            'or posts a recorded JSONL file to a callback endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='+', default=['failed', 'unmatched'],
+                            choices=[s for s, _ in PaymentCallback.STATUS_CHOICES], help='Inbox rows to replay')
+        parser.add_argument('--ids', nargs='+', type=int, help='Only these inbox rows')
+        parser.add_argument('--export', help='Write the selected rows\' payloads to this JSONL file instead of requeueing')
+        parser.add_argument('--file', help='Recorded callbacks (JSONL) to post to --url')
+        parser.add_argument('--url', help='Callback endpoint to post --file to')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--secret', help='Key to sign the callbacks with (default: FINANCE_CALLBACKS SECRET)')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            return self.post_file(options)
+
+        if options['export']:
+            callbacks = PaymentCallback.objects.filter(status__in=options['status'])
+            if options['ids']:
+                callbacks = callbacks.filter(id__in=options['ids'])
+            written = 0
+            with open(options['export'], 'w') as out:
+                for payload in callbacks.values_list('payload', flat=True).iterator(chunk_size=1000):
+                    out.write(json.dumps(payload) + '\n')
+                    written += 1
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} callbacks to {options['export']}"))
+            return
+
+        requeued = requeue_callbacks(options['status'], options['ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Requeued {requeued} callbacks; apply_payment_callbacks will pick them up'
+        ))
+
+    def post_file(self, options):
+        if not options['url']:
+            raise CommandError('--file needs --url')
+        try:
+            with open(options['file']) as stream:
+                payloads = [json.loads(line) for line in stream if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read callbacks: {e}')
+
+        secret = options['secret'] or get_callback_config()['SECRET']
+        result = FakePaymentProvider.post(options['url'], payloads, options['concurrency'], secret)
+        self.stdout.write(json.dumps(result, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {result['sent']} callbacks in {result['seconds']}s, {result['errors']} errors"
+        ))
@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.cache_service import DATA_TYPES, FinanceCacheService
+from finance.external_api import get_finance_api
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the finance cache for the whole school using the upstream batch endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', choices=DATA_TYPES, default=DATA_TYPES,
+                            help='Data types to sync (default: all)')
+        parser.add_argument('--grade-level', type=int, help='Only sync students in this GradeLevel ID')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Student IDs per upstream request (default: FINANCE_API BATCH_SIZE)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent upstream requests')
+
+    def handle(self, *args, **options):
+        api = get_finance_api()
+        if not api.api_url:
+            raise CommandError('FINANCE_API_URL is not configured')
+        if not api.batch_endpoints:
+            raise CommandError("The upstream batch endpoints are disabled; set FINANCE_API['BATCH_ENDPOINTS']")
+
+        students = Student.objects.filter(is_superuser=False)
+        if options['grade_level']:
+            students = students.filter(grade_level_id=options['grade_level'])
+        pk_by_ref = {ref: pk for pk, ref in students.values_list('id', 'student_id')}
+        refs = sorted(pk_by_ref)
+
+        chunk_size = options['chunk_size'] or api.batch_size
+        tasks = [
+            (data_type, refs[start:start + chunk_size])
+            for data_type in options['types']
+            for start in range(0, len(refs), chunk_size)
+        ]
+
+        started = time.perf_counter()
+        created = updated = missing = failed = 0
+        # Workers only talk HTTP; every database write happens on this thread
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(api.get_students_batch, data_type, chunk): (data_type, chunk)
+                       for data_type, chunk in tasks}
+            for future in as_completed(futures):
+                data_type, chunk = futures[future]
+                results = future.result()
+                if results is None:
+                    failed += len(chunk)
+                    self.stderr.write(f'Failed to fetch {data_type} for {len(chunk)} students')
+                    continue
+
+                data_by_student = {pk_by_ref[ref]: data for ref, data in results.items() if ref in pk_by_ref}
+                missing += len(chunk) - len(data_by_student)
+                chunk_created, chunk_updated = FinanceCacheService.store_many(data_type, data_by_student)
+                created += chunk_created
+                updated += chunk_updated
+
+        elapsed = time.perf_counter() - started
+        summary = (
+            f'Synced {len(refs)} students x {len(options["types"])} types in {len(tasks)} batches '
+            f'in {elapsed:.2f}s: {created} created, {updated} updated, '
+            f'{missing} without upstream data, {failed} failed'
+        )
+        if failed:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
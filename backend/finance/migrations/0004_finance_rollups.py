@@ -0,0 +1,73 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    StudentFee = apps.get_model('finance', 'StudentFee')
+    Payment = apps.get_model('finance', 'Payment')
+    FeeRollup = apps.get_model('finance', 'FeeRollup')
+    RevenueRollup = apps.get_model('finance', 'RevenueRollup')
+
+    FeeRollup.objects.bulk_create([
+        FeeRollup(**row)
+        for row in StudentFee.objects.order_by().values('fee_structure_id').annotate(
+            fee_count=Count('id'),
+            defaulters_count=Count('id', filter=Q(balance__gt=0)),
+            total_fees=Sum('final_amount'),
+            total_paid=Sum('amount_paid'),
+            total_balance=Sum('balance'),
+        )
+    ])
+    RevenueRollup.objects.bulk_create([
+        RevenueRollup(date=row['day'], payment_method=row['payment_method'],
+                      payment_count=row['payment_count'], total_amount=row['total_amount'])
+        for row in Payment.objects.annotate(day=TruncDate('payment_date')).order_by().values(
+            'day', 'payment_method'
+        ).annotate(payment_count=Count('id'), total_amount=Sum('amount'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_alter_studentfee_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('mpesa', 'M-Pesa'), ('bank', 'Bank Transfer'), ('cash', 'Cash'), ('card', 'Card'), ('cheque', 'Cheque')], max_length=10)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('date', 'payment_method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fee_count', models.IntegerField(default=0)),
+                ('defaulters_count', models.IntegerField(default=0)),
+                ('total_fees', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('fee_structure', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='finance.feestructure')),
+            ],
+            options={
+                'unique_together': {('fee_structure',)},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
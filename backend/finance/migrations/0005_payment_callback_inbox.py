@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_finance_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('idempotency_key', models.CharField(help_text='provider:transaction reference', max_length=150, unique=True)),
+                ('transaction_reference', models.CharField(max_length=100)),
+                ('account', models.CharField(blank=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_at', models.DateTimeField()),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('applied', 'Applied'), ('duplicate', 'Duplicate'), ('unmatched', 'Unmatched'), ('failed', 'Failed')], default='pending', max_length=12)),
+                ('claim', models.CharField(blank=True, help_text='Batch that is applying this callback', max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='callbacks', to='finance.payment')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='finance_pay_status_728f64_idx'), models.Index(fields=['claim'], name='finance_pay_claim_5aa84e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_payment_callback_inbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentfee',
+            index=models.Index(fields=['balance', 'id'], name='finance_fee_balance_id_idx'),
+        ),
+    ]
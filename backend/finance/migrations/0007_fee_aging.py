@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_fee_aging(apps, schema_editor):
+    """Age the fees that were outstanding before the snapshot tables existed"""
+    # The refresh only reads the balance, due date and payment date columns these tables have at this point
+    from finance.aging import refresh_fee_aging
+
+    refresh_fee_aging()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0005_reportbatchjob'),
+        ('core', '0004_accesslog_duration'),
+        ('finance', '0006_studentfee_balance_index'),
+        ('students', '0005_student_grade_level'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeAging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('due_date', models.DateField()),
+                ('days_overdue', models.IntegerField()),
+                ('bucket', models.CharField(choices=[('current', 'Not yet due'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('90_plus', 'Over 90 days')], max_length=10)),
+                ('last_payment_date', models.DateTimeField(blank=True, null=True)),
+                ('as_of', models.DateField()),
+                ('academic_term', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.academicterm')),
+                ('grade_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cbc.gradelevel')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_aging', to=settings.AUTH_USER_MODEL)),
+                ('student_fee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='aging', to='finance.studentfee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grade_level', 'academic_term', 'bucket'], name='finance_fee_grade_l_f4c8d6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeAgingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('current', 'Not yet due'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('90_plus', 'Over 90 days')], max_length=10)),
+                ('fee_count', models.IntegerField(default=0)),
+                ('total_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('as_of', models.DateField()),
+                ('academic_term', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.academicterm')),
+                ('grade_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='cbc.gradelevel')),
+            ],
+            options={
+                'unique_together': {('grade_level', 'academic_term', 'bucket')},
+            },
+        ),
+        migrations.RunPython(populate_fee_aging, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-17 01:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_accesslog_duration'),
+        ('finance', '0007_fee_aging'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentfee',
+            name='credit_applied',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Overpayment credit carried in from an earlier term (negative: carried out to a later term)', max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='CreditCarryForward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overpayment', models.DecimalField(decimal_places=2, help_text="Overpaid on the closing term's fees", max_digits=10)),
+                ('opening_credit', models.DecimalField(decimal_places=2, help_text='Student credit balance before the run', max_digits=10)),
+                ('applied', models.DecimalField(decimal_places=2, help_text="Credited to the next term's fees", max_digits=10)),
+                ('closing_credit', models.DecimalField(decimal_places=2, help_text='Student credit balance after the run', max_digits=10)),
+                ('source_fees', models.JSONField(default=list)),
+                ('target_fees', models.JSONField(default=list)),
+                ('run_id', models.CharField(max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('from_term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits_carried_out', to='core.academicterm')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_carry_forwards', to=settings.AUTH_USER_MODEL)),
+                ('to_term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits_carried_in', to='core.academicterm')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('student', 'from_term')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:16
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+TOTALS = ['fee_count', 'defaulters_count', 'total_fees', 'total_paid', 'total_balance']
+
+
+def merge_unstructured_rollups(apps, schema_editor):
+    # Concurrent first writers could each create a row without a fee structure; their sums add up
+    FeeRollup = apps.get_model('finance', 'FeeRollup')
+    rows = list(FeeRollup.objects.filter(fee_structure__isnull=True).order_by('id'))
+    if len(rows) < 2:
+        return
+    keep = rows[0]
+    for field in TOTALS:
+        setattr(keep, field, sum(getattr(row, field) for row in rows))
+    keep.save()
+    FeeRollup.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_invoice_sequences'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_unstructured_rollups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='feerollup',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='feerollup',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('fee_structure', 0), name='unique_fee_rollup_structure'),
+        ),
+    ]
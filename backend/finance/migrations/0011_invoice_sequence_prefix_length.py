@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_fee_rollup_unique_structure'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoicesequence',
+            name='prefix',
+            field=models.CharField(max_length=40, unique=True),
+        ),
+    ]
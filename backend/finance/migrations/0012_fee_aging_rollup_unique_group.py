@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:49
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    # Refreshes racing on a group without a grade or term could each write its rows; their sums add up
+    FeeAgingRollup = apps.get_model('finance', 'FeeAgingRollup')
+    groups = {}
+    for row in FeeAgingRollup.objects.order_by('id'):
+        groups.setdefault((row.grade_level_id, row.academic_term_id, row.bucket), []).append(row)
+    for rows in groups.values():
+        if len(rows) < 2:
+            continue
+        keep = rows[0]
+        keep.fee_count = sum(row.fee_count for row in rows)
+        keep.total_balance = sum(row.total_balance for row in rows)
+        keep.as_of = min(row.as_of for row in rows)
+        keep.save()
+        FeeAgingRollup.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbc', '0009_curriculum_releases'),
+        ('core', '0006_populate_people_search'),
+        ('finance', '0011_invoice_sequence_prefix_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='feeagingrollup',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='feeagingrollup',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('grade_level', 0), django.db.models.functions.comparison.Coalesce('academic_term', 0), models.F('bucket'), name='unique_fee_aging_rollup'),
+        ),
+    ]
@@ -2,8 +2,9 @@
 Finance app models for fee management and payment tracking
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from students.models import Student
 from cbc.models import GradeLevel
 
@@ -45,6 +46,50 @@ class FeeStructure(models.Model):
         return f"{self.grade_level.name} - {self.academic_term}"
 
 
+class StudentFeeQuerySet(models.QuerySet):
+    """
+    Bulk update() and delete() keep the fee rollups and the aging snapshot of
+    the affected fees current, as StudentFee.save/delete do for single rows
+    """
+
+    # Fields the rollups and aging are derived from
+    DERIVED_FROM = {'fee_structure', 'fee_structure_id', 'student', 'student_id', 'final_amount',
+                    'amount_paid', 'balance', 'credit_applied', 'created_at'}
+
+    def update(self, **kwargs):
+        from .aging import refresh_fee_aging
+        from .rollups import rebuild_fee_rollups
+
+        if not self.DERIVED_FROM & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic():
+            # The filter may no longer match once updated, so resolve the rows first
+            fees = dict(self.values_list('id', 'fee_structure_id'))
+            updated = super().update(**kwargs)
+            structures = set(fees.values()) | set(
+                StudentFee.objects.filter(id__in=fees).values_list('fee_structure_id', flat=True)
+            )
+            rebuild_fee_rollups(structures)
+            refresh_fee_aging(fees)
+        return updated
+
+    def delete(self):
+        from .aging import discard_fee_aging
+        from .rollups import rebuild_fee_rollups
+
+        with transaction.atomic():
+            fees = dict(self.values_list('id', 'fee_structure_id'))
+            discard_fee_aging(fees)
+            result = super().delete()
+            rebuild_fee_rollups(set(fees.values()))
+        return result
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        # bulk_update() runs through update(); its callers apply their own
+        # rollup deltas and aging refresh (see finance.rollups)
+        return models.QuerySet(self.model, using=self.db).bulk_update(objs, fields, batch_size)
+
+
 class StudentFee(models.Model):
     """
     Fee assignment to a specific student
@@ -68,16 +113,27 @@ class StudentFee(models.Model):
     final_amount = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     balance = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    credit_applied = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0,
+        help_text="Overpayment credit carried in from an earlier term (negative: carried out to a later term)"
+    )
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudentFeeQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of defaulters (finance.defaulters)
+            models.Index(fields=['balance', 'id'], name='finance_fee_balance_id_idx'),
+        ]
     
-    def save(self, *args, **kwargs):
+    def calculate_amounts(self):
+        """Derive final_amount, balance and status from the fee source and payments"""
         # Calculate final amount
         if self.custom_amount:
             base_amount = self.custom_amount
@@ -91,17 +147,64 @@ class StudentFee(models.Model):
         self.final_amount = base_amount - self.discount_amount
         
         # Calculate balance
-        self.balance = self.final_amount - self.amount_paid
+        self.balance = self.final_amount - self.amount_paid - self.credit_applied
         
         # Update status
         if self.balance <= 0:
             self.status = 'paid'
-        elif self.amount_paid > 0:
+        elif self.amount_paid > 0 or self.credit_applied > 0:
             self.status = 'partial'
         else:
             self.status = 'pending'
-        
-        super().save(*args, **kwargs)
+
+    # Fields a FeeRollup contribution is derived from
+    ROLLUP_FIELDS = {'fee_structure_id', 'final_amount', 'amount_paid', 'balance'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributes to the rollups so save() can apply a delta
+        if cls.ROLLUP_FIELDS.issubset(field_names):
+            instance._rollup_contribution = instance.rollup_contribution()
+        return instance
+
+    def rollup_contribution(self):
+        """(rollup key, field deltas) this fee adds to its FeeRollup row"""
+        return (self.fee_structure_id,), {
+            'fee_count': 1,
+            'defaulters_count': 1 if self.balance > 0 else 0,
+            'total_fees': self.final_amount,
+            'total_paid': self.amount_paid,
+            'total_balance': self.balance,
+        }
+
+    def save(self, *args, **kwargs):
+        from .aging import refresh_fee_aging
+        from .rollups import rebuild_fee_rollups, update_fee_rollups
+
+        self.calculate_amounts()
+        adding = self._state.adding
+        previous = getattr(self, '_rollup_contribution', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding or previous is not None:
+                update_fee_rollups(previous, self.rollup_contribution())
+            else:
+                # Loaded without the rollup fields; recompute this fee's row instead
+                rebuild_fee_rollups([self.fee_structure_id])
+            refresh_fee_aging([self.id])
+        self._rollup_contribution = self.rollup_contribution()
+
+    def delete(self, *args, **kwargs):
+        from .aging import discard_fee_aging
+        from .rollups import update_fee_rollups
+
+        contribution = getattr(self, '_rollup_contribution', None) or self.rollup_contribution()
+        with transaction.atomic():
+            discard_fee_aging([self.id])
+            result = super().delete(*args, **kwargs)
+            update_fee_rollups(contribution, None)
+        return result
     
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.fee_structure}"
@@ -134,18 +237,85 @@ class Payment(models.Model):
     class Meta:
         ordering = ['-payment_date']
     
+    # Fields a RevenueRollup contribution is derived from
+    ROLLUP_FIELDS = {'payment_date', 'payment_method', 'amount'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if cls.ROLLUP_FIELDS.issubset(field_names):
+            instance._rollup_contribution = instance.rollup_contribution()
+        return instance
+
+    def rollup_contribution(self):
+        """(rollup key, field deltas) this payment adds to its RevenueRollup row"""
+        from django.utils import timezone
+        day = timezone.localdate(self.payment_date) if timezone.is_aware(self.payment_date) else self.payment_date.date()
+        return (day, self.payment_method), {'payment_count': 1, 'total_amount': self.amount}
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update student fee amount_paid
-        self.student_fee.amount_paid = self.student_fee.payments.aggregate(
-            total=models.Sum('amount')
-        )['total'] or 0
-        self.student_fee.save()
+        from .rollups import rebuild_revenue_rollups, update_revenue_rollups
+
+        adding = self._state.adding
+        previous = getattr(self, '_rollup_contribution', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding or previous is not None:
+                update_revenue_rollups(previous, self.rollup_contribution())
+            else:
+                rebuild_revenue_rollups([self.rollup_contribution()[0][0]])
+            # Update student fee amount_paid
+            self.student_fee.amount_paid = self.student_fee.payments.aggregate(
+                total=models.Sum('amount')
+            )['total'] or 0
+            self.student_fee.save()
+        self._rollup_contribution = self.rollup_contribution()
+
+    def delete(self, *args, **kwargs):
+        from .rollups import update_revenue_rollups
+
+        contribution = getattr(self, '_rollup_contribution', None) or self.rollup_contribution()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            update_revenue_rollups(contribution, None)
+        return result
     
     def __str__(self):
         return f"Payment {self.receipt_number} - {self.amount}"
 
 
+class InvoiceQuerySet(models.QuerySet):
+    """
+    Bulk update() and delete() re-age the fees whose due dates they may move,
+    as Invoice.save/delete do for single rows
+    """
+
+    # Fields a fee's due date is derived from
+    DERIVED_FROM = {'student_fee', 'student_fee_id', 'due_date', 'status'}
+
+    def update(self, **kwargs):
+        from .aging import refresh_fee_aging
+
+        if not self.DERIVED_FROM & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic():
+            fee_ids = set(self.values_list('student_fee_id', flat=True))
+            updated = super().update(**kwargs)
+            if 'student_fee' in kwargs or 'student_fee_id' in kwargs:
+                fee_ids.add(getattr(kwargs.get('student_fee'), 'pk', None) or kwargs.get('student_fee_id'))
+            refresh_fee_aging(fee_ids - {None})
+        return updated
+
+    def delete(self):
+        from .aging import refresh_fee_aging
+
+        with transaction.atomic():
+            fee_ids = set(self.values_list('student_fee_id', flat=True))
+            result = super().delete()
+            refresh_fee_aging(fee_ids)
+        return result
+
+
 class Invoice(models.Model):
     """
     Invoice for student fees
@@ -167,13 +337,32 @@ class Invoice(models.Model):
     
     pdf_file = models.FileField(upload_to='invoices/', null=True, blank=True)
     notes = models.TextField(blank=True)
+    batch = models.ForeignKey('InvoiceBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InvoiceQuerySet.as_manager()
     
     class Meta:
         ordering = ['-issue_date']
     
+    def save(self, *args, **kwargs):
+        from .aging import refresh_fee_aging
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # The fee's due date is its earliest invoice's
+            refresh_fee_aging([self.student_fee_id])
+
+    def delete(self, *args, **kwargs):
+        from .aging import refresh_fee_aging
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            refresh_fee_aging([self.student_fee_id])
+        return result
+
     def __str__(self):
         return f"Invoice {self.invoice_number}"
 
@@ -213,3 +402,219 @@ class FinanceCache(models.Model):
     
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.data_type}"
+
+
+class FeeRollup(models.Model):
+    """
+    Running fee totals per fee structure (i.e. per term x grade level).
+    Fees not billed from a structure (events, custom charges) share the row with
+    no fee_structure. Kept current by StudentFee.save/delete; see finance.rollups.
+    """
+    fee_structure = models.ForeignKey(FeeStructure, on_delete=models.CASCADE, related_name='rollups', null=True, blank=True)
+    fee_count = models.IntegerField(default=0)
+    defaulters_count = models.IntegerField(default=0)
+    total_fees = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # NULLs never collide in a plain unique index, so the unstructured row is keyed as 0
+            models.UniqueConstraint(Coalesce('fee_structure', 0), name='unique_fee_rollup_structure'),
+        ]
+
+    def __str__(self):
+        return f"Fee rollup - {self.fee_structure_id or 'unstructured'}"
+
+
+class RevenueRollup(models.Model):
+    """
+    Running payment totals per day and payment method, kept current by Payment.save/delete
+    """
+    date = models.DateField()
+    payment_method = models.CharField(max_length=10, choices=Payment.PAYMENT_METHODS)
+    payment_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['date', 'payment_method']
+        ordering = ['date']
+
+    def __str__(self):
+        return f"Revenue {self.date} {self.payment_method}: {self.total_amount}"
+
+
+class PaymentCallback(models.Model):
+    """
+    Append-only inbox of payment provider callbacks. The endpoint only inserts;
+    finance.callback_inbox applies pending rows in batches.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('applied', 'Applied'),
+        ('duplicate', 'Duplicate'),
+        ('unmatched', 'Unmatched'),
+        ('failed', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=20)
+    idempotency_key = models.CharField(max_length=150, unique=True, help_text="provider:transaction reference")
+    transaction_reference = models.CharField(max_length=100)
+    account = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_at = models.DateTimeField()
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    claim = models.CharField(max_length=32, blank=True, help_text="Batch that is applying this callback")
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='callbacks')
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['claim']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} callback {self.transaction_reference} ({self.status})"
+
+
+class FeeAging(models.Model):
+    """
+    Aging snapshot of one fee with an outstanding balance: how many days past its
+    due date it was on `as_of`. Maintained by finance.aging.
+    """
+    BUCKETS = [
+        ('current', 'Not yet due'),
+        ('1_30', '1-30 days'),
+        ('31_60', '31-60 days'),
+        ('61_90', '61-90 days'),
+        ('90_plus', 'Over 90 days'),
+    ]
+
+    student_fee = models.OneToOneField(StudentFee, on_delete=models.CASCADE, related_name='aging')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='fee_aging')
+    grade_level = models.ForeignKey(GradeLevel, on_delete=models.SET_NULL, null=True, blank=True)
+    academic_term = models.ForeignKey('core.AcademicTerm', on_delete=models.SET_NULL, null=True, blank=True)
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    due_date = models.DateField()
+    days_overdue = models.IntegerField()
+    bucket = models.CharField(max_length=10, choices=BUCKETS)
+    last_payment_date = models.DateTimeField(null=True, blank=True)
+    as_of = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grade_level', 'academic_term', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"Aging {self.student_fee_id}: {self.bucket} ({self.balance})"
+
+
+class FeeAgingRollup(models.Model):
+    """
+    Outstanding balances per grade level x term x aging bucket, derived from FeeAging
+    """
+    grade_level = models.ForeignKey(GradeLevel, on_delete=models.CASCADE, null=True, blank=True)
+    academic_term = models.ForeignKey('core.AcademicTerm', on_delete=models.CASCADE, null=True, blank=True)
+    bucket = models.CharField(max_length=10, choices=FeeAging.BUCKETS)
+    fee_count = models.IntegerField(default=0)
+    total_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    as_of = models.DateField()
+
+    class Meta:
+        constraints = [
+            # As FeeRollup: NULL grades and terms are keyed as 0 so their rows collide too
+            models.UniqueConstraint(
+                Coalesce('grade_level', 0), Coalesce('academic_term', 0), 'bucket', name='unique_fee_aging_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Aging {self.grade_level_id}/{self.academic_term_id} {self.bucket}: {self.total_balance}"
+
+
+class CreditCarryForward(models.Model):
+    """
+    Audit ledger of term-end credit carry-forward (finance.credits): one row per
+    student and closing term, which is also what makes re-runs skip them.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='credit_carry_forwards')
+    from_term = models.ForeignKey('core.AcademicTerm', on_delete=models.CASCADE, related_name='credits_carried_out')
+    to_term = models.ForeignKey('core.AcademicTerm', on_delete=models.CASCADE, related_name='credits_carried_in')
+
+    overpayment = models.DecimalField(max_digits=10, decimal_places=2, help_text="Overpaid on the closing term's fees")
+    opening_credit = models.DecimalField(max_digits=10, decimal_places=2, help_text="Student credit balance before the run")
+    applied = models.DecimalField(max_digits=10, decimal_places=2, help_text="Credited to the next term's fees")
+    closing_credit = models.DecimalField(max_digits=10, decimal_places=2, help_text="Student credit balance after the run")
+    # [[fee ID, amount], ...]
+    source_fees = models.JSONField(default=list)
+    target_fees = models.JSONField(default=list)
+
+    run_id = models.CharField(max_length=32)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['student', 'from_term']
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Credit {self.student_id}: {self.from_term_id} -> {self.to_term_id} ({self.applied})"
+
+
+class InvoiceSequence(models.Model):
+    """
+    Next invoice number per term. Numbers are reserved in blocks by
+    finance.invoicing inside the transaction that inserts the invoices, so a
+    rolled back batch gives its block back and numbering stays gap-free.
+    """
+    academic_term = models.OneToOneField('core.AcademicTerm', on_delete=models.CASCADE, related_name='invoice_sequence')
+    prefix = models.CharField(max_length=40, unique=True)
+    next_number = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.prefix} (next {self.next_number})"
+
+
+class InvoiceBatch(models.Model):
+    """
+    Bulk invoicing of a term: the invoices are inserted up front, their
+    documents are rendered afterwards by `manage.py render_invoices`
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('rendering', 'Rendering'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    academic_term = models.ForeignKey('core.AcademicTerm', on_delete=models.CASCADE, related_name='invoice_batches')
+    first_number = models.CharField(max_length=50, blank=True)
+    last_number = models.CharField(max_length=50, blank=True)
+    invoice_count = models.IntegerField(default=0)
+    rendered_count = models.IntegerField(default=0)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Invoice batch {self.id}: {self.first_number}..{self.last_number}"
@@ -0,0 +1,146 @@
+"""
+Finance Rollups
+Keeps FeeRollup (per fee structure) and RevenueRollup (per day x payment method)
+current with O(1) delta updates, and rebuilds them from source rows.
+
+Model saves and deletes apply deltas automatically. Code that writes fees or
+payments with bulk_create/bulk_update() must call the add_*/move_* helpers or
+rebuild_* itself; `manage.py rebuild_finance_rollups` repairs any drift.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import FeeRollup, Payment, RevenueRollup, StudentFee
+
+# (rollup key, {field: delta}) as returned by StudentFee/Payment.rollup_contribution()
+Contribution = Tuple[tuple, Dict[str, object]]
+
+
+def _merge(*signed_contributions) -> Dict[tuple, Dict[str, object]]:
+    merged = defaultdict(dict)
+    for sign, contribution in signed_contributions:
+        if contribution is None:
+            continue
+        key, values = contribution
+        deltas = merged[key]
+        for field, value in values.items():
+            deltas[field] = deltas.get(field, 0) + sign * value
+    return merged
+
+
+def _bump(model, key: dict, deltas: dict):
+    """Add deltas to one rollup row, creating it on first use"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**changes, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**key).update(**changes, updated_at=timezone.now())
+
+
+def update_fee_rollups(old: Optional[Contribution], new: Optional[Contribution]):
+    """Move one fee's contribution from its previous state to its current one"""
+    for (structure_id,), deltas in _merge((-1, old), (1, new)).items():
+        _bump(FeeRollup, {'fee_structure_id': structure_id}, deltas)
+
+
+def add_fee_rollups(fees: Iterable[StudentFee]):
+    """Add newly bulk-created fees, one UPDATE per fee structure"""
+    for (structure_id,), deltas in _merge(*((1, fee.rollup_contribution()) for fee in fees)).items():
+        _bump(FeeRollup, {'fee_structure_id': structure_id}, deltas)
+
+
+def move_fee_rollups(fees: Iterable[StudentFee]):
+    """
+    Apply bulk_update()d fees: each fee's contribution as loaded is replaced by its
+    current one, one UPDATE per fee structure. Fees must have been loaded with the
+    rollup fields; afterwards their remembered contribution is the current one.
+    """
+    fees = list(fees)
+    signed = []
+    for fee in fees:
+        signed.append((-1, fee._rollup_contribution))
+        signed.append((1, fee.rollup_contribution()))
+    for (structure_id,), deltas in _merge(*signed).items():
+        _bump(FeeRollup, {'fee_structure_id': structure_id}, deltas)
+    for fee in fees:
+        fee._rollup_contribution = fee.rollup_contribution()
+
+
+def add_revenue_rollups(payments: Iterable[Payment]):
+    """Add newly bulk-created payments, one UPDATE per day and payment method"""
+    for (day, method), deltas in _merge(*((1, payment.rollup_contribution()) for payment in payments)).items():
+        _bump(RevenueRollup, {'date': day, 'payment_method': method}, deltas)
+
+
+def update_revenue_rollups(old: Optional[Contribution], new: Optional[Contribution]):
+    """Move one payment's contribution from its previous state to its current one"""
+    for (day, method), deltas in _merge((-1, old), (1, new)).items():
+        _bump(RevenueRollup, {'date': day, 'payment_method': method}, deltas)
+
+
+def rebuild_fee_rollups(structure_ids: Iterable[Optional[int]] = None) -> int:
+    """
+    Recompute fee rollups from StudentFee rows (all, or only the given structures;
+    None stands for fees without a structure). Returns the number of rows written.
+    """
+    fees = StudentFee.objects.all()
+    rollups = FeeRollup.objects.all()
+    if structure_ids is not None:
+        structure_ids = set(structure_ids)
+        scope = Q(fee_structure_id__in=structure_ids - {None})
+        if None in structure_ids:
+            scope |= Q(fee_structure__isnull=True)
+        fees, rollups = fees.filter(scope), rollups.filter(scope)
+
+    rows = [
+        FeeRollup(**row)
+        for row in fees.order_by().values('fee_structure_id').annotate(
+            fee_count=Count('id'),
+            defaulters_count=Count('id', filter=Q(balance__gt=0)),
+            total_fees=Sum('final_amount'),
+            total_paid=Sum('amount_paid'),
+            total_balance=Sum('balance'),
+        )
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        FeeRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_revenue_rollups(dates: Iterable = None) -> int:
+    """
+    Recompute revenue rollups from Payment rows (all, or only the given local dates).
+    Returns the number of rows written.
+    """
+    payments = Payment.objects.annotate(day=TruncDate('payment_date'))
+    rollups = RevenueRollup.objects.all()
+    if dates is not None:
+        dates = list(dates)
+        payments, rollups = payments.filter(day__in=dates), rollups.filter(date__in=dates)
+
+    rows = [
+        RevenueRollup(date=row['day'], payment_method=row['payment_method'],
+                      payment_count=row['payment_count'], total_amount=row['total_amount'])
+        for row in payments.order_by().values('day', 'payment_method').annotate(
+            payment_count=Count('id'),
+            total_amount=Sum('amount'),
+        )
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        RevenueRollup.objects.bulk_create(rows)
+    return len(rows)
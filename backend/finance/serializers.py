@@ -3,7 +3,7 @@ Finance serializers
 """
 
 from rest_framework import serializers
-from .models import FeeStructure, StudentFee, Payment, Invoice
+from .models import FeeStructure, StudentFee, Payment, Invoice, InvoiceBatch
 
 
 class FeeStructureSerializer(serializers.ModelSerializer):
@@ -27,7 +27,7 @@ class StudentFeeSerializer(serializers.ModelSerializer):
     class Meta:
         model = StudentFee
         fields = '__all__'
-        read_only_fields = ['final_amount', 'amount_paid', 'balance', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['final_amount', 'amount_paid', 'credit_applied', 'balance', 'status', 'created_at', 'updated_at']
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -50,6 +50,24 @@ class InvoiceSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
+class InvoiceBatchSerializer(serializers.ModelSerializer):
+    """Serializer for bulk invoicing batches"""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = InvoiceBatch
+        fields = [
+            'id', 'academic_term', 'first_number', 'last_number', 'invoice_count', 'rendered_count',
+            'progress', 'status', 'error', 'created_by', 'created_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        if not obj.invoice_count:
+            return 0
+        return round(obj.rendered_count * 100 / obj.invoice_count, 1)
+
+
 class FinanceSummarySerializer(serializers.Serializer):
     """Serializer for finance summary data"""
     total_fees = serializers.DecimalField(max_digits=10, decimal_places=2)
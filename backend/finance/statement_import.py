@@ -0,0 +1,371 @@
+"""
+Payment Statement Import
+Streams an M-Pesa or bank statement (CSV or JSONL), matches each line to a
+student fee through in-memory hash indexes, skips references already recorded
+and writes the rest in bulk, one transaction per chunk, producing a
+reconciliation report. A failed import can be re-run: chunks already written
+are reported as already recorded.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from students.models import Student
+from .bulk_payments import record_payments
+from .models import Invoice, Payment, StudentFee
+
+logger = logging.getLogger(__name__)
+
+# Normalised column name -> statement field
+COLUMN_ALIASES = {
+    'transaction_reference': 'reference', 'reference': 'reference', 'trans_id': 'reference',
+    'transid': 'reference', 'transaction_id': 'reference', 'receipt_no': 'reference', 'receipt': 'reference',
+    'amount': 'amount', 'trans_amount': 'amount', 'transamount': 'amount', 'paid_in': 'amount', 'credit': 'amount',
+    'account': 'account', 'bill_ref_number': 'account', 'billrefnumber': 'account', 'student_id': 'account',
+    'account_reference': 'account', 'account_no': 'account',
+    'invoice': 'invoice', 'invoice_number': 'invoice',
+    'payment_date': 'date', 'date': 'date', 'trans_time': 'date', 'transtime': 'date',
+    'completion_time': 'date', 'value_date': 'date',
+    'payment_method': 'method', 'method': 'method',
+    'name': 'payer', 'payer': 'payer', 'first_name': 'payer', 'firstname': 'payer',
+}
+
+DATE_FORMATS = ['%Y%m%d%H%M%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y']
+
+
+def _normalise_key(key: str) -> str:
+    return re.sub(r'[\s\-]+', '_', (key or '').strip().lower())
+
+
+def read_statement(stream, fmt: str = 'csv') -> Iterator[dict]:
+    """
+    Lazily yield statement lines as {field: raw value} dicts.
+
+    Args:
+        stream: Text or binary file object
+        fmt: 'csv' or 'jsonl'
+    """
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(stream, 'mode', ''):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'jsonl':
+        rows = (json.loads(line) for line in stream if line.strip())
+    elif fmt == 'csv':
+        rows = csv.DictReader(stream)
+    else:
+        raise ValueError(f"Unsupported statement format: {fmt}")
+
+    for row in rows:
+        yield normalise_line(row)
+
+
+def normalise_line(row: dict) -> dict:
+    """Map a statement row or provider callback payload onto statement fields"""
+    line = {}
+    for key, value in row.items():
+        field = COLUMN_ALIASES.get(_normalise_key(key))
+        if field and field not in line and value not in (None, ''):
+            line[field] = str(value).strip()
+    return line
+
+
+def parse_amount(value: Optional[str]) -> Optional[Decimal]:
+    try:
+        amount = Decimal((value or '').replace(',', ''))
+    except InvalidOperation:
+        return None
+    return amount if amount > 0 else None
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+REFERENCE_MAX_LENGTH = Payment._meta.get_field('transaction_reference').max_length
+RECEIPT_MAX_LENGTH = Payment._meta.get_field('receipt_number').max_length
+
+
+class StatementImporter:
+    """
+    Matches statement lines to fees and records them in chunks.
+
+    Lines are matched by invoice number first, then by account (the student ID or
+    an invoice number). A student's payment goes to their oldest fee that still
+    has a balance, tracking balances across the statement; with nothing
+    outstanding it goes to their newest fee as an overpayment.
+
+    Indexes cover every student, invoice and fee unless `accounts` limits them
+    to the given account values (student IDs or invoice numbers).
+    """
+
+    CHUNK_SIZE = 1000
+    MAX_UNMATCHED_IN_REPORT = 1000
+    # Attempts at writing a chunk that loses references to concurrent imports or callbacks
+    MAX_WRITE_ATTEMPTS = 3
+    RECEIPT_PREFIX = 'IMP'
+    NOTE = 'Statement import'
+
+    def __init__(self, default_method: str = 'mpesa', received_by: str = 'Statement import',
+                 dry_run: bool = False, chunk_size: int = None, accounts: Iterable[str] = None):
+        if default_method not in dict(Payment.PAYMENT_METHODS):
+            raise ValueError(f"Unknown payment method: {default_method}")
+        self.default_method = default_method
+        self.received_by = received_by
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+        self.report = {
+            'dry_run': dry_run,
+            'lines': 0,
+            'imported': 0,
+            'imported_amount': Decimal('0'),
+            'duplicates_in_file': 0,
+            'already_recorded': 0,
+            'unmatched': 0,
+            'invalid': 0,
+            'fees_updated': 0,
+            'students_updated': 0,
+            'unmatched_lines': [],
+        }
+        self._seen_references = set()
+        self._pending = []
+        self._fee_ids = set()
+        self._student_ids = set()
+        # line number -> 'imported', 'duplicate', 'already_recorded' or the unmatched reason
+        self.outcomes = {}
+        self._build_indexes(accounts)
+
+    def _build_indexes(self, accounts: Iterable[str] = None):
+        students = Student.objects.all()
+        invoices = Invoice.objects.order_by()
+        fees = StudentFee.objects.order_by('created_at', 'id')
+        if accounts is not None:
+            values = {value.strip() for value in accounts if value}
+            values |= {value.upper() for value in values}
+            students = students.filter(student_id__in=values)
+            invoices = invoices.filter(invoice_number__in=values)
+            fees = fees.filter(Q(student__in=students) | Q(invoices__in=invoices)).distinct()
+
+        self.students = {
+            student_id.strip().upper(): pk
+            for pk, student_id in students.values_list('id', 'student_id')
+        }
+        self.invoices = {
+            number.strip().upper(): fee_id
+            for number, fee_id in invoices.values_list('invoice_number', 'student_fee_id')
+        }
+        # Per student, fees oldest first as [fee_id, remaining balance]
+        self.fees = defaultdict(list)
+        for fee_id, student_id, balance in fees.values_list('id', 'student_id', 'balance'):
+            self.fees[student_id].append([fee_id, balance])
+        self.fee_owner = {fee_id: student_id for student_id, fees in self.fees.items() for fee_id, _ in fees}
+
+    def recorded(self, payments):
+        """Called with each chunk's payments once written (or matched, on a dry run)"""
+
+    def receipt_number(self, reference: str) -> str:
+        receipt = f'{self.RECEIPT_PREFIX}-{reference}'
+        if len(receipt) > RECEIPT_MAX_LENGTH:
+            # Cutting long references short would make distinct ones collide
+            receipt = f'{self.RECEIPT_PREFIX}-{hashlib.sha1(reference.encode()).hexdigest()}'
+        return receipt
+
+    def _unmatched(self, line_no: int, line: dict, reason: str, key: str = 'unmatched'):
+        self.report[key] += 1
+        self.outcomes[line_no] = reason
+        if len(self.report['unmatched_lines']) < self.MAX_UNMATCHED_IN_REPORT:
+            self.report['unmatched_lines'].append({
+                'line': line_no,
+                'reference': line.get('reference'),
+                'account': line.get('account'),
+                'amount': line.get('amount'),
+                'reason': reason,
+            })
+
+    def _match_fee(self, line: dict, amount: Decimal) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Returns:
+            (fee ID, None) or (None, reason the line could not be matched)
+        """
+        for value in (line.get('invoice'), line.get('account')):
+            fee_id = self.invoices.get((value or '').strip().upper())
+            if fee_id:
+                self._allocate(self.fee_owner.get(fee_id), fee_id, amount)
+                return fee_id, None
+
+        student_pk = self.students.get((line.get('account') or '').strip().upper())
+        if student_pk is None:
+            return None, 'unknown_account'
+        fees = self.fees.get(student_pk)
+        if not fees:
+            return None, 'no_fee'
+        fee = next((fee for fee in fees if fee[1] > 0), fees[-1])
+        fee[1] -= amount
+        return fee[0], None
+
+    def _allocate(self, student_pk, fee_id, amount):
+        for fee in self.fees.get(student_pk, []):
+            if fee[0] == fee_id:
+                fee[1] -= amount
+
+    def feed(self, line_no: int, line: dict):
+        """Validate one line and queue it; flushes every chunk_size lines"""
+        self.report['lines'] += 1
+        reference = line.get('reference')
+        if not reference:
+            return self._unmatched(line_no, line, 'missing_reference', 'invalid')
+        if len(reference) > REFERENCE_MAX_LENGTH:
+            return self._unmatched(line_no, line, 'reference_too_long', 'invalid')
+        if reference in self._seen_references:
+            self.report['duplicates_in_file'] += 1
+            self.outcomes[line_no] = 'duplicate'
+            return
+        self._seen_references.add(reference)
+
+        amount = parse_amount(line.get('amount'))
+        if amount is None:
+            return self._unmatched(line_no, line, 'invalid_amount', 'invalid')
+        payment_date = parse_date(line.get('date'))
+        if payment_date is None:
+            return self._unmatched(line_no, line, 'invalid_date', 'invalid')
+
+        self._pending.append((line_no, line, reference, amount, payment_date))
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # One query per chunk for references recorded by earlier imports or callbacks
+        recorded = self._recorded_references([reference for _, _, reference, _, _ in pending])
+
+        methods = dict(Payment.PAYMENT_METHODS)
+        matched = {}
+        for line_no, line, reference, amount, payment_date in pending:
+            if reference in recorded:
+                self._already_recorded(line_no)
+                continue
+            fee_id, reason = self._match_fee(line, amount)
+            if fee_id is None:
+                self._unmatched(line_no, line, reason)
+                continue
+
+            method = (line.get('method') or '').lower()
+            matched[line_no] = Payment(
+                student_fee_id=fee_id,
+                amount=amount,
+                payment_method=method if method in methods else self.default_method,
+                transaction_reference=reference,
+                payment_date=payment_date,
+                received_by=self.received_by,
+                receipt_number=self.receipt_number(reference),
+                notes=f"{self.NOTE}: {line.get('payer', '')}".strip(),
+            )
+        self._write(matched)
+
+    @staticmethod
+    def _recorded_references(references) -> set:
+        return set(Payment.objects.filter(
+            transaction_reference__in=references
+        ).order_by().values_list('transaction_reference', flat=True))
+
+    def _already_recorded(self, line_no: int):
+        self.report['already_recorded'] += 1
+        self.outcomes[line_no] = 'already_recorded'
+
+    def _write(self, matched: Dict[int, Payment]):
+        """
+        Record one chunk in its own transaction. References recorded meanwhile
+        by a concurrent import or callback are dropped and the chunk retried.
+        """
+        for attempt in range(1, self.MAX_WRITE_ATTEMPTS + 1):
+            if self.dry_run or not matched:
+                student_ids = {self.fee_owner.get(payment.student_fee_id) for payment in matched.values()}
+                break
+            try:
+                with transaction.atomic():
+                    student_ids = record_payments(list(matched.values()))
+                break
+            except IntegrityError:
+                recorded = self._recorded_references([payment.transaction_reference for payment in matched.values()])
+                if not recorded or attempt == self.MAX_WRITE_ATTEMPTS:
+                    raise ValueError('Could not record payments: a receipt number or reference is already in use')
+                for line_no, payment in list(matched.items()):
+                    if payment.transaction_reference in recorded:
+                        del matched[line_no]
+                        self._already_recorded(line_no)
+                for payment in matched.values():
+                    payment.pk = None
+
+        for line_no, payment in matched.items():
+            self.report['imported'] += 1
+            self.report['imported_amount'] += payment.amount
+            self.outcomes[line_no] = 'imported'
+        self._fee_ids |= {payment.student_fee_id for payment in matched.values()}
+        self._student_ids |= student_ids
+        self.recorded(list(matched.values()))
+
+    def run(self, lines) -> Dict:
+        """
+        Import an iterable of statement lines (see read_statement).
+
+        Returns:
+            Reconciliation report
+        """
+        for line_no, line in enumerate(lines, start=1):
+            self.feed(line_no, line)
+        return self.finish()
+
+    def finish(self) -> Dict:
+        """
+        Match and record any queued lines (nothing is written on a dry run).
+
+        Returns:
+            Reconciliation report
+        """
+        self._flush()
+
+        self.report['fees_updated'] = len(self._fee_ids)
+        self.report['students_updated'] = len(self._student_ids)
+
+        self.report['imported_amount'] = float(self.report['imported_amount'])
+        self.report['unmatched_lines'].sort(key=lambda entry: entry['line'])
+        logger.info(
+            f"{self.NOTE}{' (dry run)' if self.dry_run else ''}: {self.report['imported']} of "
+            f"{self.report['lines']} lines imported, {self.report['unmatched']} unmatched"
+        )
+        return self.report
+
+
+def import_statement(stream, fmt: str = 'csv', **options) -> Dict:
+    """
+    Helper function to import a statement file
+    """
+    return StatementImporter(**options).run(read_statement(stream, fmt))
@@ -0,0 +1,265 @@
+"""
+Finance Test Doubles
+StubFinanceServer is a small local HTTP server that speaks the external finance
+API, for tests and for exercising the client against a slow or failing upstream
+during development. FakePaymentProvider generates and posts payment callbacks
+for load testing the callback inbox.
+"""
+
+import json
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.utils import timezone
+
+
+class StubFinanceServer:
+    """
+    Serves /students/<id>/<data_type>, /students/batch/<data_type>?ids=..&page=..
+    and any canned responses on 127.0.0.1.
+
+    Args:
+        responses: {path: (status, payload)} for paths that need specific answers
+        delays: {path substring: seconds} to simulate a slow upstream
+        failures: {path substring: count} of requests answered with 503 before recovering
+        page_size: students per page of a batch response
+
+    Set `down = True` to answer every request with 503.
+
+    Usage:
+        with StubFinanceServer(delays={'/invoices': 2}) as server:
+            api = ExternalFinanceAPI(api_url=server.url, api_key='test')
+    """
+
+    def __init__(self, responses: Dict[str, tuple] = None, delays: Dict[str, float] = None,
+                 failures: Dict[str, int] = None, page_size: int = 1000):
+        self.responses = responses or {}
+        self.delays = delays or {}
+        self.failures = dict(failures or {})
+        self.page_size = page_size
+        self.down = False
+        self.connections = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._released = threading.Event()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-finance-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Wake any handlers still sleeping on a delay so clients are not left hanging
+        self._released.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def request_count(self, path_fragment: str = '') -> int:
+        with self._lock:
+            return sum(1 for _, path in self.requests if path_fragment in path)
+
+    def student_data(self, student_id: str, data_type: str) -> Optional[dict]:
+        if data_type == 'balance':
+            return {'student_id': student_id, 'balance': 0.0, 'currency': 'KES'}
+        if data_type in ('fees', 'payments', 'invoices'):
+            return {'student_id': student_id, data_type: []}
+        return None
+
+    def respond(self, method: str, path: str, body: Optional[dict], query: Dict[str, str] = None) -> tuple:
+        """
+        Build the (status, payload) for a request. Override for custom behaviour.
+        """
+        if self.down:
+            return 503, {'error': 'Service unavailable'}
+        with self._lock:
+            for fragment, remaining in self.failures.items():
+                if fragment in path and remaining > 0:
+                    self.failures[fragment] = remaining - 1
+                    return 503, {'error': 'Service unavailable'}
+
+        if path in self.responses:
+            return self.responses[path]
+
+        query = query or {}
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[:2] == ['students', 'batch']:
+            ids = [i for i in query.get('ids', '').split(',') if i]
+            page = int(query.get('page', 1))
+            page_ids = ids[(page - 1) * self.page_size:page * self.page_size]
+            more = page * self.page_size < len(ids)
+            return 200, {
+                'results': {i: self.student_data(i, parts[2]) for i in page_ids},
+                'next_page': page + 1 if more else None,
+            }
+        if len(parts) == 3 and parts[0] == 'students':
+            data = self.student_data(parts[1], parts[2])
+            if data is not None:
+                return 200, data
+        return 404, {'error': 'Not found'}
+
+    def _handle(self, handler, method):
+        split = urlsplit(handler.path)
+        path = split.path
+        query = {key: values[-1] for key, values in parse_qs(split.query).items()}
+        with self._lock:
+            self.requests.append((method, path))
+
+        delay = max((seconds for fragment, seconds in self.delays.items() if fragment in path), default=0)
+        if delay:
+            self._released.wait(delay)
+
+        body = None
+        length = int(handler.headers.get('Content-Length') or 0)
+        if length:
+            body = json.loads(handler.rfile.read(length))
+
+        status, payload = self.respond(method, path, body, query)
+        content = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                stub._handle(self, 'GET')
+
+            def do_POST(self):
+                stub._handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakePaymentProvider:
+    """
+    Generates M-Pesa C2B confirmation callbacks and posts them the way the
+    provider does, including redeliveries of callbacks it already sent.
+
+    Args:
+        accounts: BillRefNumbers to pay against (student IDs or invoice numbers)
+        amounts: (min, max) KES per payment
+        redelivery_rate: Fraction of callbacks delivered a second time
+        seed: Seed for reproducible runs
+
+    Usage:
+        provider = FakePaymentProvider(['STU001', 'STU002'], redelivery_rate=0.1)
+        result = provider.post(url, provider.callbacks(1000), concurrency=16)
+    """
+
+    def __init__(self, accounts: Sequence[str], amounts: tuple = (500, 20000),
+                 redelivery_rate: float = 0.0, seed: int = None):
+        if not accounts:
+            raise ValueError("FakePaymentProvider needs at least one account")
+        self.accounts = list(accounts)
+        self.amounts = amounts
+        self.redelivery_rate = redelivery_rate
+        self.random = random.Random(seed)
+
+    def callback(self) -> dict:
+        reference = ''.join(self.random.choices(string.ascii_uppercase + string.digits, k=10))
+        return {
+            'TransactionType': 'Pay Bill',
+            'TransID': reference,
+            'TransTime': timezone.localtime().strftime('%Y%m%d%H%M%S'),
+            'TransAmount': f'{self.random.randint(*self.amounts)}.00',
+            'BusinessShortCode': '600000',
+            'BillRefNumber': self.random.choice(self.accounts),
+            'MSISDN': f'2547{self.random.randint(0, 99999999):08}',
+            'FirstName': self.random.choice(['Wanjiku', 'Otieno', 'Akinyi', 'Kamau', 'Njeri']),
+        }
+
+    def callbacks(self, count: int) -> Iterator[dict]:
+        """Yield `count` new callbacks, each redelivered with probability redelivery_rate"""
+        for _ in range(count):
+            payload = self.callback()
+            yield payload
+            if self.random.random() < self.redelivery_rate:
+                yield payload
+
+    @staticmethod
+    def post(url: str, payloads: Iterable[dict], concurrency: int = 8, secret: str = '',
+             timeout: float = 10) -> Dict:
+        """
+        POST payloads to a callback endpoint from `concurrency` threads, each
+        signed with `secret` (see callback_inbox.sign_callback).
+
+        Returns:
+            {'sent', 'accepted', 'duplicates', 'errors', 'seconds', 'latency_ms': {p50, p95, p99, max}}
+        """
+        from .callback_inbox import sign_callback
+
+        sessions = threading.local()
+
+        def send(payload):
+            session = getattr(sessions, 'session', None)
+            if session is None:
+                session = sessions.session = requests.Session()
+            body = json.dumps(payload).encode()
+            headers = {'Content-Type': 'application/json', 'X-Callback-Signature': sign_callback(body, secret)}
+            started = time.perf_counter()
+            try:
+                status = session.post(url, data=body, headers=headers, timeout=timeout).status_code
+            except requests.RequestException:
+                status = None
+            return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, payloads))
+        seconds = time.perf_counter() - started
+
+        statuses = [status for status, _ in results]
+        return {
+            'sent': len(results),
+            'accepted': statuses.count(202),
+            'duplicates': statuses.count(200),
+            'errors': sum(1 for status in statuses if status not in (200, 202)),
+            'seconds': round(seconds, 3),
+            'latency_ms': latency_summary([latency for _, latency in results]),
+        }
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+    return {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99), 'max': round(latencies[-1], 2)}
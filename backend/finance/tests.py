@@ -0,0 +1,921 @@
+import csv
+import json
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from cbc.models import GradeLevel
+from core.models import AcademicTerm, AcademicYear
+from students.models import Parent, Student
+
+from . import callback_inbox, external_api
+from .aging import refresh_fee_aging
+from .billing import apply_bulk_billing, plan_bulk_billing
+from .bulk_payments import record_payments
+from .cache_service import FinanceCacheService, get_local_cache
+from .credits import carry_forward_credits
+from .invoicing import InvoiceRenderer, allocate_invoice_numbers, create_term_invoices, launch_invoice_rendering
+from .models import (
+    CreditCarryForward, FeeAging, FeeAgingRollup, FeeRollup, FeeStructure, FinanceCache, Invoice, InvoiceBatch,
+    InvoiceSequence, Payment, PaymentCallback, RevenueRollup, StudentFee,
+)
+from .rollups import rebuild_fee_rollups, rebuild_revenue_rollups
+from .statement_import import StatementImporter, import_statement
+from .testing import StubFinanceServer
+
+
+class FinanceCacheServiceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_local_cache().clear()
+        self.student = Student.objects.create_user(student_id='S001', email='s@example.com')
+        self.api = mock.patch.object(
+            FinanceCacheService, '_fetch_from_api', return_value={'balance': 100.0, 'currency': 'KES'}
+        )
+        self.fetch = self.api.start()
+        self.addCleanup(self.api.stop)
+
+    def test_hits_are_served_without_queries(self):
+        self.assertEqual(FinanceCacheService.get_or_fetch(self.student.id, 'balance')['balance'], 100.0)
+        self.assertTrue(FinanceCache.objects.filter(student=self.student, data_type='balance').exists())
+
+        with self.assertNumQueries(0):
+            FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+
+        # A process with a cold local tier is answered by the shared cache
+        get_local_cache().clear()
+        with self.assertNumQueries(0):
+            FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_local_tier_hands_out_copies(self):
+        FinanceCacheService.get_or_fetch(self.student.id, 'balance')['balance'] = -1
+        with self.assertNumQueries(0):
+            self.assertEqual(FinanceCacheService.get_or_fetch(self.student.id, 'balance')['balance'], 100.0)
+
+    def test_durable_row_backfills_after_cache_flush(self):
+        FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        cache.clear()
+        get_local_cache().clear()
+
+        with self.assertNumQueries(1):
+            FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_invalidation_forces_synchronous_fetch(self):
+        FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        FinanceCacheService.invalidate_cache(self.student.id)
+        self.fetch.return_value = {'balance': 40.0, 'currency': 'KES'}
+
+        self.assertEqual(FinanceCacheService.get_or_fetch(self.student.id, 'balance')['balance'], 40.0)
+
+        # Invalidated data is still the answer of last resort when the API is down
+        FinanceCacheService.invalidate_cache(self.student.id, 'balance')
+        self.fetch.return_value = None
+        self.assertEqual(FinanceCacheService.get_or_fetch(self.student.id, 'balance')['balance'], 40.0)
+
+    def test_stale_entries_are_served_while_revalidating(self):
+        FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        with mock.patch.object(FinanceCacheService, '_revalidate_async') as revalidate:
+            with mock.patch('finance.cache_service.time.time', return_value=time.time() + 3700):
+                data = FinanceCacheService.get_or_fetch(self.student.id, 'balance')
+        self.assertEqual(data['balance'], 100.0)
+        revalidate.assert_called_once_with(self.student.id, 'balance')
+        self.assertEqual(self.fetch.call_count, 1)
+
+
+@override_settings(FINANCE_CACHE={'DB_FALLBACK': False})
+class FinanceFanOutTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        get_local_cache().clear()
+        self.students = [
+            Student.objects.create_user(student_id=f'S00{i}', email=f's{i}@example.com') for i in range(3)
+        ]
+
+    def use_server(self, **kwargs):
+        server = StubFinanceServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        self.addCleanup(setattr, external_api, '_api_instance', None)
+        external_api._api_instance = external_api.ExternalFinanceAPI(api_url=server.url, api_key='test')
+        return server
+
+    def test_lookups_run_in_parallel(self):
+        server = self.use_server(delays={'/students/': 0.3})
+        started = time.perf_counter()
+        results, pending = FinanceCacheService.fetch_many([s.id for s in self.students], ['balance', 'fees'])
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(pending, [])
+        self.assertEqual(results[self.students[2].id]['balance']['student_id'], 'S002')
+        self.assertEqual(server.request_count('/students/'), 6)
+        # Sequentially this is 1.8s
+        self.assertLess(elapsed, 1.2)
+
+    def test_refresh_returns_partial_results_at_deadline(self):
+        server = self.use_server(delays={'/invoices': 5})
+        student = self.students[0]
+        started = time.perf_counter()
+        pending = FinanceCacheService.refresh_cache(student.id, timeout=0.5)
+
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertEqual(pending, ['invoices'])
+        with self.assertNumQueries(0):
+            self.assertEqual(FinanceCacheService.get_or_fetch(student.id, 'balance')['balance'], 0.0)
+
+        # Let the straggler finish before the test database goes away
+        server.stop()
+        deadline = time.time() + 5
+        while cache.get(FinanceCacheService._key(student.id, 'invoices')) is None and time.time() < deadline:
+            time.sleep(0.05)
+
+
+class ExternalFinanceAPITest(TestCase):
+    def client_for(self, server, **options):
+        options = {'BACKOFF': 0, 'BACKOFF_JITTER': 0, **options}
+        return external_api.ExternalFinanceAPI(api_url=server.url, api_key='test', **options)
+
+    def test_connections_are_reused(self):
+        with StubFinanceServer() as server:
+            api = self.client_for(server)
+            for _ in range(5):
+                self.assertEqual(api.get_outstanding_balance('S001')['balance'], 0.0)
+        self.assertEqual(server.connections, 1)
+
+    def test_idempotent_calls_are_retried(self):
+        with StubFinanceServer(failures={'/balance': 2}) as server:
+            api = self.client_for(server, RETRIES=2)
+            self.assertEqual(api.get_outstanding_balance('S001')['student_id'], 'S001')
+        self.assertEqual(server.request_count('/balance'), 3)
+
+    def test_read_timeouts_are_not_retried(self):
+        with StubFinanceServer(delays={'/balance': 1}) as server:
+            api = self.client_for(server, RETRIES=3, TIMEOUT=0.2)
+            self.assertIsNone(api.get_outstanding_balance('S001'))
+            self.assertEqual(server.request_count('/balance'), 1)
+
+    def test_open_circuit_fails_fast_then_recovers(self):
+        with StubFinanceServer() as server:
+            api = self.client_for(server, RETRIES=0, BREAKER_THRESHOLD=2, BREAKER_RESET=0.2)
+            server.down = True
+            self.assertIsNone(api.get_student_fees('S001'))
+            self.assertIsNone(api.get_student_fees('S001'))
+            self.assertEqual(api.breaker.state, 'open')
+
+            self.assertIsNone(api.get_student_fees('S001'))
+            self.assertEqual(server.request_count(), 2)
+
+            server.down = False
+            time.sleep(0.25)
+            self.assertEqual(api.get_student_fees('S001')['fees'], [])
+            self.assertEqual(api.breaker.state, 'closed')
+
+    def test_unexpected_error_in_trial_does_not_wedge_the_circuit(self):
+        with StubFinanceServer() as server:
+            api = self.client_for(server, RETRIES=0, BREAKER_THRESHOLD=1, BREAKER_RESET=0.2)
+            server.down = True
+            self.assertIsNone(api.get_student_fees('S001'))
+            time.sleep(0.25)
+
+            with mock.patch.object(api.session, 'get', side_effect=RuntimeError('boom')):
+                with self.assertRaises(RuntimeError):
+                    api.get_student_fees('S001')
+            self.assertEqual(api.breaker.state, 'open')
+
+            server.down = False
+            time.sleep(0.25)
+            self.assertEqual(api.get_student_fees('S001')['fees'], [])
+            self.assertEqual(api.breaker.state, 'closed')
+
+    def test_cache_answers_while_circuit_is_open(self):
+        cache.clear()
+        get_local_cache().clear()
+        student = Student.objects.create_user(student_id='S001', email='s@example.com')
+        with StubFinanceServer() as server:
+            api = self.client_for(server, RETRIES=0, BREAKER_THRESHOLD=1)
+            self.addCleanup(setattr, external_api, '_api_instance', None)
+            external_api._api_instance = api
+
+            FinanceCacheService.get_or_fetch(student.id, 'balance')
+            FinanceCacheService.invalidate_cache(student.id)
+            server.down = True
+            self.assertIsNone(api.get_student_fees('S001'))
+
+            self.assertEqual(FinanceCacheService.get_or_fetch(student.id, 'balance')['balance'], 0.0)
+        self.assertEqual(server.request_count('/balance'), 1)
+
+
+@override_settings(FINANCE_CACHE={'DB_FALLBACK': True})
+class SyncFinanceCacheTest(TestCase):
+    def test_sync_writes_every_student_in_batches(self):
+        cache.clear()
+        get_local_cache().clear()
+        students = [Student.objects.create_user(student_id=f'S{i:03}', email=f's{i}@example.com') for i in range(5)]
+        FinanceCache.objects.create(
+            student=students[0], data_type='balance', cached_data={'balance': 9}, stale_after='2020-01-01T00:00Z',
+            is_stale=True,
+        )
+
+        with StubFinanceServer(page_size=2) as server:
+            self.addCleanup(setattr, external_api, '_api_instance', None)
+            external_api._api_instance = external_api.ExternalFinanceAPI(api_url=server.url, api_key='test')
+            with self.assertRaises(CommandError):
+                call_command('sync_finance_cache', chunk_size=3, workers=2, stdout=StringIO())
+
+            external_api._api_instance = external_api.ExternalFinanceAPI(
+                api_url=server.url, api_key='test', BATCH_ENDPOINTS=True
+            )
+            call_command('sync_finance_cache', chunk_size=3, workers=2, stdout=StringIO())
+
+        # 2 chunks (3 + 2 students) per type; the 3-student chunk takes two pages
+        self.assertEqual(server.request_count('/students/batch/'), 4 * 3)
+        self.assertEqual(FinanceCache.objects.count(), 20)
+        refreshed = FinanceCache.objects.get(student=students[0], data_type='balance')
+        self.assertFalse(refreshed.is_stale)
+        self.assertEqual(refreshed.cached_data['balance'], 0.0)
+        with self.assertNumQueries(0):
+            FinanceCacheService.get_or_fetch(students[4].id, 'invoices')
+
+
+class BillingFixtureMixin:
+    # Bill every student with a structure for the term before each test
+    BILL_TERM = False
+
+    def setUp(self):
+        year = AcademicYear.objects.create(name='2025', start_date=date(2025, 1, 1), end_date=date(2025, 12, 31))
+        self.term = AcademicTerm.objects.create(
+            year=year, name='Term 1', start_date=date(2025, 1, 6), end_date=date(2025, 4, 4)
+        )
+        grade4 = GradeLevel.objects.create(name='Grade 4', curriculum_type='CBC', order=4)
+        grade5 = GradeLevel.objects.create(name='Grade 5', curriculum_type='CBC', order=5)
+        self.structure = FeeStructure.objects.create(grade_level=grade4, academic_term=self.term, tuition_amount=1000)
+        self.grade_ids = [grade4.id, grade5.id]
+        self.students = [
+            Student.objects.create(email=f's{i}@example.com', username=f's{i}', student_id=f'S{i:03}', grade_level=grade)
+            for i, grade in enumerate([grade4, grade4, grade4, grade5])
+        ]
+        self.admin = Student.objects.create(email='admin@example.com', username='admin', student_id='ADM', is_staff=True)
+        if self.BILL_TERM:
+            apply_bulk_billing(plan_bulk_billing(self.term, self.grade_ids))
+
+
+class BulkBillingTest(BillingFixtureMixin, TestCase):
+    def test_plan_is_set_based(self):
+        StudentFee.objects.create(student=self.students[0], fee_structure=self.structure)
+        with self.assertNumQueries(3):
+            plan = plan_bulk_billing(self.term, self.grade_ids)
+
+        summary = plan.summary()
+        self.assertEqual(
+            (summary['created'], summary['skipped_already_exists'], summary['no_structure_found']), (2, 1, 1)
+        )
+        self.assertEqual(summary['total_amount'], 2000.0)
+        self.assertEqual([fee.status for fee in plan.new_fees], ['pending', 'pending'])
+
+    def test_dry_run_previews_without_writing(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = '/api/finance/student-fees/bulk_bill/'
+
+        preview = client.post(url, {'grade_ids': self.grade_ids, 'term_id': self.term.id, 'dry_run': True}, format='json')
+        self.assertEqual(preview.data['created'], 3)
+        self.assertEqual(preview.data['by_grade'][0]['students'], 3)
+        self.assertFalse(StudentFee.objects.exists())
+
+        response = client.post(url, {'grade_ids': self.grade_ids, 'term_id': self.term.id}, format='json')
+        self.assertEqual(response.data['created'], 3)
+        fee = StudentFee.objects.get(student=self.students[1])
+        self.assertEqual((fee.final_amount, fee.balance, fee.status), (1000, 1000, 'pending'))
+
+        again = client.post(url, {'grade_ids': self.grade_ids, 'term_id': self.term.id}, format='json')
+        self.assertEqual((again.data['created'], again.data['skipped_already_exists']), (0, 3))
+
+
+class FinanceRollupTest(BillingFixtureMixin, TestCase):
+    def totals(self):
+        expected = StudentFee.objects.aggregate(
+            total_fees=Sum('final_amount'), total_paid=Sum('amount_paid'), total_balance=Sum('balance'),
+            defaulters_count=Count('id', filter=Q(balance__gt=0)),
+        )
+        actual = FeeRollup.objects.aggregate(
+            total_fees=Sum('total_fees'), total_paid=Sum('total_paid'), total_balance=Sum('total_balance'),
+            defaulters_count=Sum('defaulters_count'),
+        )
+        return expected, actual
+
+    def pay(self, fee, amount, reference, when, method='mpesa'):
+        return Payment.objects.create(
+            student_fee=fee, amount=amount, payment_method=method, transaction_reference=reference,
+            payment_date=when, received_by='Bursar', receipt_number=f'R-{reference}',
+        )
+
+    def test_rollups_follow_saves_and_deletes(self):
+        apply_bulk_billing(plan_bulk_billing(self.term, self.grade_ids))
+        fees = list(StudentFee.objects.order_by('id'))
+        jan = timezone.make_aware(datetime(2025, 1, 10, 9))
+        feb = timezone.make_aware(datetime(2025, 2, 3, 9))
+        self.pay(fees[0], 400, 'T1', jan)
+        second = self.pay(fees[0], 600, 'T2', jan, method='cash')
+        self.pay(fees[1], 250, 'T3', feb)
+
+        second.amount = 500
+        second.save()
+        self.pay(fees[2], 50, 'T4', feb).delete()
+        fees[2].discount_amount = 100
+        fees[2].save()
+
+        expected, actual = self.totals()
+        self.assertEqual(expected, actual)
+        self.assertEqual(actual['defaulters_count'], 3)
+        self.assertEqual(
+            sorted(RevenueRollup.objects.values_list('date', 'payment_method', 'payment_count', 'total_amount')),
+            [(jan.date(), 'cash', 1, 500), (jan.date(), 'mpesa', 1, 400), (feb.date(), 'mpesa', 1, 250)],
+        )
+
+        before = sorted(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount'))
+        rebuild_fee_rollups()
+        rebuild_revenue_rollups()
+        self.assertEqual(self.totals()[1], actual)
+        self.assertEqual(sorted(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount')), before)
+
+    def test_one_rollup_row_without_a_structure(self):
+        FeeRollup.objects.create(fee_structure=None)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FeeRollup.objects.create(fee_structure=None)
+
+        StudentFee(student=self.students[3], custom_amount=250).save()
+        self.assertEqual(FeeRollup.objects.get(fee_structure=None).total_balance, 250)
+
+    def test_reports_read_rollups(self):
+        fee = StudentFee.objects.create(student=self.students[0], fee_structure=self.structure)
+        self.pay(fee, 300, 'T1', timezone.make_aware(datetime(2025, 1, 10, 9)))
+        self.pay(fee, 200, 'T2', timezone.make_aware(datetime(2025, 2, 3, 9)), method='bank')
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):
+            overview = client.get('/api/finance/overview/', {'term_id': self.term.id})
+        self.assertEqual((overview.data['total_fees'], overview.data['total_balance']), (1000, 500))
+        self.assertEqual(overview.data['defaulters_count'], 1)
+
+        report = client.get('/api/finance/reports/revenue/', {'start_date': '2025-01-01', 'bucket': 'month'})
+        self.assertEqual(report.data['total_revenue'], 500.0)
+        self.assertEqual(report.data['by_method']['Bank Transfer'], 200.0)
+        self.assertEqual(
+            [(p['period'], p['total']) for p in report.data['series']], [('2025-01-01', 300.0), ('2025-02-01', 200.0)]
+        )
+        self.assertEqual(client.get('/api/finance/reports/revenue/', {'bucket': 'year'}).status_code, 400)
+
+
+class StatementImportTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+    STATEMENT = (
+        'TransID,TransTime,TransAmount,BillRefNumber,FirstName\n'
+        'QX1,20250110093000,400,s000,Jane\n'
+        'QX2,20250111093000,"1,000.00",S000,Jane\n'
+        'QX1,20250110093000,400,S000,Jane\n'
+        'QX3,20250112093000,250,INV-1,John\n'
+        'QX4,20250112093000,100,S999,Nobody\n'
+        'QX5,20250112093000,abc,S001,John\n'
+        'OLD,20250101093000,50,S001,John\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.fee0 = StudentFee.objects.get(student=self.students[0])
+        self.fee1 = StudentFee.objects.get(student=self.students[1])
+        Invoice.objects.create(
+            student_fee=self.fee1, invoice_number='INV-1', issue_date='2025-01-06', due_date='2025-02-06', amount=1000
+        )
+        Payment.objects.create(
+            student_fee=self.fee1, amount=50, payment_method='cash', transaction_reference='OLD',
+            payment_date=timezone.make_aware(datetime(2025, 1, 1)), received_by='Bursar', receipt_number='R-OLD',
+        )
+
+    def test_import_matches_dedupes_and_reconciles(self):
+        with CaptureQueriesContext(connection) as queries:
+            report = import_statement(StringIO(self.STATEMENT), 'csv')
+        # Indexes, one dedupe lookup, the insert, one rollup bump per day, one grouped fee recompute,
+        # and a fixed-cost aging refresh of the touched fees
+        self.assertEqual(len(queries), 32)
+
+        self.assertEqual(
+            {key: report[key] for key in ('lines', 'imported', 'duplicates_in_file', 'already_recorded', 'unmatched', 'invalid')},
+            {'lines': 7, 'imported': 3, 'duplicates_in_file': 1, 'already_recorded': 1, 'unmatched': 1, 'invalid': 1},
+        )
+        self.assertEqual(report['imported_amount'], 1650.0)
+        self.assertEqual(
+            [(line['reference'], line['reason']) for line in report['unmatched_lines']],
+            [('QX4', 'unknown_account'), ('QX5', 'invalid_amount')],
+        )
+
+        self.fee0.refresh_from_db()
+        self.fee1.refresh_from_db()
+        self.assertEqual((self.fee0.amount_paid, self.fee0.balance, self.fee0.status), (1400, -400, 'paid'))
+        self.assertEqual((self.fee1.amount_paid, self.fee1.status), (300, 'partial'))
+        self.assertEqual(Payment.objects.get(transaction_reference='QX2').amount, 1000)
+        self.assertEqual(FeeRollup.objects.get(fee_structure=self.structure).total_paid, 1700)
+
+        again = import_statement(StringIO(self.STATEMENT), 'csv')
+        self.assertEqual((again['imported'], again['already_recorded']), (0, 4))
+
+    def test_dry_run_via_api_writes_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile('statement.csv', self.STATEMENT.encode('utf-8'))
+        response = client.post('/api/finance/payment/import/', {'file': upload, 'dry_run': 'true'}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['imported'], response.data['students_updated']), (3, 2))
+        self.assertEqual(Payment.objects.count(), 1)
+
+        client.force_authenticate(self.students[0])
+        upload = SimpleUploadedFile('statement.csv', self.STATEMENT.encode('utf-8'))
+        response = client.post('/api/finance/payment/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+    def test_long_references_are_rejected_or_hashed_into_receipts(self):
+        statement = (
+            'TransID,TransTime,TransAmount,BillRefNumber\n'
+            f"{'A' * 60}1,20250110093000,100,S000\n"
+            f"{'A' * 60}2,20250110093000,100,S000\n"
+            f"{'B' * 101},20250110093000,100,S000\n"
+        )
+        report = import_statement(StringIO(statement), 'csv', chunk_size=1)
+
+        self.assertEqual((report['imported'], report['invalid']), (2, 1))
+        self.assertEqual(report['unmatched_lines'][0]['reason'], 'reference_too_long')
+        receipts = list(Payment.objects.filter(transaction_reference__startswith='A').values_list('receipt_number', flat=True))
+        self.assertEqual(len(set(receipts)), 2)
+        self.assertTrue(all(len(receipt) <= 50 for receipt in receipts))
+
+    def test_references_recorded_concurrently_are_skipped(self):
+        original = StatementImporter._recorded_references
+        calls = []
+
+        def stale_first_lookup(references):
+            # The first lookup runs before another writer records QX2
+            calls.append(references)
+            return set() if len(calls) == 1 else original(references)
+
+        Payment.objects.create(
+            student_fee=self.fee0, amount=1000, payment_method='mpesa', transaction_reference='QX2',
+            payment_date=timezone.now(), received_by='Callback', receipt_number='CB-QX2',
+        )
+        with mock.patch.object(StatementImporter, '_recorded_references', side_effect=stale_first_lookup):
+            report = import_statement(StringIO(self.STATEMENT), 'csv')
+
+        self.assertEqual((report['imported'], report['already_recorded']), (2, 2))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Payment.objects.filter(transaction_reference='QX2').count(), 1)
+
+
+@override_settings(FINANCE_CALLBACKS={'SECRET': 'secret'})
+class PaymentCallbackInboxTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+    URL = '/api/finance/callbacks/mpesa/'
+
+    def setUp(self):
+        super().setUp()
+        self.fee0 = StudentFee.objects.get(student=self.students[0])
+
+    def callback(self, reference, amount, account='S000'):
+        return {'TransID': reference, 'TransTime': '20250110093000', 'TransAmount': str(amount),
+                'BillRefNumber': account, 'FirstName': 'Jane'}
+
+    def accept(self, payload):
+        body = json.dumps(payload).encode()
+        return callback_inbox.accept_callback('mpesa', payload, body, callback_inbox.sign_callback(body))
+
+    def post(self, payload, url=URL, signature=None):
+        body = json.dumps(payload).encode()
+        signature = callback_inbox.sign_callback(body) if signature is None else signature
+        return APIClient().post(url, body, content_type='application/json', HTTP_X_CALLBACK_SIGNATURE=signature)
+
+    def test_endpoint_only_appends_and_dedupes_redeliveries(self):
+        first = self.post(self.callback('QA1', 300))
+        again = self.post(self.callback('QA1', 300))
+        invalid = self.post(self.callback('QA2', 'abc'))
+        too_long = self.post(self.callback('Q' * 101, 300))
+        unknown = self.post(self.callback('QA3', 10), url='/api/finance/callbacks/paypal/')
+
+        self.assertEqual((first.status_code, first.data['ResultCode']), (202, 0))
+        self.assertEqual((again.status_code, again.data['ResultDesc']), (200, 'Duplicate'))
+        self.assertEqual((invalid.status_code, invalid.data['ResultCode']), (400, 1))
+        self.assertEqual(too_long.status_code, 400)
+        self.assertEqual(unknown.status_code, 404)
+        self.assertEqual(PaymentCallback.objects.filter(status='pending').count(), 1)
+        self.assertEqual(Payment.objects.count(), 0)
+
+    def test_signature_is_required(self):
+        self.assertEqual(self.post(self.callback('QA1', 300), signature='').status_code, 403)
+        self.assertEqual(self.post(self.callback('QA1', 300), signature='0' * 64).status_code, 403)
+        signed = self.post(self.callback('QA1', 300), signature=f"sha256={callback_inbox.sign_callback(b'x')}")
+        self.assertEqual(signed.status_code, 403)
+        self.assertEqual(self.post(self.callback('QA1', 300)).status_code, 202)
+
+        # Without a secret every callback is refused, even one signed with the empty key
+        with override_settings(FINANCE_CALLBACKS={'SECRET': ''}):
+            self.assertEqual(self.post(self.callback('QA2', 300)).status_code, 403)
+        self.assertEqual(PaymentCallback.objects.count(), 1)
+
+    def test_batch_coalesces_per_fee_and_invalidates_once_per_student(self):
+        Payment.objects.create(
+            student_fee=self.fee0, amount=50, payment_method='cash', transaction_reference='QB9',
+            payment_date=self.fee0.created_at, received_by='Bursar', receipt_number='R-QB9',
+        )
+        for reference, amount, account in [('QB1', 200, 'S000'), ('QB2', 300, 's000'), ('QB3', 100, 'S001'),
+                                           ('QB9', 50, 'S000'), ('QB4', 75, 'S999')]:
+            self.accept(self.callback(reference, amount, account))
+
+        with mock.patch.object(FinanceCacheService, 'invalidate_many') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            totals = callback_inbox.drain_inbox(batch_size=100)
+
+        self.assertEqual(totals, {'batches': 1, 'applied': 3, 'duplicate': 1, 'unmatched': 1})
+        self.assertEqual(len(queries), 31)
+        invalidate.assert_called_once_with({self.students[0].id, self.students[1].id})
+
+        self.fee0.refresh_from_db()
+        self.assertEqual((self.fee0.amount_paid, self.fee0.balance), (550, 450))
+        self.assertEqual(FeeRollup.objects.get(fee_structure=self.structure).total_paid, 650)
+
+        callbacks = {c.transaction_reference: c for c in PaymentCallback.objects.all()}
+        self.assertEqual(callbacks['QB1'].payment.amount, 200)
+        self.assertEqual(callbacks['QB9'].payment.receipt_number, 'R-QB9')
+        self.assertEqual((callbacks['QB4'].status, callbacks['QB4'].error), ('unmatched', 'unknown_account'))
+        self.assertEqual(callback_inbox.drain_inbox(), {'batches': 0})
+
+    def test_requeued_callbacks_apply_once_fixed(self):
+        self.accept(self.callback('QC1', 100, 'S004'))
+        callback_inbox.drain_inbox()
+        self.assertEqual(PaymentCallback.objects.get().status, 'unmatched')
+
+        Student.objects.filter(student_id='S003').update(student_id='S004')
+        self.assertEqual(callback_inbox.requeue_callbacks(['unmatched']), 1)
+        self.assertEqual(callback_inbox.drain_inbox(), {'batches': 1, 'unmatched': 1})
+        self.assertEqual(PaymentCallback.objects.get().error, 'no_fee')
+
+        callback_inbox.requeue_callbacks(['unmatched'])
+        Student.objects.filter(student_id='S004').update(student_id='S003')
+        PaymentCallback.objects.update(account='S000')
+        self.assertEqual(callback_inbox.drain_inbox(), {'batches': 1, 'applied': 1})
+        self.assertEqual(PaymentCallback.objects.get().attempts, 3)
+
+    def test_expired_claims_are_reclaimed(self):
+        self.accept(self.callback('QD1', 100))
+        self.assertEqual(len(callback_inbox.claim_batch()), 1)
+        self.assertEqual(callback_inbox.claim_batch(), [])
+
+        PaymentCallback.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(callback_inbox.drain_inbox(), {'batches': 1, 'applied': 1})
+
+
+class DefaultersTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+
+    def setUp(self):
+        super().setUp()
+        # Balances 1000, 600, 600 (grade 4 structure) and 250 (custom fee, grade 5)
+        StudentFee.objects.filter(student__in=self.students[1:3]).update(amount_paid=400, balance=600)
+        extra = StudentFee(student=self.students[3], custom_amount=250)
+        extra.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pages_cover_every_defaulter_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get('/api/finance/defaulters/', {'page_size': 1, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [(row['student_id'], float(row['balance'])) for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [('S000', 1000.0), ('S002', 600.0), ('S001', 600.0), ('S003', 250.0)])
+
+    def test_filters_and_bad_input(self):
+        def ids(**params):
+            return [row['student_id'] for row in self.client.get('/api/finance/defaulters/', params).data['results']]
+
+        self.assertEqual(ids(grade=self.grade_ids[1]), ['S003'])
+        self.assertEqual(ids(term=self.term.id), ['S000', 'S002', 'S001'])
+        self.assertEqual(ids(min_balance=300, max_balance=600), ['S002', 'S001'])
+        self.assertEqual(self.client.get('/api/finance/defaulters/', {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/finance/defaulters/', {'min_balance': 'x'}).status_code, 400)
+        for value in ('NaN', 'Infinity', '-inf'):
+            self.assertEqual(self.client.get('/api/finance/defaulters/', {'max_balance': value}).status_code, 400)
+            self.assertEqual(self.client.get('/api/finance/defaulters/export/', {'min_balance': value}).status_code, 400)
+        self.assertEqual(self.client.get('/api/finance/defaulters/', {'cursor': 'TmFOOjE'}).status_code, 400)
+
+    def test_only_staff_see_defaulters(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.get('/api/finance/defaulters/').status_code, 403)
+        self.assertEqual(client.get('/api/finance/defaulters/export/').status_code, 403)
+
+    def test_page_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/finance/defaulters/', {'page_size': 10})
+        self.assertLessEqual(len(queries), 2)
+
+    def test_export_streams_csv(self):
+        response = self.client.get('/api/finance/defaulters/export/', {'term': self.term.id})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['Student ID', 'First Name'])
+        self.assertEqual([(row[0], row[9]) for row in rows[1:]], [('S000', '1000.00'), ('S002', '600.00'), ('S001', '600.00')])
+
+
+class FeeAgingTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.fees = [StudentFee.objects.get(student=student) for student in self.students[:3]]
+        for fee, days in zip(self.fees, [45, 100]):
+            Invoice.objects.create(
+                student_fee=fee, invoice_number=f'INV-{fee.id}', amount=1000,
+                issue_date=self.today - timedelta(days=days + 30), due_date=self.today - timedelta(days=days),
+            )
+
+    def buckets(self, **filters):
+        return dict(FeeAging.objects.filter(**filters).values_list('student_fee__student__student_id', 'bucket'))
+
+    def test_fees_are_bucketed_by_first_invoice_due_date(self):
+        self.assertEqual(self.buckets(), {'S000': '31_60', 'S001': '90_plus', 'S002': 'current'})
+
+        self.assertEqual(refresh_fee_aging(as_of=self.today + timedelta(days=20)), 3)
+        self.assertEqual(self.buckets(), {'S000': '61_90', 'S001': '90_plus', 'S002': '1_30'})
+        self.assertEqual(
+            dict(FeeAgingRollup.objects.values_list('bucket', 'total_balance')),
+            {'61_90': 1000, '90_plus': 1000, '1_30': 1000},
+        )
+
+    def test_payments_refresh_incrementally(self):
+        Payment.objects.create(
+            student_fee=self.fees[0], amount=1000, payment_method='cash', transaction_reference='P1',
+            payment_date=timezone.now(), received_by='Bursar', receipt_number='R-P1',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            record_payments([Payment(
+                student_fee=self.fees[1], amount=400, payment_method='mpesa', transaction_reference='P2',
+                payment_date=timezone.now(), received_by='Bursar', receipt_number='R-P2',
+            )])
+
+        self.assertEqual(self.buckets(), {'S001': '90_plus', 'S002': 'current'})
+        self.assertEqual(FeeAgingRollup.objects.get(bucket='90_plus').total_balance, 600)
+        self.assertFalse(FeeAgingRollup.objects.filter(bucket='31_60').exists())
+
+        self.fees[2].delete()
+        self.assertFalse(FeeAgingRollup.objects.filter(bucket='current').exists())
+
+    def test_admin_report_and_child_finances_read_the_snapshot(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        report = client.get('/api/finance/reports/aging/', {'term_id': self.term.id}).data
+        self.assertEqual(report['total_balance'], 3000.0)
+        self.assertEqual([b['fee_count'] for b in report['buckets']], [1, 0, 1, 0, 1])
+        self.assertEqual(report['by_grade'][0]['grade_name'], 'Grade 4')
+
+        parent = Parent.objects.create(email='p@example.com', password_hash='x', first_name='P', last_name='P', phone='1')
+        parent.children.add(self.students[1])
+        token = RefreshToken()
+        token['parent_id'] = parent.id
+        token['user_type'] = 'parent'
+        parent_client = APIClient()
+        parent_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+        response = parent_client.get(f'/api/parents/child-finances/{self.students[1].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['max_days_overdue'], 100)
+        self.assertEqual(response.data['aging']['buckets'][4]['total_balance'], 1000.0)
+
+    def test_invoice_deletes_and_bulk_updates_re_age_fees(self):
+        Invoice.objects.filter(student_fee=self.fees[0]).update(due_date=self.today - timedelta(days=70))
+        self.assertEqual(self.buckets(student_fee=self.fees[0]), {'S000': '61_90'})
+
+        Invoice.objects.get(student_fee=self.fees[1]).delete()
+        self.assertEqual(self.buckets(student_fee=self.fees[1]), {'S001': 'current'})
+
+        Invoice.objects.filter(student_fee=self.fees[0]).delete()
+        self.assertEqual(self.buckets(), {'S000': 'current', 'S001': 'current', 'S002': 'current'})
+        self.assertEqual(FeeAgingRollup.objects.get().fee_count, 3)
+
+        StudentFee.objects.filter(id=self.fees[2].id).update(balance=0)
+        self.assertEqual(set(self.buckets()), {'S000', 'S001'})
+
+    def test_rollups_are_upserted_and_unique_per_group(self):
+        rows = dict(FeeAgingRollup.objects.values_list('bucket', 'id'))
+        Payment.objects.create(
+            student_fee=self.fees[1], amount=400, payment_method='cash', transaction_reference='P1',
+            payment_date=timezone.now(), received_by='Bursar', receipt_number='R-P1',
+        )
+        self.assertEqual(dict(FeeAgingRollup.objects.values_list('bucket', 'id')), rows)
+        self.assertEqual(FeeAgingRollup.objects.get(bucket='90_plus').total_balance, 600)
+
+        # Groups without a grade or term have one row per bucket too
+        FeeAgingRollup.objects.create(bucket='current', as_of=self.today)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FeeAgingRollup.objects.create(bucket='current', as_of=self.today)
+
+    def test_migration_backfills_outstanding_fees(self):
+        from importlib import import_module
+        from types import SimpleNamespace
+        from django.apps import apps
+
+        FeeAging.objects.all().delete()
+        FeeAgingRollup.objects.all().delete()
+        migration = import_module('finance.migrations.0007_fee_aging')
+        migration.populate_fee_aging(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self.buckets(), {'S000': '31_60', 'S001': '90_plus', 'S002': 'current'})
+        self.assertEqual(FeeAgingRollup.objects.aggregate(total=Sum('total_balance'))['total'], 3000)
+
+    def test_aging_report_is_admin_only_and_checks_filters(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/finance/reports/aging/', {'term_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'term_id must be an integer')
+        self.assertEqual(client.get('/api/finance/reports/aging/', {'grade_id': '1.5'}).status_code, 400)
+
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.get('/api/finance/reports/aging/').status_code, 403)
+
+
+class CreditCarryForwardTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+
+    def setUp(self):
+        super().setUp()
+        self.term2 = AcademicTerm.objects.create(
+            year=self.term.year, name='Term 2', start_date=date(2025, 5, 5), end_date=date(2025, 8, 1)
+        )
+        FeeStructure.objects.create(grade_level_id=self.grade_ids[0], academic_term=self.term2, tuition_amount=1000)
+        # S000 overpaid by 1500 (more than next term's fee), S001 by 300, S002 paid exactly
+        for student, paid in zip(self.students, [2500, 1300, 1000]):
+            fee = StudentFee.objects.get(student=student, fee_structure=self.structure)
+            fee.amount_paid = paid
+            fee.save()
+
+    def test_credit_moves_to_next_term_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = carry_forward_credits(self.term)
+
+        self.assertEqual(
+            {key: summary[key] for key in ('to_term', 'students', 'fees_billed', 'overpayment_total', 'applied_total', 'held_total')},
+            {'to_term': self.term2.id, 'students': 2, 'fees_billed': 2, 'overpayment_total': 1800.0,
+             'applied_total': 1300.0, 'held_total': 500.0},
+        )
+        old = {fee.student_id: fee for fee in StudentFee.objects.filter(fee_structure=self.structure)}
+        new = {fee.student_id: fee for fee in StudentFee.objects.filter(fee_structure__academic_term=self.term2)}
+        s0, s1 = self.students[0].id, self.students[1].id
+        self.assertEqual((old[s0].balance, old[s0].credit_applied), (0, -1500))
+        self.assertEqual((new[s0].balance, new[s0].status), (0, 'paid'))
+        self.assertEqual((new[s1].balance, new[s1].status), (700, 'partial'))
+        self.students[0].refresh_from_db()
+        self.assertEqual(self.students[0].credit_balance, 500)
+        # Overpayments (-1800) no longer count against the closing term
+        self.assertEqual(FeeRollup.objects.get(fee_structure=self.structure).total_balance, 0)
+
+        entry = CreditCarryForward.objects.get(student=self.students[0])
+        self.assertEqual((entry.overpayment, entry.applied, entry.closing_credit), (1500, 1000, 500))
+        self.assertEqual(entry.target_fees, [[new[s0].id, '1000.00']])
+
+        again = carry_forward_credits(self.term)
+        self.assertEqual((again['students'], again['already_processed'], again['applied_total']), (0, 2, 0.0))
+        self.assertEqual(CreditCarryForward.objects.count(), 2)
+
+    def test_dry_run_writes_nothing(self):
+        summary = carry_forward_credits(self.term, dry_run=True)
+
+        self.assertEqual(summary['applied_total'], 1300.0)
+        self.assertFalse(CreditCarryForward.objects.exists())
+        self.assertFalse(StudentFee.objects.filter(fee_structure__academic_term=self.term2).exists())
+        self.assertEqual(StudentFee.objects.get(student=self.students[0], fee_structure=self.structure).balance, -1500)
+
+    def test_needs_a_later_term(self):
+        with self.assertRaises(ValueError):
+            carry_forward_credits(self.term2)
+
+    def test_credit_is_not_writable_through_the_api(self):
+        fee = StudentFee.objects.get(student=self.students[2], fee_structure=self.structure)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(f'/api/finance/student-fees/{fee.id}/', {'credit_applied': '400'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        fee.refresh_from_db()
+        self.assertEqual((fee.credit_applied, fee.balance), (0, 0))
+
+
+class BulkInvoicingTest(BillingFixtureMixin, TestCase):
+    BILL_TERM = True
+
+    def setUp(self):
+        super().setUp()
+        self.fees = list(StudentFee.objects.filter(fee_structure=self.structure).order_by('student__student_id'))
+        # S002 has paid in full and is not invoiced
+        self.fees[2].amount_paid = 1000
+        self.fees[2].save()
+        self.prefix = f'INV-2025-TERM1-{self.term.id}'
+
+    def test_numbers_are_consecutive_and_fees_invoiced_once(self):
+        # Constant in the number of fees: select, sequence, batch, invoice INSERT, aging refresh
+        with self.assertNumQueries(22):
+            batch = create_term_invoices(self.term)
+
+        self.assertEqual((batch.first_number, batch.last_number, batch.invoice_count),
+                         (f'{self.prefix}-000001', f'{self.prefix}-000002', 2))
+        invoices = list(Invoice.objects.filter(batch=batch).order_by('invoice_number'))
+        self.assertEqual([invoice.student_fee_id for invoice in invoices], [self.fees[0].id, self.fees[1].id])
+        self.assertEqual([invoice.amount for invoice in invoices], [1000, 1000])
+        self.assertEqual(FeeAging.objects.get(student_fee=self.fees[0]).due_date, invoices[0].due_date)
+
+        self.assertIsNone(create_term_invoices(self.term))
+        self.assertEqual(InvoiceSequence.objects.get(academic_term=self.term).next_number, 3)
+
+    def test_rolled_back_batch_returns_its_numbers(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            allocate_invoice_numbers(self.term, 50)
+            raise RuntimeError
+
+        batch = create_term_invoices(self.term)
+        self.assertEqual(batch.first_number, f'{self.prefix}-000001')
+
+    def test_single_invoice_takes_next_number(self):
+        create_term_invoices(self.term)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/finance/invoice/generate/', {
+            'student_fee': self.fees[2].id, 'issue_date': '2025-01-10', 'due_date': '2025-01-24', 'amount': '0',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['invoice_number'], f'{self.prefix}-000003')
+
+    def test_render_attaches_documents(self):
+        batch = create_term_invoices(self.term)
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            batch = InvoiceRenderer(batch, workers=1).run()
+            self.assertEqual((batch.status, batch.rendered_count), ('completed', 2))
+
+            invoice = batch.invoices.get(student_fee=self.fees[0])
+            with invoice.pdf_file.open('rb') as f:
+                document = f.read().decode()
+            self.assertIn(f'{self.prefix}-000001', document)
+            self.assertIn('Tuition', document)
+
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            response = client.get(f'/api/finance/invoice/{invoice.id}/download/')
+            self.assertEqual(response['Content-Type'], 'text/html')
+
+    def test_bulk_generate_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with mock.patch('finance.invoicing.launch_invoice_rendering') as launch, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/finance/invoice/bulk-generate/', {'term_id': self.term.id}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['invoice_count'], response.data['status']), (2, 'pending'))
+        launch.assert_called_once()
+        status_response = client.get(f"/api/finance/invoice/batches/{response.data['id']}/")
+        self.assertEqual(status_response.data['last_number'], f'{self.prefix}-000002')
+
+        with mock.patch('finance.invoicing.launch_command') as launch_command:
+            launch_invoice_rendering(InvoiceBatch.objects.get(id=response.data['id']))
+        launch_command.assert_called_once_with('render_invoices', '--batch', str(response.data['id']))
+
+        client.force_authenticate(self.students[0])
+        self.assertEqual(client.post('/api/finance/invoice/bulk-generate/', {'term_id': self.term.id}).status_code, 403)
+        self.assertEqual(client.get(f"/api/finance/invoice/batches/{response.data['id']}/").status_code, 403)
+
+    def test_terms_with_the_same_truncated_names_get_their_own_prefix(self):
+        year = AcademicYear.objects.create(
+            name='2025 Academic Calendar Year', start_date=date(2025, 1, 1), end_date=date(2025, 12, 31)
+        )
+        terms = [
+            AcademicTerm.objects.create(year=year, name=f'Supplementary Session {n}', start_date=date(2025, 1, 6),
+                                        end_date=date(2025, 4, 4))
+            for n in (1, 2)
+        ]
+        prefixes = [allocate_invoice_numbers(term, 1)[0] for term in terms]
+        self.assertEqual(prefixes, [f'INV-2025ACADEMIC-SUPPLEMENTAR-{term.id}' for term in terms])
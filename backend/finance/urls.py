@@ -26,10 +26,16 @@ urlpatterns = [
     # Admin endpoints
     path('overview/', views.finance_overview, name='overview'),
     path('defaulters/', views.defaulters_list, name='defaulters'),
+    path('defaulters/export/', views.export_defaulters, name='export-defaulters'),
     path('payment/record/', views.record_payment, name='record-payment'),
+    path('payment/import/', views.import_statement, name='import-statement'),
+    path('callbacks/<str:provider>/', views.payment_callback, name='payment-callback'),
     path('invoice/generate/', views.generate_invoice, name='generate-invoice'),
+    path('invoice/bulk-generate/', views.bulk_generate_invoices, name='bulk-generate-invoices'),
+    path('invoice/batches/<int:batch_id>/', views.invoice_batch_status, name='invoice-batch-status'),
     path('cache/refresh/<int:student_id>/', views.refresh_cache, name='refresh-cache'),
     path('reports/revenue/', views.revenue_report, name='revenue-report'),
+    path('reports/aging/', views.aging_report, name='aging-report'),
     
     # ViewSet routes
     path('', include(router.urls)),
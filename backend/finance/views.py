@@ -2,23 +2,37 @@
 Finance API views
 """
 
+import os
+from datetime import date
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
 
-from .models import FeeStructure, StudentFee, Payment, Invoice
+from .models import (
+    FeeStructure, StudentFee, Payment, Invoice, InvoiceBatch, FeeAgingRollup, FeeRollup, RevenueRollup
+)
 from .serializers import (
     FeeStructureSerializer, StudentFeeSerializer,
-    PaymentSerializer, InvoiceSerializer, FinanceSummarySerializer
+    PaymentSerializer, InvoiceSerializer, InvoiceBatchSerializer, FinanceSummarySerializer
 )
 from .cache_service import FinanceCacheService
-from students.models import Student
+from .billing import apply_bulk_billing, plan_bulk_billing
+from . import aging, callback_inbox, defaulters, invoicing, statement_import
+from core.downloads import serve_file
+from core.permissions import IsAdmin
 from core.models import AcademicTerm
 from cbc.models import GradeLevel
 
+REVENUE_BUCKETS = ['day', 'week', 'month']
+
 
 # Parent/Student Endpoints
 
@@ -87,14 +101,17 @@ def student_invoices(request, student_id):
 @api_view(['GET'])
 def download_invoice(request, invoice_id):
     """
-    Download invoice PDF
+    Download invoice document (conditional and range requests supported)
     GET /api/finance/invoice/{id}/download/
     """
     invoice = get_object_or_404(Invoice, id=invoice_id)
     
     if invoice.pdf_file:
-        from django.http import FileResponse
-        return FileResponse(invoice.pdf_file.open('rb'), content_type='application/pdf')
+        try:
+            extension = os.path.splitext(invoice.pdf_file.name)[1]
+            return serve_file(request, invoice.pdf_file, filename=f'{invoice.invoice_number}{extension}')
+        except FileNotFoundError:
+            pass
     
     return Response({'error': 'PDF not available'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -107,37 +124,82 @@ def finance_overview(request):
     """
     Get financial overview for admin dashboard
     GET /api/finance/overview/
+    Query params: term_id, grade_id (optional)
     """
-    # Get current term fees
-    total_fees = StudentFee.objects.aggregate(total=Sum('final_amount'))['total'] or 0
-    total_paid = StudentFee.objects.aggregate(total=Sum('amount_paid'))['total'] or 0
-    total_balance = StudentFee.objects.aggregate(total=Sum('balance'))['total'] or 0
-    
-    # Count defaulters (students with balance > 0)
-    defaulters_count = StudentFee.objects.filter(balance__gt=0).count()
+    # Totals come from the per term x grade rollups, not a scan of every fee
+    rollups = FeeRollup.objects.all()
+    term_id = request.query_params.get('term_id')
+    grade_id = request.query_params.get('grade_id')
+    if term_id:
+        rollups = rollups.filter(fee_structure__academic_term_id=term_id)
+    if grade_id:
+        rollups = rollups.filter(fee_structure__grade_level_id=grade_id)
+
+    totals = rollups.aggregate(
+        total_fees=Sum('total_fees'),
+        total_paid=Sum('total_paid'),
+        total_balance=Sum('total_balance'),
+        defaulters_count=Sum('defaulters_count'),
+    )
     
     # Recent payments
-    recent_payments = Payment.objects.order_by('-payment_date')[:10]
+    recent_payments = Payment.objects.select_related('student_fee__student').order_by('-payment_date')[:10]
     
     return Response({
-        'total_fees': total_fees,
-        'total_paid': total_paid,
-        'total_balance': total_balance,
-        'defaulters_count': defaulters_count,
+        'total_fees': totals['total_fees'] or 0,
+        'total_paid': totals['total_paid'] or 0,
+        'total_balance': totals['total_balance'] or 0,
+        'defaulters_count': totals['defaulters_count'] or 0,
         'recent_payments': PaymentSerializer(recent_payments, many=True).data
     })
 
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAdmin])
 def defaulters_list(request):
     """
-    Get list of students with outstanding balances
-    GET /api/finance/defaulters/
+    Get list of students with outstanding balances, largest balance first
+    GET /api/finance/defaulters/?grade=&term=&min_balance=&max_balance=&page_size=&cursor=
+    Pass back next_cursor to get the following page.
     """
-    defaulters = StudentFee.objects.filter(balance__gt=0).select_related('student', 'fee_structure')
-    serializer = StudentFeeSerializer(defaulters, many=True)
-    return Response(serializer.data)
+    try:
+        fees = defaulters.defaulters_queryset(
+            grade=request.query_params.get('grade'),
+            term=request.query_params.get('term'),
+            min_balance=request.query_params.get('min_balance'),
+            max_balance=request.query_params.get('max_balance'),
+        )
+        page_size = int(request.query_params.get('page_size') or defaulters.PAGE_SIZE)
+        page, next_cursor = defaulters.defaulters_page(fees, request.query_params.get('cursor'), page_size)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'results': StudentFeeSerializer(page, many=True).data,
+        'next_cursor': next_cursor,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def export_defaulters(request):
+    """
+    Stream the defaulters list as CSV (same filters as defaulters_list)
+    GET /api/finance/defaulters/export/
+    """
+    try:
+        fees = defaulters.defaulters_queryset(
+            grade=request.query_params.get('grade'),
+            term=request.query_params.get('term'),
+            min_balance=request.query_params.get('min_balance'),
+            max_balance=request.query_params.get('max_balance'),
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(defaulters.iter_defaulters_csv(fees), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="defaulters-{timezone.localdate():%Y%m%d}.csv"'
+    return response
 
 
 @api_view(['POST'])
@@ -159,21 +221,135 @@ def record_payment(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def import_statement(request):
+    """
+    Import an M-Pesa or bank statement and return a reconciliation report
+    POST /api/finance/payment/import/
+    Multipart: file, format (csv/jsonl), method (default mpesa), dry_run
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fmt = request.data.get('format') or ('jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+    try:
+        report = statement_import.import_statement(
+            upload.file, fmt,
+            default_method=request.data.get('method', 'mpesa'),
+            received_by=request.user.get_full_name() or 'Statement import',
+            dry_run=dry_run,
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def payment_callback(request, provider):
+    """
+    Payment provider callback (e.g. M-Pesa C2B confirmation)
+    POST /api/finance/callbacks/{provider}/
+    Only validates and stores the callback; it is applied by apply_payment_callbacks.
+    Redeliveries are acknowledged without being stored again.
+    Header: X-Callback-Signature, the hex HMAC-SHA256 of the body
+    """
+    # Read the raw body before request.data consumes the stream
+    body = request.body
+    try:
+        callback, created = callback_inbox.accept_callback(
+            provider, request.data, body, request.headers.get('X-Callback-Signature')
+        )
+    except callback_inbox.CallbackRejected as e:
+        return Response({'ResultCode': 1, 'ResultDesc': str(e)}, status=e.status_code)
+
+    return Response(
+        {'ResultCode': 0, 'ResultDesc': 'Accepted' if created else 'Duplicate'},
+        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+    )
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_invoice(request):
     """
     Generate invoice for a student fee
     POST /api/finance/invoice/generate/
+    Without an invoice_number the next number in the fee's term sequence is used.
     """
-    serializer = InvoiceSerializer(data=request.data)
-    if serializer.is_valid():
-        invoice = serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    
+    data = request.data.copy()
+    with transaction.atomic():
+        if not data.get('invoice_number'):
+            fee = StudentFee.objects.filter(id=data.get('student_fee')).select_related(
+                'fee_structure__academic_term__year'
+            ).first()
+            if fee is None or fee.fee_structure is None or fee.fee_structure.academic_term is None:
+                return Response(
+                    {'invoice_number': ['Required for fees that do not belong to a term.']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            data['invoice_number'] = invoicing.next_invoice_number(fee.fee_structure.academic_term)
+
+        serializer = InvoiceSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # Hand the reserved number back
+        transaction.set_rollback(True)
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def bulk_generate_invoices(request):
+    """
+    Invoice every fee in a term that has a balance and no open invoice; the
+    documents are rendered in the background
+    POST /api/finance/invoice/bulk-generate/
+    Body: { "term_id": 5, "grade_ids": [1, 2], "issue_date": "YYYY-MM-DD", "due_date": "YYYY-MM-DD", "notes": "" }
+    """
+    term_id = request.data.get('term_id')
+    if not term_id:
+        return Response({'error': 'term_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    term = get_object_or_404(AcademicTerm, id=term_id)
+
+    try:
+        dates = {
+            key: date.fromisoformat(request.data[key]) if request.data.get(key) else None
+            for key in ('issue_date', 'due_date')
+        }
+        batch = invoicing.create_term_invoices(
+            term, **dates,
+            grade_ids=request.data.get('grade_ids') or None,
+            created_by=request.user,
+            notes=request.data.get('notes', ''),
+        )
+    except (TypeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if batch is None:
+        return Response({'message': 'Nothing to invoice.'})
+    transaction.on_commit(lambda: invoicing.launch_invoice_rendering(batch))
+    return Response(InvoiceBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def invoice_batch_status(request, batch_id):
+    """
+    Numbering and rendering progress of a bulk invoicing batch
+    GET /api/finance/invoice/batches/{batch_id}/
+    """
+    batch = get_object_or_404(InvoiceBatch, id=batch_id)
+    return Response(InvoiceBatchSerializer(batch).data)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def refresh_cache(request, student_id):
@@ -182,7 +358,9 @@ def refresh_cache(request, student_id):
     POST /api/finance/cache/refresh/{student_id}/
     """
     try:
-        FinanceCacheService.refresh_cache(student_id)
+        pending = FinanceCacheService.refresh_cache(student_id)
+        if pending:
+            return Response({'message': 'Cache partially refreshed', 'pending': pending})
         return Response({'message': 'Cache refreshed successfully'})
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -192,37 +370,111 @@ def refresh_cache(request, student_id):
 @permission_classes([IsAuthenticated])
 def revenue_report(request):
     """
-    Get revenue report
+    Get revenue report from the daily revenue rollups
     GET /api/finance/reports/revenue/
-    Query params: start_date, end_date
+    Query params: start_date, end_date (inclusive days), bucket (day/week/month)
     """
     from datetime import datetime
     
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
+    bucket = request.query_params.get('bucket')
+
+    if bucket and bucket not in REVENUE_BUCKETS:
+        return Response(
+            {'error': f"bucket must be one of: {', '.join(REVENUE_BUCKETS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    payments = Payment.objects.all()
+    rollups = RevenueRollup.objects.all()
     
     if start_date:
-        payments = payments.filter(payment_date__gte=datetime.fromisoformat(start_date))
+        rollups = rollups.filter(date__gte=datetime.fromisoformat(start_date).date())
     if end_date:
-        payments = payments.filter(payment_date__lte=datetime.fromisoformat(end_date))
+        rollups = rollups.filter(date__lte=datetime.fromisoformat(end_date).date())
     
-    total_revenue = payments.aggregate(total=Sum('amount'))['total'] or 0
-    payment_count = payments.count()
+    totals = rollups.aggregate(total=Sum('total_amount'), count=Sum('payment_count'))
+    method_labels = dict(Payment.PAYMENT_METHODS)
     
     # Group by payment method
-    by_method = {}
-    for method, label in Payment.PAYMENT_METHODS:
-        method_total = payments.filter(payment_method=method).aggregate(total=Sum('amount'))['total'] or 0
-        by_method[label] = float(method_total)
+    by_method = {label: 0.0 for label in method_labels.values()}
+    for row in rollups.values('payment_method').annotate(total=Sum('total_amount')).order_by():
+        by_method[method_labels.get(row['payment_method'], row['payment_method'])] = float(row['total'])
     
-    return Response({
-        'total_revenue': float(total_revenue),
-        'payment_count': payment_count,
+    report = {
+        'total_revenue': float(totals['total'] or 0),
+        'payment_count': totals['count'] or 0,
         'by_method': by_method,
         'start_date': start_date,
         'end_date': end_date
+    }
+
+    if bucket:
+        series = {}
+        rows = rollups.annotate(period=Trunc('date', bucket, output_field=DateField())).values(
+            'period', 'payment_method'
+        ).annotate(total=Sum('total_amount'), count=Sum('payment_count')).order_by('period')
+        for row in rows:
+            period = series.setdefault(row['period'], {
+                'period': row['period'].isoformat(), 'total': 0.0, 'count': 0, 'by_method': {}
+            })
+            period['total'] += float(row['total'])
+            period['count'] += row['count']
+            period['by_method'][method_labels.get(row['payment_method'], row['payment_method'])] = float(row['total'])
+        report['bucket'] = bucket
+        report['series'] = list(series.values())
+
+    return Response(report)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def aging_report(request):
+    """
+    Get outstanding balances by days overdue from the fee aging rollups
+    GET /api/finance/reports/aging/
+    Query params: term_id, grade_id (optional)
+    """
+    rollups = FeeAgingRollup.objects.all()
+    for param, field in (('term_id', 'academic_term_id'), ('grade_id', 'grade_level_id')):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        if _int_or_none(value) is None:
+            return Response({'error': f'{param} must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        rollups = rollups.filter(**{field: int(value)})
+
+    rows = list(rollups.values(
+        'grade_level_id', 'grade_level__name', 'academic_term_id', 'academic_term__name',
+        'bucket', 'fee_count', 'total_balance', 'as_of',
+    ).order_by('grade_level__order', 'academic_term__start_date'))
+
+    by_grade, by_term = {}, {}
+    for row in rows:
+        by_grade.setdefault(row['grade_level_id'], {
+            'grade_level': row['grade_level_id'], 'grade_name': row['grade_level__name'], 'rows': [],
+        })['rows'].append(row)
+        by_term.setdefault(row['academic_term_id'], {
+            'academic_term': row['academic_term_id'], 'term_name': row['academic_term__name'], 'rows': [],
+        })['rows'].append(row)
+    for group in [*by_grade.values(), *by_term.values()]:
+        group['buckets'] = aging.summarise_buckets(group.pop('rows'))
+        group['total_balance'] = sum(bucket['total_balance'] for bucket in group['buckets'])
+
+    buckets = aging.summarise_buckets(rows)
+    return Response({
+        'as_of': min((row['as_of'] for row in rows), default=None),
+        'total_balance': sum(bucket['total_balance'] for bucket in buckets),
+        'buckets': buckets,
+        'by_grade': list(by_grade.values()),
+        'by_term': list(by_term.values()),
     })
 
 
@@ -246,67 +498,25 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
         """
         Bill multiple students or grades based on fee structures
         POST /api/finance/student-fees/bulk_bill/
-        Body: { "grade_ids": [1, 2], "term_id": 5, "student_ids": [] }
+        Body: { "grade_ids": [1, 2], "term_id": 5, "student_ids": [], "dry_run": false }
+        With dry_run the response previews what would be billed, per grade, without writing.
         """
         grade_ids = request.data.get('grade_ids', [])
         term_id = request.data.get('term_id')
         student_ids = request.data.get('student_ids', [])
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true')
 
         if not term_id:
             return Response({'error': 'term_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         term = get_object_or_404(AcademicTerm, id=term_id)
-        students_to_bill = Student.objects.none()
+        plan = plan_bulk_billing(term, grade_ids, student_ids)
 
-        if grade_ids:
-            students_to_bill = students_to_bill | Student.objects.filter(grade_level_id__in=grade_ids, is_superuser=False)
-        
-        if student_ids:
-            students_to_bill = students_to_bill | Student.objects.filter(id__in=student_ids, is_superuser=False)
-
-        students_to_bill = students_to_bill.distinct()
-        
-        created_count = 0
-        skipped_count = 0
-        no_structure_count = 0
-
-        for student in students_to_bill:
-            if not student.grade_level:
-                skipped_count += 1
-                continue
-
-            # Find matching fee structure
-            structure = FeeStructure.objects.filter(
-                grade_level=student.grade_level,
-                academic_term=term,
-                is_active=True
-            ).first()
+        if dry_run:
+            return Response({'message': 'Billing preview (nothing was created).', 'dry_run': True, **plan.summary()})
 
-            if not structure:
-                no_structure_count += 1
-                continue
-
-            # Check if already billed
-            if StudentFee.objects.filter(student=student, fee_structure=structure).exists():
-                skipped_count += 1
-                continue
-
-            # Create the fee
-            StudentFee.objects.create(
-                student=student,
-                fee_structure=structure
-            )
-            created_count += 1
-            
-            # Invalidate cache
-            FinanceCacheService.invalidate_cache(student.id)
-
-        return Response({
-            'message': f'Billing complete.',
-            'created': created_count,
-            'skipped_already_exists': skipped_count,
-            'no_structure_found': no_structure_count
-        })
+        apply_bulk_billing(plan)
+        return Response({'message': f'Billing complete.', 'dry_run': False, **plan.summary()})
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
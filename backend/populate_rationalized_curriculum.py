@@ -6,7 +6,14 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'school_management.settings')
 django.setup()
 
-from cbc.models import GradeLevel, LearningArea
+from cbc import releases
+from cbc.curriculum import get_curriculum
+from cbc.models import CurriculumRelease, GradeLevel, LearningArea
+
+# The rationalized curriculum is a release over the base registry, so cohorts
+# still on the old curriculum keep it (see cbc.releases)
+RELEASE_CODE = 'rationalized'
+
 
 def populate_learning_areas():
     curriculum_map = {
@@ -53,6 +60,15 @@ def populate_learning_areas():
         'Grades 10-12': [10, 11, 12]
     }
 
+    release, created = CurriculumRelease.objects.get_or_create(
+        code=RELEASE_CODE,
+        defaults={'name': 'Rationalized CBC', 'description': 'KICD rationalized learning areas'}
+    )
+    if created:
+        print(f"Created curriculum release: {release.name}")
+    curriculum = get_curriculum(release.id)
+    existing = {(area.grade.id, area.name) for area in curriculum.areas.values()}
+
     for group_name, area_list in curriculum_map.items():
         grades = grade_groups[group_name]
         for grade_num in grades:
@@ -62,17 +78,18 @@ def populate_learning_areas():
                 print(f"Processing {grade_name}...")
                 for name, base_code in area_list:
                     code = f"{base_code}-G{grade_num}"
-                    area, created = LearningArea.objects.get_or_create(
-                        name=name,
-                        grade_level=grade_level,
-                        defaults={'code': code, 'is_active': True}
-                    )
-                    if created:
-                        print(f"  Created Learning Area: {name} ({code})")
-                    else:
+                    if (grade_level.id, name) in existing:
                         print(f"  Skipped (already exists): {name}")
+                        continue
+                    try:
+                        releases.add(release, LearningArea, grade_level.id, name=name, code=code, is_active=True)
+                        print(f"  Created Learning Area: {name} ({code})")
+                    except ValueError as e:
+                        print(f"  Skipped: {e}")
             except GradeLevel.DoesNotExist:
                 print(f"Error: {grade_name} not found.")
 
+    print(f"Assign grades with: python manage.py curriculum_release assign {RELEASE_CODE} --grades <names>")
+
 if __name__ == "__main__":
     populate_learning_areas()
@@ -213,6 +213,98 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASS', '')
 RATELIMIT_ENABLE = True
 RATELIMIT_RATE = '100/m'  # 100 requests per minute
 
+# Sliding-window rate limits (core.rate_limiting); admins are exempt
+RATE_LIMITS = {
+    'ENABLED': True,
+    'BACKEND': 'auto',  # 'cache', 'local', or a dotted path to a backend class
+    'DEFAULT': {
+        'anonymous': '500/h',
+        'student': '1000/h',
+        'teacher': '1000/h',
+        'parent': '1000/h',
+        '*': '500/h',  # roles without a rate of their own, e.g. 'unknown'
+    },
+    'ROUTES': [
+        ('/api/auth/login/', {'anonymous': '60/m'}),
+        # Providers post bursts of callbacks from a handful of IPs
+        ('/api/finance/callbacks/', {'anonymous': '6000/m'}),
+    ],
+}
+
+# Buffered access logging (core.access_log_writer)
+ACCESS_LOG = {
+    'ENABLED': os.getenv('ACCESS_LOG_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '1.0')),  # 5xx responses are always logged
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 2.0,  # seconds
+    'MAX_BUFFER': 10000,
+    'OVERFLOW': 'drop_oldest',  # or 'drop_newest'
+}
+
+# External finance API client (finance.external_api)
+FINANCE_API = {
+    'TIMEOUT': 10,  # read timeout, seconds
+    'POOL_MAXSIZE': 16,  # keep-alive connections per host
+    'RETRIES': 2,  # GET requests only, with jittered exponential backoff
+    'BREAKER_THRESHOLD': 5,  # consecutive failures before failing fast
+    'BREAKER_RESET': 30,  # seconds before a trial request is allowed
+    # The upstream's students/batch/<type> endpoint is undocumented; enable once it is confirmed
+    'BATCH_ENDPOINTS': os.getenv('FINANCE_API_BATCH_ENDPOINTS', '') == '1',
+    'BATCH_SIZE': 100,  # student IDs per batch request (sync_finance_cache)
+}
+
+# Tiered finance API cache (finance.cache_service)
+FINANCE_CACHE = {
+    'TTL': 3600,  # seconds served as fresh
+    'STALE_TTL': 600,  # seconds served stale while refreshing in the background
+    'LOCAL_TTL': 15,  # per-process LRU copies; bounds cross-process staleness after invalidation
+    'LOCAL_MAX_ENTRIES': 5000,
+    'DB_FALLBACK': True,  # keep FinanceCache rows as a durable copy
+}
+
+# Prometheus /metrics (core.metrics): open to these addresses, or with the bearer token
+METRICS = {
+    'ALLOWED_IPS': [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')],
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+}
+
+# Payment callback inbox (finance.callback_inbox)
+FINANCE_CALLBACKS = {
+    # HMAC-SHA256 key of the X-Callback-Signature header; callbacks are refused while it is empty
+    'SECRET': os.getenv('PAYMENT_CALLBACK_SECRET', ''),
+    'BATCH_SIZE': 500,  # callbacks applied per transaction
+    'CLAIM_TIMEOUT': 300,  # seconds before a batch held by a dead applier is retried
+}
+
+# File downloads (core.downloads); let the web server stream stored files
+DOWNLOADS = {
+    'BACKEND': os.getenv('DOWNLOAD_BACKEND', 'python'),  # 'python', 'x-accel-redirect' or 'x-sendfile'
+    # nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+    'ACCEL_ROOTS': [(MEDIA_ROOT, '/protected-media/')],
+}
+
+# Detached management command processes (core.background)
+BACKGROUND_COMMANDS = {
+    'LOG_DIR': os.path.join(BASE_DIR, 'logs'),  # <command>.log per background command
+}
+
+# In-memory CBC curriculum snapshot (cbc.curriculum)
+CURRICULUM_SNAPSHOT = {
+    'CHECK_INTERVAL': 5,  # seconds between version checks; bounds cross-process staleness after a registry write
+}
+
+# Precomputed curriculum bundles for clients (cbc.bundles)
+CURRICULUM_BUNDLES = {
+    'KEEP_VERSIONS': 10,  # past contents kept per bundle as bases for ?since= deltas
+    'BACKGROUND_REBUILD': True,  # rebuild in a thread after registry commits
+    'DELAY': 2,  # seconds to gather further registry writes before rebuilding
+}
+
+# Ranked learning outcome search (cbc.outcome_search)
+OUTCOME_SEARCH = {
+    'BACKEND': os.getenv('OUTCOME_SEARCH_BACKEND', 'auto'),  # 'auto', 'fts5' (SQLite) or 'table'
+}
+
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_MAX_MEMORY_SIZE = 26214400  # 25MB
 
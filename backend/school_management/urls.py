@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.metrics import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
@@ -29,6 +31,7 @@ urlpatterns = [
     path('api/parents/', include('students.parent_urls')),  # Parent Portal API
     path('api/finance/', include('finance.urls')),  # Finance API
     path('api/events/', include('events.urls')),  # Schools Events and Clubs
+    path('metrics', metrics, name='prometheus-django-metrics'),  # Prometheus, scrapers only
 ]
 
 if settings.DEBUG:
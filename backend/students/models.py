@@ -65,10 +65,11 @@ class Student(AbstractUser):
         
         # If grade_level changed or student is new, update CBC learning areas
         if self.grade_level and (is_new or self.grade_level != old_grade_level):
-            from cbc.models import LearningArea
-            areas = LearningArea.objects.filter(grade_level=self.grade_level, is_active=True)
-            for area in areas:
-                area.students.add(self)
+            # The areas of the release the grade follows, by node id (cbc.releases)
+            from cbc.curriculum import get_curriculum
+            grade = next((grade for grade in get_curriculum().grades if grade.id == self.grade_level_id), None)
+            if grade is not None:
+                self.learning_areas.add(*[area.id for area in grade.areas if area.is_active])
 
     def __str__(self):
         return f"{self.get_full_name()} ({self.student_id})"
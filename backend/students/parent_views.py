@@ -22,7 +22,9 @@ from .parent_serializers import (
     AddChildSerializer
 )
 from cbc.report_generator import generate_student_report
-from finance.models import StudentFee, Payment, Invoice, FeeStructure
+from finance.aging import summarise_buckets
+from finance.models import StudentFee, Payment, Invoice, FeeAging, FeeStructure
+from finance.cache_service import FinanceCacheService
 from finance.serializers import StudentFeeSerializer, PaymentSerializer, InvoiceSerializer, FeeStructureSerializer
 from courses.models import Assignment, Quiz, AssignmentSubmission, QuizSubmission
 from courses.serializers import AssignmentSerializer, QuizSerializer
@@ -310,19 +312,64 @@ class ParentViewSet(viewsets.ModelViewSet):
             
         fee_structure_data = FeeStructureSerializer(structures, many=True).data
 
+        # Days overdue come from the fee aging snapshot rather than invoice/payment joins
+        aging_rows = list(FeeAging.objects.filter(student=child).order_by('-days_overdue').values(
+            'student_fee_id', 'balance', 'due_date', 'days_overdue', 'bucket', 'as_of'
+        ))
+
         return Response({
             'fees': StudentFeeSerializer(fees, many=True).data,
             'payments': PaymentSerializer(payments, many=True).data,
             'invoices': InvoiceSerializer(invoices, many=True).data,
             'fee_frameworks': fee_structure_data,
+            'aging': {
+                'as_of': min((row['as_of'] for row in aging_rows), default=None),
+                'buckets': summarise_buckets(
+                    {'bucket': row['bucket'], 'fee_count': 1, 'total_balance': row['balance']} for row in aging_rows
+                ),
+                'fees': aging_rows,
+            },
             'summary': {
                 'total_fees': sum(f.final_amount for f in fees),
                 'total_paid': sum(f.amount_paid for f in fees),
                 'balance': sum(f.balance for f in fees),
-                'credit_balance': child.credit_balance
+                'credit_balance': child.credit_balance,
+                'max_days_overdue': aging_rows[0]['days_overdue'] if aging_rows else 0,
             }
         })
 
+    @action(detail=False, methods=['get'], url_path='children-finances')
+    def children_finances(self, request):
+        """
+        Get balance and fees for all of the parent's children, fetched concurrently
+        GET /api/parents/children-finances/
+        """
+        if not hasattr(request, 'parent_id'):
+            return Response({'error': 'Not authenticated'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        parent = get_object_or_404(Parent, id=request.parent_id)
+        children = list(parent.children.values('id', 'student_id', 'first_name', 'last_name'))
+        results, pending = FinanceCacheService.fetch_many(
+            [child['id'] for child in children], ['balance', 'fees']
+        )
+
+        return Response({
+            'children': [
+                {
+                    'id': child['id'],
+                    'student_id': child['student_id'],
+                    'name': f"{child['first_name']} {child['last_name']}".strip(),
+                    'balance': results[child['id']]['balance'],
+                    'fees': results[child['id']]['fees'],
+                }
+                for child in children
+            ],
+            # Lookups that missed the deadline; they finish in the background
+            'incomplete': [
+                {'child_id': child_id, 'data_type': data_type} for child_id, data_type in pending
+            ],
+        })
+
     @action(detail=False, methods=['get'], url_path='child-activities/(?P<child_id>[^/.]+)')
     def child_activities(self, request, child_id=None):
         """
@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 from django.db import models
 from courses.models import Course, Module, Lesson
 from .module_serializers import ModuleSerializer, ModuleCreateUpdateSerializer
+from cbc.curriculum import get_area
 from cbc.models import LearningArea, Strand, SubStrand
 from django.db import transaction
 
@@ -113,15 +114,20 @@ def sync_course_from_registry(request, course_id):
     Sync a teacher's workspace with the global CBC registry.
     Creates Modules (from Strands) and Lessons (from Sub-strands).
     """
-    learning_area = get_object_or_404(LearningArea, id=course_id)
+    learning_area = get_object_or_404(LearningArea.objects.current(), id=course_id)
     
     # Check permission
     if not hasattr(request.user, 'teacher') or learning_area.teacher != request.user.teacher:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
+    # Strands and sub-strands as the area's release words them, without override rows
+    area_node = get_area(learning_area.id)
+    if area_node is None:
+        return Response({'error': 'Learning area not found'}, status=status.HTTP_404_NOT_FOUND)
+
     try:
         with transaction.atomic():
-            strands = learning_area.strands.all().prefetch_related('sub_strands')
+            strands = area_node.strands
             
             created_modules = 0
             created_lessons = 0
@@ -141,7 +147,7 @@ def sync_course_from_registry(request, course_id):
                 if m_created: created_modules += 1
                 
                 # 2. Create Lessons from SubStrands
-                for sub in strand.sub_strands.all():
+                for sub in strand.sub_strands:
                     lesson, l_created = Lesson.objects.get_or_create(
                         module=module,
                         title=sub.name,
@@ -23,7 +23,7 @@ def lesson_quizzes_api(request, lesson_id):
     except Lesson.DoesNotExist:
         # Fallback to CBC SubStrand
         try:
-            sub_strand = SubStrand.objects.get(id=lesson_id)
+            sub_strand = SubStrand.objects.current().get(id=lesson_id)
             learning_area = sub_strand.strand.learning_area
             course_teacher = learning_area.teacher
         except SubStrand.DoesNotExist:
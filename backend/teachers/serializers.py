@@ -91,10 +91,11 @@ class LearningAreaSerializer(serializers.ModelSerializer):
         return 0
     
     def get_modules(self, obj):
-        # Map Strands to "Modules" for frontend compatibility
-        from cbc.serializers import StrandDetailSerializer
-        strands = obj.strands.all().order_by('order')
-        return StrandDetailSerializer(strands, many=True).data
+        # Map Strands to "Modules" for frontend compatibility, as the area's release words them
+        from cbc.curriculum import get_area
+        from cbc.serializers import strand_detail_data
+        node = get_area(obj.id)
+        return [strand_detail_data(strand) for strand in node.strands] if node else []
 
     def get_quizzes(self, obj):
         from courses.models import Quiz
@@ -122,8 +123,9 @@ class LearningAreaSerializer(serializers.ModelSerializer):
         }
 
     def get_learning_summary(self, obj):
-        from cbc.models import SubStrand
-        sub_strand_count = SubStrand.objects.filter(strand__learning_area=obj).count()
+        from cbc.curriculum import get_area
+        node = get_area(obj.id)
+        sub_strand_count = sum(len(strand.sub_strands) for strand in node.strands) if node else 0
         return {
             'published_lessons': sub_strand_count,
             'quiz_count': obj.quizzes.filter(is_published=True).count(),
@@ -303,7 +303,7 @@ def assigned_courses_api(request):
     from cbc.models import LearningArea
     
     # Get CBC Learning Areas assigned to this teacher
-    learning_areas = LearningArea.objects.filter(teacher=request.user.teacher, is_active=True)
+    learning_areas = LearningArea.objects.current().filter(teacher=request.user.teacher, is_active=True)
     serializer = LearningAreaSerializer(learning_areas, many=True)
     
     # Calculate unique student count across all assigned learning areas
@@ -398,7 +398,7 @@ def teacher_class_attendance(request):
     
     # Get all learning areas taught by the teacher
     from cbc.models import LearningArea
-    areas = LearningArea.objects.filter(teacher=teacher)
+    areas = LearningArea.objects.current().filter(teacher=teacher)
     
     # Aggregate attendance by learning area and date
     attendance_data = []